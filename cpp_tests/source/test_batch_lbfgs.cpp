@@ -0,0 +1,71 @@
+#include "pele/array.h"
+#include "pele/lj.h"
+#include "pele/lbfgs.h"
+#include "pele/batch_lbfgs.h"
+#include <cstdlib>
+#include <memory>
+#include <stdexcept>
+#include <gtest/gtest.h>
+
+using pele::Array;
+
+class BatchLBFGSTest : public ::testing::Test {
+public:
+    std::shared_ptr<pele::LJ> lj;
+    size_t natoms, ndof, n;
+    Array<double> x0;
+
+    virtual void SetUp()
+    {
+        lj = std::make_shared<pele::LJ>(4., 4.);
+        natoms = 7;
+        ndof = 3 * natoms;
+        n = 11;
+        x0 = Array<double>(n * ndof);
+        std::srand(1);
+        for (size_t i = 0; i < x0.size(); ++i) {
+            x0[i] = 1.5 * (double(std::rand()) / RAND_MAX - 0.5);
+        }
+    }
+
+    void check(size_t nthreads)
+    {
+        Array<double> x(n * ndof), f(n), rms(n);
+        Array<long> nfev(n), niter(n), success(n);
+        pele::BatchLBFGS batch(lj, 1e-4, 4, nthreads);
+        batch.set_max_iter(2000);
+        batch.run(x0, ndof, x, f, rms, nfev, niter, success);
+
+        for (size_t i = 0; i < n; ++i) {
+            Array<double> xi = Array<double>(x0.data() + i * ndof, ndof).copy();
+            pele::LBFGS lbfgs(lj, xi, 1e-4, 4);
+            lbfgs.set_max_iter(2000);
+            lbfgs.run();
+            ASSERT_EQ(lbfgs.get_nfev(), nfev[i]);
+            ASSERT_EQ(lbfgs.get_niter(), niter[i]);
+            ASSERT_EQ(lbfgs.success(), bool(success[i]));
+            ASSERT_DOUBLE_EQ(lbfgs.get_f(), f[i]);
+            ASSERT_DOUBLE_EQ(lbfgs.get_rms(), rms[i]);
+            Array<double> xnew = lbfgs.get_x();
+            for (size_t k = 0; k < ndof; ++k) {
+                ASSERT_DOUBLE_EQ(xnew[k], x[i * ndof + k]);
+            }
+        }
+    }
+};
+
+TEST_F(BatchLBFGSTest, SameAsSingle_Works){
+    check(1);
+}
+
+TEST_F(BatchLBFGSTest, Threaded_Works){
+    check(3);
+}
+
+TEST_F(BatchLBFGSTest, WrongSize_Throws){
+    Array<double> x(n * ndof), f(n - 1), rms(n);
+    Array<long> nfev(n), niter(n), success(n);
+    pele::BatchLBFGS batch(lj);
+    EXPECT_THROW(batch.run(x0, ndof, x, f, rms, nfev, niter, success), std::invalid_argument);
+    EXPECT_THROW(batch.run(x0, ndof + 1, x, f, rms, nfev, niter, success), std::invalid_argument);
+}
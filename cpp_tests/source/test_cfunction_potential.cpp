@@ -0,0 +1,86 @@
+#include "pele/array.h"
+#include "pele/cfunction_potential.h"
+#include "pele/lbfgs.h"
+#include <memory>
+#include <stdexcept>
+#include <gtest/gtest.h>
+
+using pele::Array;
+
+namespace {
+
+// E = k * sum(x**2) with k passed as userdata
+double quadratic_energy(double const * x, size_t ndof, void * userdata)
+{
+    double const k = *static_cast<double *>(userdata);
+    double e = 0;
+    for (size_t i = 0; i < ndof; ++i) {
+        e += k * x[i] * x[i];
+    }
+    return e;
+}
+
+double quadratic_energy_gradient(double const * x, double * grad, size_t ndof, void * userdata)
+{
+    double const k = *static_cast<double *>(userdata);
+    for (size_t i = 0; i < ndof; ++i) {
+        grad[i] = 2 * k * x[i];
+    }
+    return quadratic_energy(x, ndof, userdata);
+}
+
+}
+
+class CFunctionPotentialTest : public ::testing::Test {
+public:
+    double k;
+    Array<double> x;
+
+    virtual void SetUp()
+    {
+        k = 1.5;
+        x = Array<double>(5);
+        for (size_t i = 0; i < x.size(); ++i) {
+            x[i] = 0.3 * i - 0.4;
+        }
+    }
+};
+
+TEST_F(CFunctionPotentialTest, Energy_Works){
+    pele::CFunctionPotential pot(&quadratic_energy, &quadratic_energy_gradient, &k);
+    double etrue = quadratic_energy(x.data(), x.size(), &k);
+    ASSERT_DOUBLE_EQ(etrue, pot.get_energy(x));
+    Array<double> g(x.size());
+    ASSERT_DOUBLE_EQ(etrue, pot.get_energy_gradient(x, g));
+    for (size_t i = 0; i < x.size(); ++i) {
+        ASSERT_DOUBLE_EQ(2 * k * x[i], g[i]);
+    }
+}
+
+TEST_F(CFunctionPotentialTest, EnergyOnly_Works){
+    pele::CFunctionPotential pot(&quadratic_energy, NULL, &k);
+    Array<double> g(x.size());
+    double e = pot.get_energy_gradient(x, g);
+    ASSERT_DOUBLE_EQ(quadratic_energy(x.data(), x.size(), &k), e);
+    for (size_t i = 0; i < x.size(); ++i) {
+        ASSERT_NEAR(2 * k * x[i], g[i], 1e-6);
+    }
+}
+
+TEST_F(CFunctionPotentialTest, GradientOnly_Works){
+    pele::CFunctionPotential pot(NULL, &quadratic_energy_gradient, &k);
+    ASSERT_DOUBLE_EQ(quadratic_energy(x.data(), x.size(), &k), pot.get_energy(x));
+}
+
+TEST_F(CFunctionPotentialTest, NoFunction_Throws){
+    EXPECT_THROW(pele::CFunctionPotential(NULL, NULL, &k), std::invalid_argument);
+}
+
+TEST_F(CFunctionPotentialTest, LBFGS_Works){
+    auto pot = std::make_shared<pele::CFunctionPotential>(&quadratic_energy,
+            &quadratic_energy_gradient, &k);
+    pele::LBFGS lbfgs(pot, x);
+    lbfgs.run();
+    ASSERT_TRUE(lbfgs.success());
+    ASSERT_NEAR(0, lbfgs.get_f(), 1e-8);
+}
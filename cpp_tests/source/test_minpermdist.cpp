@@ -0,0 +1,251 @@
+#include "pele/array.h"
+#include "pele/cutoff_permutation.h"
+#include "pele/lap.h"
+#include "pele/minpermdist.h"
+
+#include <algorithm>
+#include <random>
+#include <gtest/gtest.h>
+
+using pele::Array;
+
+TEST(LinearAssignmentTest, BruteForce_Works)
+{
+    std::mt19937 rng(0);
+    std::uniform_real_distribution<double> uniform(0., 1.);
+    for (size_t n = 1; n < 7; ++n) {
+        std::vector<double> cost(n * n);
+        for (size_t i = 0; i < n * n; ++i) {
+            cost[i] = uniform(rng);
+        }
+        std::vector<size_t> assignment;
+        double total = pele::linear_assignment(cost.data(), n, assignment);
+
+        std::vector<size_t> perm(n);
+        for (size_t i = 0; i < n; ++i) {
+            perm[i] = i;
+        }
+        double best = 1e100;
+        do {
+            double c = 0;
+            for (size_t i = 0; i < n; ++i) {
+                c += cost[i * n + perm[i]];
+            }
+            best = std::min(best, c);
+        } while (std::next_permutation(perm.begin(), perm.end()));
+        ASSERT_NEAR(total, best, 1e-10);
+
+        std::sort(assignment.begin(), assignment.end());
+        for (size_t i = 0; i < n; ++i) {
+            ASSERT_EQ(assignment[i], i);
+        }
+    }
+}
+
+TEST(SparseLinearAssignmentTest, DenseInput_SameAsDense)
+{
+    std::mt19937 rng(0);
+    std::uniform_real_distribution<double> uniform(0., 1.);
+    size_t const n = 30;
+    std::vector<double> cost(n * n);
+    std::vector<size_t> row_ptr(1, 0), cols;
+    for (size_t i = 0; i < n; ++i) {
+        for (size_t j = 0; j < n; ++j) {
+            cost[i * n + j] = uniform(rng);
+            cols.push_back(j);
+        }
+        row_ptr.push_back(cols.size());
+    }
+    std::vector<size_t> assignment, sparse_assignment;
+    double total = pele::linear_assignment(cost.data(), n, assignment);
+    double sparse_total;
+    pele::SparseLinearAssignment lap;
+    ASSERT_TRUE(lap.solve(row_ptr.data(), cols.data(), cost.data(), n,
+                sparse_assignment, sparse_total));
+    ASSERT_NEAR(total, sparse_total, 1e-10);
+}
+
+TEST(SparseLinearAssignmentTest, NoPerfectMatching_Fails)
+{
+    // rows 0 and 1 can only be assigned to column 0
+    size_t row_ptr[] = {0, 1, 2, 5};
+    size_t cols[] = {0, 0, 0, 1, 2};
+    double costs[] = {1., 1., 1., 1., 1.};
+    std::vector<size_t> assignment;
+    double total;
+    pele::SparseLinearAssignment lap;
+    ASSERT_FALSE(lap.solve(row_ptr, cols, costs, 3, assignment, total));
+}
+
+TEST(CutoffPermutationTest, Periodic_SameAsDense)
+{
+    std::mt19937 rng(0);
+    std::uniform_real_distribution<double> uniform(0., 1.);
+    size_t const natoms = 200;
+    std::vector<double> box(3);
+    box[0] = 6.; box[1] = 7.; box[2] = 8.;
+    std::vector<double> x1(3 * natoms), x2(3 * natoms);
+    for (size_t i = 0; i < natoms; ++i) {
+        for (size_t d = 0; d < 3; ++d) {
+            x1[3 * i + d] = box[d] * uniform(rng);
+        }
+    }
+    // x2 is a shuffled, perturbed copy of x1 with some atoms in other images
+    std::vector<size_t> shuffle(natoms);
+    for (size_t i = 0; i < natoms; ++i) {
+        shuffle[i] = i;
+    }
+    std::shuffle(shuffle.begin(), shuffle.end(), rng);
+    for (size_t i = 0; i < natoms; ++i) {
+        for (size_t d = 0; d < 3; ++d) {
+            x2[3 * shuffle[i] + d] = x1[3 * i + d] + 0.3 * (uniform(rng) - 0.5)
+                    + box[d] * (i % 3 == 0);
+        }
+    }
+
+    pele::CutoffPermutation cutoff_perm(box);
+    std::vector<size_t> perm;
+    double dist2;
+    ASSERT_TRUE(cutoff_perm.find_permutation(x1.data(), x2.data(), natoms, 0.1, 0,
+                perm, dist2));
+    ASSERT_GT(cutoff_perm.get_final_cutoff(), 0.1);
+    ASSERT_LT(cutoff_perm.get_npairs(), natoms * natoms / 4);
+
+    std::vector<double> cost(natoms * natoms);
+    for (size_t i = 0; i < natoms; ++i) {
+        for (size_t j = 0; j < natoms; ++j) {
+            double r2 = 0;
+            for (size_t d = 0; d < 3; ++d) {
+                double dx = x1[3 * i + d] - x2[3 * j + d];
+                dx -= box[d] * std::round(dx / box[d]);
+                r2 += dx * dx;
+            }
+            cost[i * natoms + j] = r2;
+        }
+    }
+    std::vector<size_t> assignment;
+    double total = pele::linear_assignment(cost.data(), natoms, assignment);
+    ASSERT_NEAR(dist2, total, 1e-10);
+    for (size_t i = 0; i < natoms; ++i) {
+        ASSERT_EQ(perm[i], shuffle[i]);
+    }
+
+    // with a small maximum cutoff there is no solution
+    ASSERT_FALSE(cutoff_perm.find_permutation(x1.data(), x2.data(), natoms, 0.01, 0.02,
+                perm, dist2));
+}
+
+TEST(CutoffPermutationTest, NonPeriodic_SameAsDense)
+{
+    std::mt19937 rng(2);
+    std::uniform_real_distribution<double> uniform(-3., 3.);
+    size_t const natoms = 50;
+    std::vector<double> x1(3 * natoms), x2(3 * natoms);
+    for (size_t i = 0; i < 3 * natoms; ++i) {
+        x1[i] = uniform(rng);
+        x2[i] = uniform(rng);
+    }
+    pele::CutoffPermutation cutoff_perm;
+    std::vector<size_t> perm;
+    double dist2;
+    ASSERT_TRUE(cutoff_perm.find_permutation(x1.data(), x2.data(), natoms, 0.5, 0,
+                perm, dist2));
+    std::vector<double> cost(natoms * natoms);
+    for (size_t i = 0; i < natoms; ++i) {
+        for (size_t j = 0; j < natoms; ++j) {
+            double r2 = 0;
+            for (size_t d = 0; d < 3; ++d) {
+                double const dx = x1[3 * i + d] - x2[3 * j + d];
+                r2 += dx * dx;
+            }
+            cost[i * natoms + j] = r2;
+        }
+    }
+    std::vector<size_t> assignment;
+    double total = pele::linear_assignment(cost.data(), natoms, assignment);
+    // the sparse solution is optimal among the pairs within the final cutoff
+    ASSERT_GE(dist2, total - 1e-10);
+    for (size_t i = 0; i < natoms; ++i) {
+        ASSERT_LE(cost[i * natoms + perm[i]],
+                std::pow(cutoff_perm.get_final_cutoff(), 2) + 1e-10);
+    }
+}
+
+class MinPermDistTest : public ::testing::Test {
+public:
+    size_t natoms;
+    Array<double> x1, x2;
+    std::vector<std::vector<size_t> > permlist;
+
+    virtual void SetUp()
+    {
+        std::mt19937 rng(1);
+        std::uniform_real_distribution<double> uniform(0., 3.);
+        natoms = 20;
+        x1 = Array<double>(3 * natoms);
+        x2 = Array<double>(3 * natoms);
+        for (size_t i = 0; i < 3 * natoms; ++i) {
+            x1[i] = uniform(rng);
+        }
+        permlist.resize(2);
+        for (size_t i = 0; i < natoms; ++i) {
+            permlist[i < 15 ? 0 : 1].push_back(i);
+        }
+
+        // x2 is a rotated, inverted, permuted and translated copy of x1
+        double rot[9];
+        pele::minpermdist_detail::random_rotation(rng, rot);
+        std::vector<size_t> perm(natoms);
+        for (size_t i = 0; i < natoms; ++i) {
+            perm[i] = i;
+        }
+        std::shuffle(perm.begin(), perm.begin() + 15, rng);
+        std::shuffle(perm.begin() + 15, perm.end(), rng);
+        for (size_t i = 0; i < natoms; ++i) {
+            for (size_t k = 0; k < 3; ++k) {
+                double r = 0;
+                for (size_t l = 0; l < 3; ++l) {
+                    r += rot[3 * k + l] * x1[3 * perm[i] + l];
+                }
+                x2[3 * i + k] = -r + 1. + k;
+            }
+        }
+    }
+};
+
+TEST_F(MinPermDistTest, Isomer_Works)
+{
+    pele::MinPermDistCluster mindist(permlist);
+    Array<double> x2new(3 * natoms);
+    double dist = mindist.align(x1, x2, x2new);
+    ASSERT_NEAR(dist, 0, 1e-8);
+    ASSERT_TRUE(mindist.get_transformation().invert);
+}
+
+TEST_F(MinPermDistTest, Threads_Works)
+{
+    pele::MinPermDistCluster mindist(permlist, true, 10, 0.01, 0.01, 4);
+    Array<double> x2new(3 * natoms);
+    double dist = mindist.align(x1, x2, x2new);
+    ASSERT_NEAR(dist, 0, 1e-8);
+}
+
+TEST_F(MinPermDistTest, Transformation_Works)
+{
+    std::mt19937 rng(2);
+    std::uniform_real_distribution<double> uniform(0., 3.);
+    for (size_t i = 0; i < 3 * natoms; ++i) {
+        x2[i] = uniform(rng);
+    }
+    pele::MinPermDistCluster mindist(permlist, true, 10, 0.01, 0.01, 2);
+    Array<double> x2new(3 * natoms);
+    Array<double> x2new2(3 * natoms);
+    double dist = mindist.align(x1, x2, x2new);
+    mindist.get_transformation().apply(x2.data(), x2new2.data(), natoms);
+    double d = 0;
+    for (size_t i = 0; i < 3 * natoms; ++i) {
+        ASSERT_NEAR(x2new[i], x2new2[i], 1e-10);
+        d += (x1[i] - x2[i]) * (x1[i] - x2[i]);
+    }
+    ASSERT_LE(dist, std::sqrt(d));
+}
@@ -0,0 +1,90 @@
+#include "pele/array.h"
+#include "pele/neb.h"
+#include "pele/lbfgs.h"
+#include "pele/harmonic.h"
+
+#include <iostream>
+#include <memory>
+#include <gtest/gtest.h>
+
+using pele::Array;
+
+/**
+ * a two dimensional double well with minima at (-1, 0) and (1, 0) and the
+ * saddle point at (0, 0)
+ */
+class DoubleWell : public pele::BasePotential {
+public:
+    virtual double get_energy(Array<double> x)
+    {
+        return (x[0] * x[0] - 1) * (x[0] * x[0] - 1) + 2 * x[1] * x[1];
+    }
+    virtual double get_energy_gradient(Array<double> x, Array<double> grad)
+    {
+        grad[0] = 4 * x[0] * (x[0] * x[0] - 1);
+        grad[1] = 4 * x[1];
+        return get_energy(x);
+    }
+};
+
+class NEBTest : public ::testing::Test {
+public:
+    size_t nimages;
+    Array<double> path;
+    std::shared_ptr<pele::BasePotential> pot;
+
+    virtual void SetUp()
+    {
+        nimages = 11;
+        path = Array<double>(2 * nimages);
+        for (size_t i = 0; i < nimages; ++i) {
+            double s = double(i) / (nimages - 1);
+            path[2 * i] = -1 + 2 * s;
+            path[2 * i + 1] = 0.5 * sin(M_PI * s);
+        }
+        pot = std::make_shared<DoubleWell>();
+    }
+};
+
+TEST_F(NEBTest, Constructor_EnergiesComputed)
+{
+    pele::NEB neb(pot, path, nimages);
+    Array<double> energies = neb.get_energies();
+    EXPECT_EQ(energies.size(), nimages);
+    EXPECT_NEAR(energies[0], 0, 1e-10);
+    EXPECT_NEAR(energies[nimages - 1], 0, 1e-10);
+    EXPECT_EQ(neb.get_nactive_dof(), 2 * (nimages - 2));
+}
+
+TEST_F(NEBTest, Optimize_FindsSaddle)
+{
+    auto neb = std::make_shared<pele::NEB>(pot, path, nimages, 10.);
+    Array<double> x0 = path.view(2, 2 * (nimages - 1)).copy();
+    pele::LBFGS lbfgs(neb, x0, 1e-6);
+    lbfgs.set_max_f_rise(1e3);
+    lbfgs.run(2000);
+    EXPECT_TRUE(lbfgs.success());
+
+    neb->make_all_maxima_climbing();
+    EXPECT_TRUE(neb->is_climbing(nimages / 2));
+    pele::LBFGS lbfgs2(neb, lbfgs.get_x(), 1e-6);
+    lbfgs2.set_max_f_rise(1e3);
+    lbfgs2.run(2000);
+    Array<double> coords = neb->get_coords();
+    Array<double> energies = neb->get_energies();
+    EXPECT_NEAR(coords[2 * (nimages / 2)], 0, 1e-4);
+    EXPECT_NEAR(coords[2 * (nimages / 2) + 1], 0, 1e-4);
+    EXPECT_NEAR(energies[nimages / 2], 1, 1e-6);
+}
+
+TEST_F(NEBTest, AdjustK_KIncreases)
+{
+    // move one image to make the spacing very uneven
+    path[2] = -0.99;
+    auto neb = std::make_shared<pele::NEB>(pot, path, nimages, 10.);
+    neb->set_adjust_k(1, 0.1, 2.);
+    Array<double> x0 = path.view(2, 2 * (nimages - 1)).copy();
+    Array<double> grad(x0.size());
+    neb->get_energy_gradient(x0, grad);
+    EXPECT_DOUBLE_EQ(neb->get_k(), 20.);
+}
@@ -1,8 +1,10 @@
 #include <gtest/gtest.h>
 #include "pele/graph.hpp"
 #include "pele/ngt.hpp"
+#include "pele/ngt_compact.hpp"
 
 using pele::NGT;
+using pele::CompactNGT;
 using pele::node_id;
 
 TEST(Graph, AddDuplicateEdges_NoEffect){
@@ -104,3 +106,38 @@ TEST_F(NGT10, RatesCommittors_Correct){
 	ASSERT_NEAR(ngt.get_rate_BA_SS(), kBASS, 1e-9);
 }
 
+TEST_F(NGT3, CompactRatesCommittors_Correct){
+	CompactNGT ngt(rate_map, A, B);
+	ngt.compute_rates_and_committors();
+	ASSERT_NEAR(ngt.get_rate_AB(), 1, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_BA(), 1, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_AB_SS(), 1.5, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_BA_SS(), 1.5, 1e-9);
+
+	auto committors = ngt.get_committors();
+	ASSERT_NEAR(committors.at(2), 0.5, 1e-9);
+}
+
+TEST_F(NGT10, CompactRates_Correct){
+	CompactNGT ngt(rate_map, A, B);
+	ngt.compute_rates();
+	ASSERT_NEAR(ngt.get_rate_AB(), kAB, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_BA(), kBA, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_AB_SS(), kABSS, 1e-9);
+	ASSERT_NEAR(ngt.get_rate_BA_SS(), kBASS, 1e-9);
+}
+
+TEST_F(NGT10, CompactRatesCommittors_SameAsNGT){
+	NGT ngt(rate_map, A, B);
+	ngt.compute_rates_and_committors();
+	CompactNGT compact(rate_map, A, B);
+	compact.compute_rates_and_committors();
+	ASSERT_NEAR(compact.get_rate_AB(), kAB, 1e-9);
+	ASSERT_NEAR(compact.get_rate_BA(), kBA, 1e-9);
+	auto committors = ngt.get_committors();
+	auto compact_committors = compact.get_committors();
+	ASSERT_EQ(committors.size(), compact_committors.size());
+	for (auto const & q : committors){
+		ASSERT_NEAR(q.second, compact_committors.at(q.first), 1e-9);
+	}
+}
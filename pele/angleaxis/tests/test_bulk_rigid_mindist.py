@@ -6,6 +6,7 @@ from math import pi, cos, sin
 from pele.angleaxis.rigidbody import RBTopologyBulk, RigidFragmentBulk
 from pele.angleaxis.aaperiodicttransforms import MeasurePeriodicRigid, ExactMatchRigidPeriodic, TransformPeriodicRigid
 from pele.mindist.periodic_mindist import MinPermDistBulk
+from pele.utils.rbtools import CoordsAdapter
 
 class TestExactMatchPeriodicRigid(unittest.TestCase):
     def setUp(self):
@@ -205,6 +206,29 @@ class TestExactMatchPeriodicRigid(unittest.TestCase):
         self.assertFalse(fail_counter, "alignment failed %d times" % fail_counter)
 
 
-    
+class TestMinPermDistBulkPermutations(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.nrigid = 5
+        self.boxl = np.array([5., 5., 5.])
+        import pele.angleaxis._otp_bulk as OTP
+        self.system = OTP.OTPBulk(self.nrigid, self.boxl, 2.5)
+        self.measure = MeasurePeriodicRigid(self.system.aatopology, TransformPeriodicRigid())
+        self.mindist = MinPermDistBulk(self.boxl, self.measure, transform=TransformPeriodicRigid(),
+                                       permlist=[range(self.nrigid)])
+
+    def test_permuted(self):
+        x1 = self.system.get_random_configuration()
+        x2 = x1.copy()
+        ca = CoordsAdapter(coords=x2)
+        perm = np.random.permutation(self.nrigid)
+        ca.posRigid[:] = ca.posRigid[perm] + 0.05
+        ca.rotRigid[:] = ca.rotRigid[perm]
+        ca.posRigid[0] += self.boxl
+        dist, x1new, x2new = self.mindist(x1, x2)
+        self.assertAlmostEqual(dist, 0., 5)
+        self.assertTrue(np.all(x1new == x1))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -7,7 +7,8 @@ from PyQt4.QtCore import pyqtSlot
 import networkx as nx
 
 import dgraph_browser
-from pele.utils.disconnectivity_graph import DisconnectivityGraph, database2graph, TreeLeastCommonAncestor
+from pele.utils.disconnectivity_graph import (DisconnectivityGraph, database2graph, TreeLeastCommonAncestor,
+                                              BarrierTree)
 from pele.storage import Database, TransitionState
 from pele.utils.events import Signal
 from pele.rates import RatesLinalg, compute_committors
@@ -171,6 +172,12 @@ class DGraphWidget(QWidget):
         
         self.database = database
         self.graph = graph
+        self._barrier_tree = None
+        if self.database is not None:
+            # the barrier tree can only grow, so it must be rebuilt when
+            # minima or transition states are removed or merged
+            self.database.on_minimum_removed.connect(self._reset_barrier_tree)
+            self.database.on_ts_removed.connect(self._reset_barrier_tree)
         
         self.ui = dgraph_browser.Ui_Form()
         self.ui.setupUi(self)
@@ -318,14 +325,26 @@ class DGraphWidget(QWidget):
         self._build_disconnectivity_graph(**self.params)
         self._draw_disconnectivity_graph(self.show_minima, self.show_trees)
 
+    def _reset_barrier_tree(self, *args, **kwargs):
+        """forget the cached barrier tree, it will be rebuilt from the database"""
+        self._barrier_tree = None
+
     def _build_disconnectivity_graph(self, **params):
         if self.database is not None:
             db = self.database
-            apply_Emax = "Emax" in params and "T" not in params
-            if apply_Emax:
-                self.graph = database2graph(db, Emax=params['Emax'])
-            else:
+            if "T" in params:
                 self.graph = database2graph(db)
+            else:
+                # only the transition states added since the last rebuild
+                # need to be processed
+                if (self._barrier_tree is not None and
+                        self._barrier_tree.number_of_minima() > db.number_of_minima()):
+                    # minima were removed without a signal
+                    self._barrier_tree = None
+                if self._barrier_tree is None:
+                    self._barrier_tree = BarrierTree()
+                self._barrier_tree.update_from_database(db)
+                self.graph = self._barrier_tree.to_graph(Emax=params.get("Emax"))
         dg = DisconnectivityGraph(self.graph, **params)
         dg.calculate()
         self.dg = dg
@@ -17,6 +17,7 @@ series of minima and transition states between two end point minima.
    :toctree: generated/
 
     DoubleEndedConnect
+    MultiDoubleEndedConnect
 
 Connect manager
 ++++++++++++++++++++++++++++
@@ -36,8 +37,10 @@ Other utilities
    :toctree: generated/
 
     TSGraph
+    CompactTSGraph
     database2graph
     smoothPath
+    TransitionStateCache
 
 Core Routines
 +++++++++++++
@@ -57,8 +60,11 @@ More core routines can be found in the documentation for the
 
 
 from _graph import *
+from _compact_graph import *
+from _ts_cache import *
 from local_connect import *
 from connect_min import *
+from connect_many import *
 #from singleended import *
 from _smooth_path import *
 from connect_manager import *
@@ -0,0 +1,488 @@
+"""a compact representation of the graph of minima and transition states
+
+For very large databases building a networkx graph of Minimum and
+TransitionState objects (see TSGraph and database2graph) is not possible
+because each object costs several kilobytes.  CompactTSGraph reads only the
+id, energy and connectivity columns from the database, in chunks, and stores
+them in numpy arrays.  The connected components are maintained with an array
+based union-find.
+"""
+import numpy as np
+import networkx as nx
+import scipy.sparse
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
+
+__all__ = ["CompactTSGraph", "ArrayUnionFind", "spanning_forest_edges"]
+
+
+class _Column(object):
+    """a numpy array which can be appended to in amortized constant time"""
+
+    def __init__(self, data, dtype=None):
+        self._data = np.array(data, dtype=dtype)
+        self.size = len(self._data)
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+    def append(self, value):
+        if self.size == len(self._data):
+            data = np.empty(max(16, 2 * self.size), dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        self._data[self.size] = value
+        self.size += 1
+
+
+class ArrayUnionFind(object):
+    """union-find (disjoint set) data structure over the integers 0 ... n-1
+
+    The parent of each element is stored in a numpy array and many unions can
+    be done at once with union_edges().  The root of each set is always its
+    element with the smallest index.
+
+    Parameters
+    ----------
+    n : int
+        the number of elements
+    """
+
+    def __init__(self, n=0):
+        self._parent = _Column(np.arange(n), dtype=np.int64)
+
+    def __len__(self):
+        return self._parent.size
+
+    @property
+    def parent(self):
+        return self._parent.values
+
+    def add(self):
+        """add a new element in its own set and return its index"""
+        i = len(self)
+        self._parent.append(i)
+        return i
+
+    def find(self, i):
+        """return the root of the set containing i"""
+        parent = self.parent
+        while parent[i] != i:
+            # path halving
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def roots(self, nodes):
+        """return the roots of the sets containing each of nodes"""
+        self.compress()
+        return self.parent[nodes]
+
+    def union(self, i, j):
+        """join the sets containing i and j.  Return False if they were already joined"""
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return False
+        parent = self.parent
+        if ri < rj:
+            parent[rj] = ri
+        else:
+            parent[ri] = rj
+        return True
+
+    def union_edges(self, u, v):
+        """join the sets containing u[k] and v[k] for all k
+
+        The connected components of the graph of the roots joined by the
+        edges are found with scipy.sparse.csgraph, so this takes linear time
+        however the sets are joined (e.g. for long chains of minima).
+        """
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        n = len(self)
+        roots = self.roots(np.arange(n))
+        ru, rv = roots[u], roots[v]
+        keep = ru != rv
+        if not keep.any():
+            return
+        matrix = scipy.sparse.coo_matrix((np.ones(np.count_nonzero(keep)), (ru[keep], rv[keep])),
+                                         shape=(n, n))
+        ncomponents, component = connected_components(matrix, directed=False)
+        # the elements which aren't roots are isolated in the graph, so the
+        # smallest element of each component is the smallest root
+        smallest = np.empty(ncomponents, dtype=np.int64)
+        smallest.fill(n)
+        np.minimum.at(smallest, component, np.arange(n))
+        self.parent[:] = smallest[component[roots]]
+
+    def compress(self):
+        """point every element directly at its root
+
+        This uses pointer jumping, each pass halves the depth of the trees.
+        """
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return
+            parent[:] = grandparent
+
+    def labels(self):
+        """return the root of every element"""
+        self.compress()
+        return self.parent.copy()
+
+
+def spanning_forest_edges(u, v, energies, n):
+    """return the indices of the edges in the minimum spanning forest
+
+    Parameters
+    ----------
+    u, v : arrays of ints
+        the nodes (in the range 0 ... n-1) joined by each edge
+    energies : array
+        the weight of each edge, e.g. the transition state energies
+    n : int
+        the number of nodes
+
+    Notes
+    -----
+    Edges which join a node to itself are ignored and of several edges
+    between the same pair of nodes only the lowest is considered.  The
+    connectivity of the nodes below any energy is the same for the
+    spanning forest as for all the edges.
+    """
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    energies = np.asarray(energies, dtype=float)
+    edges = np.where(u != v)[0]
+    u, v = np.minimum(u[edges], v[edges]), np.maximum(u[edges], v[edges])
+    # keep the lowest energy edge of each pair of nodes
+    order = np.lexsort((energies[edges], v, u))
+    edges, u, v = edges[order], u[order], v[order]
+    first = np.ones(len(edges), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    edges, u, v = edges[first], u[first], v[first]
+    if len(edges) == 0:
+        return edges
+
+    # weights must be positive because zeros are treated as missing edges
+    weights = energies[edges] - energies[edges].min() + 1.
+    matrix = scipy.sparse.coo_matrix((weights, (u, v)), shape=(n, n)).tocsr()
+    forest = minimum_spanning_tree(matrix).tocoo()
+    fu = np.minimum(forest.row, forest.col)
+    fv = np.maximum(forest.row, forest.col)
+    # the pairs (u, v) are sorted so the edges can be found by bisection
+    keys = u * n + v
+    return edges[np.searchsorted(keys, fu * n + fv)]
+
+
+def _stream_columns(query, ncol, chunk_size):
+    """return the rows of a query of ncol numerical columns as a float array
+
+    The rows are fetched from the database chunk_size at a time and each
+    chunk is converted to an array before the next one is read.
+    """
+    chunks = []
+    rows = []
+    for row in query.yield_per(chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            chunks.append(np.array(rows, dtype=float).reshape(-1, ncol))
+            rows = []
+    chunks.append(np.array(rows, dtype=float).reshape(-1, ncol))
+    return np.concatenate(chunks)
+
+
+def _in_chunks(values, chunk_size=500):
+    """split values into chunks small enough for an sql IN clause"""
+    for i in xrange(0, len(values), chunk_size):
+        yield values[i:i + chunk_size]
+
+
+class CompactTSGraph(object):
+    """a memory efficient graph of the minima and transition states in a database
+
+    Only the ids, the energies and the connectivity are loaded from the
+    database.  They are streamed from the database in chunks and stored in
+    numpy arrays, so no Minimum or TransitionState objects are created.  The
+    minima are referred to by their index in the arrays.  Functions which take
+    minima accept either Minimum objects or minimum ids.
+
+    The connected components are kept up to date in an ArrayUnionFind as
+    transition states are added.  The interface for adding minima and
+    transition states and for checking connectivity is the same as that of
+    TSGraph, so this can be used in its place when a networkx graph is not
+    needed.
+
+    Parameters
+    ----------
+    database : pele Database
+    Emax : float, optional
+        include only minima and transition states with energy <= Emax
+    chunk_size : int
+        the number of rows to read from the database at a time
+
+    Attributes
+    ----------
+    min_ids, min_energy : arrays
+        the id and energy of each minimum
+    ts_ids, ts_energy : arrays
+        the id and energy of each transition state
+    ts_min1, ts_min2 : arrays
+        the indices of the minima connected by each transition state
+
+    See Also
+    --------
+    TSGraph, database2graph
+
+    Examples
+    --------
+    A disconnectivity graph of a database which is too large for database2graph::
+
+    >>> graph = CompactTSGraph(database)
+    >>> dgraph = DisconnectivityGraph(graph.to_graph())
+    >>> dgraph.calculate()
+    """
+
+    def __init__(self, database, Emax=None, chunk_size=100000):
+        from pele.storage.database import Minimum, TransitionState
+
+        self.storage = database
+        self.chunk_size = chunk_size
+
+        query = database.session.query(Minimum._id, Minimum.energy)
+        if Emax is not None:
+            query = query.filter(Minimum.energy <= Emax)
+        min_data = _stream_columns(query, 2, chunk_size)
+
+        query = database.session.query(TransitionState._id, TransitionState.energy,
+                                       TransitionState._minimum1_id, TransitionState._minimum2_id)
+        if Emax is not None:
+            query = query.filter(TransitionState.energy <= Emax)
+        ts_data = _stream_columns(query, 4, chunk_size)
+
+        self._set_arrays(min_data[:, 0].astype(np.int64), min_data[:, 1],
+                         ts_data[:, 0].astype(np.int64), ts_data[:, 1],
+                         ts_data[:, 2].astype(np.int64), ts_data[:, 3].astype(np.int64))
+
+    def _set_arrays(self, min_ids, min_energy, ts_ids, ts_energy, ts_min1_ids, ts_min2_ids):
+        """store the columns and compute the connected components"""
+        self._min_ids = _Column(min_ids, dtype=np.int64)
+        self._min_energy = _Column(min_energy, dtype=float)
+        self._removed = _Column(np.zeros(len(min_ids), dtype=bool))
+        self._index_of_id = np.zeros(0, dtype=np.int64)
+        self._set_index(self.min_ids, np.arange(len(min_ids)))
+
+        min1 = self._indices(ts_min1_ids)
+        min2 = self._indices(ts_min2_ids)
+        # skip transition states connected to minima that were excluded
+        keep = (min1 >= 0) & (min2 >= 0)
+        self._ts_ids = _Column(ts_ids[keep], dtype=np.int64)
+        self._ts_energy = _Column(ts_energy[keep], dtype=float)
+        self._ts_min1 = _Column(min1[keep], dtype=np.int64)
+        self._ts_min2 = _Column(min2[keep], dtype=np.int64)
+
+        self.union_find = ArrayUnionFind(self._min_ids.size)
+        self.union_find.union_edges(self.ts_min1, self.ts_min2)
+
+    @property
+    def min_ids(self):
+        return self._min_ids.values
+
+    @property
+    def min_energy(self):
+        return self._min_energy.values
+
+    @property
+    def ts_ids(self):
+        return self._ts_ids.values
+
+    @property
+    def ts_energy(self):
+        return self._ts_energy.values
+
+    @property
+    def ts_min1(self):
+        return self._ts_min1.values
+
+    @property
+    def ts_min2(self):
+        return self._ts_min2.values
+
+    def _set_index(self, ids, indices):
+        if len(ids) == 0:
+            return
+        nmax = ids.max() + 1
+        if nmax > len(self._index_of_id):
+            index_of_id = -np.ones(max(nmax, 2 * len(self._index_of_id)), dtype=np.int64)
+            index_of_id[:len(self._index_of_id)] = self._index_of_id
+            self._index_of_id = index_of_id
+        self._index_of_id[ids] = indices
+
+    def _indices(self, ids):
+        """return the index of each minimum id.  -1 for ids not in the graph"""
+        ids = np.asarray(ids, dtype=np.int64)
+        indices = -np.ones(ids.shape, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self._index_of_id))
+        indices[known] = self._index_of_id[ids[known]]
+        return indices
+
+    def index(self, minimum):
+        """return the index of a minimum (or minimum id) in the arrays"""
+        mid = minimum if not hasattr(minimum, "id") else minimum.id()
+        i = self._indices([mid])[0]
+        if i < 0:
+            raise KeyError("minimum %s is not in the graph" % str(mid))
+        return i
+
+    def number_of_minima(self):
+        return self._min_ids.size - np.count_nonzero(self._removed.values)
+
+    def number_of_transition_states(self):
+        return self._ts_ids.size
+
+    def get_minima(self, indices):
+        """load the Minimum objects at the given indices from the database"""
+        from pele.storage.database import Minimum
+
+        ids = self.min_ids[np.asarray(indices, dtype=np.int64)].tolist()
+        id_to_minimum = dict()
+        for chunk in _in_chunks(ids):
+            for m in self.storage.session.query(Minimum).filter(Minimum._id.in_(chunk)):
+                id_to_minimum[m._id] = m
+        return [id_to_minimum[mid] for mid in ids]
+
+    def addMinimum(self, minimum):
+        """add a minimum to the graph"""
+        if self._indices([minimum.id()])[0] >= 0:
+            return minimum
+        i = self.union_find.add()
+        self._min_ids.append(minimum.id())
+        self._min_energy.append(minimum.energy)
+        self._removed.append(False)
+        self._set_index(np.array([minimum.id()]), np.array([i]))
+        return minimum
+
+    def addTransitionState(self, ts):
+        """add a transition state to the graph"""
+        self.addMinimum(ts.minimum1)
+        self.addMinimum(ts.minimum2)
+        i, j = self.index(ts.minimum1), self.index(ts.minimum2)
+        self._ts_ids.append(ts.id())
+        self._ts_energy.append(ts.energy)
+        self._ts_min1.append(i)
+        self._ts_min2.append(j)
+        self.union_find.union(i, j)
+        return ts
+
+    def areConnected(self, min1, min2):
+        """return True if there is a path of transition states between min1 and min2"""
+        uf = self.union_find
+        return uf.find(self.index(min1)) == uf.find(self.index(min2))
+
+    def mergeMinima(self, min1, min2):
+        """
+        delete minima2.  all transition states pointing to min2 should
+        now point to min1
+        """
+        i1, i2 = self.index(min1), self.index(min2)
+        self.union_find.union(i1, i2)
+        self.ts_min1[self.ts_min1 == i2] = i1
+        self.ts_min2[self.ts_min2 == i2] = i1
+        self._removed.values[i2] = True
+        self._set_index(self.min_ids[i2:i2 + 1], np.array([-1]))
+
+    def component_labels(self):
+        """return a label for each minimum.  Minima in the same connected component have the same label"""
+        return self.union_find.labels()
+
+    def connected_components(self):
+        """return the connected components as a list of arrays of minimum indices
+
+        The components are sorted from largest to smallest.
+        """
+        labels = self.component_labels()
+        indices = np.where(~self._removed.values)[0]
+        labels = labels[indices]
+        order = np.argsort(labels, kind="mergesort")
+        labels, indices = labels[order], indices[order]
+        starts = np.concatenate(([0], np.nonzero(labels[1:] != labels[:-1])[0] + 1))
+        components = np.split(indices, starts[1:])
+        components.sort(key=len, reverse=True)
+        return components
+
+    def _edges(self):
+        """return the indices of the transition states which aren't self connections"""
+        return np.where(self.ts_min1 != self.ts_min2)[0]
+
+    def minimum_spanning_forest(self):
+        """return the indices of the transition states in the minimum spanning forest
+
+        For each pair of connected minima only the lowest energy transition state
+        is considered.  The connectivity of the minima below any energy is the same
+        for the spanning forest as for the full set of transition states, so it is
+        sufficient for constructing a disconnectivity graph.
+
+        See Also
+        --------
+        spanning_forest_edges
+        """
+        return spanning_forest_edges(self.ts_min1, self.ts_min2, self.ts_energy,
+                                     self._min_ids.size)
+
+    def to_graph(self, minima=None, spanning_forest=True):
+        """return a networkx graph of Minimum and TransitionState objects
+
+        Parameters
+        ----------
+        minima : array of ints, optional
+            the indices of the minima to include.  Default is all minima
+        spanning_forest : bool
+            if True include only the transition states of the minimum spanning
+            forest, otherwise include all of them.
+
+        Notes
+        -----
+        The graph can be passed to DisconnectivityGraph.  With the spanning forest
+        the number of edges is at most the number of minima and the graph is
+        that of a BarrierTree of the minima.  Note that the default energy
+        levels of the disconnectivity graph depend on the highest energy
+        transition state in the graph.
+        """
+        from pele.storage.database import TransitionState
+
+        include = ~self._removed.values
+        if minima is not None:
+            selected = np.zeros(len(include), dtype=bool)
+            selected[np.asarray(minima, dtype=np.int64)] = True
+            include &= selected
+
+        if spanning_forest:
+            edges = self.minimum_spanning_forest()
+        else:
+            edges = self._edges()
+        edges = edges[include[self.ts_min1[edges]] & include[self.ts_min2[edges]]]
+
+        # load the minima first, so the sql session can find the minima of the
+        # transition states without querying the database again
+        minima = self.get_minima(np.where(include)[0])
+
+        # sort the transition states with the largest energy first, so the lowest
+        # energy transition state is kept for duplicate edges (as in database2graph)
+        ts_ids = self.ts_ids[edges[np.argsort(-self.ts_energy[edges], kind="mergesort")]].tolist()
+        id_to_ts = dict()
+        for chunk in _in_chunks(ts_ids):
+            for ts in self.storage.session.query(TransitionState).filter(TransitionState._id.in_(chunk)):
+                id_to_ts[ts._id] = ts
+        tslist = [id_to_ts[tsid] for tsid in ts_ids]
+
+        if spanning_forest:
+            from pele.utils.disconnectivity_graph import BarrierTree
+            return BarrierTree.from_transition_states(minima, tslist).to_graph()
+
+        graph = nx.Graph()
+        graph.add_nodes_from(minima)
+        for ts in tslist:
+            graph.add_edge(ts.minimum1, ts.minimum2, ts=ts)
+        return graph
@@ -1,5 +1,9 @@
-import networkx as nx
+import heapq
+import itertools
 import logging
+from collections import defaultdict, OrderedDict
+
+import networkx as nx
 
 
 __all__ = []
@@ -7,6 +11,170 @@ __all__ = []
 logger = logging.getLogger("pele.connect")
 
 
+class _IncrementalShortestPath(object):
+    """maintain the shortest path tree from a single source in a weighted graph
+    
+    The full Dijkstra search is done only once.  After that the tree is
+    updated each time an edge weight changes or a node is added or removed.
+    Only the part of the tree that is affected by the change is recomputed.
+    
+    Parameters
+    ----------
+    graph : networkx.Graph
+        the graph.  The edge weights are stored in the attribute "weight".
+        The graph must not be modified without notifying this class.
+    source :
+        the node from which all paths start
+    
+    Notes
+    -----
+    If an edge weight decreases, the new distances are propagated outwards
+    from the end of the edge with a Dijkstra search which stops as soon as
+    no distances improve.  If an edge in the shortest path tree increases 
+    in weight, or a node in the tree is removed, the distances of the nodes
+    in the subtree below it are reset and recomputed from their neighbors
+    outside the subtree.
+    """
+
+    def __init__(self, graph, source):
+        self.graph = graph
+        self.source = source
+        self.dist = dict()
+        self.pred = dict()
+        self._counter = itertools.count()
+        self.rebuild()
+
+    def rebuild(self):
+        """compute the shortest path tree from scratch"""
+        self.dist = {self.source: 0.}
+        self.pred = {self.source: None}
+        self._propagate([(0., next(self._counter), self.source)])
+
+    def _propagate(self, heap):
+        """Dijkstra search starting from the nodes in the heap"""
+        graph = self.graph
+        dist = self.dist
+        pred = self.pred
+        inf = float("inf")
+        while heap:
+            d, _, u = heapq.heappop(heap)
+            if d > dist.get(u, inf):
+                continue
+            for v, data in graph[u].items():
+                dnew = d + data["weight"]
+                if dnew < dist.get(v, inf):
+                    dist[v] = dnew
+                    pred[v] = u
+                    heapq.heappush(heap, (dnew, next(self._counter), v))
+
+    def _subtree(self, roots):
+        """return the set of nodes in the shortest path tree below roots"""
+        children = defaultdict(list)
+        for v, u in self.pred.items():
+            if u is not None:
+                children[u].append(v)
+        subtree = set()
+        stack = list(roots)
+        while stack:
+            u = stack.pop()
+            if u in subtree:
+                continue
+            subtree.add(u)
+            stack.extend(children[u])
+        return subtree
+
+    def _recompute(self, affected):
+        """recompute the distances of the affected nodes
+        
+        the distances of all other nodes are assumed to be correct
+        """
+        inf = float("inf")
+        for u in affected:
+            self.dist.pop(u, None)
+            self.pred.pop(u, None)
+        heap = []
+        for u in affected:
+            if u not in self.graph:
+                continue
+            best, pbest = inf, None
+            for v, data in self.graph[u].items():
+                if v == u or v in affected:
+                    continue
+                d = self.dist.get(v, inf) + data["weight"]
+                if d < best:
+                    best, pbest = d, v
+            if pbest is not None:
+                self.dist[u] = best
+                self.pred[u] = pbest
+                heap.append((best, next(self._counter), u))
+        heapq.heapify(heap)
+        self._propagate(heap)
+
+    def edge_changed(self, u, v, old_weight=None):
+        """update the tree after the weight of edge (u, v) was changed or the edge was added
+        
+        old_weight should be None if the edge is new
+        """
+        if u == v:
+            # self loops never shorten a path
+            return
+        weight = self.graph[u][v]["weight"]
+        if old_weight is not None and weight > old_weight:
+            if self.pred.get(v) == u:
+                self._recompute(self._subtree([v]))
+            elif self.pred.get(u) == v:
+                self._recompute(self._subtree([u]))
+            return
+        inf = float("inf")
+        heap = []
+        for a, b in ((u, v), (v, u)):
+            if a not in self.dist:
+                continue
+            d = self.dist[a] + weight
+            if d < self.dist.get(b, inf):
+                self.dist[b] = d
+                self.pred[b] = a
+                heap.append((d, next(self._counter), b))
+        heapq.heapify(heap)
+        self._propagate(heap)
+
+    def node_added(self, u):
+        """update the tree after node u was added to the graph along with its edges"""
+        inf = float("inf")
+        best, pbest = inf, None
+        for v, data in self.graph[u].items():
+            if v == u:
+                continue
+            d = self.dist.get(v, inf) + data["weight"]
+            if d < best:
+                best, pbest = d, v
+        if pbest is None:
+            return
+        self.dist[u] = best
+        self.pred[u] = pbest
+        self._propagate([(best, next(self._counter), u)])
+
+    def node_removed(self, u):
+        """update the tree after node u was removed from the graph"""
+        if u not in self.dist:
+            return
+        affected = self._subtree([u])
+        affected.discard(u)
+        self.dist.pop(u)
+        self.pred.pop(u)
+        self._recompute(affected)
+
+    def path(self, target):
+        """return the shortest path from the source to target or None if there is no path"""
+        if target not in self.dist:
+            return None
+        path = [target]
+        while path[-1] != self.source:
+            path.append(self.pred[path[-1]])
+        path.reverse()
+        return path
+
+
 class _DistanceGraph(object):
     """
     This graph is used by DoubleEndedConnect to make educated guesses for connecting two minima
@@ -21,6 +189,9 @@ class _DistanceGraph(object):
         the routine which calculates the optimized distance between two structures
     verbosity :
         how much info to print (not very thoroughly implemented)
+    aligned_cache_size : int
+        the number of minima pairs for which the aligned coordinates
+        returned by mindist are kept, see getAlignedCoords()
     
     Description
     -----------
@@ -39,11 +210,15 @@ class _DistanceGraph(object):
     them again.  The minimum weight path between min1 and min2 in this graph gives a
     good guess for the best way to try connect min1 and min2.  
 
+    The shortest path trees from the start minima are maintained incrementally
+    as edge weights change, so finding the minimum weight path does not 
+    require a full Dijkstra search over the complete graph each time.
+
     TODO: could we use a disjoint set data structure (nx.utils.UnionFind) to improve this
     algorithm?
     """
 
-    def __init__(self, database, graph, mindist, verbosity):
+    def __init__(self, database, graph, mindist, verbosity, aligned_cache_size=1000):
         self.database = database
         self.graph = graph
         self.mindist = mindist
@@ -51,10 +226,27 @@ class _DistanceGraph(object):
 
         self.Gdist = nx.Graph()
         self.distance_map = dict()  # place to store distances locally for faster lookup
+        # the aligned coordinates of the most recently computed or requested
+        # distances, least recently used first
+        self.aligned_cache_size = aligned_cache_size
+        self._aligned = OrderedDict()
         nx.set_edge_attributes(self.Gdist, "weight", dict())
         self.debug = False
 
         self.infinite_weight = 1e20
+        
+        # the shortest path trees, keyed by the start minimum
+        self._shortest_paths = dict()
+
+    def _setEdgeWeight(self, min1, min2, weight):
+        """set the weight of an edge and update the shortest path tree"""
+        if self.Gdist.has_edge(min1, min2):
+            old_weight = self.Gdist[min1][min2]["weight"]
+        else:
+            old_weight = None
+        self.Gdist.add_edge(min1, min2, weight=weight)
+        for tree in self._shortest_paths.itervalues():
+            tree.edge_changed(min1, min2, old_weight)
 
     def distToWeight(self, dist):
         """
@@ -108,8 +300,39 @@ class _DistanceGraph(object):
         if self.verbosity > 1:
             logger.debug("calculated distance between %s %s %s", min1.id(), min2.id(), dist)
         self._setDist(min1, min2, dist)
+        self._setAligned(min1, min2, dist, coords1, coords2)
         return dist
 
+    def _setAligned(self, min1, min2, dist, coords1, coords2):
+        """keep the aligned coordinates, dropping the least recently used if the cache is full"""
+        if self.aligned_cache_size <= 0:
+            return
+        self._aligned.pop((min1, min2), None)
+        self._aligned[(min1, min2)] = (dist, coords1, coords2)
+        while len(self._aligned) > self.aligned_cache_size:
+            self._aligned.popitem(last=False)
+
+    def getAlignedCoords(self, min1, min2):
+        """return (dist, coords1, coords2) as returned by mindist, or None if it is not known
+
+        The alignment of the structures of min1 and min2 which was done when
+        their distance was computed is reused, e.g. as the end points of an
+        NEB, instead of calling mindist again.  Only the most recently
+        computed or requested alignments are kept (see aligned_cache_size),
+        so this never calculates anything.
+        """
+        ret = self._aligned.pop((min1, min2), None)
+        if ret is not None:
+            # move it to the end, it is now the most recently used
+            self._aligned[(min1, min2)] = ret
+            return ret
+        ret = self._aligned.pop((min2, min1), None)
+        if ret is not None:
+            self._aligned[(min2, min1)] = ret
+            dist, coords2, coords1 = ret
+            return dist, coords1, coords2
+        return None
+
     def _addMinimum(self, m):
         """
         add a new minimum to the graph
@@ -134,6 +357,9 @@ class _DistanceGraph(object):
                 dist = self.getDist(m, m2)
                 weight = self.distToWeight(dist)
                 self.Gdist.add_edge(m, m2, {"weight": weight})
+        
+        for tree in self._shortest_paths.itervalues():
+            tree.node_added(m)
 
 
     def addMinimum(self, m):
@@ -165,7 +391,7 @@ class _DistanceGraph(object):
         if self.Gdist.has_edge(min1, min2):
             w = self.Gdist[min1][min2]["weight"]
             if not w < 1e-6:
-                self.Gdist.add_edge(min1, min2, weight=self.infinite_weight)
+                self._setEdgeWeight(min1, min2, self.infinite_weight)
         return True
 
     def replaceTransitionStateGraph(self, graph):
@@ -181,6 +407,8 @@ class _DistanceGraph(object):
         self.getDist(minstart, minend)
         self.addMinimum(minstart)
         self.addMinimum(minend)
+        if minstart not in self._shortest_paths:
+            self._shortest_paths[minstart] = _IncrementalShortestPath(self.Gdist, minstart)
 
     def setTransitionStateConnection(self, min1, min2):
         """use this function to tell _DistanceGraph that
@@ -189,14 +417,20 @@ class _DistanceGraph(object):
         The edge weight will be set to zero
         """
         weight = 0.
-        self.Gdist.add_edge(min1, min2, {"weight": weight})
+        self._setEdgeWeight(min1, min2, weight)
 
     def shortestPath(self, min1, min2):
         """return the minimum weight path path between min1 and min2"""
-        try:
-            path = nx.shortest_path(self.Gdist, min1, min2, weight="weight")
-        except nx.NetworkXNoPath:
-            return None, None
+        tree = self._shortest_paths.get(min1)
+        if tree is not None:
+            path = tree.path(min2)
+            if path is None:
+                return None, None
+        else:
+            try:
+                path = nx.shortest_path(self.Gdist, min1, min2, weight="weight")
+            except nx.NetworkXNoPath:
+                return None, None
 
         # get_edge attributes is really slow:
         weights = [self.Gdist[path[i]][path[i + 1]]["weight"] for i in range(len(path) - 1)]
@@ -219,9 +453,14 @@ class _DistanceGraph(object):
             w1 = self.Gdist[min1][m]["weight"]
             wnew = min(w1, w2)
             # note: this will override any previous call to self.setTransitionStateConnection
-            self.Gdist.add_edge(min1, m, weight=wnew)
+            self._setEdgeWeight(min1, m, wnew)
 
         self.Gdist.remove_node(min2)
+        self._shortest_paths.pop(min2, None)
+        for pair in [pair for pair in self._aligned if min2 in pair]:
+            del self._aligned[pair]
+        for tree in self._shortest_paths.itervalues():
+            tree.node_removed(min2)
 
 
     def checkGraph(self):
@@ -263,7 +502,7 @@ class _DistanceGraph(object):
                 logger.warning("    problem: are_connected %s %s %s %s %s %s %s",
                                are_connected, "but weight", weights[e], "dist", dist, e[0].id(), e[1].id())
                 w = self.distToWeight(dist)
-                self.Gdist.add_edge(e[0], e[1], {"weight": w})
+                self._setEdgeWeight(e[0], e[1], w)
         if count > 0:
             logger.info("    found %s %s", count, "inconsistencies in Gdist")
 
@@ -0,0 +1,160 @@
+"""a cache of known transition states used to avoid repeating the pushoff quenches"""
+import logging
+from collections import defaultdict
+
+import numpy as np
+
+__all__ = ["TransitionStateCache", "radial_fingerprint"]
+
+logger = logging.getLogger("pele.connect")
+
+
+def radial_fingerprint(coords):
+    """return the sorted distances of the atoms from the center of mass
+
+    This is invariant to translation, rotation, inversion and permutation of
+    identical atoms, so it can be compared without any alignment.  It assumes
+    the coordinates are those of a cluster of atoms in three dimensions.  If
+    they are not, an empty fingerprint is returned, so all structures pass on
+    to the exact comparison.
+    """
+    coords = np.asarray(coords)
+    if coords.size % 3 != 0:
+        return np.zeros(0)
+    x = np.reshape(coords, [-1, 3])
+    x = x - x.mean(axis=0)
+    return np.sort(np.sqrt((x * x).sum(axis=1)))
+
+
+class TransitionStateCache(object):
+    """a lookup table of transition states that are already in the database
+
+    The transition states are binned by energy and compared with an alignment
+    invariant fingerprint of their structure.  Candidates that pass both are
+    only reused if `compare` finds an exact match.  This makes it possible
+    to recognize a refined transition state that is already known before
+    falling off either side of it to find the connected minima, which is
+    the most expensive part of refining a transition state candidate.
+
+    Parameters
+    ----------
+    compare : callable
+        `bool = compare(coords1, coords2)` returns True if the structures are
+        the same, e.g. `system.get_compare_exact()`.  This is the final test,
+        so it must take into account the symmetries of the system.
+    energy_tolerance : float
+        transition states with energies within this tolerance are candidates
+        to be the same.  This should be the same as `Database.accuracy`
+    fingerprint : callable, optional
+        `fp = fingerprint(coords)` returns a numpy array which does not depend
+        on the alignment of the structure.  The default is
+        :func:`radial_fingerprint`, which is only suitable for atomic clusters.
+    fingerprint_tolerance : float, optional
+        the maximum absolute difference between the elements of two
+        fingerprints for them to be passed on to `compare`
+
+    Notes
+    -----
+    Only the energy and the fingerprint are held in memory, along with the
+    TransitionState object.  The coordinates are loaded from the database
+    when a candidate is passed to `compare`.
+
+    See Also
+    --------
+    DoubleEndedConnect : the cache is filled as new transition states are found
+    LocalConnect : the cache is queried after each transition state is refined
+    """
+
+    def __init__(self, compare, energy_tolerance=1e-3, fingerprint=radial_fingerprint,
+                 fingerprint_tolerance=1e-2):
+        self.energy_tolerance = float(energy_tolerance)
+        self.fingerprint = fingerprint
+        self.fingerprint_tolerance = fingerprint_tolerance
+        self.compare = compare
+
+        self._bins = defaultdict(list)
+        self._ids = dict()
+
+        self.nhits = 0
+        self.nmisses = 0
+
+    def _bin(self, energy):
+        return int(np.floor(energy / self.energy_tolerance))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, ts):
+        return ts.id() in self._ids
+
+    def add(self, ts, coords=None):
+        """add a transition state from the database to the cache
+
+        Parameters
+        ----------
+        ts : TransitionState
+        coords : numpy array, optional
+            the coordinates of the transition state.  If not passed they will
+            be loaded from ts.coords
+        """
+        if ts.id() in self._ids:
+            return
+        if coords is None:
+            coords = ts.coords
+        fp = np.asarray(self.fingerprint(coords))
+        ibin = self._bin(ts.energy)
+        self._bins[ibin].append((ts.energy, fp, ts))
+        self._ids[ts.id()] = ibin
+
+    def remove(self, ts):
+        """remove a transition state from the cache"""
+        ibin = self._ids.pop(ts.id(), None)
+        if ibin is None:
+            return
+        self._bins[ibin] = [v for v in self._bins[ibin] if v[2].id() != ts.id()]
+
+    def clear(self):
+        self._bins.clear()
+        self._ids.clear()
+
+    def add_from_database(self, database, Emax=None):
+        """add all transition states in the database to the cache"""
+        from sqlalchemy.orm import undefer
+        from pele.storage import TransitionState
+
+        query = database.session.query(TransitionState).options(undefer("coords"))
+        if Emax is not None:
+            query = query.filter(TransitionState.energy <= Emax)
+        for ts in query:
+            self.add(ts)
+
+    def connect_database(self, database):
+        """keep the cache up to date with the database
+
+        Transition states added to the database will be added to the cache
+        and transition states removed from the database will be removed.
+        """
+        database.on_ts_added.connect(self.add)
+        database.on_ts_removed.connect(self.remove)
+
+    def find(self, energy, coords):
+        """return the known TransitionState matching this structure, or None
+        """
+        fp = None
+        ibin = self._bin(energy)
+        for jbin in (ibin - 1, ibin, ibin + 1):
+            for e, fpknown, ts in self._bins.get(jbin, []):
+                if abs(e - energy) > self.energy_tolerance:
+                    continue
+                if fp is None:
+                    fp = np.asarray(self.fingerprint(coords))
+                if fp.shape != fpknown.shape:
+                    continue
+                if np.max(np.abs(fp - fpknown)) > self.fingerprint_tolerance:
+                    continue
+                if not self.compare(coords, ts.coords):
+                    continue
+                self.nhits += 1
+                return ts
+        self.nmisses += 1
+        return None
@@ -6,10 +6,9 @@ from collections import deque
 
 import numpy as np
 import sqlalchemy
-import networkx as nx
 
 from pele.storage import Minimum
-from pele.landscape import TSGraph
+from pele.landscape import CompactTSGraph
 
 
 __all__ = ["ConnectManager"]
@@ -71,14 +70,24 @@ class ConnectManagerGMin(BaseConnectManager):
             print "populating list of minima not connected to the global minimum"
         self.minpairs = deque()
 
-        gmin = self.database.minima()[0]
+        graph = CompactTSGraph(self.database)
+        order = np.argsort(graph.min_energy, kind="mergesort")
+        if len(order) == 0:
+            return
+        gmin = graph.get_minima(order[:1])[0]
 
-        graph = TSGraph(self.database)
+        # the minima not connected to the global minimum, in order of energy
+        labels = graph.component_labels()
+        candidates = order[labels[order] != labels[order[0]]]
 
-        for m in self.database.minima()[1:]:
-            if not graph.areConnected(gmin, m):
+        # load only as many minima from the database as are needed to fill the list
+        chunk_size = max(self.list_len, 100)
+        for i in xrange(0, len(candidates), chunk_size):
+            for m in graph.get_minima(candidates[i:i + chunk_size]):
                 if self.is_good_pair(gmin, m):
                     self.minpairs.append((gmin, m))
+            if len(self.minpairs) >= self.list_len:
+                break
 
 
 class ConnectManagerUntrap(BaseConnectManager):
@@ -122,12 +131,14 @@ class ConnectManagerUntrap(BaseConnectManager):
                     # print "minimum", min2.id(), "has energy barrier", energy_barrier
                     energy_barriers[min2] = energy_barrier - min2.energy
 
-    def _compute_barriers(self, graph, min1):
+    def _compute_barriers(self, graph, min1, energy_levels=None):
         """for each minimum graph compute the (approximate) energy barrier to min1"""
         # this is a local import to avoid cyclical imports
         from pele.utils.disconnectivity_graph import DisconnectivityGraph
 
         dgraph = DisconnectivityGraph(graph, nlevels=self.nlevels)
+        if energy_levels is not None:
+            dgraph.set_energy_levels(energy_levels)
         dgraph.calculate()
         tree = dgraph.tree_graph
 
@@ -139,19 +150,31 @@ class ConnectManagerUntrap(BaseConnectManager):
         print "using disconnectivity analysis to find minima to untrap"
         self.minpairs = deque()
 
-        graph = TSGraph(self.database).graph
-        cclist = list(nx.connected_components(graph))
+        graph = CompactTSGraph(self.database)
+        cclist = graph.connected_components()
 
         # get the largest cluster
         group1 = cclist[0]
-        min1 = sorted(group1, key=lambda m: m.energy)[0]
-        if not min1 == self.database.minima()[0]:
+        i1 = group1[np.argmin(graph.min_energy[group1])]
+        if graph.min_energy[i1] > graph.min_energy.min():
             # make sure that the global minimum is in group1
             print "warning, the global minimum is not the in the largest cluster."
 
-        # compute the energy barriers for all minima in the cluster        
-        subgraph = nx.subgraph(graph, group1)
-        energy_barriers = self._compute_barriers(subgraph, min1)
+        # The energy levels are determined by all the transition states in the
+        # cluster, but only the minimum spanning tree is needed to compute the
+        # disconnectivity graph
+        in_group1 = graph.component_labels()[graph.ts_min1] == graph.union_find.find(i1)
+        ts_energy = graph.ts_energy[in_group1 & (graph.ts_min1 != graph.ts_min2)]
+        if len(ts_energy) == 0:
+            return
+        emin, emax = ts_energy.min(), ts_energy.max()
+        de = (emax - emin) / (self.nlevels - 1)
+        energy_levels = [emin + de * i for i in range(self.nlevels)]
+
+        # compute the energy barriers for all minima in the cluster
+        subgraph = graph.to_graph(minima=group1)
+        min1 = graph.get_minima([i1])[0]
+        energy_barriers = self._compute_barriers(subgraph, min1, energy_levels=energy_levels)
 
         # sort the minima by the barrier height divided by the energy difference
         weights = [(m, np.abs(barrier) / np.abs(m.energy - min1.energy))
@@ -186,12 +209,17 @@ class ConnectManagerCombine(BaseConnectManager):
         of minima pairs to connect
     clust_min : int
         Clusters of minima below this size will be ignored.
+    index : StructureIndex, optional
+        if given, each cluster is connected to the minimum of the main cluster
+        which is structurally closest to it, rather than the lowest one.
+        See Database.structure_index()
     """
 
-    def __init__(self, database, list_len=20, clust_min=4):
+    def __init__(self, database, list_len=20, clust_min=4, index=None):
         self.database = database
         self.list_len = list_len
         self.clust_min = clust_min
+        self.index = index
 
         self.minpairs = deque()
 
@@ -200,8 +228,8 @@ class ConnectManagerCombine(BaseConnectManager):
         print "analyzing the database to find minima to connect"
         self.minpairs = deque()
 
-        graph = TSGraph(self.database).graph
-        cclist = list(nx.connected_components(graph))
+        graph = CompactTSGraph(self.database)
+        cclist = graph.connected_components()
 
         # remove clusters with fewer than clust_min
         cclist = [cc for cc in cclist if len(cc) >= self.clust_min]
@@ -212,17 +240,28 @@ class ConnectManagerCombine(BaseConnectManager):
 
         # get the group that all other groups will be connected to
         group1 = cclist[0]
-        min1 = sorted(group1, key=lambda m: m.energy)[0]
+        min1 = graph.get_minima([group1[np.argmin(graph.min_energy[group1])]])[0]
         if True:
             # make sure that the global minimum is in group1
-            global_min = self.database.minima()[0]
-            if global_min not in group1:
+            igmin = np.argmin(graph.min_energy)
+            if igmin not in group1:
                 print "warning, the global minimum is not the in the largest cluster.  Will try to connect them"
+                global_min = graph.get_minima([igmin])[0]
                 self.minpairs.append((min1, global_min))
 
 
         # remove group1 from cclist
-        cclist.remove(group1)
+        cclist = cclist[1:]
+
+        if self.index is not None:
+            in_group1 = np.zeros(graph.min_ids.size, dtype=bool)
+            in_group1[group1] = True
+
+            def accept(mid):
+                try:
+                    return in_group1[graph.index(mid)]
+                except KeyError:
+                    return False
 
         # get a minimum from each of the other groups
         for group2 in cclist:
@@ -231,15 +270,19 @@ class ConnectManagerCombine(BaseConnectManager):
 
             print "adding groups of size", len(group1), "and", len(group2), "to the connect list"
 
-            # sort the groups by energy
-            group2.sort(key=lambda m: m.energy)
-
             # select the lowest energy minima in the groups
             # (this can probably be done in a more intelligent way)
-            min2 = group2[0]
+            min2 = graph.get_minima([group2[np.argmin(graph.min_energy[group2])]])[0]
 
-            if self.is_good_pair(min1, min2):
-                self.minpairs.append((min1, min2))
+            partner = min1
+            if self.index is not None:
+                # the structurally closest minimum in group1
+                nearest = self.index.knn(min2.coords, 1, accept=accept)
+                if len(nearest) > 0:
+                    partner = nearest[0][1]
+
+            if self.is_good_pair(partner, min2):
+                self.minpairs.append((partner, min2))
 
         return self.minpairs
 
@@ -295,19 +338,22 @@ class ConnectManager(object):
     strategy : string
         define the default strategy for the connect runs.  Can be one of 
         ["random", "combine", "untrap", "gmin"] 
+    index : StructureIndex, optional
+        used by the "combine" strategy to pair structurally close minima
     """
 
     class NoMoreConnectionsError(Exception):
         """raised when the connect manager can't find any more pairs to connect"""
 
     def __init__(self, database, strategy="random", list_len=20, clust_min=4, Emax=None,
-                 untrap_nlevels=20, verbosity=1):
+                 untrap_nlevels=20, verbosity=1, index=None):
         self.database = database
         self.default_strategy = strategy
         self.verbosity = verbosity
 
         self.manager_random = ConnectManagerRandom(self.database, Emax)
-        self.manager_combine = ConnectManagerCombine(self.database, list_len=list_len, clust_min=4)
+        self.manager_combine = ConnectManagerCombine(self.database, list_len=list_len, clust_min=4,
+                                                     index=index)
         self.manager_untrap = ConnectManagerUntrap(database, list_len=list_len, nlevels=untrap_nlevels)
         self.manager_gmin = ConnectManagerGMin(database, list_len=list_len, verbosity=self.verbosity)
 
@@ -0,0 +1,245 @@
+import logging
+from collections import defaultdict
+
+from pele.landscape.connect_min import DoubleEndedConnect
+from pele.optimize.optimization_exceptions import LineSearchError
+from pele.utils.events import Signal
+
+__all__ = ["MultiDoubleEndedConnect"]
+
+logger = logging.getLogger("pele.connect")
+
+
+class MultiDoubleEndedConnect(DoubleEndedConnect):
+    """
+    Find connected networks of minima and transition states between many pairs of minima
+
+    This does the same job as running DoubleEndedConnect on each pair in turn,
+    but the transition state graph and the distance graph are built only once
+    and shared between all the pairs.  Every new transition state found is
+    immediately available to all pairs, and each local connect job is chosen
+    so that it serves as many of the unconnected pairs as possible.
+
+    Parameters
+    ----------
+    pairs : list of (Minimum, Minimum)
+        the pairs of minima to try to connect
+    pot, mindist, database :
+        see DoubleEndedConnect
+    niter : int, optional
+        maximum number of connect cycles in total, i.e. summed over all pairs
+    niter_per_pair : int, optional
+        a pair is abandoned after it has been served by this many connect
+        cycles without being connected.
+    **kwargs :
+        all other parameters are passed to DoubleEndedConnect
+
+    Attributes
+    ----------
+    on_pair_done : Signal
+        called as `on_pair_done(min1, min2, success)` when a pair is
+        connected or abandoned.
+
+    Notes
+    -----
+    In each connect cycle the best guess path in the distance graph is found
+    for every unconnected pair, and the pair of minima that each of those
+    paths would try to connect next is determined as in DoubleEndedConnect.
+    The local connect job requested by the most paths is then run.  Only
+    the pairs whose minima are already in the distance graph take part, the
+    others are added one at a time when they are needed, so pairs which are
+    connected along the way never cost any distance calculations.  The
+    typical use is connecting one minimum (e.g. the global minimum) to many
+    others, in which case all the paths start from the same shortest path
+    tree in the distance graph and many of them share their first steps.
+
+    Examples
+    --------
+
+    >>> gmin = database.minima()[0]
+    >>> pairs = [(gmin, m) for m in database.minima()[1:201]]
+    >>> connect = MultiDoubleEndedConnect(pairs, pot, mindist, database)
+    >>> connect.connect()
+    >>> for (m1, m2), success in connect.results().iteritems():
+    >>>     print m1.id(), m2.id(), success
+
+    See Also
+    --------
+    DoubleEndedConnect
+    """
+
+    def __init__(self, pairs, pot, mindist, database, niter=1000, niter_per_pair=200,
+                 verbosity=1, local_connect_params=None, fresh_connect=False,
+                 ts_cache=None, **kwargs):
+        pairs = [(m1, m2) for m1, m2 in pairs if m1 != m2]
+        if len(pairs) == 0:
+            raise ValueError("there must be at least one pair of distinct minima to connect")
+        min1, min2 = pairs[0]
+        self._all_endpoints = set()
+        for m1, m2 in pairs:
+            self._all_endpoints.add(m1)
+            self._all_endpoints.add(m2)
+
+        # this builds the shared graphs and initializes the distance graph for the first pair
+        DoubleEndedConnect.__init__(self, min1, min2, pot, mindist, database,
+                                    verbosity=verbosity, local_connect_params=local_connect_params,
+                                    fresh_connect=fresh_connect, niter=niter,
+                                    ts_cache=ts_cache, **kwargs)
+
+        self.pairs = pairs
+        self.niter_per_pair = niter_per_pair
+        self.on_pair_done = Signal()
+
+        self._ncycles = defaultdict(int)
+        self._done = dict()
+        # the pairs for which the distance graph has been initialized.  The
+        # first pair was initialized by DoubleEndedConnect
+        self._initialized = set([pairs[0]])
+
+        for m1, m2 in self.pairs:
+            if self.graph.areConnected(m1, m2):
+                self._done[(m1, m2)] = True
+        logger.info("starting a multiple double ended connect run for %s pairs of minima, %s already connected",
+                    len(self.pairs), len(self._done))
+
+    def _endpoints(self):
+        return self._all_endpoints
+
+    def _updatePairs(self):
+        """check which pairs are newly connected or have exhausted their cycles"""
+        for pair in self.pairs:
+            if pair in self._done:
+                continue
+            m1, m2 = pair
+            if self.graph.areConnected(m1, m2):
+                logger.info("found connection between %s %s", m1.id(), m2.id())
+                self._done[pair] = True
+                self.on_pair_done(m1, m2, True)
+            elif self._ncycles[pair] >= self.niter_per_pair:
+                logger.info("abandoning connection between %s %s after %s cycles",
+                            m1.id(), m2.id(), self._ncycles[pair])
+                self._abandon(pair)
+
+    def _abandon(self, pair):
+        self._done[pair] = False
+        self.on_pair_done(pair[0], pair[1], False)
+
+    def _activatePairs(self):
+        """initialize the distance graph for the pairs which are needed next
+
+        Adding a minimum to the distance graph costs a mindist call for every
+        minimum already in it, so the pairs are initialized lazily.  A pair is
+        initialized as soon as both its minima are in the distance graph,
+        which costs at most one distance calculation.  Otherwise it waits
+        until no initialized pair is left to work on.  Pairs which are
+        connected while they wait are never initialized.
+        """
+        Gdist = self.dist_graph.Gdist
+        waiting = [pair for pair in self.pairs
+                   if pair not in self._done and pair not in self._initialized]
+        for pair in waiting:
+            if pair[0] in Gdist and pair[1] in Gdist:
+                self._initializePair(pair)
+        active = [pair for pair in self._initialized if pair not in self._done]
+        if len(active) == 0:
+            for pair in waiting:
+                if pair not in self._initialized:
+                    self._initializePair(pair)
+                    break
+
+    def _initializePair(self, pair):
+        self.dist_graph.initialize(*pair)
+        self._initialized.add(pair)
+
+    def _getNextJob(self):
+        """return (min1, min2, served), the pair of minima to try to connect
+        next and the list of pairs it serves
+
+        return (None, None, []) if there is nothing left to try
+        """
+        requests = defaultdict(list)
+        weights = dict()
+        while len(requests) == 0 and len(self._done) < len(self.pairs):
+            self._activatePairs()
+            for pair in self.pairs:
+                if pair in self._done or pair not in self._initialized:
+                    continue
+                w, min1, min2 = self._getNextPairOnPath(*pair)
+                if min1 is None:
+                    self._abandon(pair)
+                    continue
+                if (min2, min1) in requests:
+                    min1, min2 = min2, min1
+                requests[(min1, min2)].append(pair)
+                weights[(min1, min2)] = w
+        if len(requests) == 0:
+            return None, None, []
+
+        # choose the job that serves the most pairs.  Break ties with the edge weight
+        if self.longest_first:
+            key = lambda job: (len(requests[job]), weights[job])
+        else:
+            key = lambda job: (len(requests[job]), -weights[job])
+        min1, min2 = max(requests.iterkeys(), key=key)
+        return min1, min2, requests[(min1, min2)]
+
+    def connect(self):
+        """
+        the main loop of the algorithm
+        """
+        i = 0
+        for i in range(self.niter):
+            self._updatePairs()
+            if len(self._done) == len(self.pairs):
+                break
+
+            logger.info("")
+            logger.info("======== starting multiple connect cycle %s %s", i, "========")
+            min1, min2, served = self._getNextJob()
+            if min1 is None:
+                break
+            logger.info("connecting %s %s serves %s unconnected pairs", min1.id(), min2.id(), len(served))
+            self._sendProgress("cycle", i, min1, min2, nserved=len(served),
+                               npairs_done=len(self._done))
+            for pair in served:
+                self._ncycles[pair] += 1
+
+            try:
+                self._localConnect(min1, min2)
+            except LineSearchError as err:
+                logger.error("caught line search error, aborting connection attempt: %s", err)
+                break
+
+        self._updatePairs()
+        nsuccess = len([s for s in self._done.itervalues() if s])
+        logger.info("connected %s out of %s pairs of minima", nsuccess, len(self.pairs))
+        self._sendProgress("finished", i, success=nsuccess == len(self.pairs),
+                           nsuccess=nsuccess)
+
+    def success(self, min1=None, min2=None):
+        """return True if all pairs are connected, or if min1 and min2 are connected"""
+        if min1 is not None:
+            return self.graph.areConnected(min1, min2)
+        return all(self.graph.areConnected(m1, m2) for m1, m2 in self.pairs)
+
+    def results(self):
+        """return a dictionary mapping each pair to whether it is connected"""
+        return dict([((m1, m2), self.graph.areConnected(m1, m2)) for m1, m2 in self.pairs])
+
+    def number_of_cycles(self, min1, min2):
+        """return the number of connect cycles that served the pair (min1, min2)"""
+        return self._ncycles[(min1, min2)]
+
+    def returnPath(self, min1=None, min2=None):
+        """return information about the path between min1 and min2
+
+        See DoubleEndedConnect.returnPath
+        """
+        if min1 is None:
+            return DoubleEndedConnect.returnPath(self)
+        minstart, minend = self.minstart, self.minend
+        self.minstart, self.minend = min1, min2
+        try:
+            return DoubleEndedConnect.returnPath(self)
+        finally:
+            self.minstart, self.minend = minstart, minend
@@ -57,6 +57,22 @@ class DoubleEndedConnect(object):
         
         If any configuration in a minimum-transition_state-minimum triplet fails
         a test then the whole triplet is rejected.
+    ts_cache : TransitionStateCache, optional
+        a cache of known transition states.  If a refined transition state is
+        found in the cache the minima on either side are taken from the
+        database rather than found by quenching.  The cache is not used by
+        default.  Create it with the exact match comparison of the system,
+        e.g. `TransitionStateCache(system.get_compare_exact(),
+        energy_tolerance=database.accuracy)`, and call
+        `ts_cache.connect_database(database)` so it holds the transition
+        states found during this run.  Pass the same cache to successive runs
+        (or fill it with `ts_cache.add_from_database(database)`) to recognize
+        transition states found previously.
+    progress : callable, optional
+        e.g. a :class:`pele.utils.progress.ProgressChannel`.  It is called
+        with event="cycle" at the start of each connect cycle, with
+        event="finished" at the end, and is passed to the NEB to report the
+        progress of the band optimizations.
     
     Notes
     -----
@@ -134,7 +150,7 @@ class DoubleEndedConnect(object):
                  merge_minima=False,
                  max_dist_merge=0.1, local_connect_params=None,
                  fresh_connect=False, longest_first=True,
-                 niter=200, conf_checks=None
+                 niter=200, conf_checks=None, ts_cache=None, progress=None
     ):
         self.minstart = min1
         assert min1.id() == min1, "minima must compare equal with their id %d %s %s" % (
@@ -156,15 +172,14 @@ class DoubleEndedConnect(object):
         self.local_connect_params = dict([("verbosity", verbosity)] + local_connect_params.items())
         self.database = database
         self.fresh_connect = fresh_connect
-        if self.fresh_connect:
-            self.graph = TSGraph(self.database, minima=[self.minstart, self.minend], no_edges=True)
-        else:
-            self.graph = TSGraph(self.database)
 
         self.merge_minima = merge_minima
         self.max_dist_merge = float(max_dist_merge)
 
-        self.dist_graph = _DistanceGraph(self.database, self.graph, self.mindist, self.verbosity)
+        self.ts_cache = ts_cache
+        self.progress = progress
+
+        self._buildGraphs()
 
         # check if a connection exists before initializing distance graph
         if self.graph.areConnected(self.minstart, self.minend):
@@ -182,6 +197,14 @@ class DoubleEndedConnect(object):
             logger.info("************************************************************")
 
 
+    def _buildGraphs(self):
+        """build the transition state graph and the distance graph"""
+        if self.fresh_connect:
+            self.graph = TSGraph(self.database, minima=list(self._endpoints()), no_edges=True)
+        else:
+            self.graph = TSGraph(self.database)
+        self.dist_graph = _DistanceGraph(self.database, self.graph, self.mindist, self.verbosity)
+
     def mergeMinima(self, min1, min2):
         """merge two minimum objects
         
@@ -198,11 +221,11 @@ class DoubleEndedConnect(object):
 
         # deal with the case where min1 and/or min2 are the same as minstart and/or minend
         # make sure the one that is deleted (min2) is not minstart or minend
-        if ((min1 == self.minstart and min2 == self.minend) or
-                (min2 == self.minstart and min1 == self.minend)):
+        endpoints = self._endpoints()
+        if min1 in endpoints and min2 in endpoints:
             logger.error("ERROR: trying to merge the start and end minima.  aborting")
             return
-        if min2 == self.minstart or min2 == self.minend:
+        if min2 in endpoints:
             min1, min2 = min2, min1
 
         if dist > self.max_dist_merge:
@@ -223,6 +246,10 @@ class DoubleEndedConnect(object):
         # merge minima in distance graph        
         self.dist_graph.mergeMinima(min1, min2)
 
+    def _endpoints(self):
+        """return the minima which should never be deleted by merging"""
+        return set([self.minstart, self.minend])
+
     def getDist(self, min1, min2):
         """
         get the distance between min1 and min2.
@@ -262,9 +289,14 @@ class DoubleEndedConnect(object):
             return False
 
 
-        # Add the minima to the database
-        min1 = self.database.addMinimum(min_ret1.energy, min_ret1.coords)
-        min2 = self.database.addMinimum(min_ret2.energy, min_ret2.coords)
+        # Add the minima to the database.  If the transition state was found
+        # in the cache the minima are already known
+        min1 = getattr(min_ret1, "minimum", None)
+        if min1 is None:
+            min1 = self.database.addMinimum(min_ret1.energy, min_ret1.coords)
+        min2 = getattr(min_ret2, "minimum", None)
+        if min2 is None:
+            min2 = self.database.addMinimum(min_ret2.energy, min_ret2.coords)
 
         # Add the minima to the transition state graph.  
         self.graph.addMinimum(min1)
@@ -315,7 +347,8 @@ class DoubleEndedConnect(object):
         return True
 
     def _getLocalConnectObject(self):
-        return LocalConnect(self.pot, self.mindist, **self.local_connect_params)
+        return LocalConnect(self.pot, self.mindist, ts_cache=self.ts_cache,
+                            progress=self.progress, **self.local_connect_params)
 
     def _localConnect(self, min1, min2):
         """
@@ -352,9 +385,10 @@ class DoubleEndedConnect(object):
             self.dist_graph.checkGraph()
             return True
 
-        # do local connect run
+        # do local connect run.  The alignment done when the distance between
+        # min1 and min2 was computed is reused for the NEB
         local_connect = self._getLocalConnectObject()
-        res = local_connect.connect(min1, min2)
+        res = local_connect.connect(min1, min2, aligned=self.dist_graph.getAlignedCoords(min1, min2))
 
         # now add each new transition state to the graph and database.
         nsuccess = 0
@@ -410,15 +444,23 @@ class DoubleEndedConnect(object):
         the NEB between minima that are very far away.  (Does this too much favor long paths?)
         """
         logger.info("finding a good pair to try to connect")
-        # get the shortest path on dist_graph between minstart and minend
         if True:
             logger.debug("Gdist has %s %s %s %s", self.dist_graph.Gdist.number_of_nodes(),
                          "nodes and", self.dist_graph.Gdist.number_of_edges(), "edges")
-        path, weights = self.dist_graph.shortestPath(self.minstart, self.minend)
-        weightsum = sum(weights)
-        if path is None or weightsum >= 10e9:
+        w, min1, min2 = self._getNextPairOnPath(self.minstart, self.minend)
+        return min1, min2
+
+    def _getNextPairOnPath(self, minstart, minend):
+        """return (weight, min1, min2), the pair of minima on the best guess path
+        between minstart and minend to try to connect next
+
+        return (None, None, None) if there is no pair to try
+        """
+        # get the shortest path on dist_graph between minstart and minend
+        path, weights = self.dist_graph.shortestPath(minstart, minend)
+        if path is None or sum(weights) >= 10e9:
             logger.warning("Can't find any way to try to connect the minima")
-            return None, None
+            return None, None, None
 
         # get the weights of the path segements
         weightlist = []
@@ -430,6 +472,10 @@ class DoubleEndedConnect(object):
             # w = weights.get((min2,min1))
             w = weights[i - 1]
             weightlist.append((w, min1, min2))
+            if w > 1e-6:
+                # the pairs on the path are the candidates for the next local
+                # connect runs, keep their alignments in the cache
+                self.dist_graph.getAlignedCoords(min1, min2)
 
         if True:
             # print the path
@@ -450,18 +496,31 @@ class DoubleEndedConnect(object):
             for w, min1, min2 in weightlist:
                 if w > 1e-6:
                     break
-        return min1, min2
+        return w, min1, min2
 
 
+    def _sendProgress(self, event, stepnum, min1=None, min2=None, **kwargs):
+        """report the progress of the connect run to self.progress"""
+        if self.progress is None:
+            return
+        if min1 is not None:
+            kwargs["min1"] = min1.id()
+            kwargs["min2"] = min2.id()
+        self.progress(event=event, stepnum=stepnum,
+                      nminima=self.graph.graph.number_of_nodes(),
+                      nts=self.graph.graph.number_of_edges(), **kwargs)
+
     def connect(self):
         """
         the main loop of the algorithm
         """
         self.NEBattempts = 2
+        i = 0
         for i in range(self.niter):
             # stop if we're done
             if self.graph.areConnected(self.minstart, self.minend):
                 logger.info("found connection!")
+                self._sendProgress("finished", i, success=True)
                 return
 
             logger.info("")
@@ -472,6 +531,7 @@ class DoubleEndedConnect(object):
             # fail if we can't find a good pair to try
             if min1 is None or min2 is None:
                 break
+            self._sendProgress("cycle", i, min1, min2)
 
             # try to connect those minima
             from pele.optimize.optimization_exceptions import LineSearchError
@@ -488,6 +548,7 @@ class DoubleEndedConnect(object):
                 self.dist_graph.checkGraph()
 
         logger.info("failed to find connection between %s %s", self.minstart.id(), self.minend.id())
+        self._sendProgress("finished", i, success=False)
 
     def success(self):
         return self.graph.areConnected(self.minstart, self.minend)
@@ -9,13 +9,19 @@ __all__ = ["LocalConnect"]
 logger = logging.getLogger("pele.connect")
 
 
-def _refineTS(pot, coords, tsSearchParams=None, eigenvec0=None, pushoff_params=None):
+def _refineTS(pot, coords, tsSearchParams=None, eigenvec0=None, pushoff_params=None,
+              ts_cache=None):
     """
     find nearest transition state to NEB climbing image.  Then fall
     off the transition state to find the associated minima.
     
     This would naturally be a part of DoubleEndedConnect.  I separated it
     to make it more easily parallelizable.      
+
+    If `ts_cache` is passed and the refined transition state is already known
+    then the minima are taken from the known transition state rather than
+    found by falling off either side.  In that case the returned minima have
+    the attribute `minimum` which is the Minimum object from the database.
     """
     if pushoff_params is None: pushoff_params = dict()
     if tsSearchParams is None: tsSearchParams = dict()
@@ -35,6 +41,15 @@ def _refineTS(pot, coords, tsSearchParams=None, eigenvec0=None, pushoff_params=N
         logger.info("         not adding transition state")
         return False, ret, None, None
 
+    if ts_cache is not None:
+        known_ts = ts_cache.find(ret.energy, coords)
+        if known_ts is not None:
+            logger.info("transition state is already known (id %s), skipping the search for the minima",
+                        known_ts.id())
+            ret1, ret2 = [Result(energy=m.energy, coords=m.coords, success=True, minimum=m)
+                          for m in (known_ts.minimum1, known_ts.minimum2)]
+            return True, ret, ret1, ret2
+
     # find the minima which this transition state connects
     logger.info("falling off either side of transition state to find new minima")
     ret1, ret2 = minima_from_ts(pot, coords, n=ret.eigenvec,
@@ -70,6 +85,13 @@ class LocalConnect(object):
     verbosity : int
         this controls how many status messages are printed.  (not really
         implemented yet)
+    ts_cache : TransitionStateCache, optional
+        if passed, refined transition states are looked up in the cache and
+        the search for the connected minima is skipped for known transition
+        states.
+    progress : callable, optional
+        e.g. a ProgressChannel.  Passed to the NEB driver to report the
+        progress of the band optimization.
     
     
     Notes
@@ -93,7 +115,8 @@ class LocalConnect(object):
     """
 
     def __init__(self, pot, mindist, tsSearchParams=None, verbosity=1, NEBparams=None, nrefine_max=100,
-                 reoptimize_climbing=0, pushoff_params=None, create_neb=NEBDriver):
+                 reoptimize_climbing=0, pushoff_params=None, create_neb=NEBDriver,
+                 ts_cache=None, progress=None):
         if pushoff_params is None: pushoff_params = dict()
         if NEBparams is None: NEBparams = dict()
         if tsSearchParams is None: tsSearchParams = dict()
@@ -111,6 +134,8 @@ class LocalConnect(object):
         self.res = Result()
         self.res.new_transition_states = []
         self.create_neb = create_neb
+        self.ts_cache = ts_cache
+        self.progress = progress
 
     def _refineTransitionStates(self, neb, climbing_images):
         """
@@ -134,7 +159,8 @@ class LocalConnect(object):
                 )
 
             ret = _refineTS(self.pot, coords, tsSearchParams=self.tsSearchParams,
-                            eigenvec0=eigenvec0, pushoff_params=self.pushoff_params)
+                            eigenvec0=eigenvec0, pushoff_params=self.pushoff_params,
+                            ts_cache=self.ts_cache)
             ts_success = ret[0]
             if ts_success:
                 # the transition state is good, add it to the list
@@ -143,12 +169,18 @@ class LocalConnect(object):
                 success = True
         return success
 
-    def _doNEB(self, minNEB1, minNEB2, repetition=0):
+    def _doNEB(self, minNEB1, minNEB2, repetition=0, aligned=None):
         """
         do NEB between minNEB1 and minNEB2.
+
+        aligned is an optional (dist, coords1, coords2) as returned by
+        mindist for the two minima.  If it is given the alignment is not
+        redone.
         """
         # arrange the coordinates to minimize the distance between them        
-        dist, newcoords1, newcoords2 = self.mindist(minNEB1.coords, minNEB2.coords)
+        if aligned is None:
+            aligned = self.mindist(minNEB1.coords, minNEB2.coords)
+        dist, newcoords1, newcoords2 = aligned
         logger.info("")
 
         if repetition == 0:
@@ -162,8 +194,11 @@ class LocalConnect(object):
 
         logger.info("starting NEB run to try to connect minima %s %s %s", minNEB1.id(), minNEB2.id(), dist)
 
+        NEBparams = self.NEBparams
+        if self.progress is not None:
+            NEBparams = dict(NEBparams, progress=self.progress)
         neb = self.create_neb(self.pot, newcoords1, newcoords2,
-                              factor=factor, **self.NEBparams)
+                              factor=factor, **NEBparams)
         neb = neb.run()
 
         neb.MakeAllMaximaClimbing()
@@ -183,7 +218,7 @@ class LocalConnect(object):
         return climbing_images, neb
 
 
-    def connect(self, min1, min2):
+    def connect(self, min1, min2, aligned=None):
         """
         1) NEB to find transition state candidates.  
         
@@ -194,11 +229,18 @@ class LocalConnect(object):
             3) if successful, fall off either side of the transition state
             to find the minima the transition state connects. Add the new 
             transition state and minima to the graph 
+
+        aligned is an optional (dist, coords1, coords2) as returned by
+        mindist for min1 and min2.  If it is given it is used for the NEB end
+        points instead of aligning the minima again.  Otherwise the minima
+        are aligned once for all NEB attempts.
         """
         self.NEBattempts = 2
+        if aligned is None:
+            aligned = self.mindist(min1.coords, min2.coords)
         for repetition in range(self.NEBattempts):
             # do NEB run
-            climbing_images, neb = self._doNEB(min1, min2, repetition)
+            climbing_images, neb = self._doNEB(min1, min2, repetition, aligned=aligned)
             self.neb = neb
 
             # check results
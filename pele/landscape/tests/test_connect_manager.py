@@ -55,6 +55,20 @@ class TestConnectManager(unittest.TestCase):
         g = database2graph(self.db)
         self.assertEqual(len(list(nx.connected_components(g))), 1)
         
+    def test_combine_index(self):
+        minima = self.db.minima()
+        for m1, m2 in izip(minima[:5], minima[1:6]):
+            self.connect_min(m1, m2)
+        for m1, m2 in izip(minima[6:], minima[7:]):
+            self.connect_min(m1, m2)
+        
+        # minimum 6 is the lowest of the small group.  The minimum of
+        # the large group which is closest to it is minimum 5
+        index = self.db.structure_index(descriptor=lambda coords: np.asarray(coords))
+        manager = ConnectManager(self.db, strategy="combine", index=index)
+        m1, m2 = manager.get_connect_job()
+        self.assertEqual(set([m1, m2]), set([minima[5], minima[6]]))
+        
     def test_untrap(self):
         # first connect them all randomly
         manager = ConnectManager(self.db, strategy="random")
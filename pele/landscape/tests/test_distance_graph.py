@@ -169,5 +169,93 @@ class TestDistanceGraph(unittest.TestCase):
         allok = self.connect.dist_graph.checkGraph()
         self.assertTrue(allok, "adding multiple transition states broke the distance graph")
 
+    def test_incremental_shortest_path(self):
+        import networkx as nx
+        dist_graph = self.connect.dist_graph
+        minima = list(self.db.minima())
+        self.run_add_TS(minima[2], minima[5], nocheck=True)
+        dist_graph.removeEdge(minima[0], minima[3])
+        dist_graph.removeEdge(minima[3], minima[1])
+        self.connect.mergeMinima(minima[6], minima[7])
+        
+        path, weights = dist_graph.shortestPath(self.connect.minstart, self.connect.minend)
+        path_nx = nx.shortest_path(dist_graph.Gdist, self.connect.minstart, 
+                                   self.connect.minend, weight="weight")
+        weights_nx = [dist_graph.Gdist[path_nx[i]][path_nx[i + 1]]["weight"] 
+                      for i in range(len(path_nx) - 1)]
+        self.assertAlmostEqual(sum(weights), sum(weights_nx))
+
+    def test_aligned_coords(self):
+        dist_graph = self.connect.dist_graph
+        min1, min2 = list(self.db.minima())[2:4]
+        ret = dist_graph.getAlignedCoords(min1, min2)
+        self.assertIsNotNone(ret)
+        dist, x1, x2 = ret
+        self.assertAlmostEqual(dist, dist_graph.getDist(min1, min2))
+        self.assertAlmostEqual(dist, np.linalg.norm(x1 - x2), 5)
+
+        # the reversed pair returns the coordinates in the reversed order
+        dist, y2, y1 = dist_graph.getAlignedCoords(min2, min1)
+        self.assertTrue(np.all(y1 == x1))
+        self.assertTrue(np.all(y2 == x2))
+
+    def test_aligned_coords_lru(self):
+        # requesting an alignment makes it the most recently used
+        dist_graph = self.connect.dist_graph
+        m1, m2, m3, m4 = list(self.db.minima())[:4]
+        dist_graph.aligned_cache_size = 2
+        dist_graph._aligned.clear()
+        dist_graph._setAligned(m1, m2, 1., m1.coords, m2.coords)
+        dist_graph._setAligned(m1, m3, 1., m1.coords, m3.coords)
+        self.assertIsNotNone(dist_graph.getAlignedCoords(m2, m1))
+        dist_graph._setAligned(m1, m4, 1., m1.coords, m4.coords)
+        self.assertIsNotNone(dist_graph.getAlignedCoords(m1, m2))
+        self.assertIsNone(dist_graph.getAlignedCoords(m1, m3))
+
+    def test_aligned_coords_merge(self):
+        dist_graph = self.connect.dist_graph
+        min1, min2, min3 = list(self.db.minima())[2:5]
+        self.connect.mergeMinima(min1, min2)
+        self.assertIsNone(dist_graph.getAlignedCoords(min2, min3))
+        self.assertIsNotNone(dist_graph.getAlignedCoords(min1, min3))
+
+    def test_aligned_cache_size(self):
+        dist_graph = self.connect.dist_graph
+        dist_graph.aligned_cache_size = 2
+        minima = list(self.db.minima())
+        dist_graph._aligned.clear()
+        dist_graph.distance_map.clear()
+        for m in minima[1:4]:
+            dist_graph.getDist(minima[0], m)
+        self.assertIsNone(dist_graph.getAlignedCoords(minima[0], minima[1]))
+        self.assertIsNotNone(dist_graph.getAlignedCoords(minima[0], minima[3]))
+
+class TestDistanceGraphConnectedMinimum(unittest.TestCase):
+    def test_add_minimum_connected_to_graph(self):
+        # add a minimum whose transition state component is already in the
+        # distance graph.  The minimum has the lowest id so its zero weight
+        # self loop is visited first when the shortest path tree is updated.
+        from pele.storage import Database
+        natoms = 13
+        sys = LJCluster(natoms)
+        db = Database()
+        m1, m2, m3 = [db.addMinimum(float(i), np.random.uniform(-1,1,natoms*3))
+                      for i in range(3)]
+        db.addTransitionState(10., np.random.uniform(-1,1,natoms*3), m1, m2)
+        connect = DoubleEndedConnect(m2, m3, sys.get_potential(), sys.get_mindist(), db)
+        dist_graph = connect.dist_graph
+        
+        dist_graph.addMinimum(m1)
+        
+        tree = dist_graph._shortest_paths[m2]
+        self.assertEqual(tree.pred[m1], m2)
+        path, weights = dist_graph.shortestPath(m2, m1)
+        self.assertEqual(path, [m2, m1])
+        self.assertEqual(weights, [0.])
+        path, weights = dist_graph.shortestPath(m2, m3)
+        self.assertEqual(path[0], m2)
+        self.assertEqual(path[-1], m3)
+
+
 if __name__ == "__main__":
     unittest.main()
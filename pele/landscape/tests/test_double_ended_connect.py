@@ -2,7 +2,7 @@ import unittest
 
 import numpy as np
 
-from pele.landscape import DoubleEndedConnect
+from pele.landscape import DoubleEndedConnect, MultiDoubleEndedConnect
 from pele.transition_states.tests.test_NEB import _x1, _x2
 
 
@@ -48,5 +48,98 @@ class TestDoubleEndedConnect(unittest.TestCase):
         
         path = connect.returnPath()
 
+    def test_progress(self):
+        from pele.storage import Database
+        from pele.systems import LJCluster
+        from pele.utils.progress import ProgressChannel
+        np.random.seed(0)
+
+        natoms = 13
+        system = LJCluster(natoms)
+        pot = system.get_potential()
+        mindist = system.get_mindist(niter=1)
+        
+        db = Database()
+        db.addMinimum(pot.getEnergy(_x1), _x1)
+        db.addMinimum(pot.getEnergy(_x2), _x2)
+        m1, m2 = db.minima()
+        
+        progress = ProgressChannel(every=10, maxlen=1000)
+        connect = DoubleEndedConnect(m1, m2, pot, mindist, db, progress=progress)
+        connect.connect()
+        self.assertTrue(connect.success())
+        
+        events = [r["event"] for r in progress.records()]
+        self.assertEqual(events[0], "cycle")
+        self.assertEqual(events[-1], "finished")
+        self.assertIn("initial", events)
+        self.assertIn("final", events)
+        self.assertTrue(progress.latest()["success"])
+        self.assertLess(progress.nrecorded, progress.ncalls)
+
+    def test_multiple_pairs(self):
+        from pele.storage import Database
+        from pele.systems import LJCluster
+        np.random.seed(0)
+
+        natoms = 13
+        system = LJCluster(natoms)
+        pot = system.get_potential()
+        mindist = system.get_mindist(niter=1)
+        
+        db = Database()
+        db.addMinimum(pot.getEnergy(_x1), _x1)
+        db.addMinimum(pot.getEnergy(_x2), _x2)
+        m1, m2 = db.minima()
+        
+        done = []
+        def on_done(min1, min2, success):
+            done.append((min1, min2, success))
+        connect = MultiDoubleEndedConnect([(m1, m2), (m2, m1)], pot, mindist, db)
+        connect.on_pair_done.connect(on_done)
+        connect.connect()
+        self.assertTrue(connect.success())
+        self.assertEqual(len(done), 2)
+        self.assertTrue(all(success for min1, min2, success in done))
+        # both pairs should have been served by the same connect cycles
+        self.assertEqual(connect.number_of_cycles(m1, m2), connect.number_of_cycles(m2, m1))
+        
+        mints, S, energies = connect.returnPath(m2, m1)
+        self.assertEqual(mints[0], m2)
+        self.assertEqual(mints[-1], m1)
+
+    def test_pairs_initialized_lazily(self):
+        from pele.storage import Database
+        from pele.systems import LJCluster
+        np.random.seed(0)
+
+        natoms = 13
+        system = LJCluster(natoms)
+        pot = system.get_potential()
+        mindist = system.get_mindist(niter=1)
+
+        db = Database()
+        x3 = _x1 + np.random.uniform(-.1, .1, _x1.shape)
+        x4 = _x2 + np.random.uniform(-.1, .1, _x2.shape)
+        m1 = db.addMinimum(pot.getEnergy(_x1), _x1)
+        m2 = db.addMinimum(pot.getEnergy(_x2), _x2)
+        m3 = db.addMinimum(pot.getEnergy(x3), x3)
+        m4 = db.addMinimum(pot.getEnergy(x4), x4)
+        db.addTransitionState(max(m2.energy, m3.energy) + 1., _x2, m2, m3)
+
+        connect = MultiDoubleEndedConnect([(m1, m2), (m2, m3), (m1, m4)], pot, mindist, db)
+        # only the first pair is in the distance graph
+        self.assertEqual(set(connect.dist_graph.Gdist.nodes()), set([m1, m2]))
+        self.assertTrue(connect._done[(m2, m3)])
+        
+        # (m1, m4) waits while (m1, m2) can still be worked on
+        connect._activatePairs()
+        self.assertNotIn(m4, connect.dist_graph.Gdist)
+        
+        connect._abandon((m1, m2))
+        connect._activatePairs()
+        self.assertIn(m4, connect.dist_graph.Gdist)
+        self.assertNotIn(m3, connect.dist_graph.Gdist)
+
 if __name__ == "__main__":
     unittest.main()
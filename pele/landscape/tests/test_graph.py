@@ -1,8 +1,10 @@
+import time
 import unittest
 from itertools import izip
 import networkx as nx
+import numpy as np
 
-from pele.landscape import TSGraph
+from pele.landscape import TSGraph, CompactTSGraph, ArrayUnionFind, database2graph
 
 
 def create_random_database(nmin=20, nts=None, natoms=2):
@@ -118,6 +120,99 @@ class TestGraph(unittest.TestCase):
                     self.assertFalse(tsgraph.areConnected(u, v))
 
 
+class TestArrayUnionFind(unittest.TestCase):
+    def test_union_edges(self):
+        uf = ArrayUnionFind(10)
+        uf.union_edges([9, 8, 1, 5], [8, 7, 2, 9])
+        self.assertEqual(uf.labels().tolist(), [0, 1, 1, 3, 4, 5, 6, 5, 5, 5])
+        self.assertTrue(uf.union(3, 9))
+        self.assertFalse(uf.union(7, 5))
+        self.assertEqual(uf.find(8), 3)
+        i = uf.add()
+        self.assertEqual(uf.find(i), i)
+
+    def test_long_chain(self):
+        # a path of minima is the worst case for joining the sets in rounds
+        n = 200000
+        order = np.random.permutation(n)
+        uf = ArrayUnionFind(n)
+        t0 = time.time()
+        uf.union_edges(order[:-1], order[1:])
+        labels = uf.labels()
+        self.assertLess(time.time() - t0, 5.)
+        self.assertTrue(np.all(labels == 0))
+
+        uf = ArrayUnionFind(n)
+        t0 = time.time()
+        uf.union_edges(np.arange(n - 1, 0, -1), np.arange(n - 2, -1, -1))
+        self.assertLess(time.time() - t0, 5.)
+        self.assertTrue(np.all(uf.labels() == 0))
+
+
+class TestCompactTSGraph(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.db = create_random_database(nmin=30, nts=20)
+
+    def test_components(self):
+        graph = CompactTSGraph(self.db)
+        self.assertEqual(graph.number_of_minima(), self.db.number_of_minima())
+        self.assertEqual(graph.number_of_transition_states(), self.db.number_of_transition_states())
+        
+        nxgraph = database2graph(self.db)
+        cc = graph.connected_components()
+        self.assertItemsEqual([frozenset(graph.min_ids[c]) for c in cc],
+                              [frozenset(m.id() for m in c) for c in nx.connected_components(nxgraph)])
+        self.assertEqual(len(cc[0]), max(len(c) for c in cc))
+        for m1 in self.db.minima()[:5]:
+            for m2 in self.db.minima():
+                self.assertEqual(graph.areConnected(m1, m2), nx.has_path(nxgraph, m1, m2))
+
+    def test_add(self):
+        graph = CompactTSGraph(self.db)
+        tsgraph = TSGraph(self.db)
+        minima = self.db.minima()
+        m = self.db.addMinimum(-1., [0.])
+        graph.addMinimum(m)
+        tsgraph.addMinimum(m)
+        for i in xrange(10):
+            m1, m2 = minima[i], minima[-i - 1]
+            ts = self.db.addTransitionState(10., [0.], m1, m2)
+            graph.addTransitionState(ts)
+            tsgraph.addTransitionState(ts)
+        ts = self.db.addTransitionState(10., [0.], m, minima[0])
+        graph.addTransitionState(ts)
+        tsgraph.addTransitionState(ts)
+        for m2 in self.db.minima():
+            self.assertEqual(graph.areConnected(m, m2), tsgraph.areConnected(m, m2))
+
+    def test_merge_minima(self):
+        graph = CompactTSGraph(self.db)
+        min1, min2 = self.db.minima()[:2]
+        i2 = graph.index(min2)
+        graph.mergeMinima(min1, min2)
+        self.assertEqual(graph.number_of_minima(), self.db.number_of_minima() - 1)
+        self.assertRaises(KeyError, graph.index, min2)
+        self.assertNotIn(i2, graph.ts_min1)
+        self.assertNotIn(i2, graph.ts_min2)
+
+    def test_spanning_forest(self):
+        graph = CompactTSGraph(self.db)
+        nxgraph = database2graph(self.db)
+        forest = graph.to_graph()
+        self.assertEqual(forest.number_of_nodes(), nxgraph.number_of_nodes())
+        self.assertEqual(forest.number_of_edges(),
+                         nxgraph.number_of_nodes() - nx.number_connected_components(nxgraph))
+        for u, v, data in nxgraph.edges(data=True):
+            data["energy"] = data["ts"].energy
+        mst = nx.minimum_spanning_tree(nxgraph, weight="energy")
+        energy = lambda g: sum(data["ts"].energy for u, v, data in g.edges(data=True))
+        self.assertAlmostEqual(energy(forest), energy(mst))
+        
+        full = graph.to_graph(spanning_forest=False)
+        self.assertEqual(full.number_of_edges(), nxgraph.number_of_edges())
+
+
 if __name__ == "__main__":
     unittest.main()
 
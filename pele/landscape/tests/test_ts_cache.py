@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from pele.landscape import TransitionStateCache
+from pele.landscape._ts_cache import radial_fingerprint
+from pele.systems import LJCluster
+from pele.utils.rotations import random_aa, aa2mx
+from test_graph import create_random_database
+
+
+class TestTransitionStateCache(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 5
+        self.db = create_random_database(nmin=10, nts=5, natoms=self.natoms)
+        self.compare = LJCluster(self.natoms).get_compare_exact()
+        self.cache = TransitionStateCache(self.compare, energy_tolerance=self.db.accuracy)
+        self.cache.add_from_database(self.db)
+
+    def test_fingerprint_invariant(self):
+        x = np.random.uniform(-1, 1, 3 * self.natoms)
+        mx = aa2mx(random_aa())
+        x2 = np.dot(mx, x.reshape(-1, 3).transpose()).transpose()
+        x2 = -x2[::-1, :] + 1.
+        self.assertTrue(np.allclose(radial_fingerprint(x), radial_fingerprint(x2)))
+
+    def test_fingerprint_not_3d(self):
+        self.assertEqual(radial_fingerprint(np.random.uniform(-1, 1, 4)).size, 0)
+
+    def test_find_known(self):
+        self.assertEqual(len(self.cache), self.db.number_of_transition_states())
+        for ts in self.db.transition_states():
+            x = ts.coords.reshape(-1, 3)[::-1, :] + 2.
+            found = self.cache.find(ts.energy + self.db.accuracy / 2, x.ravel())
+            self.assertIsNotNone(found)
+            self.assertEqual(found.id(), ts.id())
+
+    def test_find_unknown(self):
+        ts = self.db.transition_states()[0]
+        self.assertIsNone(self.cache.find(ts.energy + 1., ts.coords))
+        x = np.random.uniform(-1, 1, 3 * self.natoms)
+        self.assertIsNone(self.cache.find(ts.energy, x))
+
+    def test_same_energy_and_fingerprint(self):
+        # two distinct transition states with near identical energies and the
+        # same radial fingerprint.  Only the exact comparison tells them apart
+        m1, m2 = self.db.minima()[:2]
+        x1 = np.random.uniform(-1, 1, [self.natoms, 3])
+        x1 -= x1.mean(axis=0)
+        # rotate two atoms about the axis through their sum, which leaves the
+        # center of mass and the distances from it unchanged
+        axis = x1[0] + x1[1]
+        mx = aa2mx(axis / np.linalg.norm(axis) * np.pi / 2)
+        x2 = x1.copy()
+        x2[:2] = np.dot(x1[:2], mx.transpose())
+        self.assertTrue(np.allclose(radial_fingerprint(x1), radial_fingerprint(x2)))
+        self.assertFalse(self.compare(x1.ravel(), x2.ravel()))
+        energy = 50.
+        ts1 = self.db.addTransitionState(energy, x1.ravel(), m1, m2)
+        self.cache.add(ts1)
+
+        self.assertIsNone(self.cache.find(energy + self.db.accuracy / 10, x2.ravel()))
+        found = self.cache.find(energy + self.db.accuracy / 10, x1.ravel())
+        self.assertEqual(found.id(), ts1.id())
+
+    def test_database_signals(self):
+        cache = TransitionStateCache(self.compare, energy_tolerance=self.db.accuracy)
+        cache.connect_database(self.db)
+        m1, m2 = self.db.minima()[:2]
+        x = np.random.uniform(-1, 1, 3 * self.natoms)
+        ts = self.db.addTransitionState(100., x, m1, m2)
+        self.assertIn(ts, cache)
+        self.db.remove_transition_state(ts)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
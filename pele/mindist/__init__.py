@@ -55,6 +55,15 @@ very quickly using the Hungarian (shortest augmenting path) algorithm.
     optimize_permutations
     find_best_permutation
     
+For large systems, e.g. bulk glasses, the dense cost matrix is too expensive.
+find_permutations_cutoff only considers pairs of atoms within a cutoff which is
+widened if necessary.
+
+.. autosummary::
+   :toctree: generated/
+
+    find_permutations_cutoff
+    
 
 Rotational + permutational alignment
 ------------------------------------
@@ -78,6 +87,16 @@ For atomic cluster, specialized wrapper exist.
     MinPermDistAtomicCluster
     ExactMatchAtomicCluster
 
+MinPermDistAtomicClusterCpp does the same as MinPermDistAtomicCluster, but
+the whole alignment loop is in c++ and the trial rotations can be spread over
+several threads.
+
+.. autosummary::
+   :toctree: generated/
+    
+    MinPermDistAtomicClusterCpp
+    linear_assignment
+
 See the angleaxis module for angleaxis minpermdist routines
 
 Periodic Boundary Conditions
@@ -90,6 +109,9 @@ structures are identical
    :toctree: generated/
     
     ExactMatchPeriodic
+
+Both ExactMatchPeriodic and MinPermDistBulk optimize the permutations with
+find_permutations_cutoff, so they can be used for large systems.
     
 Customizing minpermdist - minpermdist policies
 ----------------------------------------------
@@ -105,6 +127,8 @@ Utilities
    :toctree: generated/
 
     PointGroupOrderCluster
+    PointGroupOrderCache
+    ClusterFingerprint
 
 """
 from backward_compatibility import CoMToOrigin
@@ -114,5 +138,14 @@ from minpermdist_stochastic import MinPermDistCluster
 from rmsfit import *
 from _minpermdist_policies import *
 from periodic_exact_match import ExactMatchPeriodic
-from _pointgrouporder import PointGroupOrderCluster
+from _pointgrouporder import PointGroupOrderCluster, PointGroupOrderCache
+from _fingerprint import ClusterFingerprint
 from _wrapper_atomiccluster import MinPermDistAtomicCluster, ExactMatchAtomicCluster
+try:
+    from _minpermdist_cpp import MinPermDistAtomicClusterCpp, linear_assignment
+except ImportError:
+    def MinPermDistAtomicClusterCpp(*args, **kwargs):
+        raise ImportError("MinPermDistAtomicClusterCpp requires the compiled extension pele.mindist._minpermdist_cpp")
+
+    def linear_assignment(*args, **kwargs):
+        raise ImportError("linear_assignment requires the compiled extension pele.mindist._minpermdist_cpp")
@@ -0,0 +1,141 @@
+import numpy as np
+
+__all__ = ["ClusterFingerprint"]
+
+
+class ClusterFingerprint(object):
+    """cheap structural descriptors of an atomic cluster which are invariant to symmetry
+
+    The fingerprint of a structure is a vector which does not change under
+    translation, rotation, inversion and permutations of identical atoms.  Two
+    structures which are identical have the same fingerprint (to within
+    numerical noise), so if the fingerprints are different the structures
+    are certainly different and the expensive exact match can be skipped.  The
+    converse is not true.
+
+    The fingerprint is made of
+
+    1. the eigenvalues of the inertia tensor (per atom)
+    #. a smoothed histogram of the interatomic distances for each pair of atom types
+    #. the average coordination number of each atom type
+
+    All lengths are measured in units of the median nearest neighbor distance
+    of the structure, so no knowledge of the potential is needed.
+    All components are continuous functions of the coordinates.
+
+    Parameters
+    ----------
+    permlist : list of lists, optional
+        the groups of identical atoms.  If None all atoms are identical
+    nbins : int
+        the number of points in the distance histogram
+    bin_width : float
+        the spacing of the histogram points and the width of the gaussians
+        used for smoothing it, in units of the nearest neighbor distance
+    rcoord : float
+        atoms closer than this are counted as neighbors (with a smooth
+        switching function) in units of the nearest neighbor distance
+    tol : float
+        the relative tolerance for two fingerprints to match
+    key_resolution : float
+        the resolution of the integer key, see key()
+
+    Examples
+    --------
+    >>> fingerprint = ClusterFingerprint()
+    >>> fp1, fp2 = fingerprint(x1), fingerprint(x2)
+    >>> if not fingerprint.match(fp1, fp2):
+    >>>     print "the structures are different"
+    """
+    def __init__(self, permlist=None, nbins=24, bin_width=0.25, rcoord=1.3, tol=1e-2,
+                 key_resolution=0.02):
+        self.permlist = permlist
+        self.nbins = nbins
+        self.bin_width = bin_width
+        self.rcoord = rcoord
+        self.tol = tol
+        self.key_resolution = key_resolution
+
+    def _types(self, natoms):
+        """return the type of each atom"""
+        types = np.zeros(natoms, dtype=int)
+        if self.permlist is not None:
+            # atoms which are not in permlist each have their own type
+            types[:] = np.arange(natoms) + len(self.permlist)
+            for i, atomlist in enumerate(self.permlist):
+                types[list(atomlist)] = i
+        return types
+
+    def __call__(self, coords):
+        """return the fingerprint of a structure"""
+        x = np.reshape(coords, [-1, 3])
+        natoms = len(x)
+        x = x - x.mean(0)
+        inertia = np.eye(3) * np.sum(x * x) - np.dot(x.T, x)
+        fp = [np.linalg.eigvalsh(inertia)[::-1] / natoms]
+        if natoms < 2:
+            return np.concatenate(fp)
+
+        dist = np.sqrt(((x[:, np.newaxis, :] - x[np.newaxis, :, :]) ** 2).sum(2))
+        np.fill_diagonal(dist, np.inf)
+        rnn = np.median(dist.min(1))
+        dist /= rnn
+
+        types = self._types(natoms)
+        ntypes = types.max() + 1 if self.permlist is None else len(self.permlist)
+
+        # the smoothed distance histogram of each pair of types
+        i, j = np.triu_indices(natoms, 1)
+        centers = self.bin_width * np.arange(1, self.nbins + 1)
+        weights = np.exp(-(dist[i, j][:, np.newaxis] - centers[np.newaxis, :]) ** 2
+                         / (2 * self.bin_width ** 2))
+        ti = np.minimum(types[i], types[j])
+        tj = np.maximum(types[i], types[j])
+        for a in xrange(ntypes):
+            for b in xrange(a, ntypes):
+                fp.append(weights[(ti == a) & (tj == b)].sum(0))
+
+        # the average coordination number of each type
+        r6 = (dist / self.rcoord) ** 6
+        coordination = (1. / (1. + r6)).sum(1)
+        for a in xrange(ntypes):
+            in_type = types == a
+            fp.append([coordination[in_type].mean() if in_type.any() else 0.])
+
+        return np.concatenate(fp)
+
+    def match(self, fp1, fp2):
+        """return True if the fingerprints are the same within the tolerance"""
+        fp1 = np.asarray(fp1)
+        fp2 = np.asarray(fp2)
+        if fp1.shape != fp2.shape:
+            return False
+        scale = np.maximum(np.maximum(np.abs(fp1), np.abs(fp2)), 1.)
+        return bool(np.all(np.abs(fp1 - fp2) <= self.tol * scale))
+
+    def key(self, fp):
+        """return an integer summary of the fingerprint for indexed lookups
+
+        This is the sum of the inertia eigenvalues (twice the squared radius
+        of gyration) divided by key_resolution.  The key of a matching
+        fingerprint is in the range returned by key_window()
+        """
+        return int(np.floor(np.sum(fp[:3]) / self.key_resolution))
+
+    def key_window(self, fp):
+        """return the range of keys (kmin, kmax) which a matching fingerprint can have"""
+        s = np.sum(fp[:3])
+        # each inertia eigenvalue can differ by tol * max(1, |value|)
+        delta = self.tol * np.sum(np.maximum(np.abs(fp[:3]), 1.)) * 2
+        return (int(np.floor((s - delta) / self.key_resolution)),
+                int(np.floor((s + delta) / self.key_resolution)))
+
+    def cell(self, fp):
+        """return the full fingerprint rounded to key_resolution as a hashable tuple
+
+        Identical structures have the same cell unless their fingerprint lies
+        within numerical noise of a cell boundary, so the cell can be used as
+        a dictionary key where an occasional missed match is acceptable, e.g.
+        for caches.
+        """
+        return tuple(np.floor(np.asarray(fp) / self.key_resolution).astype(int))
@@ -0,0 +1,266 @@
+"""
+# distutils: language = C++
+
+python interface to the c++ minpermdist routines for atomic clusters
+"""
+import numpy as np
+
+cimport numpy as np
+from libcpp cimport bool as cbool
+from libcpp.vector cimport vector
+
+cimport pele.potentials._pele as _pele
+from pele.potentials._pele cimport array_wrap_np
+
+
+cdef extern from "pele/lap.h" namespace "pele":
+    double c_linear_assignment "pele::linear_assignment"(double *, size_t, vector[size_t] &) nogil except +
+
+cdef extern from "pele/cutoff_permutation.h" namespace "pele":
+    cdef cppclass cCutoffPermutation "pele::CutoffPermutation":
+        cCutoffPermutation(vector[double] &, double) except +
+        cbool find_permutation(double *, double *, size_t, double, double, vector[size_t] &, double &) nogil except +
+        double get_final_cutoff()
+        size_t get_npairs()
+
+cdef extern from "pele/minpermdist.h" namespace "pele":
+    cdef cppclass cClusterTransformation "pele::ClusterTransformation":
+        double rotation[9]
+        cbool invert
+        vector[size_t] permutation
+        double com1[3]
+        double com2[3]
+
+    cdef cppclass cMinPermDistCluster "pele::MinPermDistCluster":
+        cMinPermDistCluster(vector[vector[size_t]] &, cbool, size_t, double, double, size_t, unsigned long) except +
+        void set_seed(unsigned long)
+        void set_nthreads(size_t)
+        double align(_pele.Array[double], _pele.Array[double], _pele.Array[double]) nogil except +
+        cClusterTransformation & get_transformation()
+
+
+def linear_assignment(cost):
+    """solve the linear assignment problem with the c++ shortest augmenting path solver
+
+    Parameters
+    ----------
+    cost : array, shape (n, n)
+        the cost matrix
+
+    Returns
+    -------
+    perm : array
+        perm[i] is the column assigned to row i
+    total : float
+        the sum of the costs of the assignment
+    """
+    cdef np.ndarray[double, ndim=2, mode="c"] ccost = np.ascontiguousarray(cost, dtype=float)
+    if ccost.shape[0] != ccost.shape[1]:
+        raise ValueError("the cost matrix must be square")
+    cdef vector[size_t] assignment
+    cdef size_t n = ccost.shape[0]
+    cdef double total
+    with nogil:
+        total = c_linear_assignment(<double*> ccost.data, n, assignment)
+    return np.array(assignment, dtype=int), total
+
+
+cdef class CutoffPermutation(object):
+    """find the best permutation of identical atoms considering only pairs closer than a cutoff
+
+    Candidate pairs are found with a cell list and the sparse assignment
+    problem is solved with a shortest augmenting path method.  If there is no
+    perfect matching within the cutoff the cutoff is multiplied by
+    widen_factor until there is one.
+
+    Parameters
+    ----------
+    box_lengths : array, optional
+        the side lengths of the rectangular box for periodic boundary
+        conditions.  None for no periodic boundary conditions
+    widen_factor : float
+        the factor by which the cutoff is increased
+
+    See Also
+    --------
+    find_permutations_cutoff
+    """
+    cdef cCutoffPermutation *thisptr
+
+    def __cinit__(self, box_lengths=None, widen_factor=1.5):
+        cdef vector[double] box
+        if box_lengths is not None:
+            for l in box_lengths:
+                box.push_back(float(l))
+        self.thisptr = new cCutoffPermutation(box, widen_factor)
+
+    def __dealloc__(self):
+        if self.thisptr != NULL:
+            del self.thisptr
+            self.thisptr = NULL
+
+    def find_permutation(self, X1, X2, cutoff, max_cutoff=None):
+        """return (dist2, perm) or None if there is no perfect matching within max_cutoff
+
+        X2[perm[i]] is matched with X1[i] and dist2 is the sum of the squared
+        distances of the matched atoms.
+        """
+        cdef np.ndarray[double, ndim=1, mode="c"] x1 = np.array(X1, dtype=float).reshape(-1)
+        cdef np.ndarray[double, ndim=1, mode="c"] x2 = np.array(X2, dtype=float).reshape(-1)
+        if x1.size != x2.size or x1.size % 3 != 0:
+            raise ValueError("the coordinates must have the same size, a multiple of 3")
+        cdef size_t natoms = x1.size / 3
+        cdef double ccutoff = cutoff
+        cdef double cmax_cutoff = -1 if max_cutoff is None else max_cutoff
+        cdef vector[size_t] perm
+        cdef double dist2 = 0
+        cdef cbool success
+        with nogil:
+            success = self.thisptr.find_permutation(<double*> x1.data, <double*> x2.data, natoms,
+                                                    ccutoff, cmax_cutoff, perm, dist2)
+        if not success:
+            return None
+        return dist2, np.array(perm, dtype=int)
+
+    def get_final_cutoff(self):
+        """return the cutoff used in the last call to find_permutation"""
+        return self.thisptr.get_final_cutoff()
+
+    def get_npairs(self):
+        """return the number of candidate pairs in the last call to find_permutation"""
+        return self.thisptr.get_npairs()
+
+
+cdef class MinPermDistAtomicClusterCpp(object):
+    """minpermdist for atomic clusters implemented in c++
+
+    This is a drop in replacement for MinPermDistAtomicCluster and can be
+    used wherever the result of `system.get_mindist()` is.  The algorithm is
+    the same as in MinPermDistCluster, but the whole alignment loop, including
+    the solution of the assignment problem, is done in c++.  The standard
+    alignments and the random rotations are independent trials which are
+    distributed over `nthreads` threads.  All threads stop as soon as a
+    distance less than `tol` is found.  The python GIL is released during the
+    alignment.
+
+    Parameters
+    ----------
+    permlist : optional
+        list of allowed permutations. If nothing is given, all atoms will be
+        considered as permutable. For no permutations give an empty list []
+    can_invert : bool, optional
+        also test for inversion
+    niter : int
+        the number of random rotations to try
+    tol : float
+        stop if a distance less than tol is found
+    accuracy : float
+        accuracy for the standard alignments
+    nthreads : int
+        the number of threads to use
+    seed : int, optional
+        the seed for the random rotations.  If not given a new seed is drawn
+        from numpy.random for every alignment.
+
+    See Also
+    --------
+    MinPermDistAtomicCluster
+    """
+    cdef cMinPermDistCluster *thisptr
+    cdef object permlist
+    cdef size_t natoms
+    cdef public object can_invert, niter, tol, accuracy, nthreads, seed, verbose
+
+    def __cinit__(self, permlist=None, can_invert=True, niter=10, tol=0.01, accuracy=0.01,
+                  nthreads=1, seed=None, verbose=False):
+        self.thisptr = NULL
+        self.permlist = permlist
+        self.natoms = 0
+        self.can_invert = can_invert
+        self.niter = niter
+        self.tol = tol
+        self.accuracy = accuracy
+        self.nthreads = nthreads
+        self.seed = seed
+        self.verbose = verbose
+
+    def __dealloc__(self):
+        if self.thisptr != NULL:
+            del self.thisptr
+            self.thisptr = NULL
+
+    cdef _setup(self, size_t natoms):
+        cdef vector[vector[size_t]] permlist
+        if self.permlist is None:
+            permlist.push_back(range(natoms))
+        else:
+            for atomlist in self.permlist:
+                permlist.push_back([int(i) for i in atomlist])
+        if self.thisptr != NULL:
+            del self.thisptr
+        self.thisptr = new cMinPermDistCluster(permlist, bool(self.can_invert), self.niter,
+                                               self.tol, self.accuracy, self.nthreads, 0)
+        self.natoms = natoms
+
+    def align_structures(self, coords1, coords2):
+        """
+        Parameters
+        ----------
+        coords1, coords2 : np.array
+            the structures to align.  coords2 will be aligned with coords1
+
+        Returns
+        -------
+        a triple of (dist, coords1, coords2). coords1 are the unchanged coords1
+        and coords2 are brought in best alignment with coords1
+        """
+        cdef np.ndarray[double, ndim=1, mode="c"] x1 = np.array(coords1, dtype=float).reshape(-1)
+        cdef np.ndarray[double, ndim=1, mode="c"] x2 = np.array(coords2, dtype=float).reshape(-1)
+        cdef np.ndarray[double, ndim=1, mode="c"] x2new = np.zeros(x2.size)
+        if x1.size != x2.size or x1.size % 3 != 0:
+            raise ValueError("the coordinates must have the same size, a multiple of 3")
+        if self.thisptr == NULL or self.natoms != x1.size / 3:
+            self._setup(x1.size / 3)
+        self.thisptr.set_nthreads(self.nthreads)
+        if self.seed is None:
+            self.thisptr.set_seed(np.random.randint(2**31 - 1))
+        else:
+            self.thisptr.set_seed(self.seed)
+
+        cdef _pele.Array[double] cx1 = array_wrap_np(x1)
+        cdef _pele.Array[double] cx2 = array_wrap_np(x2)
+        cdef _pele.Array[double] cx2new = array_wrap_np(x2new)
+        cdef double dist
+        with nogil:
+            dist = self.thisptr.align(cx1, cx2, cx2new)
+        if self.verbose:
+            print "finaldist", dist
+        return dist, coords1, x2new.reshape(np.shape(coords2))
+
+    def get_transformation(self):
+        """return the transformation found in the last alignment
+
+        Returns
+        -------
+        rotation : array, shape (3, 3)
+        invert : bool
+        permutation : array
+        com1, com2 : arrays
+            the centers of mass of the two structures
+
+        the aligned coordinates are
+
+            x2new = rotation.dot(sign * (x2[permutation] - com2).T).T + com1
+
+        with sign -1 if invert is True
+        """
+        if self.thisptr == NULL:
+            raise RuntimeError("no alignment has been done yet")
+        cdef cClusterTransformation t = self.thisptr.get_transformation()
+        rotation = np.array([t.rotation[i] for i in range(9)]).reshape(3, 3)
+        com1 = np.array([t.com1[i] for i in range(3)])
+        com2 = np.array([t.com2[i] for i in range(3)])
+        return rotation, bool(t.invert), np.array(t.permutation, dtype=int), com1, com2
+
+    def __call__(self, coords1, coords2):
+        return self.align_structures(coords1, coords2)
@@ -60,6 +60,15 @@ class MeasurePolicy(object):
     def find_rotation(self, X1, X2):
         """ find the best rotation matrix to bring structure 2 on 1 """
         raise NotImplementedError
+    
+    def could_be_identical(self, X1, X2, tol):
+        """ cheap test if 2 structures with the center of mass at the origin can be identical
+        
+        This is called by ExactMatchCluster before trying any alignments.  It
+        must only return False if the structures are certainly different.  The
+        default always returns True.
+        """
+        return True
 
 class TransformAtomicCluster(TransformPolicy):
     """ transformation rules for atomic clusters """
@@ -113,5 +122,33 @@ class MeasureAtomicCluster(MeasurePolicy):
     def find_rotation(self, X1, X2):
         dist, mx = findrotation(X1, X2)
         return dist, mx
+
+    def could_be_identical(self, X1, X2, tol):
+        """ compare the sorted distances from the origin of each group of permutable atoms
+        
+        If the distance between the structures after the best alignment is
+        less than tol, the distance of each atom from the center differs by
+        less than tol from that of the atom it is matched with.
+        """
+        R1 = np.sqrt(np.sum(np.reshape(X1, [-1,3])**2, axis=1))
+        R2 = np.sqrt(np.sum(np.reshape(X2, [-1,3])**2, axis=1))
+        if len(R1) != len(R2):
+            return False
+        if self.permlist is None:
+            groups = [np.arange(len(R1))]
+        else:
+            groups = [np.asarray(atomlist, dtype=int) for atomlist in self.permlist]
+            # the atoms which can't be permuted are compared directly
+            fixed = np.ones(len(R1), dtype=bool)
+            for atomlist in groups:
+                fixed[atomlist] = False
+            if np.any(np.abs(R1[fixed] - R2[fixed]) >= tol):
+                return False
+        for atomlist in groups:
+            if len(atomlist) == 0:
+                continue
+            if np.max(np.abs(np.sort(R1[atomlist]) - np.sort(R2[atomlist]))) >= tol:
+                return False
+        return True
     
     
\ No newline at end of file
@@ -1,6 +1,8 @@
+from collections import OrderedDict
+
 import numpy as np
 
-__all__= ["PointGroupOrderCluster"]
+__all__= ["PointGroupOrderCluster", "PointGroupOrderCache"]
 
 def _rotation_in_list(rot, rot_list, eps=1e-6):
     """return true if the rotation matrix is already in the list"""
@@ -21,9 +23,13 @@ class PointGroupOrderCluster(object):
 
         exact_match :
             class to perform exact match checks and get transform policies
+        skip_eps : float
+            trial rotations closer than this (in the Frobenius norm) to a
+            symmetry operation which has already been found are skipped
     """
-    def __init__(self, exact_match):
+    def __init__(self, exact_match, skip_eps=0.1):
         self.exact_match = exact_match
+        self.skip_eps = skip_eps
         
         if not hasattr(exact_match, "transform") or not hasattr(exact_match, "measure"):
             raise RuntimeError("exact_match does not have a transform or measure policy")
@@ -44,6 +50,11 @@ class PointGroupOrderCluster(object):
         rot_list = []
         for rot, invert in self.exact_match.standard_alignments(x1, x1):
             if invert: continue
+            # many alignments map onto the same symmetry operation.  Distinct
+            # operations are far apart, so a trial rotation close to one
+            # which was already found need not be checked again
+            if _rotation_in_list(rot, rot_list, eps=self.skip_eps):
+                continue
             match = self.exact_match.check_match(x1, x1, rot, invert)
             if match is not None:
                 # check if the rotation matrix has already been found.
@@ -53,6 +64,73 @@ class PointGroupOrderCluster(object):
         pgorder = len(rot_list)
         return inversion_multiplier * pgorder
 
+
+class PointGroupOrderCache(object):
+    """memoize the point group order of structures
+    
+    Structures are looked up by their full fingerprint, rounded to the key
+    resolution (see ClusterFingerprint.cell).  If a previously seen structure
+    has the same rounded fingerprint and is an exact match, its point group
+    order is returned, otherwise it is computed with pgorder and stored.
+    Symmetry equivalent copies of a structure (rotated, inverted, permuted)
+    therefore only have their point group order computed once.  At most
+    max_size structures are stored, the least recently used are discarded
+    first.
+    
+    Parameters
+    ----------
+    pgorder : callable
+        pgorder(coords) returns the point group order, e.g. system.get_pgorder
+    fingerprint : ClusterFingerprint like object
+        see BaseSystem.get_fingerprint()
+    exact_match : callable
+        exact_match(coords1, coords2) returns True if the structures are
+        identical, see BaseSystem.get_compare_exact()
+    max_size : int
+        the maximum number of structures which are stored
+    
+    Examples
+    --------
+    >>> pgorder = PointGroupOrderCache(system.get_pgorder, system.get_fingerprint(),
+    >>>                                system.get_compare_exact())
+    >>> for m in db.minima():
+    >>>     m.pgorder = pgorder(m.coords)
+    """
+    def __init__(self, pgorder, fingerprint, exact_match, max_size=1000):
+        self.pgorder = pgorder
+        self.fingerprint = fingerprint
+        self.exact_match = exact_match
+        self.max_size = max_size
+        # cell -> list of (coords, pgorder), in least recently used order
+        self._cache = OrderedDict()
+        self._size = 0
+        self.nhits = 0
+        self.ncalls = 0
+
+    def __len__(self):
+        return self._size
+
+    def __call__(self, coords):
+        self.ncalls += 1
+        cell = self.fingerprint.cell(self.fingerprint(coords))
+        entries = self._cache.pop(cell, [])
+        self._cache[cell] = entries
+        for coords2, pgorder in entries:
+            if self.exact_match(coords, coords2):
+                self.nhits += 1
+                return pgorder
+        
+        pgorder = self.pgorder(coords)
+        entries.append((coords.copy(), pgorder))
+        self._size += 1
+        while self._size > self.max_size:
+            oldest = next(iter(self._cache))
+            self._cache[oldest].pop(0)
+            self._size -= 1
+            if not self._cache[oldest]:
+                del self._cache[oldest]
+        return pgorder
+
 #
 # testing only below here
 #
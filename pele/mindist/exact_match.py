@@ -22,6 +22,9 @@ class StandardClusterAlignment(object):
        orientation and check for match. Skip directly if angle of candidates
        does not match angle of reference atoms in structure 1.
 
+    All candidate pairs are tested and the rotations are computed at once with
+    array operations when the object is created.
+
     Parameters
     ----------
     coords1 : np.array
@@ -32,6 +35,11 @@ class StandardClusterAlignment(object):
         accuracy of shell for atom candidates in standard alignment
     can_invert : boolean
         is an inversion possible?
+    check_distance : boolean
+        also discard candidate pairs whose separation differs from the
+        separation of the reference atoms by more than 2*accuracy.  This is
+        safe when looking for exact matches, but removes useful starting
+        points for the alignment of structures which are different.
 
     Examples
     --------
@@ -40,126 +48,113 @@ class StandardClusterAlignment(object):
     >>     print "possible rotation:",rot,"inversion:",invert
 
     """
-    def __init__(self, coords1, coords2, accuracy = 0.01, can_invert=True):
+    def __init__(self, coords1, coords2, accuracy = 0.01, can_invert=True, check_distance=False):
         x1 = coords1.reshape([-1,3]).copy()
         x2 = coords2.reshape([-1,3]).copy()
 
         self.accuracy = accuracy
         self.can_invert = can_invert
+        self.x1 = x1
+        self.x2 = x2
+        self._index = 0
 
         # calculate distance of all atoms
         R1 = np.sqrt(np.sum(x1*x1, axis=1))
         R2 = np.sqrt(np.sum(x2*x2, axis=1))
 
         # at least 2 atoms are needed
-        # get atom most outer atom
+        if len(x1) < 2:
+            self.idx1_1 = self.idx1_2 = None
+            self._set_pairs(np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+            return
 
         # get 1. reference atom in configuration 1
         # use the atom with biggest distance to com
         idx_sorted = R1.argsort()
         idx1_1 = idx_sorted[-1]
 
-        # find second atom which is not in a line
-        cos_best = 99.00
-        for idx1_2 in reversed(idx_sorted[0:-1]):
-            # stop if angle is larger than threshold
-            cos_theta1 = np.dot(x1[idx1_1], x1[idx1_2]) / \
-                (np.linalg.norm(x1[idx1_1])*np.linalg.norm(x1[idx1_2]))
-
-            # store the best match in case it is a almost linear molecule
-            if np.abs(cos_theta1) < np.abs(cos_best):
-                cos_best = cos_theta1
-                idx1_2_best = idx1_2
-
-            if np.abs(cos_theta1) < 0.9:
-                break
-
-        idx1_2 = idx1_2_best
+        # find second atom which is not in a line.  Take the outermost atom
+        # with |cos(theta)| < 0.9 or, if the structure is almost linear, the
+        # atom with the smallest |cos(theta)|
+        others = idx_sorted[-2::-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cos_theta = np.dot(x1[others], x1[idx1_1]) / (R1[others] * R1[idx1_1])
+        # an atom at the center can't be used as a reference
+        cos_theta[~np.isfinite(cos_theta)] = 1.
+        not_linear = np.where(np.abs(cos_theta) < 0.9)[0]
+        if len(not_linear) > 0:
+            k = not_linear[0]
+        else:
+            k = np.argmin(np.abs(cos_theta))
+        idx1_2 = others[k]
+        self.cos_theta1 = cos_theta[k]
+        self.idx1_1 = idx1_1
+        self.idx1_2 = idx1_2
 
         # do a very quick check if most distant atom from
         # center are within accuracy
         if np.abs(R1[idx1_1] - R2.max()) > accuracy:
-            candidates1 = []
-            candidates2 = []
+            self._set_pairs(np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+            return
+
+        # get indices of atoms in shell of thickness 2*accuracy
+        candidates1 = np.where(np.abs(R2 - R1[idx1_1]) < accuracy)[0]
+        candidates2 = np.where(np.abs(R2 - R1[idx1_2]) < accuracy)[0]
+
+        # all the candidate pairs, in the order of a loop over candidates1
+        # then candidates2
+        idx2_1 = np.repeat(candidates1, len(candidates2))
+        idx2_2 = np.tile(candidates2, len(candidates1))
+
+        # discard the pairs if the angle does not match
+        keep = idx2_1 != idx2_2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cos_theta2 = np.sum(x2[idx2_1] * x2[idx2_2], axis=1) / (R2[idx2_1] * R2[idx2_2])
+        keep &= np.abs(cos_theta2 - self.cos_theta1) <= 0.5
+        if check_distance:
+            d1 = np.linalg.norm(x1[idx1_1] - x1[idx1_2])
+            d2 = np.sqrt(np.sum((x2[idx2_1] - x2[idx2_2])**2, axis=1))
+            keep &= np.abs(d2 - d1) <= 2 * accuracy
+
+        self._set_pairs(idx2_1[keep], idx2_2[keep])
+
+    def _set_pairs(self, idx2_1, idx2_2):
+        """compute the rotations for all pairs of candidate atoms"""
+        if self.can_invert:
+            # the inverted alignment of each pair directly follows the non inverted
+            idx2_1 = np.repeat(idx2_1, 2)
+            idx2_2 = np.repeat(idx2_2, 2)
+            inversions = np.tile([False, True], len(idx2_1) // 2)
         else:
-            # get indices of atoms in shell of thickness 2*accuracy
-            candidates1 = np.arange(len(R2))[ \
-                 (R2 > R1[idx1_1] - accuracy)*(R2 < R1[idx1_1] + accuracy)]
-            candidates2 = np.arange(len(R2))[ \
-                 (R2 > R1[idx1_2] - accuracy)*(R2 < R1[idx1_2] + accuracy)]
-
-        self.x1 = x1
-        self.x2 = x2
-        self.idx1_1 = idx1_1
-        self.idx1_2 = idx1_2
-        self.idx2_1 = None
-        self.idx2_2 = None
-        self.invert = False
-
-        self.cos_theta1 = cos_theta1
-        self.candidates2 = candidates2
-
-        self.iter1 = iter(candidates1)
-        self.iter2 = iter(self.candidates2)
+            inversions = np.zeros(len(idx2_1), dtype=bool)
+        self.idx2_1 = idx2_1
+        self.idx2_2 = idx2_2
+        self.inversions = inversions
+
+        if len(idx2_1) == 0:
+            self.rotations = np.zeros([0, 3, 3])
+            return
+        
+        # get rotation for all atom match candidates
+        ref = self.x1[[self.idx1_1, self.idx1_2]]
+        mul = np.where(inversions, -1., 1.)[:, np.newaxis, np.newaxis]
+        pairs = mul * np.concatenate([self.x2[idx2_1][:, np.newaxis, :],
+                                      self.x2[idx2_2][:, np.newaxis, :]], axis=1)
+        ref = np.tile(ref, [len(pairs), 1, 1])
+        self.rotations = rmsfit.findrotation_many(ref, pairs)
+
+    def __len__(self):
+        return len(self.inversions)
 
     def __iter__(self):
         return self
 
     def next(self):
-        # obtain first index for first call
-        if self.idx2_1 is None:
-            self.idx2_1 = self.iter1.next()
-
-        # toggle inversion if inversion is possible
-        if self.can_invert and self.invert == False and self.idx2_2 is not None:
-            self.invert = True
-        else:
-            # determine next pair of indices
-            self.invert = False
-            # try to increment 2nd iterator
-            try:
-                self.idx2_2 = self.iter2.next()
-            except StopIteration:
-                # end of list, start over again
-                self.iter2 = iter(self.candidates2)
-                # and increment iter1
-                self.idx2_1 = self.iter1.next()
-                self.idx2_2 = None
-                return self.next()
-
-        if self.idx2_1 == self.idx2_2:
-            return self.next()
-
-        x1 = self.x1
-        x2 = self.x2
-        idx1_1 = self.idx1_1
-        idx1_2 = self.idx1_2
-        idx2_1 = self.idx2_1
-        idx2_2 = self.idx2_2
-
-        assert idx1_1 is not None
-        assert idx1_2 is not None
-        assert idx2_1 is not None
-        assert idx2_2 is not None
-
-        # we can immediately trash the match if angle does not match
-        try:
-            cos_theta2 = np.dot(x2[idx2_1], x2[idx2_2]) / \
-                (np.linalg.norm(x2[idx2_1])*np.linalg.norm(x2[idx2_2]))
-        except ValueError:
-            raise
-        if np.abs(cos_theta2 - self.cos_theta1) > 0.5:
-            return self.next()
-
-        mul = 1.0
-        if self.invert:
-            mul=-1.0
-
-        # get rotation for current atom match candidates
-        dist, rot = rmsfit.findrotation(
-            x1[[idx1_1, idx1_2]], mul*x2[[idx2_1, idx2_2]], align_com=False)
-
-        return rot, self.invert
+        if self._index >= len(self.inversions):
+            raise StopIteration
+        i = self._index
+        self._index += 1
+        return self.rotations[i], bool(self.inversions[i])
 
 class ClusterTransoformation(object):
     """an object that defines a transformation on a cluster"""
@@ -213,7 +208,8 @@ class ExactMatchCluster(object):
     def standard_alignments(self, coords1, coords2):
         """return an iterator over the standard alignments"""
         return StandardClusterAlignment(coords1, coords2, accuracy = self.accuracy,
-                                   can_invert=self.transform.can_invert())
+                                   can_invert=self.transform.can_invert(),
+                                   check_distance=True)
 
 
     def __call__(self, coords1, coords2, check_inversion=True):
@@ -243,6 +239,10 @@ class ExactMatchCluster(object):
 
         self.exact_transformation.translation = com1 - com2
 
+        # quickly rule out structures which are obviously different
+        if not self.measure.could_be_identical(x1, x2, self.tol):
+            return None
+
         for rot, invert in self.standard_alignments(x1, x2):
             if invert and not check_inversion: continue
             ret = self.check_match(x1, x2, rot, invert)
@@ -4,7 +4,8 @@ import copy
 # from math import pi, sqrt
 
 from _minpermdist_policies import MeasurePolicy, TransformPolicy
-from pele.mindist.permutational_alignment import find_best_permutation
+from pele.mindist.permutational_alignment import find_best_permutation, \
+    find_permutations_cutoff, NoPerfectMatchingError, have_cutoff_permutation
 # from pele.utils.rbtools import CoordsAdapter
 # from pele.angleaxis.aamindist import MeasureAngleAxisCluster
 
@@ -21,11 +22,16 @@ class MeasurePeriodic(MeasurePolicy):
         vector defining the box
     permlist : list of lists
         list of lists of identical atoms
+    cutoff : float, optional
+        only atoms closer than this are considered when optimizing the
+        permutations.  It is increased as needed. The default is the mean
+        interatomic spacing. See find_permutations_cutoff
     """
-    def __init__(self, box_lengths, permlist=None):
+    def __init__(self, box_lengths, permlist=None, cutoff=None):
         self.boxlengths = np.array(box_lengths)
         self.iboxlengths = 1. / self.boxlengths
         self.permlist = permlist
+        self.cutoff = cutoff
 
     def get_dist(self, X1, X2):
         """ calculate the distance between 2 sets of coordinates """
@@ -35,8 +41,27 @@ class MeasurePeriodic(MeasurePolicy):
         dx -= np.round(dx * self.iboxlengths) * self.boxlengths
         return np.linalg.norm(dx.flatten())
     
-    def find_permutation(self, X1, X2):
-        return find_best_permutation(X1, X2, self.permlist, box_lengths=self.boxlengths)
+    def find_permutation(self, X1, X2, max_cutoff=None):
+        """find the best permutation
+        
+        NoPerfectMatchingError is raised if max_cutoff is given and the atoms
+        cannot all be matched with an atom closer than max_cutoff
+        """
+        if not have_cutoff_permutation:
+            # the cutoff solver is not compiled, solve the dense problem instead
+            dist, perm = find_best_permutation(X1, X2, self.permlist, box_lengths=self.boxlengths)
+            if max_cutoff is not None:
+                dx = np.reshape(X2, [-1, 3])[perm] - np.reshape(X1, [-1, 3])
+                dx -= np.round(dx * self.iboxlengths) * self.boxlengths
+                if np.any(np.sqrt((dx**2).sum(1)) > max_cutoff):
+                    raise NoPerfectMatchingError("no assignment of all atoms within a cutoff of %g" % max_cutoff)
+            return dist, perm
+        cutoff = self.cutoff
+        if max_cutoff is not None and cutoff is not None:
+            cutoff = min(cutoff, max_cutoff)
+        return find_best_permutation(X1, X2, self.permlist, user_algorithm=find_permutations_cutoff,
+                                     box_lengths=self.boxlengths, cutoff=cutoff,
+                                     max_cutoff=max_cutoff)
     
     def get_com(self, X):
         raise NotImplementedError("Center of mass not defined for periodic systems")   
@@ -101,7 +126,7 @@ class ExactMatchPeriodic(object):
         
         # get the shortest atomlist from permlist
         if permlist is None:
-            atomlist = [range(len(x1.shape[0]))]
+            atomlist = range(x1.shape[0])
         elif len(permlist) == 0:
             # no permutable atoms
             atomlist = [0]
@@ -121,7 +146,11 @@ class ExactMatchPeriodic(object):
     def check_match(self, x1, x2, iA, iB):
         """overlay structures with atom iA == atom iB and check for exact match""" 
         self.transform.translate(x2, x1[iA,:] - x2[iB,:])
-        dist, perm = self.measure.find_permutation(x1, x2)
+        # if the structures match, every atom is closer than accuracy to its partner
+        try:
+            dist, perm = self.measure.find_permutation(x1, x2, max_cutoff=self.accuracy)
+        except NoPerfectMatchingError:
+            return False
         x2 = self.transform.permute(x2, perm)
         x2 = x2.reshape(-1,3)
         dist = self.measure.get_dist(x1, x2)
@@ -1,12 +1,32 @@
 import numpy as np
 from periodic_exact_match import TransformPeriodic
+from permutational_alignment import find_best_permutation, find_permutations_cutoff, \
+    have_cutoff_permutation
 from pele.utils.rbtools import CoordsAdapter
 from inspect import stack
 
 class MinPermDistBulk(object):
-    """ Obtain the best alignment between two configurations of a periodic system"""
+    """ Obtain the best alignment between two configurations of a periodic system
+    
+    Parameters
+    ----------
+    boxvec : array
+        the box lengths
+    measure, transform :
+        the measure and transform policies
+    niter : int
+        the maximum number of alternating translations and permutations
+    permlist : list of lists, optional
+        lists of identical rigid bodies.  If given, the rigid bodies are
+        permuted into best alignment after the translation.  This uses
+        find_permutations_cutoff, so it is cheap even for large systems.
+    cutoff : float, optional
+        the initial cutoff for find_permutations_cutoff
+    """
     def __init__(self, boxvec, measure, transform=TransformPeriodic(), niter=10, verbose=False, tol=0.01, 
-                 accuracy=0.01):        
+                 accuracy=0.01, permlist=None, cutoff=None):        
+        self.permlist = permlist
+        self.cutoff = cutoff
         self.niter = niter       
         self.verbose = verbose
         self.measure = measure
@@ -51,14 +71,40 @@ class MinPermDistBulk(object):
         ca1 = CoordsAdapter(coords=x1)
         ca2 = CoordsAdapter(coords=x2)        
         
+        self._translate(ca1, ca2, x2)
+        if self.permlist is not None:
+            # alternate permutations and translations until the permutation is unchanged
+            for i in xrange(self.niter):
+                if not self._permute(ca1, ca2):
+                    break
+                self._translate(ca1, ca2, x2)
+
+        dist, x2 = self.finalize_best_match(coords1, x2)    
+        return dist, coords1, x2  
+    
+    def _translate(self, ca1, ca2, x2):
+        """translate x2 to minimize the distance between the rigid body positions"""
         dx = ca1.posRigid - ca2.posRigid
         dx -= np.round(dx / self.boxvec) * self.boxvec
         ave2 = dx.sum(0)/ca1.nrigid 
         self.transform.translate(x2, ave2)
 
-        dist, x2 = self.finalize_best_match(coords1, x2)    
-        return dist, coords1, x2  
-    
+    def _permute(self, ca1, ca2):
+        """permute the rigid bodies in place, return False if nothing changed"""
+        if have_cutoff_permutation:
+            dist, perm = find_best_permutation(ca1.posRigid, ca2.posRigid, self.permlist,
+                                               user_algorithm=find_permutations_cutoff,
+                                               box_lengths=self.boxvec, cutoff=self.cutoff)
+        else:
+            dist, perm = find_best_permutation(ca1.posRigid, ca2.posRigid, self.permlist,
+                                               box_lengths=self.boxvec)
+        perm = np.asarray(perm)
+        if np.all(perm == np.arange(len(perm))):
+            return False
+        ca2.posRigid[:] = ca2.posRigid[perm]
+        ca2.rotRigid[:] = ca2.rotRigid[perm]
+        return True
+
     def __call__(self, coords1, coords2): 
         return self.align_fragments(coords1, coords2)    
 
@@ -3,11 +3,13 @@ import itertools
 
 __all__ = ["find_best_permutation", "optimize_permutations",
            "find_permutations_OPTIM", "find_permutations_munkres",
-           "find_permutations_hungarian"] 
+           "find_permutations_hungarian", "find_permutations_cutoff",
+           "NoPerfectMatchingError"] 
 
 have_minperm = False
 have_hungarian = False
 have_munkres = False
+have_cutoff_permutation = False
 
 try:
     import minperm
@@ -24,6 +26,11 @@ try:
     have_munkres = True
 except ImportError:
     pass
+try:
+    from _minpermdist_cpp import CutoffPermutation
+    have_cutoff_permutation = True
+except ImportError:
+    pass
 
 
 _findBestPermutationList = None
@@ -177,6 +184,79 @@ def find_permutations_OPTIM(X1, X2, box_lengths=None, make_cost_matrix=None):
     return dist, perm
 
 
+class NoPerfectMatchingError(Exception):
+    """raised if no assignment of all atoms is possible within the maximum cutoff"""
+
+
+def _default_cutoff(X1, box_lengths=None):
+    """return the mean interatomic spacing, a sensible first cutoff"""
+    natoms = len(X1)
+    if box_lengths is not None:
+        volume = np.prod(box_lengths)
+    else:
+        extent = X1.max(0) - X1.min(0) if natoms > 0 else np.zeros(3)
+        volume = np.prod(np.maximum(extent, 1e-3 * max(extent.max(), 1.)))
+    return (volume / max(natoms, 1)) ** (1. / 3)
+
+
+def find_permutations_cutoff(X1, X2, box_lengths=None, cutoff=None, max_cutoff=None,
+                             widen_factor=1.5, make_cost_matrix=None):
+    """find the optimum permutation considering only pairs of atoms closer than a cutoff
+
+    This is intended for large systems, e.g. bulk glasses, where the
+    dense cost matrix of the other algorithms is too expensive.  Pairs of atoms
+    closer than the cutoff are found with a cell list, so the sparse cost
+    matrix is built in O(natoms) time, and the sparse assignment problem is
+    solved with a shortest augmenting path method in c++.  If no assignment
+    of all atoms exists within the cutoff, the cutoff is multiplied by
+    widen_factor and the search repeated.  Once all pairs are within the
+    cutoff a solution always exists.
+
+    Note that the result is only guaranteed to be the optimum permutation if
+    the optimum has all atoms matched within the final cutoff.  This is the
+    case if the structures are already in good alignment.
+
+    Parameters
+    ----------
+    X1, X2 : arrays, shape (natoms, 3)
+        the positions of the permutable atoms
+    box_lengths : float array, optional
+        the box lengths for periodic boundary conditions, None for no periodic
+        boundary conditions.  The minimum image convention is used.
+    cutoff : float, optional
+        the initial cutoff.  The default is the mean interatomic spacing
+    max_cutoff : float, optional
+        do not widen the cutoff beyond this.  If no solution is found
+        NoPerfectMatchingError is raised
+    widen_factor : float
+        the factor by which the cutoff is increased
+
+    Returns
+    -------
+    dist : float
+        the distance between the structures after the permutation
+    perm : array
+        X2[perm] is in best alignment with X1
+    """
+    if make_cost_matrix is not _make_cost_matrix and make_cost_matrix is not None:
+        raise RuntimeError("cannot use a custom cost matrix with find_permutations_cutoff")
+    if not have_cutoff_permutation:
+        raise ImportError("find_permutations_cutoff requires the compiled extension pele.mindist._minpermdist_cpp")
+    X1 = np.asarray(X1, dtype=float).reshape(-1, 3)
+    X2 = np.asarray(X2, dtype=float).reshape(-1, 3)
+    if cutoff is None:
+        cutoff = _default_cutoff(X1, box_lengths)
+        if max_cutoff is not None:
+            cutoff = min(cutoff, max_cutoff)
+
+    solver = CutoffPermutation(box_lengths=box_lengths, widen_factor=widen_factor)
+    result = solver.find_permutation(X1, X2, cutoff, max_cutoff=max_cutoff)
+    if result is None:
+        raise NoPerfectMatchingError("no assignment of all atoms within a cutoff of %g" % max_cutoff)
+    dist2, perm = result
+    return np.sqrt(dist2), perm
+
+
 def find_best_permutation(X1, X2, permlist=None, user_algorithm=None, 
                              reshape=True, user_cost_matrix=_make_cost_matrix,
                              **kwargs):
@@ -238,6 +318,10 @@ def find_best_permutation(X1, X2, permlist=None, user_algorithm=None,
     version of the Jonker-Volgenant algorithm.  Furthermore the cost matrix calculated in 
     a compiled language for an additional speed boost. It scales roughly like natoms**2
 
+    For large systems pass `user_algorithm=find_permutations_cutoff`.  Only
+    pairs of atoms within a cutoff are considered, which makes the cost
+    roughly linear in natoms if the structures are already in good alignment.
+
     """
     if reshape:
         X1 = X1.reshape([-1,3])
@@ -1,7 +1,7 @@
 import numpy as np
 from pele.utils import rotations
 
-__all__ = ["findrotation", "findrotation_kabsch", "findrotation_kearsley"]
+__all__ = ["findrotation", "findrotation_kabsch", "findrotation_kearsley", "findrotation_many"]
 
 def findrotation_kabsch(coords1, coords2, align_com=True):
     """
@@ -131,6 +131,35 @@ def findrotation_kearsley(coords1, coords2, align_com=True):
 
 findrotation = findrotation_kearsley
 
+def findrotation_many(coords1, coords2):
+    """
+    Return the rotation matrices which best align many pairs of structures
+    
+    This is the Kabsch algorithm applied to a stack of problems at once.
+    Rotations are done around the origin, not the center of mass.
+    
+    Parameters
+    ----------
+    coords1, coords2 : arrays, shape (nfits, natoms, 3)
+        coords2[k] will be aligned with coords1[k]
+    
+    Returns
+    -------
+    rot : array, shape (nfits, 3, 3)
+        rot[k] minimizes |coords1[k] - rot[k] coords2[k]|
+    """
+    x1 = np.asarray(coords1, dtype=float)
+    x2 = np.asarray(coords2, dtype=float)
+    if x1.shape != x2.shape:
+        raise ValueError("dimension of arrays does not match")
+    # the covariance matrices
+    A = np.einsum("kia,kib->kab", x2, x1)
+    u, s, v = np.linalg.svd(A)
+    # make sure the rotations are proper rotations
+    improper = np.linalg.det(u) * np.linalg.det(v) < 0.
+    u[improper, :, -1] *= -1
+    return np.einsum("kab,kbc->kca", u, v)
+
 if __name__ == "__main__":
     x1 = np.random.random(24)
     mx = rotations.q2mx(rotations.random_q())
@@ -4,7 +4,9 @@ from itertools import izip
 import numpy as np
 
 from pele.mindist.permutational_alignment import  find_permutations_munkres, \
-    find_permutations_OPTIM, find_best_permutation, find_permutations_hungarian
+    find_permutations_OPTIM, find_best_permutation, find_permutations_hungarian, \
+    find_permutations_cutoff, NoPerfectMatchingError
+from pele.mindist import linear_assignment
 
 
 class PermutationTest(unittest.TestCase):
@@ -80,5 +82,58 @@ class PermutationTestBinary(unittest.TestCase):
         self.assertAlmostEqual(np.linalg.norm(coords2[perm] - self.coords), 0.)
 
         
+
+
+class TestFindPermutationsCutoff(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 300
+        self.box_lengths = np.array([7., 8., 9.])
+        self.x1 = np.random.uniform(0, 1, [self.natoms, 3]) * self.box_lengths
+        self.perm = np.random.permutation(self.natoms)
+        self.x2 = np.zeros_like(self.x1)
+        self.x2[self.perm] = self.x1 + np.random.uniform(-.01, .01, self.x1.shape)
+        # put some atoms in a different periodic image
+        self.x2[::4] += self.box_lengths
+
+    def test_periodic(self):
+        dist, perm = find_permutations_cutoff(self.x1, self.x2, box_lengths=self.box_lengths)
+        self.assertEqual(list(perm), list(self.perm))
+
+        dx = self.x1[:, np.newaxis, :] - self.x2[np.newaxis, :, :]
+        dx -= self.box_lengths * np.round(dx / self.box_lengths)
+        perm_dense, cost = linear_assignment((dx**2).sum(2))
+        self.assertAlmostEqual(dist, np.sqrt(cost), 8)
+
+    def test_widen(self):
+        # a tiny cutoff must be widened to find a solution
+        dist, perm = find_permutations_cutoff(self.x1, self.x2, box_lengths=self.box_lengths,
+                                              cutoff=1e-3)
+        self.assertEqual(list(perm), list(self.perm))
+
+    def test_max_cutoff(self):
+        with self.assertRaises(NoPerfectMatchingError):
+            find_permutations_cutoff(self.x1, self.x2, box_lengths=self.box_lengths,
+                                     max_cutoff=1e-2)
+
+    def test_non_periodic(self):
+        x2 = np.zeros_like(self.x1)
+        x2[self.perm] = self.x1 + np.random.uniform(-.01, .01, self.x1.shape)
+        dist, perm = find_permutations_cutoff(self.x1, x2)
+        self.assertEqual(list(perm), list(self.perm))
+        self.assertAlmostEqual(dist, np.linalg.norm(x2[perm] - self.x1), 8)
+
+    def test_find_best_permutation(self):
+        permlist = [range(0, self.natoms, 2), range(1, self.natoms, 2)]
+        x2 = self.x1.copy()
+        x2[permlist[0]] = x2[np.random.permutation(permlist[0])]
+        x2[permlist[1]] = x2[np.random.permutation(permlist[1])]
+        dist, perm = find_best_permutation(self.x1, x2, permlist=permlist,
+                                           user_algorithm=find_permutations_cutoff,
+                                           box_lengths=self.box_lengths)
+        self.assertAlmostEqual(dist, 0., 8)
+        self.assertAlmostEqual(np.abs(x2[perm] - self.x1).max(), 0.)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,8 @@ import unittest
 import numpy as np
 import itertools
 
-from pele.mindist import ExactMatchAtomicCluster
+from pele.mindist import ExactMatchAtomicCluster, StandardClusterAlignment, \
+    findrotation, findrotation_many, MeasureAtomicCluster
 from pele.systems import LJCluster
 import pele.utils.rotations as rotations
 
@@ -125,6 +126,58 @@ class TestExactMatchAtomicCluster(unittest.TestCase):
         
         
 
+class TestStandardClusterAlignment(unittest.TestCase):
+    def setUp(self):
+        self.natoms = 13
+        self.x1 = np.random.uniform(-1, 1, [self.natoms, 3])
+        self.x1 -= self.x1.mean(0)
+        mx = rotations.aa2mx(rotations.random_aa())
+        self.x2 = np.dot(mx, self.x1[np.random.permutation(self.natoms)].transpose()).transpose()
+
+    def test_findrotation_many(self):
+        x1 = np.random.uniform(-1, 1, [4, 5, 3])
+        x2 = np.random.uniform(-1, 1, [4, 5, 3])
+        rots = findrotation_many(x1, x2)
+        for k in range(4):
+            dist, mx = findrotation(x1[k].flatten(), x2[k].flatten(), align_com=False)
+            self.assertTrue(np.allclose(rots[k], mx))
+            self.assertAlmostEqual(np.linalg.det(rots[k]), 1.)
+
+    def test_alignments(self):
+        alignments = StandardClusterAlignment(self.x1.flatten(), self.x2.flatten())
+        self.assertEqual(len(alignments), len(list(alignments)))
+        self.assertGreater(len(alignments), 0)
+        # each rotation maps the candidate pair onto the reference atoms
+        ref = self.x1[[alignments.idx1_1, alignments.idx1_2]]
+        for i, j, rot, invert in zip(alignments.idx2_1, alignments.idx2_2, 
+                                     alignments.rotations, alignments.inversions):
+            mul = -1. if invert else 1.
+            dist, mx = findrotation(ref.flatten(), mul * self.x2[[i, j]].flatten(), align_com=False)
+            self.assertTrue(np.allclose(rot, mx))
+        # and one of them is the exact match
+        mismatch = []
+        for rot, invert in StandardClusterAlignment(self.x1.flatten(), self.x2.flatten()):
+            x2 = -self.x2 if invert else self.x2
+            x2 = np.dot(rot, x2.transpose()).transpose()
+            dist = np.sqrt(((self.x1[:, np.newaxis, :] - x2[np.newaxis, :, :])**2).sum(2))
+            mismatch.append(dist.min(1).max())
+        self.assertLess(min(mismatch), 1e-6)
+
+    def test_check_distance(self):
+        n1 = len(StandardClusterAlignment(self.x1.flatten(), self.x2.flatten()))
+        n2 = len(StandardClusterAlignment(self.x1.flatten(), self.x2.flatten(), check_distance=True))
+        self.assertLessEqual(n2, n1)
+        self.assertGreater(n2, 0)
+
+    def test_could_be_identical(self):
+        measure = MeasureAtomicCluster(permlist=[range(5), range(5, self.natoms)])
+        perm = np.concatenate([np.random.permutation(5), 5 + np.random.permutation(self.natoms - 5)])
+        x2 = self.x1[perm]
+        self.assertTrue(measure.could_be_identical(self.x1, x2, 1e-3))
+        x2[0] *= 1.1
+        self.assertFalse(measure.could_be_identical(self.x1, x2, 1e-3))
+
+
 if __name__ == "__main__":
     unittest.main()
         
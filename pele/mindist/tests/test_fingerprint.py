@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from pele.mindist import ClusterFingerprint
+from pele.utils import rotations
+
+
+class TestClusterFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.natoms = 20
+        self.permlist = [range(15), range(15, 20)]
+        self.x = np.random.uniform(-1, 1, 3 * self.natoms) * 1.5
+        self.fingerprint = ClusterFingerprint(permlist=self.permlist)
+
+    def transformed(self, x):
+        """return a rotated, inverted, permuted and translated copy of x"""
+        mx = rotations.aa2mx(rotations.random_aa())
+        x = -np.dot(mx, x.reshape(-1, 3).transpose()).transpose()
+        perm = np.concatenate([np.random.permutation(atomlist) for atomlist in self.permlist])
+        return (x[perm] + np.random.rand(3)).flatten()
+
+    def test_invariant(self):
+        fp1 = self.fingerprint(self.x)
+        fp2 = self.fingerprint(self.transformed(self.x))
+        self.assertTrue(np.allclose(fp1, fp2))
+        self.assertTrue(self.fingerprint.match(fp1, fp2))
+        kmin, kmax = self.fingerprint.key_window(fp1)
+        self.assertTrue(kmin <= self.fingerprint.key(fp2) <= kmax)
+
+    def test_noise(self):
+        fp1 = self.fingerprint(self.x)
+        fp2 = self.fingerprint(self.x + np.random.normal(scale=1e-4, size=self.x.size))
+        self.assertTrue(self.fingerprint.match(fp1, fp2))
+
+    def test_different(self):
+        fp1 = self.fingerprint(self.x)
+        x2 = self.x.copy()
+        x2[:3] += 0.3
+        self.assertFalse(self.fingerprint.match(fp1, self.fingerprint(x2)))
+
+    def test_types(self):
+        # swapping atoms of different types changes the fingerprint
+        x2 = self.x.reshape(-1, 3).copy()
+        x2[[0, 19]] = x2[[19, 0]]
+        fp1 = self.fingerprint(self.x)
+        self.assertFalse(self.fingerprint.match(fp1, self.fingerprint(x2.flatten())))
+        # but not if all atoms are the same
+        fingerprint = ClusterFingerprint()
+        self.assertTrue(fingerprint.match(fingerprint(self.x), fingerprint(x2.flatten())))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import itertools
+import random
+
+import numpy as np
+
+from pele.mindist import MinPermDistAtomicClusterCpp, MinPermDistAtomicCluster, linear_assignment
+from pele.mindist.permutational_alignment import permuteArray
+from pele.utils import rotations
+from pele.potentials import LJ
+from pele.optimize import mylbfgs
+from testmindist import TestMinDist
+
+
+class TestLinearAssignment(unittest.TestCase):
+    def test_brute_force(self):
+        for n in range(1, 7):
+            cost = np.random.rand(n, n)
+            perm, total = linear_assignment(cost)
+            best = min(sum(cost[i, p[i]] for i in range(n))
+                       for p in itertools.permutations(range(n)))
+            self.assertAlmostEqual(total, best, 10)
+            self.assertEqual(sorted(perm), range(n))
+            self.assertAlmostEqual(cost[range(n), perm].sum(), total, 10)
+
+    def test_ties(self):
+        cost = np.ones([5, 5])
+        perm, total = linear_assignment(cost)
+        self.assertEqual(sorted(perm), range(5))
+        self.assertAlmostEqual(total, 5.)
+
+
+class TestMinPermDistCpp(TestMinDist):
+    def setUp(self):
+        self.natoms = 20
+        self.ntypeA = 15
+        self.pot = LJ()
+        self.permlist = [range(self.ntypeA), range(self.ntypeA, self.natoms)]
+        self.X1 = mylbfgs(np.random.uniform(-1, 1, 3 * self.natoms) * 1.5, self.pot).coords
+
+    def make_isomer(self, invert=False):
+        mx = rotations.aa2mx(rotations.random_aa())
+        X2 = np.dot(mx, self.X1.reshape(-1, 3).transpose()).transpose().flatten()
+        if invert:
+            X2 = -X2
+        for atomlist in self.permlist:
+            perm = list(atomlist)
+            random.shuffle(perm)
+            X2 = permuteArray(X2, perm)
+        return X2 + np.tile(np.random.rand(3), self.natoms)
+
+    def test_isomer(self):
+        for nthreads in [1, 4]:
+            mindist = MinPermDistAtomicClusterCpp(permlist=self.permlist, nthreads=nthreads)
+            dist, X1, X2 = self.runtest(self.X1.copy(), self.make_isomer(), mindist)
+            self.assertLess(dist, 1e-8)
+
+    def test_isomer_inverted(self):
+        mindist = MinPermDistAtomicClusterCpp(permlist=self.permlist)
+        dist, X1, X2 = self.runtest(self.X1.copy(), self.make_isomer(invert=True), mindist)
+        self.assertLess(dist, 1e-8)
+
+        mindist = MinPermDistAtomicClusterCpp(permlist=self.permlist, can_invert=False)
+        dist, X1, X2 = mindist(self.X1.copy(), self.make_isomer(invert=True))
+        self.assertGreater(dist, 1e-3)
+
+    def test_non_isomer(self):
+        X2 = mylbfgs(np.random.uniform(-1, 1, 3 * self.natoms) * 1.5, self.pot).coords
+        mindist = MinPermDistAtomicClusterCpp(permlist=self.permlist, niter=20, nthreads=2, seed=0)
+        dist, X1, X2new = self.runtest(self.X1.copy(), X2, mindist)
+        
+        # the result is reproducible for a given seed
+        dist2, X1, X2new2 = mindist(self.X1.copy(), X2)
+        self.assertAlmostEqual(dist, dist2, 10)
+
+        # and comparable to the python implementation
+        pydist = MinPermDistAtomicCluster(permlist=self.permlist, niter=20)(self.X1.copy(), X2)[0]
+        self.assertLess(dist, pydist + 0.5)
+
+    def test_transformation(self):
+        X2 = mylbfgs(np.random.uniform(-1, 1, 3 * self.natoms) * 1.5, self.pot).coords
+        mindist = MinPermDistAtomicClusterCpp(permlist=self.permlist)
+        dist, X1, X2new = mindist(self.X1, X2)
+        rotation, invert, perm, com1, com2 = mindist.get_transformation()
+        x2 = X2.reshape(-1, 3)[perm] - com2
+        if invert:
+            x2 = -x2
+        x2 = np.dot(rotation, x2.transpose()).transpose() + com1
+        self.assertTrue(np.allclose(x2.flatten(), X2new))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -53,5 +53,37 @@ class TestExactMatchPeriodicBLJ(TestExactMatchPeriodicLJ):
         self.ntypeA = int(self.natoms *.8)
         return [range(self.ntypeA), range(self.ntypeA, self.natoms)]
     
+class TestExactMatchPeriodicDense(TestExactMatchPeriodicLJ):
+    """without the compiled cutoff solver the dense permutation solver is used"""
+    def setUp(self):
+        from pele.mindist import periodic_exact_match
+        self.module = periodic_exact_match
+        self.have_cutoff_permutation = periodic_exact_match.have_cutoff_permutation
+        periodic_exact_match.have_cutoff_permutation = False
+        TestExactMatchPeriodicLJ.setUp(self)
+    
+    def tearDown(self):
+        self.module.have_cutoff_permutation = self.have_cutoff_permutation
+
+class TestExactMatchPeriodicLarge(unittest.TestCase):
+    """the permutations are optimized with a cutoff, so large systems are cheap"""
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 2000
+        self.boxlengths = np.array([12., 13., 14.])
+        self.permlist = [range(self.natoms)]
+        self.measure = MeasurePeriodic(self.boxlengths, self.permlist)
+        self.exact_match = ExactMatchPeriodic(self.measure, accuracy=1e-5)
+        self.x1 = np.random.uniform(0, 1, [self.natoms, 3]) * self.boxlengths
+    
+    def test_exact_match(self):
+        x2 = self.x1[np.random.permutation(self.natoms)] + np.random.uniform(-5, 5, 3)
+        self.assertTrue(self.exact_match(self.x1.flatten(), x2.flatten()))
+
+    def test_no_exact_match(self):
+        x2 = np.random.uniform(0, 1, [self.natoms, 3]) * self.boxlengths
+        self.assertFalse(self.exact_match(self.x1.flatten(), x2.flatten()))
+
+
 if __name__ == '__main__':
     unittest.main()
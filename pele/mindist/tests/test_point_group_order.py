@@ -3,7 +3,9 @@ import os
 import nose
 
 import numpy as np
-from pele.mindist import PointGroupOrderCluster, ExactMatchAtomicCluster
+from pele.mindist import PointGroupOrderCluster, ExactMatchAtomicCluster, \
+    PointGroupOrderCache, ClusterFingerprint
+from pele.utils import rotations
 from pele.utils.xyz import read_xyz
 
 class TestPgorderLj75(unittest.TestCase):
@@ -112,7 +114,96 @@ class TestPgorderLj75Database(unittest.TestCase):
 #            print pgorder
         
 
+
+class TestPgorderCache(unittest.TestCase):
+    def test1(self):
+        d = os.path.dirname(__file__)
+        xyz = read_xyz(open(os.path.join(d, "coords.lj75.gmin.xyz"), "r"))
+        coords = xyz.coords.reshape(-1)
+        permlist = [range(75)]
+        match = ExactMatchAtomicCluster(permlist=permlist, can_invert=True)
+        cache = PointGroupOrderCache(PointGroupOrderCluster(match),
+                                     ClusterFingerprint(permlist=permlist), match)
+        self.assertEqual(cache(coords), 20)
+        
+        # a rotated and permuted copy is found in the cache
+        x = coords.reshape(-1, 3)[np.random.permutation(75)]
+        x = np.dot(x, rotations.q2mx(rotations.random_q()).transpose())
+        self.assertEqual(cache(x.reshape(-1)), 20)
+        self.assertEqual(cache.nhits, 1)
+        
+        # a different structure is not
+        x = coords + np.random.uniform(-.1, .1, coords.shape)
+        self.assertEqual(cache(x), 1)
+        self.assertEqual(cache.nhits, 1)
+
+    def test_many(self):
+        # thousands of different structures of the same size.  The lookup
+        # must not scan all stored structures
+        import time
+        natoms = 38
+        permlist = [range(natoms)]
+        match = ExactMatchAtomicCluster(permlist=permlist, can_invert=True)
+        cache = PointGroupOrderCache(lambda x: 1, ClusterFingerprint(permlist=permlist),
+                                     match, max_size=1000)
+        x0 = np.random.uniform(-1.5, 1.5, natoms * 3)
+        t0 = time.time()
+        for i in xrange(3000):
+            x = x0 + np.random.uniform(-.05, .05, x0.shape)
+            self.assertEqual(cache(x), 1)
+        self.assertLess(time.time() - t0, 30.)
+        self.assertEqual(len(cache), 1000)
         
+        # the most recently used structures are still there
+        self.assertEqual(cache(x), 1)
+        self.assertEqual(cache.nhits, 1)
+
+
+class TestPgorderInformation(unittest.TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from pele.systems import LJCluster
+        d = os.path.dirname(__file__)
+        self.tmpdir = tempfile.mkdtemp()
+        dbfname = os.path.join(self.tmpdir, "lj13.sqlite")
+        shutil.copy(os.path.join(d, "lj13_small_pathsample.sqlite"), dbfname)
+        self.system = LJCluster(13)
+        self.db = self.system.create_database(dbfname, createdb=False)
+        self.minima = dict((m.id(), m.pgorder) for m in self.db.minima())
+        self.ts = dict((ts.id(), ts.pgorder) for ts in self.db.transition_states())
+        # overwrite the stored values
+        self.db.set_pgorders(minima=[(i, 0) for i in self.minima],
+                             transition_states=[(i, 0) for i in self.ts])
+    
+    def tearDown(self):
+        import shutil
+        self.db.session.close()
+        shutil.rmtree(self.tmpdir)
     
+    def check(self):
+        for m in self.db.minima():
+            self.assertEqual(m.pgorder, self.minima[m.id()])
+        for ts in self.db.transition_states():
+            self.assertEqual(ts.pgorder, self.ts[ts.id()])
+    
+    def test_serial(self):
+        from pele.thermodynamics import get_pgorder_information
+        self.assertEqual(self.db.minima()[0].pgorder, 0)
+        get_pgorder_information(self.system, self.db, nproc=None, recalculate=True, batch_size=7)
+        self.check()
+
+    def test_cache(self):
+        from pele.thermodynamics import get_pgorder_information
+        get_pgorder_information(self.system, self.db, nproc=None, recalculate=True,
+                                use_cache=True)
+        self.check()
+
+    def test_parallel(self):
+        from pele.thermodynamics import get_pgorder_information
+        get_pgorder_information(self.system, self.db, nproc=2, recalculate=True)
+        self.check()
+
+
 if __name__ == "__main__":
     unittest.main() 
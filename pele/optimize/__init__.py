@@ -64,6 +64,8 @@ lbfgs potentially fail with non-Hamiltonian systems.
    MYLBFGS
    mylbfgs
    lbfgs_scipy
+   lbfgs_cpp_batch
+   LBFGSQuencher
 
 Fire
 ----
@@ -94,5 +96,5 @@ from _lbfgs_py import *
 from _mylbfgs import *
 from _fire import *
 from _modified_fire_cpp import ModifiedFireCPP
-from _lbfgs_cpp import LBFGS_CPP
+from _lbfgs_cpp import LBFGS_CPP, lbfgs_cpp_batch
 from _quench import *
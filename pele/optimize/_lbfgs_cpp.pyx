@@ -32,6 +32,18 @@ cdef extern from "pele/lbfgs.h" namespace "pele":
 
         double get_H0() except +
 
+cdef extern from "pele/batch_lbfgs.h" namespace "pele":
+    cdef cppclass cppBatchLBFGS "pele::BatchLBFGS":
+        cppBatchLBFGS(shared_ptr[_pele.cBasePotential], double, int, size_t) except +
+
+        void set_maxstep(double) except +
+        void set_max_f_rise(double) except +
+        void set_H0(double) except +
+        void set_max_iter(int) except +
+        void set_use_relative_f(int) except +
+        void run(_pele.Array[double], size_t, _pele.Array[double], _pele.Array[double],
+                 _pele.Array[double], _pele.Array[long], _pele.Array[long],
+                 _pele.Array[long]) nogil except +
 
 
 cdef class _Cdef_LBFGS_CPP(_pele_opt.GradientOptimizer):
@@ -89,3 +101,95 @@ cdef class _Cdef_LBFGS_CPP(_pele_opt.GradientOptimizer):
 class LBFGS_CPP(_Cdef_LBFGS_CPP):
     """This class is the python interface for the c++ LBFGS implementation
     """
+
+
+def lbfgs_cpp_batch(x0, potential, double tol=1e-5, int M=4, double maxstep=0.1,
+                    double maxErise=1e-4, double H0=0.1, int nsteps=10000,
+                    rel_energy=False, nthreads=1):
+    """minimize many starting configurations with the c++ LBFGS in a single call
+
+    The minimizations are independent and each gives the same result as
+    LBFGS_CPP with the same parameters.  The loop over the configurations
+    is done in c++ and the optimizer state is reused, so this is much
+    faster than calling LBFGS_CPP for each configuration when the
+    minimizations are cheap.
+
+    Parameters
+    ----------
+    x0 : array, shape (n, ndof)
+        the starting configurations
+    potential :
+        the potential.  If it is not a c++ potential it is wrapped and the
+        minimizations are done in a single thread
+    nthreads : int
+        the number of threads.  The potential is shared by the threads, so
+        its energy and gradient must be thread safe, which is the case for
+        e.g. the c++ LJ, but not for the cell list potentials.  The python
+        GIL is released during the minimizations
+    tol, M, maxstep, maxErise, H0, nsteps, rel_energy :
+        see LBFGS_CPP
+
+    Returns
+    -------
+    res : Result
+        with arrays energy, coords (shape (n, ndof)), rms, nfev, nsteps and
+        success, one element (or row) per configuration
+
+    Examples
+    --------
+    >>> x0 = np.random.uniform(-1, 1, [10000, 3 * natoms])
+    >>> res = lbfgs_cpp_batch(x0, system.get_potential(), nthreads=4)
+    >>> best = res.coords[np.argmin(res.energy)]
+    """
+    cdef _pele.BasePotential pot
+    cdef size_t cnthreads = max(1, int(nthreads))
+    if not issubclass(potential.__class__, _pele.BasePotential):
+        potential = _pythonpotential.CppPotentialWrapper(potential)
+    if isinstance(potential, _pythonpotential.CppPotentialWrapperBase):
+        # python potentials need the GIL
+        cnthreads = 1
+    pot = potential
+
+    cdef np.ndarray[double, ndim=2, mode="c"] x0c = np.array(x0, dtype=float, ndmin=2, order="C")
+    cdef size_t n = x0c.shape[0]
+    cdef size_t ndof = x0c.shape[1]
+    if ndof == 0:
+        raise ValueError("x0 must have shape (n, ndof) with ndof > 0")
+    cdef np.ndarray[double, ndim=2, mode="c"] x = np.zeros([n, ndof])
+    cdef np.ndarray[double, ndim=1, mode="c"] energy = np.zeros(n)
+    cdef np.ndarray[double, ndim=1, mode="c"] rms = np.zeros(n)
+    cdef np.ndarray[long, ndim=1, mode="c"] nfev = np.zeros(n, dtype=np.int_)
+    cdef np.ndarray[long, ndim=1, mode="c"] niter = np.zeros(n, dtype=np.int_)
+    cdef np.ndarray[long, ndim=1, mode="c"] success = np.zeros(n, dtype=np.int_)
+
+    cdef cppBatchLBFGS *batch = new cppBatchLBFGS(pot.thisptr, tol, M, cnthreads)
+    cdef _pele.Array[double] cx0 = _pele.Array[double](<double*> x0c.data, n * ndof)
+    cdef _pele.Array[double] cx = _pele.Array[double](<double*> x.data, n * ndof)
+    cdef _pele.Array[double] cenergy = _pele.Array[double](<double*> energy.data, n)
+    cdef _pele.Array[double] crms = _pele.Array[double](<double*> rms.data, n)
+    cdef _pele.Array[long] cnfev = _pele.Array[long](<long*> nfev.data, n)
+    cdef _pele.Array[long] cniter = _pele.Array[long](<long*> niter.data, n)
+    cdef _pele.Array[long] csuccess = _pele.Array[long](<long*> success.data, n)
+    try:
+        batch.set_maxstep(maxstep)
+        batch.set_max_f_rise(maxErise)
+        batch.set_H0(H0)
+        batch.set_max_iter(nsteps)
+        if rel_energy:
+            batch.set_use_relative_f(1)
+        if cnthreads > 1:
+            with nogil:
+                batch.run(cx0, ndof, cx, cenergy, crms, cnfev, cniter, csuccess)
+        else:
+            batch.run(cx0, ndof, cx, cenergy, crms, cnfev, cniter, csuccess)
+    finally:
+        del batch
+
+    res = Result()
+    res.energy = energy
+    res.coords = x
+    res.rms = rms
+    res.nfev = nfev
+    res.nsteps = niter
+    res.success = success.astype(bool)
+    return res
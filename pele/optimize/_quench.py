@@ -12,7 +12,7 @@ import numpy as np
 from pele.optimize import LBFGS, MYLBFGS, Fire, Result, LBFGS_CPP, ModifiedFireCPP
 
 __all__ = ["lbfgs_scipy", "fire", "lbfgs_py", "mylbfgs", "cg",
-           "steepest_descent", "bfgs_scipy", "lbfgs_cpp"]
+           "steepest_descent", "bfgs_scipy", "lbfgs_cpp", "LBFGSQuencher"]
 
 
 def lbfgs_scipy(coords, pot, iprint=-1, tol=1e-3, nsteps=15000):
@@ -177,6 +177,54 @@ def lbfgs_cpp(coords, pot, **kwargs):
     return lbfgs.run()
 
 
+class LBFGSQuencher(object):
+    """a reusable quench with the c++ LBFGS
+
+    This is equivalent to ``lambda coords: lbfgs_cpp(coords, pot, **kwargs)``,
+    but the c++ optimizer, including the LBFGS memory, is created only once
+    and is reset for each new quench.  For small systems setting up the
+    optimizer is a noticeable part of the cost of a quench.
+
+    The quencher keeps state between calls, so it must not be shared
+    between threads.
+
+    Parameters
+    ----------
+    pot : BasePotential
+    reuse_H0 : bool
+        if True, each quench starts from the estimate of the inverse
+        Hessian H0 at the end of the previous quench instead of the value
+        passed in kwargs.  This gives slightly different results than
+        lbfgs_cpp.
+    kwargs :
+        the parameters of LBFGS_CPP
+
+    Examples
+    --------
+    >>> quench = LBFGSQuencher(pot, tol=1e-6)
+    >>> for coords in structures:
+    >>>     res = quench(coords)
+    """
+    def __init__(self, pot, reuse_H0=False, **kwargs):
+        self.pot = pot
+        self.reuse_H0 = reuse_H0
+        self.kwargs = kwargs
+        self.H0 = kwargs.get("H0", 0.1)
+        self._lbfgs = None
+        self._ndof = None
+
+    def __call__(self, coords):
+        coords = np.asarray(coords, dtype=float).ravel()
+        if self._lbfgs is None or coords.size != self._ndof:
+            self._lbfgs = LBFGS_CPP(coords, self.pot, **self.kwargs)
+            self._ndof = coords.size
+        else:
+            self._lbfgs.reset(coords)
+            if not self.reuse_H0:
+                self._lbfgs.set_H0(self.H0)
+        return self._lbfgs.run()
+
+
 def mylbfgs(coords, pot, **kwargs):
     lbfgs = MYLBFGS(coords, pot, **kwargs)
     return lbfgs.run()
@@ -4,7 +4,7 @@ import os
 
 from pele.potentials._pythonpotential import CppPotentialWrapper
 from pele.potentials import BasePotential, _lj_cpp
-from pele.optimize import LBFGS_CPP
+from pele.optimize import LBFGS_CPP, lbfgs_cpp_batch, LBFGSQuencher
 
 ndof = 4
 _xrand = np.random.uniform(-1, 1, [ndof])
@@ -176,5 +176,86 @@ class TestLBFGS_CPP_LJ(unittest.TestCase):
         self.assertTrue(np.all(res1.coords == res2.coords))
 
 
+class TestLBFGSQuencher(unittest.TestCase):
+    def setUp(self):
+        from pele.potentials import LJ
+
+        np.random.seed(0)
+        self.x0 = np.random.uniform(-1, 1, [4, 18])
+        self.pot = LJ()
+
+    def test_same_as_new(self):
+        quench = LBFGSQuencher(self.pot, tol=1e-6)
+        for x in self.x0:
+            res1 = LBFGS_CPP(x, self.pot, tol=1e-6).run()
+            res2 = quench(x)
+            self.assertEqual(res1.energy, res2.energy)
+            self.assertEqual(res1.nfev, res2.nfev)
+            self.assertEqual(res1.nsteps, res2.nsteps)
+            self.assertTrue(np.all(res1.coords == res2.coords))
+
+    def test_reuse_H0(self):
+        quench = LBFGSQuencher(self.pot, reuse_H0=True)
+        res1 = quench(self.x0[0])
+        res2 = quench(self.x0[1])
+        self.assertTrue(res2.success)
+        self.assertNotEqual(res1.H0, 0.1)
+
+    def test_change_size(self):
+        quench = LBFGSQuencher(self.pot)
+        res = quench(self.x0[0, :9])
+        self.assertEqual(res.coords.size, 9)
+        res = quench(self.x0[0])
+        self.assertEqual(res.coords.size, 18)
+        self.assertTrue(res.success)
+
+    def test_system(self):
+        from pele.systems import LJCluster
+        system = LJCluster(6)
+        quench = system.get_minimizer()
+        self.assertIsInstance(quench, LBFGSQuencher)
+        res = quench(self.x0[0])
+        self.assertTrue(res.success)
+
+
+class TestLBFGS_CPP_Batch(unittest.TestCase):
+    def setUp(self):
+        from pele.potentials import LJ
+
+        np.random.seed(0)
+        self.natoms = 6
+        self.x0 = np.random.uniform(-1, 1, [7, 3 * self.natoms])
+        self.pot = LJ()
+
+    def check_same(self, res, x0, pot):
+        self.assertEqual(res.coords.shape, x0.shape)
+        for i in xrange(len(x0)):
+            res1 = LBFGS_CPP(x0[i], pot).run()
+            self.assertEqual(res1.energy, res.energy[i])
+            self.assertEqual(res1.rms, res.rms[i])
+            self.assertEqual(res1.nfev, res.nfev[i])
+            self.assertEqual(res1.nsteps, res.nsteps[i])
+            self.assertEqual(res1.success, res.success[i])
+            self.assertTrue(np.all(res1.coords == res.coords[i]))
+
+    def test_same_as_single(self):
+        res = lbfgs_cpp_batch(self.x0, self.pot)
+        self.check_same(res, self.x0, self.pot)
+
+    def test_threads(self):
+        res = lbfgs_cpp_batch(self.x0, self.pot, nthreads=3)
+        self.check_same(res, self.x0, self.pot)
+
+    def test_python_potential(self):
+        x0 = np.random.uniform(-1, 1, [5, ndof])
+        res = lbfgs_cpp_batch(x0, _EG(), nthreads=2)
+        self.check_same(res, x0, _EG())
+        self.assertTrue(np.all(res.success))
+
+    def test_raises(self):
+        with self.assertRaises(RuntimeError):
+            lbfgs_cpp_batch(self.x0, _lj_cpp._ErrorPotential())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -24,6 +24,14 @@ also use gradient information, so it is highly recommended to also
 implement getEnergyGradient().  Otherwise the gradients will be calculated
 numerically and your system will run a lot slower.
 
+A potential can also be defined by compiled c functions, e.g. from Numba or
+Cython, which the c++ optimizers call without going through python
+
+.. autosummary::
+   :toctree: generated/
+
+    CFunctionPotential
+
 pele potentials
 -----------------
 these are potentials that exist completely within the pele package
@@ -63,6 +71,7 @@ from _hs_wca_cpp import *
 from _inversepower_cpp import InversePower
 from _wca_cpp import *
 from _harmonic_cpp import Harmonic
+from _pythonpotential import CFunctionPotential
 from ATLJ import *
 from gminpotential import *
 from heisenberg_spin import *
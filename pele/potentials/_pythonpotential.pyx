@@ -1,6 +1,8 @@
 """
 # distutils: language = C++
 """
+import ctypes
+
 import numpy as np
 
 cimport numpy as np
@@ -23,6 +25,12 @@ cdef extern from "pele/python_potential_wrapper.h" namespace "pele":
     cdef cppclass  cPythonPotential "pele::PythonPotential":
         cPythonPotential(PyObject *potential) except +
     
+cdef extern from "pele/cfunction_potential.h" namespace "pele":
+    cdef cppclass cEnergyFunction "pele::CFunctionPotential::EnergyFunction"
+    cdef cppclass cEnergyGradientFunction "pele::CFunctionPotential::EnergyGradientFunction"
+    cdef cppclass cCFunctionPotential "pele::CFunctionPotential":
+        cCFunctionPotential(cEnergyFunction *, cEnergyGradientFunction *, void *) except +
+
 cdef class CppPotentialWrapperBase(_pele.BasePotential):
     def __cinit__(self, *args, **kwargs):
         self.thisptr = shared_ptr[_pele.cBasePotential]( <_pele.cBasePotential*>new cPythonPotential(
@@ -37,6 +45,91 @@ class CppPotentialWrapper(CppPotentialWrapperBase):
 #         self.NumericalGradient = pot.NumericalGradient
 
 
+def _function_address(func):
+    """return the address of a compiled c function, 0 for None"""
+    if func is None:
+        return 0
+    if isinstance(func, (int, long)):
+        return func
+    if hasattr(func, "address"):
+        # a numba cfunc
+        return func.address
+    if isinstance(func, ctypes._CFuncPtr):
+        return ctypes.cast(func, ctypes.c_void_p).value
+    raise TypeError("can't get the address of a c function from %r" % (func,))
+
+
+def _userdata_address(userdata):
+    """return the address of the userdata, 0 for None"""
+    if userdata is None:
+        return 0
+    if isinstance(userdata, (int, long)):
+        return userdata
+    if isinstance(userdata, np.ndarray):
+        if not userdata.flags.c_contiguous:
+            raise ValueError("the userdata array must be c contiguous")
+        return userdata.ctypes.data
+    return ctypes.addressof(userdata)
+
+
+cdef class CFunctionPotential(_pele.BasePotential):
+    """a potential defined by compiled c functions
+
+    The functions must have the c signatures ::
+
+        double energy_gradient(double *x, double *grad, size_t ndof, void *userdata)
+        double energy(double *x, size_t ndof, void *userdata)
+
+    and are called from c++ directly, without the python interpreter, so a
+    potential written in a script gets the speed of a c++ potential in the
+    c++ optimizers.  energy_gradient must set every element of grad.  If
+    energy_gradient is not given the gradient is computed numerically.  If
+    the functions don't touch python objects the potential can be used
+    from several threads, e.g. in lbfgs_cpp_batch.
+
+    Parameters
+    ----------
+    energy_gradient, energy : optional
+        a Numba cfunc, a ctypes function pointer or the address of the
+        function as an integer.  At least one must be given.  Note that a
+        ctypes function pointer to a python function calls back into python
+    userdata : optional
+        passed to the functions as the last argument.  A numpy array (its
+        data pointer is passed), a ctypes object (its address is passed) or
+        an address as an integer.  A reference to it is kept.
+
+    Examples
+    --------
+    >>> from numba import cfunc, carray, types
+    >>> sig = types.float64(types.CPointer(types.float64), types.CPointer(types.float64),
+    >>>                     types.intp, types.voidptr)
+    >>> @cfunc(sig)
+    >>> def harmonic(x_, grad_, n, userdata):
+    >>>     x = carray(x_, n)
+    >>>     grad = carray(grad_, n)
+    >>>     e = 0.
+    >>>     for i in range(n):
+    >>>         e += x[i] * x[i]
+    >>>         grad[i] = 2. * x[i]
+    >>>     return e
+    >>> pot = CFunctionPotential(harmonic)
+    """
+    cdef object _keepalive
+
+    def __cinit__(self, energy_gradient=None, energy=None, userdata=None):
+        cdef size_t eg_address = _function_address(energy_gradient)
+        cdef size_t e_address = _function_address(energy)
+        cdef size_t userdata_address = _userdata_address(userdata)
+        if eg_address == 0 and e_address == 0:
+            raise ValueError("at least one of energy_gradient and energy must be given")
+        # the functions and userdata must live as long as the potential
+        self._keepalive = (energy_gradient, energy, userdata)
+        self.thisptr = shared_ptr[_pele.cBasePotential](<_pele.cBasePotential*> new cCFunctionPotential(
+                            <cEnergyFunction *> e_address,
+                            <cEnergyGradientFunction *> eg_address,
+                            <void *> userdata_address))
+
+
 class _TestingCppPotentialWrapper(CppPotentialWrapper):
     """testing potential which provides direct access to c++ wrapper"""
     def getEnergy(self, x):
@@ -0,0 +1,115 @@
+import ctypes
+import unittest
+
+import numpy as np
+
+import _base_test
+from pele.potentials import CFunctionPotential
+from pele.optimize import LBFGS_CPP
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+ndof = 4
+_xrand = np.random.uniform(-1, 1, [ndof])
+_xmin = np.zeros(ndof)
+_emin = 0.
+
+_c_double_p = ctypes.POINTER(ctypes.c_double)
+_ENERGY = ctypes.CFUNCTYPE(ctypes.c_double, _c_double_p, ctypes.c_size_t, ctypes.c_void_p)
+_ENERGY_GRADIENT = ctypes.CFUNCTYPE(ctypes.c_double, _c_double_p, _c_double_p,
+                                    ctypes.c_size_t, ctypes.c_void_p)
+
+
+def _k(userdata):
+    if userdata is None:
+        return 1.
+    return ctypes.cast(userdata, _c_double_p)[0]
+
+
+@_ENERGY
+def _energy(x, n, userdata):
+    return _k(userdata) * sum(x[i] ** 2 for i in xrange(n))
+
+
+@_ENERGY_GRADIENT
+def _energy_gradient(x, grad, n, userdata):
+    k = _k(userdata)
+    for i in xrange(n):
+        grad[i] = 2. * k * x[i]
+    return k * sum(x[i] ** 2 for i in xrange(n))
+
+
+class TestCFunctionPotential(_base_test._BaseTest):
+    def setUp(self):
+        self.pot = CFunctionPotential(_energy_gradient, _energy)
+        self.xrandom = _xrand
+        self.xmin = _xmin
+        self.Emin = _emin
+
+
+class TestCFunctionPotentialEnergyOnly(_base_test._BaseTest):
+    def setUp(self):
+        self.pot = CFunctionPotential(energy=_energy)
+        self.xrandom = _xrand
+        self.xmin = _xmin
+        self.Emin = _emin
+
+
+class TestCFunctionPotentialUserdata(unittest.TestCase):
+    def test_userdata(self):
+        k = np.array([3.])
+        pot = CFunctionPotential(_energy_gradient, userdata=k)
+        e, g = pot.getEnergyGradient(_xrand)
+        self.assertAlmostEqual(e, 3. * np.dot(_xrand, _xrand))
+        self.assertTrue(np.allclose(g, 6. * _xrand))
+        self.assertAlmostEqual(pot.getEnergy(_xrand), e)
+
+    def test_quench(self):
+        pot = CFunctionPotential(_energy_gradient, userdata=ctypes.c_double(2.))
+        res = LBFGS_CPP(_xrand, pot).run()
+        self.assertTrue(res.success)
+        self.assertAlmostEqual(res.energy, _emin, 4)
+
+    def test_address(self):
+        address = ctypes.cast(_energy_gradient, ctypes.c_void_p).value
+        pot = CFunctionPotential(address)
+        self.assertAlmostEqual(pot.getEnergy(_xrand), np.dot(_xrand, _xrand))
+
+    def test_raises(self):
+        with self.assertRaises(ValueError):
+            CFunctionPotential()
+        with self.assertRaises(TypeError):
+            CFunctionPotential(lambda x: 0.)
+
+
+@unittest.skipIf(numba is None, "numba is not installed")
+class TestCFunctionPotentialNumba(unittest.TestCase):
+    def test_numba(self):
+        from numba import cfunc, carray, types
+
+        sig = types.float64(types.CPointer(types.float64), types.CPointer(types.float64),
+                            types.intp, types.voidptr)
+
+        @cfunc(sig)
+        def harmonic(x_, grad_, n, userdata):
+            x = carray(x_, n)
+            grad = carray(grad_, n)
+            e = 0.
+            for i in range(n):
+                e += x[i] * x[i]
+                grad[i] = 2. * x[i]
+            return e
+
+        pot = CFunctionPotential(harmonic)
+        e, g = pot.getEnergyGradient(_xrand)
+        self.assertAlmostEqual(e, np.dot(_xrand, _xrand))
+        self.assertTrue(np.allclose(g, 2. * _xrand))
+        res = LBFGS_CPP(_xrand, pot).run()
+        self.assertTrue(res.success)
+
+
+if __name__ == "__main__":
+    unittest.main()
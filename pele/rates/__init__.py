@@ -107,6 +107,67 @@ The rates `B -> A` can be computed in a similar manner
    :toctree: generated/
     
     GraphReduction
+    NGT
+
+For large networks pass `backend="compact"` to NGT.  This stores the graph in
+flat arrays and removes the intermediate nodes in order of increasing degree,
+which limits the number of new edges created during the graph transformation.
+
+Building the rate network
+-------------------------
+For large databases the rate constants should be computed from the columns
+of the database rather than from a list of TransitionState objects, using
+`RateCalculation.from_database` or `RatesLinalg.from_database`.  The rate
+constants are then stored in a sparse matrix.
+
+.. autosummary::
+   :toctree: generated/
+    
+    RateMatrix
+    rate_matrix_from_database
+
+The direct sparse solvers used by `RatesLinalg` can run out of memory for
+very large networks.  Passing an `IterativeSolver` to `compute_rates` or
+`compute_committors` instead solves the equations with a preconditioned
+Krylov method (incomplete LU or algebraic multigrid), starting from the
+minimum spanning tree estimate of `EstimateRates`.  The preconditioner is
+reused when the rates to several different product groups are computed.
+
+.. autosummary::
+   :toctree: generated/
+    
+    IterativeSolver
+    EstimateRates
+
+Rates at many temperatures
+--------------------------
+The network topology, activation energies and log prefactors do not depend on
+the temperature.  `TemperatureSweep` builds them once (see `RateNetwork`) and
+for each temperature only recomputes the rate constants and solves.  The
+temperatures can be distributed over several processes.
+
+.. autosummary::
+   :toctree: generated/
+    
+    RateNetwork
+    TemperatureSweep
+
+Kinetic Monte Carlo
+-------------------
+For validating the rates.  `KineticMonteCarloCSR` stores cumulative
+transition probability tables in a CSR matrix and advances many independent
+trajectories together.  The estimates are returned with confidence intervals.
+
+.. autosummary::
+   :toctree: generated/
+    
+    KineticMonteCarlo
+    KineticMonteCarloCSR
 
 """
 from _rates import *
+from _rate_arrays import *
+from _rates_linalg import IterativeSolver, EstimateRates
+from _ngt_cpp import NGT
+from _temperature_sweep import *
+from _kmc import KineticMonteCarlo, KineticMonteCarloCSR
@@ -1,4 +1,8 @@
+from collections import namedtuple
+
 import numpy as np
+import scipy.sparse
+import scipy.stats
 
 from pele.rates._rate_calculations import GraphReduction
 
@@ -162,3 +166,218 @@ class KineticMonteCarlo(object):
         return pB
     
         
+
+KMCEstimate = namedtuple("KMCEstimate", ["value", "stderr", "low", "high", "nsamples"])
+
+
+def _z_score(confidence):
+    return scipy.stats.norm.ppf(0.5 + confidence / 2.)
+
+
+def _mean_estimate(samples, confidence):
+    """the sample mean with a normal confidence interval"""
+    samples = np.asarray(samples, dtype=float)
+    n = samples.size
+    mean = samples.mean()
+    if n > 1:
+        stderr = samples.std(ddof=1) / np.sqrt(n)
+    else:
+        stderr = np.inf
+    dx = _z_score(confidence) * stderr
+    return KMCEstimate(mean, stderr, mean - dx, mean + dx, n)
+
+
+def _proportion_estimate(nsuccess, n, confidence):
+    """a probability with the Wilson score confidence interval"""
+    p = float(nsuccess) / n
+    z = _z_score(confidence)
+    denom = 1. + z**2 / n
+    center = (p + z**2 / (2. * n)) / denom
+    dx = z * np.sqrt(p * (1. - p) / n + z**2 / (4. * n**2)) / denom
+    return KMCEstimate(p, np.sqrt(p * (1. - p) / n), center - dx, center + dx, n)
+
+
+class KineticMonteCarloCSR(object):
+    """kinetic Monte Carlo running many independent trajectories at once
+    
+    The transition probabilities are stored as cumulative probability tables
+    in a CSR matrix.  All trajectories are advanced together, one step per
+    iteration, with the next states of all trajectories chosen by a single
+    call to numpy.searchsorted.  Like KineticMonteCarlo, each step
+    advances the time by the mean waiting time, tau_u, of the current state.
+    
+    Parameters
+    ----------
+    rate_constants : dict or sparse matrix or RateMatrix
+        the rate constants.  Either a dictionary with keys (u, v) as in
+        GraphReduction, or a square sparse matrix with rate_constants[i, j]
+        the rate from node_list[i] to node_list[j], or a RateMatrix.
+    node_list : list, optional
+        the node associated with each row of a sparse matrix.  Defaults to
+        range(n)
+    random_state : numpy.random.RandomState, optional
+        the source of random numbers.  Defaults to the global numpy random state.
+    
+    Examples
+    --------
+    >>> kmc = KineticMonteCarloCSR(rate_constants)
+    >>> est = kmc.mean_first_passage_time(a, B, ntraj=10000)
+    >>> print est.value, "+-", est.stderr
+    
+    See Also
+    --------
+    KineticMonteCarlo : the version walking a networkx graph
+    """
+    def __init__(self, rate_constants, node_list=None, random_state=None):
+        if isinstance(rate_constants, dict):
+            rates, node_list = self._csr_from_dict(rate_constants)
+        elif hasattr(rate_constants, "rate_norm"):
+            # a RateMatrix.  Undo the normalization so the times are physical
+            rates = rate_constants.rates / rate_constants.rate_norm
+            node_list = rate_constants.node_ids.tolist()
+        else:
+            rates = rate_constants
+        rates = scipy.sparse.csr_matrix(rates, dtype=float)
+        rates.sum_duplicates()
+        rates.eliminate_zeros()
+        n = rates.shape[0]
+        if node_list is None:
+            node_list = range(n)
+        if len(node_list) != n:
+            raise ValueError("node_list must have the same length as rate_constants")
+        self.node_list = list(node_list)
+        self.node2index = dict((u, i) for i, u in enumerate(self.node_list))
+        self.random_state = random_state if random_state is not None else np.random
+        
+        self.indptr = rates.indptr
+        self.indices = rates.indices
+        sum_out = np.asarray(rates.sum(axis=1)).ravel()
+        if np.any(sum_out <= 0):
+            u = self.node_list[np.where(sum_out <= 0)[0][0]]
+            raise ValueError("node %s has no outgoing transitions" % str(u))
+        self.tau = 1. / sum_out
+        
+        # The cumulative transition probabilities of row i are shifted by i so
+        # that the cumulative table of the whole matrix is monotonic.  The
+        # next state from i is then found by searching for i + r, with r in [0, 1)
+        row = np.repeat(np.arange(n), np.diff(self.indptr))
+        cumsum = np.cumsum(rates.data * self.tau[row])
+        row_start = np.concatenate(([0.], cumsum))[self.indptr[:-1]]
+        cumP = cumsum - row_start[row]
+        cumP[self.indptr[1:][np.diff(self.indptr) > 0] - 1] = 1.
+        self.cumulative = row + cumP
+    
+    @staticmethod
+    def _csr_from_dict(rate_constants):
+        nodes = set()
+        for u, v in rate_constants.iterkeys():
+            nodes.add(u)
+            nodes.add(v)
+        node_list = sorted(nodes)
+        node2index = dict((u, i) for i, u in enumerate(node_list))
+        rows = []
+        cols = []
+        data = []
+        for (u, v), k in rate_constants.iteritems():
+            rows.append(node2index[u])
+            cols.append(node2index[v])
+            data.append(k)
+        n = len(node_list)
+        rates = scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n, n))
+        return rates, node_list
+    
+    def _indices(self, nodes):
+        return np.array([self.node2index[u] for u in nodes], dtype=np.intp)
+    
+    def _mask(self, nodes):
+        mask = np.zeros(len(self.node_list), dtype=bool)
+        mask[self._indices(nodes)] = True
+        return mask
+    
+    def step(self, states):
+        """return the next state of each trajectory (as indices)"""
+        r = self.random_state.uniform(0., 1., len(states))
+        ipos = np.searchsorted(self.cumulative, states + r, side="right")
+        # guard against round off at the end of a row
+        ipos = np.minimum(ipos, self.indptr[states + 1] - 1)
+        return self.indices[ipos]
+    
+    def _run(self, states, stop, maxsteps, min_steps=0):
+        """advance all trajectories until they reach a state in stop
+        
+        Returns the time and the final state (as index) of each trajectory
+        """
+        states = np.array(states, dtype=np.intp)
+        times = np.zeros(states.size)
+        if min_steps > 0:
+            active = np.arange(states.size)
+        else:
+            active = np.where(~stop[states])[0]
+        for nsteps in xrange(maxsteps):
+            if active.size == 0:
+                return times, states
+            current = states[active]
+            times[active] += self.tau[current]
+            states[active] = self.step(current)
+            if nsteps + 1 >= min_steps:
+                active = active[~stop[states[active]]]
+        raise RuntimeError("KMC: maxsteps reached with %d trajectories still running" % active.size)
+    
+    def first_passage_times(self, a, B, ntraj=1000, maxsteps=1000000):
+        """return the first passage times from node a to B of ntraj trajectories"""
+        start = np.repeat(self._indices([a]), ntraj)
+        times, final = self._run(start, self._mask(B), maxsteps)
+        return times
+    
+    def mean_first_passage_time(self, a, B, ntraj=1000, confidence=0.95, maxsteps=1000000):
+        """estimate the mean first passage time from node a to B
+        
+        Returns
+        -------
+        KMCEstimate : namedtuple with fields value, stderr, low, high, nsamples
+            low and high are the bounds of the confidence interval
+        """
+        times = self.first_passage_times(a, B, ntraj=ntraj, maxsteps=maxsteps)
+        return _mean_estimate(times, confidence)
+    
+    def mean_rate(self, A, B, ntraj=1000, weights=None, confidence=0.95, maxsteps=1000000):
+        """estimate the rate from A to B
+        
+        The rate is the inverse mean first passage time averaged over the
+        states in A, optionally weighted by the equilibrium occupation
+        probabilities `weights`.  ntraj trajectories are run from each state
+        in A.  The error of the inverse mean first passage time is propagated to
+        linear order.
+        """
+        A = list(A)
+        start = np.repeat(self._indices(A), ntraj)
+        times, final = self._run(start, self._mask(B), maxsteps)
+        times = times.reshape(len(A), ntraj)
+        mfpt = times.mean(axis=1)
+        mfpt_err = times.std(axis=1, ddof=1) / np.sqrt(ntraj) if ntraj > 1 else np.inf
+        if weights is None:
+            w = np.ones(len(A))
+        else:
+            w = np.array([weights[a] for a in A], dtype=float)
+        w /= w.sum()
+        rate = np.sum(w / mfpt)
+        stderr = np.sqrt(np.sum((w * mfpt_err / mfpt**2)**2))
+        dx = _z_score(confidence) * stderr
+        return KMCEstimate(rate, stderr, rate - dx, rate + dx, times.size)
+    
+    def committor_probability(self, x, A, B, ntraj=1000, confidence=0.95, maxsteps=1000000):
+        """estimate the probability that a trajectory starting from x reaches B before A
+        
+        As in KineticMonteCarlo.committor, at least one step is taken, so if x
+        is in A this is the probability of reaching B before returning to A.
+        
+        Returns
+        -------
+        KMCEstimate : namedtuple with fields value, stderr, low, high, nsamples
+            low and high are the bounds of the Wilson score interval
+        """
+        isB = self._mask(B)
+        stop = self._mask(A) | isB
+        start = np.repeat(self._indices([x]), ntraj)
+        times, final = self._run(start, stop, maxsteps, min_steps=1)
+        return _proportion_estimate(np.count_nonzero(isB[final]), ntraj, confidence)
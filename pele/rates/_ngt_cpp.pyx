@@ -3,6 +3,10 @@
 """
 import time
 
+import numpy as np
+import scipy.sparse
+
+cimport numpy as np
 from libcpp.vector cimport vector
 from libcpp.map cimport map
 from libcpp.pair cimport pair
@@ -27,6 +31,19 @@ cdef extern from "pele/ngt.hpp" namespace "pele":
         void set_debug() except +
         map[node_id, double] get_committors() except + # as reference ?
 
+cdef extern from "pele/ngt_compact.hpp" namespace "pele":
+    cdef cppclass cCompactNGT "pele::CompactNGT":
+        cCompactNGT(size_t, long *, long *, double *, stdlist[node_id] &, stdlist[node_id] &) except +
+        void compute_rates() except +
+        void compute_rates_and_committors() except +
+        double get_rate_AB() except +
+        double get_rate_BA() except +
+        double get_rate_AB_SS() except +
+        double get_rate_BA_SS() except +
+        void set_node_occupation_probabilities(map[node_id, double] &) except +
+        void set_debug() except +
+        map[node_id, double] get_committors() except +
+
 
 
 
@@ -36,9 +53,11 @@ cdef class BaseNGT(object):
     
     Parameters
     ----------
-    rate_constants : dict
+    rate_constants : dict or scipy.sparse matrix
         a dictionary of rates.  the keys are tuples of nodes (u,v), the values
-        are the rate constants from u to v.
+        are the rate constants from u to v.  Alternatively a sparse matrix where
+        element (u,v) is the rate constant from node u to node v, e.g. the
+        `rates` attribute of a RateMatrix.
     A, B : iterables
         Groups of nodes specifying the reactant and product groups.  The rates
         returned will be the rate from A to B and vice versa.
@@ -47,6 +66,15 @@ cdef class BaseNGT(object):
         the equilibrium occupation probabilities of the nodes in A and B.  They
         are used to do the weighted mean for the final average over inverse
         mean first passage times.
+    node_list : list, optional
+        if rate_constants is a sparse matrix, node_list[i] is the node
+        associated with row i.  The default is to use the row indices as nodes.
+    backend : "graph" or "compact"
+        "graph" uses the c++ class pele::NGT, where each node and edge
+        is allocated separately.  "compact" uses pele::CompactNGT, which stores
+        the graph in flat arrays and removes the nodes in order of increasing
+        degree.  It gives the same results and is much faster and uses much less
+        memory for large networks.
     
     Notes
     -----
@@ -59,26 +87,30 @@ cdef class BaseNGT(object):
     
     """
     cdef cNGT* thisptr
+    cdef cCompactNGT* compactptr
     cdef node_list
     cdef node2id
     time_solve = 0.
-    def __cinit__(self, rate_constants, A, B, debug=False, weights=None):
+    def __cinit__(self, rate_constants, A, B, debug=False, weights=None, node_list=None,
+                  backend="graph"):
+        if backend not in ("graph", "compact"):
+            raise ValueError("backend must be 'graph' or 'compact'")
         # all this mess is to construct the c++ objects that will be passed to the C++ NGT
-        # assign ids to all the nodes
-        nodes = set()
-        for u, v in rate_constants.iterkeys():
-            nodes.add(u)
-            nodes.add(v)
-        self.node_list = list(nodes)
-        self.node2id = dict(( (u, i) for i, u in enumerate(self.node_list) ))
-        
-        # construct the std::map rate_map
         cdef rate_map_t rate_map
         cdef node_id uid, vid
-        for (u, v), k in rate_constants.iteritems():
-            uid = self.node2id[u]
-            vid = self.node2id[v]
-            rate_map[pair_t(uid, vid)] = k
+        if backend == "compact":
+            csr = self._csr_matrix(rate_constants, node_list)
+        elif scipy.sparse.issparse(rate_constants):
+            self._rate_map_from_sparse(rate_constants, node_list, rate_map)
+        else:
+            # assign ids to all the nodes
+            self._assign_node_ids(rate_constants)
+            
+            # construct the std::map rate_map
+            for (u, v), k in rate_constants.iteritems():
+                uid = self.node2id[u]
+                vid = self.node2id[v]
+                rate_map[pair_t(uid, vid)] = k
         
         # construct the std::list _A and _B
         cdef stdlist[node_id] _A, _B
@@ -90,7 +122,17 @@ cdef class BaseNGT(object):
             _B.push_back(uid)
             
         # allocate memory and initialize the NGT object
-        self.thisptr = new cNGT(rate_map, _A, _B)
+        cdef np.ndarray[long, ndim=1] indptr, indices
+        cdef np.ndarray[double, ndim=1] data
+        if backend == "compact":
+            indptr = np.ascontiguousarray(csr.indptr, dtype=long)
+            indices = np.ascontiguousarray(csr.indices, dtype=long)
+            data = np.ascontiguousarray(csr.data, dtype=float)
+            if data.size == 0:
+                raise ValueError("there are no rate constants")
+            self.compactptr = new cCompactNGT(csr.shape[0], &indptr[0], &indices[0], &data[0], _A, _B)
+        else:
+            self.thisptr = new cNGT(rate_map, _A, _B)
         
         # pass the weights
         cdef map[node_id, double] Peq 
@@ -101,22 +143,77 @@ cdef class BaseNGT(object):
                     Peq[uid] = p
                 except KeyError:
                     pass
-                        
-            self.thisptr.set_node_occupation_probabilities(Peq)
+            if self.compactptr != NULL:
+                self.compactptr.set_node_occupation_probabilities(Peq)
+            else:
+                self.thisptr.set_node_occupation_probabilities(Peq)
         
         # set the debug flag
         if debug:
-            self.thisptr.set_debug()
+            if self.compactptr != NULL:
+                self.compactptr.set_debug()
+            else:
+                self.thisptr.set_debug()
+    
+    def _assign_node_ids(self, rate_constants):
+        nodes = set()
+        for u, v in rate_constants.iterkeys():
+            nodes.add(u)
+            nodes.add(v)
+        self.node_list = list(nodes)
+        self.node2id = dict(( (u, i) for i, u in enumerate(self.node_list) ))
+    
+    def _set_node_list(self, node_list, n):
+        if node_list is None:
+            node_list = range(n)
+        self.node_list = list(node_list)
+        self.node2id = dict(( (u, i) for i, u in enumerate(self.node_list) ))
+    
+    def _csr_matrix(self, rate_constants, node_list):
+        """return the rate constants as a csr matrix with sorted indices"""
+        if scipy.sparse.issparse(rate_constants):
+            csr = scipy.sparse.csr_matrix(rate_constants)
+            self._set_node_list(node_list, csr.shape[0])
+        else:
+            self._assign_node_ids(rate_constants)
+            n = len(self.node_list)
+            uids = np.array([self.node2id[u] for u, v in rate_constants.iterkeys()], dtype=long)
+            vids = np.array([self.node2id[v] for u, v in rate_constants.iterkeys()], dtype=long)
+            rates = np.array(rate_constants.values(), dtype=float)
+            csr = scipy.sparse.csr_matrix((rates, (uids, vids)), shape=(n, n))
+        csr.eliminate_zeros()
+        csr.sort_indices()
+        return csr
+    
+    cdef _rate_map_from_sparse(self, rate_constants, node_list, rate_map_t & rate_map):
+        """fill rate_map from a sparse matrix without creating python objects for each rate"""
+        csr = scipy.sparse.csr_matrix(rate_constants)
+        csr.eliminate_zeros()
+        cdef np.ndarray[long, ndim=1] indptr = csr.indptr.astype(long)
+        cdef np.ndarray[long, ndim=1] indices = csr.indices.astype(long)
+        cdef np.ndarray[double, ndim=1] data = csr.data.astype(float)
+        cdef long n = csr.shape[0]
+        cdef long u, j
+        for u in range(n):
+            for j in range(indptr[u], indptr[u + 1]):
+                rate_map[pair_t(u, indices[j])] = data[j]
+        self._set_node_list(node_list, n)
     
     def __dealloc__(self):
         if self.thisptr != NULL:
             del self.thisptr
             self.thisptr = NULL
+        if self.compactptr != NULL:
+            del self.compactptr
+            self.compactptr = NULL
     
     def compute_rates(self):
         """compute the rates from A->B and B->A"""
         t0 = time.clock()
-        self.thisptr.compute_rates()
+        if self.compactptr != NULL:
+            self.compactptr.compute_rates()
+        else:
+            self.thisptr.compute_rates()
         self.time_solve = time.clock() - t0 
     
     def compute_rates_and_committors(self):
@@ -126,28 +223,43 @@ cdef class BaseNGT(object):
         want the committors
         """
         t0 = time.clock()
-        self.thisptr.compute_rates_and_committors()
+        if self.compactptr != NULL:
+            self.compactptr.compute_rates_and_committors()
+        else:
+            self.thisptr.compute_rates_and_committors()
         self.time_solve = time.clock() - t0 
     
     def get_rate_AB(self):
         """return the rate from A->B"""
+        if self.compactptr != NULL:
+            return self.compactptr.get_rate_AB()
         return self.thisptr.get_rate_AB()
     
     def get_rate_BA(self):
         """return the rate from B->A"""
+        if self.compactptr != NULL:
+            return self.compactptr.get_rate_BA()
         return self.thisptr.get_rate_BA()
     
     def get_rate_AB_SS(self):
         """return the steady state rate from A->B"""
+        if self.compactptr != NULL:
+            return self.compactptr.get_rate_AB_SS()
         return self.thisptr.get_rate_AB_SS()
     
     def get_rate_BA_SS(self):
         """return the steady state rate from B->A"""
+        if self.compactptr != NULL:
+            return self.compactptr.get_rate_BA_SS()
         return self.thisptr.get_rate_BA_SS()
     
     def get_committors(self):
         """return a dictionary of the committor probabilities"""
-        cdef map[node_id, double] qmap = self.thisptr.get_committors() # as reference?
+        cdef map[node_id, double] qmap
+        if self.compactptr != NULL:
+            qmap = self.compactptr.get_committors()
+        else:
+            qmap = self.thisptr.get_committors()
         committors = dict()
         for node, nid in self.node2id.iteritems():
             committors[node] = qmap.at(nid)
@@ -158,4 +270,3 @@ cdef class BaseNGT(object):
 
 class NGT(BaseNGT):
     pass
-    
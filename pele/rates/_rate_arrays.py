@@ -0,0 +1,336 @@
+"""build the rate network directly from columns of the database
+
+The rate constants for large networks are computed with numpy arrays rather
+than by looping over Minimum and TransitionState objects.  The transition
+states are read from the database in a single query, parallel transition
+states are merged with a vectorized log-sum-exp and the result is stored as
+a sparse matrix in CSR format, which can be passed directly to NGT and to the
+linear algebra solvers.
+"""
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
+
+__all__ = ["RateMatrix", "RateNetwork", "rate_matrix_from_database",
+           "rate_network_from_database"]
+
+
+def _to_array(rows, ncol):
+    """convert the rows of a query to a float array of shape (nrows, ncol).  None becomes nan"""
+    if len(rows) == 0:
+        return np.zeros([0, ncol])
+    return np.array(rows, dtype=float).reshape(-1, ncol)
+
+
+def minima_arrays(database):
+    """return the columns (id, energy, fvib, pgorder) of the valid minima as numpy arrays"""
+    from pele.storage import Minimum
+    rows = database.session.query(Minimum._id, Minimum.energy, Minimum.fvib,
+                                  Minimum.pgorder, Minimum.invalid).all()
+    data = _to_array([r[:4] for r in rows], 4)
+    valid = np.array([not r[4] for r in rows], dtype=bool)
+    data = data[valid]
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3]
+
+
+def transition_state_arrays(database):
+    """return the columns (energy, fvib, pgorder, min1 id, min2 id) of the valid transition states"""
+    from pele.storage import TransitionState
+    rows = database.session.query(TransitionState.energy, TransitionState.fvib,
+                                  TransitionState.pgorder, TransitionState._minimum1_id,
+                                  TransitionState._minimum2_id, TransitionState.invalid).all()
+    data = _to_array([r[:5] for r in rows], 5)
+    valid = np.array([not r[5] for r in rows], dtype=bool)
+    data = data[valid]
+    return (data[:, 0], data[:, 1], data[:, 2],
+            data[:, 3].astype(np.int64), data[:, 4].astype(np.int64))
+
+
+def _group_keys(keys):
+    """return (order, starts, unique_keys) such that keys[order] is sorted and
+    the groups of equal keys start at the indices starts"""
+    order = np.argsort(keys, kind="mergesort")
+    keys = keys[order]
+    if keys.size == 0:
+        return order, np.zeros(0, dtype=int), keys
+    starts = np.concatenate(([0], np.nonzero(keys[1:] != keys[:-1])[0] + 1))
+    return order, starts, keys[starts]
+
+
+def _log_sum_exp_sorted(values, starts):
+    """return log(sum(exp(values))) for each group of values beginning at starts"""
+    if values.size == 0:
+        return values
+    vmax = np.maximum.reduceat(values, starts)
+    counts = np.diff(np.concatenate((starts, [values.size])))
+    sums = np.add.reduceat(np.exp(values - np.repeat(vmax, counts)), starts)
+    return vmax + np.log(sums)
+
+
+def log_sum_exp_groups(keys, values):
+    """sum exp(values) over entries with the same key, in log space
+
+    Returns
+    -------
+    unique_keys : array
+        the sorted unique keys
+    log_sums : array
+        log(sum(exp(values[keys == k]))) for each k in unique_keys
+    """
+    order, starts, unique_keys = _group_keys(keys)
+    return unique_keys, _log_sum_exp_sorted(values[order], starts)
+
+
+class RateMatrix(object):
+    """the rate constants of a transition network stored as a CSR sparse matrix
+
+    Parameters
+    ----------
+    rates : scipy.sparse matrix
+        rates[u, v] is the rate constant from node u to node v, divided by
+        `rate_norm`
+    node_ids : array of int
+        node_ids[u] is the id of the minimum of node u.  The ids are sorted.
+    max_log_rate : float
+        the log of the largest rate constant, which was subtracted to avoid
+        overflow and underflow.  `rate_norm = exp(-max_log_rate)`
+    log_weights : array, optional
+        the log of the (unnormalized) equilibrium occupation probabilities
+
+    See Also
+    --------
+    rate_matrix_from_database
+    """
+
+    def __init__(self, rates, node_ids, max_log_rate=0., log_weights=None):
+        self.rates = scipy.sparse.csr_matrix(rates)
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.max_log_rate = max_log_rate
+        self.rate_norm = np.exp(-max_log_rate)
+        self.log_weights = log_weights
+
+    @property
+    def nnodes(self):
+        return self.rates.shape[0]
+
+    def indices(self, nodes):
+        """return the indices of nodes, which can be Minimum objects or ids"""
+        ids = np.array([int(m) if not hasattr(m, "id") else m.id() for m in nodes], dtype=np.int64)
+        idx = np.searchsorted(self.node_ids, ids)
+        idx = np.minimum(idx, self.node_ids.size - 1)
+        missing = self.node_ids[idx] != ids
+        if np.any(missing):
+            raise KeyError("nodes not in the rate network: %s" % str(ids[missing]))
+        return idx
+
+    def sum_out_rates(self):
+        return np.asarray(self.rates.sum(axis=1)).ravel()
+
+    def weights(self):
+        """return the equilibrium occupation probabilities normalized so the largest is 1"""
+        if self.log_weights is None:
+            return None
+        return np.exp(self.log_weights - np.max(self.log_weights))
+
+    def weights_dict(self):
+        """return the weights as a dictionary keyed by minimum id"""
+        w = self.weights()
+        if w is None:
+            return None
+        return dict(zip(self.node_ids.tolist(), w.tolist()))
+
+    def subnetwork(self, keep):
+        """return the RateMatrix restricted to the nodes where keep is True"""
+        keep = np.asarray(keep, dtype=bool)
+        rates = self.rates[keep][:, keep]
+        log_weights = None
+        if self.log_weights is not None:
+            log_weights = self.log_weights[keep]
+        return RateMatrix(rates, self.node_ids[keep], self.max_log_rate, log_weights)
+
+    def reduce(self, B, A=None):
+        """remove the nodes that are not connected to the nodes in B
+
+        This is the equivalent of reduce_rates for a rate matrix
+        """
+        keep = self.connected_to(B, A=A)
+        if np.all(keep):
+            return self
+        print "removing", np.count_nonzero(~keep), "nodes that are not connected to B"
+        return self.subnetwork(keep)
+
+    def connected_to(self, B, A=None):
+        """return a boolean array which is True for the nodes connected to B"""
+        B = self.indices(B)
+        if A is not None:
+            A = self.indices(A)
+            if np.intersect1d(A, B).size > 0:
+                raise Exception("A and B share", np.intersect1d(A, B).size, "nodes")
+        ncomp, labels = connected_components(self.rates, directed=False)
+        keep = labels == labels[B[0]]
+        if not np.all(keep[B]):
+            raise Exception("the nodes in B are not all connected")
+        if A is not None and not np.all(keep[A]):
+            raise Exception("the A nodes are not all connected to the B nodes")
+        return keep
+
+
+class RateNetwork(object):
+    """the temperature independent part of the rate network
+
+    The topology of the network and, for each transition state, the
+    activation energies and the log prefactors of the rate constants in both
+    directions are computed once.  A RateMatrix for any temperature can then
+    be computed with a few vectorized operations.  The CSR structure of the
+    rate matrix is the same at all temperatures.
+
+    The rate constant from min1 to min2 over a transition state ts is ::
+
+        k = sigma * exp((min1.fvib - ts.fvib)/2) * exp(-(ts.energy - min1.energy) / T)
+        sigma = min1.pgorder / (2 pi ts.pgorder)
+
+    where the prefactor is omitted if use_fvib is False.  The contributions of
+    parallel transition states are summed.  The transition states connecting a
+    minimum with itself or with an unknown or invalid minimum are excluded.
+    Only minima connected by at least one transition state are included in
+    the network.
+
+    Parameters
+    ----------
+    min_ids, min_energy, min_fvib, min_pgorder : arrays
+        the columns of the minima
+    ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2 : arrays
+        the columns of the transition states
+    use_fvib : bool
+        include the vibrational entropy and the point group orders in the
+        rate constants
+
+    See Also
+    --------
+    rate_network_from_database
+    """
+    def __init__(self, min_ids, min_energy, min_fvib, min_pgorder,
+                 ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2,
+                 use_fvib=True):
+        min_ids = np.asarray(min_ids, dtype=np.int64)
+        order = np.argsort(min_ids)
+        min_ids = min_ids[order]
+        min_energy = np.asarray(min_energy, dtype=float)[order]
+        min_fvib = np.asarray(min_fvib, dtype=float)[order]
+        min_pgorder = np.asarray(min_pgorder, dtype=float)[order]
+
+        # map the minimum ids of the transition states to indices into the minima arrays
+        ts_min1 = np.asarray(ts_min1, dtype=np.int64)
+        ts_min2 = np.asarray(ts_min2, dtype=np.int64)
+        i1 = np.minimum(np.searchsorted(min_ids, ts_min1), max(min_ids.size - 1, 0))
+        i2 = np.minimum(np.searchsorted(min_ids, ts_min2), max(min_ids.size - 1, 0))
+        ok = (min_ids[i1] == ts_min1) & (min_ids[i2] == ts_min2)
+        nexcluded = np.count_nonzero(~ok)
+        if nexcluded > 0:
+            print "excluding", nexcluded, "transition states connected to invalid minima from rate graph"
+        same = ok & (i1 == i2)
+        if np.any(same):
+            print "warning: not using", np.count_nonzero(same), "transition states because they connect a minimum with itself"
+        ok &= i1 != i2
+        i1 = i1[ok]
+        i2 = i2[ok]
+        ts_energy = np.asarray(ts_energy, dtype=float)[ok]
+
+        # the activation energies and log prefactors in both directions
+        barrier = np.concatenate((ts_energy - min_energy[i1], ts_energy - min_energy[i2]))
+        if use_fvib:
+            ts_fvib = np.asarray(ts_fvib, dtype=float)[ok]
+            ts_pgorder = np.asarray(ts_pgorder, dtype=float)[ok]
+            log_prefactor = np.concatenate((
+                np.log(min_pgorder[i1] / (2. * np.pi * ts_pgorder)) + (min_fvib[i1] - ts_fvib) / 2.,
+                np.log(min_pgorder[i2] / (2. * np.pi * ts_pgorder)) + (min_fvib[i2] - ts_fvib) / 2.))
+        else:
+            log_prefactor = np.zeros(barrier.size)
+
+        # only keep the minima that are in the network and renumber them
+        used, inverse = np.unique(np.concatenate((i1, i2)), return_inverse=True)
+        n = used.size
+        u = inverse[:i1.size]
+        v = inverse[i1.size:]
+
+        # group the parallel transition states.  The grouped keys are sorted
+        # by row then column, which is the order of the data of a csr matrix
+        keys = np.concatenate((u * n + v, v * n + u))
+        order, self._starts, keys = _group_keys(keys)
+        self.barrier = barrier[order]
+        self.log_prefactor = log_prefactor[order]
+        self._indices = keys % n
+        self._indptr = np.concatenate(([0], np.cumsum(np.bincount(keys // n, minlength=n))))
+
+        self.node_ids = min_ids[used]
+        self.min_energy = min_energy[used]
+        self._log_weight_prefactor = -np.log(min_pgorder[used]) - 0.5 * min_fvib[used]
+
+    @property
+    def nnodes(self):
+        return self.node_ids.size
+
+    def log_rate_constants(self, T):
+        """return the log rate constants in the order of the csr data"""
+        return _log_sum_exp_sorted(self.log_prefactor - self.barrier / T, self._starts)
+
+    def rate_matrix(self, T):
+        """return the RateMatrix at temperature T"""
+        log_k = self.log_rate_constants(T)
+        if log_k.size > 0:
+            max_log_rate = np.max(log_k)
+        else:
+            max_log_rate = 0.
+        n = self.nnodes
+        rates = scipy.sparse.csr_matrix((np.exp(log_k - max_log_rate), self._indices, self._indptr),
+                                        shape=(n, n))
+        log_weights = -self.min_energy / T + self._log_weight_prefactor
+        return RateMatrix(rates, self.node_ids, max_log_rate, log_weights)
+
+
+def rate_matrix_from_arrays(min_ids, min_energy, min_fvib, min_pgorder,
+                            ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2,
+                            T=1., use_fvib=True):
+    """compute the rate matrix from the columns of the minima and transition states
+
+    See RateNetwork for details
+
+    Returns
+    -------
+    RateMatrix
+    """
+    network = RateNetwork(min_ids, min_energy, min_fvib, min_pgorder,
+                          ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2,
+                          use_fvib=use_fvib)
+    return network.rate_matrix(T)
+
+
+def rate_network_from_database(database, use_fvib=True):
+    """return the temperature independent RateNetwork of all the minima in the database"""
+    min_ids, min_energy, min_fvib, min_pgorder = minima_arrays(database)
+    ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2 = transition_state_arrays(database)
+    return RateNetwork(min_ids, min_energy, min_fvib, min_pgorder,
+                       ts_energy, ts_fvib, ts_pgorder, ts_min1, ts_min2,
+                       use_fvib=use_fvib)
+
+
+def rate_matrix_from_database(database, T=1., use_fvib=True):
+    """compute the rate constants between all the minima in the database
+
+    The minima and transition states are loaded with one query each as
+    columns of numbers, no Minimum or TransitionState objects are created.
+
+    Parameters
+    ----------
+    database : Database
+    T : float
+        the temperature
+    use_fvib : bool
+        if True include the vibrational entropy and the point group orders
+        in the rate constants
+
+    Returns
+    -------
+    RateMatrix
+    """
+    return rate_network_from_database(database, use_fvib=use_fvib).rate_matrix(T)
@@ -5,7 +5,8 @@ import numpy as np
 
 from pele.utils.disconnectivity_graph import database2graph
 from pele.rates._ngt_cpp import NGT
-from pele.rates._rates_linalg import reduce_rates, TwoStateRates, LinalgError
+from pele.rates._rates_linalg import reduce_rates, TwoStateRates, TwoStateRatesCSR, LinalgError
+from pele.rates._rate_arrays import rate_matrix_from_database
 
 __all__ = ["RateCalculation", "RatesLinalg", "compute_committors"]
 
@@ -172,6 +173,30 @@ class _Minima2Rates(object):
                             ))
         return self.weights
 
+class _Database2Rates(object):
+    """prepare the rate network directly from the columns of the database
+    
+    This does the same job as _Minima2Rates, but no Minimum or
+    TransitionState objects are loaded.  The rate constants are stored in a
+    sparse matrix (a RateMatrix) and the nodes are the minimum ids.
+    """
+    def __init__(self, database, A, B, T=1., use_fvib=True):
+        self.database = database
+        self.A = set(m if not hasattr(m, "id") else m.id() for m in A)
+        self.B = set(m if not hasattr(m, "id") else m.id() for m in B)
+        self.T = T
+        self.use_fvib = use_fvib
+    
+    def run(self):
+        rate_matrix = rate_matrix_from_database(self.database, T=self.T, use_fvib=self.use_fvib)
+        self.rate_matrix = rate_matrix.reduce(self.B, A=self.A)
+        self.rate_constants = self.rate_matrix.rates
+        self.node_list = self.rate_matrix.node_ids.tolist()
+        self.max_log_rate = self.rate_matrix.max_log_rate
+        self.rate_norm = self.rate_matrix.rate_norm
+        self.weights = self.rate_matrix.weights_dict()
+
+
 class RateCalculation(object):
     """compute transition rates from a database of minima and transition states
     
@@ -185,26 +210,44 @@ class RateCalculation(object):
     T : float
         temperature at which to do the the calculation.  Should be in units of
         energy, i.e. include the factor of k_B if necessary.
+    
+    See Also
+    --------
+    from_database : build the rate network from the database columns.  This
+        is much faster for large databases.
     """
     def __init__(self, transition_states, A, B, T=1., 
                   use_fvib=True):
         self.minima2rates = _Minima2Rates(transition_states, A, B, T=T,
                                          use_fvib=use_fvib)
 
-    def compute_rates(self):
-        """compute the rates from A to B and vice versa"""
+    @classmethod
+    def from_database(cls, database, A, B, T=1., use_fvib=True):
+        """compute the rates using all the transition states in the database
+        
+        The rate constants are computed from columns of the database with
+        numpy and passed to NGT as a sparse matrix.  The committors are
+        keyed by minimum id rather than by Minimum.
+        """
+        obj = cls.__new__(cls)
+        obj.minima2rates = _Database2Rates(database, A, B, T=T, use_fvib=use_fvib)
+        return obj
+
+    def _make_reducer(self):
         self.minima2rates.run()
         self.reducer = NGT(self.minima2rates.rate_constants, 
                            self.minima2rates.A, self.minima2rates.B, 
-                           weights=self.minima2rates.weights)
+                           weights=self.minima2rates.weights,
+                           node_list=getattr(self.minima2rates, "node_list", None))
+
+    def compute_rates(self):
+        """compute the rates from A to B and vice versa"""
+        self._make_reducer()
         self.reducer.compute_rates()
 
     def compute_rates_and_committors(self):
         """compute the rates from A to B and vice versa"""
-        self.minima2rates.run()
-        self.reducer = NGT(self.minima2rates.rate_constants, 
-                           self.minima2rates.A, self.minima2rates.B, 
-                           weights=self.minima2rates.weights)
+        self._make_reducer()
         self.reducer.compute_rates_and_committors()
 
     def get_rate_AB(self):
@@ -232,17 +275,36 @@ class RatesLinalg(object):
         self.minima2rates = _Minima2Rates(transition_states, A, B, T=T,
                                          use_fvib=use_fvib)
 
+    @classmethod
+    def from_database(cls, database, A, B, T=1., use_fvib=True):
+        """compute the rates using all the transition states in the database
+        
+        See RateCalculation.from_database
+        """
+        obj = cls.__new__(cls)
+        obj.minima2rates = _Database2Rates(database, A, B, T=T, use_fvib=use_fvib)
+        return obj
+
     def initialize(self):
         self.minima2rates.run()
-        self.two_state_rates = TwoStateRates(self.minima2rates.rate_constants, 
-                                             self.minima2rates.A, self.minima2rates.B, 
-                                             weights=self.minima2rates.weights)
+        if isinstance(self.minima2rates, _Database2Rates):
+            self.two_state_rates = TwoStateRatesCSR(self.minima2rates.rate_matrix,
+                                                    self.minima2rates.A, self.minima2rates.B)
+        else:
+            self.two_state_rates = TwoStateRates(self.minima2rates.rate_constants, 
+                                                 self.minima2rates.A, self.minima2rates.B, 
+                                                 weights=self.minima2rates.weights)
 
-    def compute_rates(self):
+    def compute_rates(self, solver=None):
+        """compute the rate from A to B
+        
+        solver is an optional IterativeSolver to use instead of the direct
+        sparse solver
+        """
         if not self._initialized:
             self.initialize()
         if not self._times_computed:
-            self.two_state_rates.compute_rates()
+            self.two_state_rates.compute_rates(solver=solver)
         self._times_computed = True
         return self.two_state_rates.get_rate_AB() / self.minima2rates.rate_norm
     
@@ -251,7 +313,7 @@ class RatesLinalg(object):
             self.initialize()
         if not self._times_computed:
             self.two_state_rates.compute_rates()
-        times = self.two_state_rates.mfpt_computer.mfpt_dict
+        times = self.two_state_rates.mfptimes
         
         self.mfpt_dict = dict(( (m, t * self.minima2rates.rate_norm) 
                                 for m,t in times.iteritems() ))
@@ -259,10 +321,10 @@ class RatesLinalg(object):
             self.mfpt_dict[m] = 0.
         return self.mfpt_dict
     
-    def compute_committors(self):
+    def compute_committors(self, solver=None):
         if not self._initialized:
             self.initialize()
-        self.two_state_rates.compute_committors()
+        self.two_state_rates.compute_committors(solver=solver)
         self.committors = self.two_state_rates.committor_dict
         for m in self.minima2rates.A:
             self.committors[m] = 0.
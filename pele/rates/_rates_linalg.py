@@ -58,74 +58,257 @@ def compute_sum_out_rates(rates):
     return sum_out_rates
 
 
-#class EstimateRates(object):
-#    """make a rough estimate of the rates
-#    
-#    This is aimed to be used as an initial guess for the rate solver.
-#    Equivalently it can be used to precondition the matrix in the system of
-#    linear equations
-#    """
-#    def __init__(self, rate_constants, Peq, B):
-#        self.union_find = nx.utils.UnionFind()
-#        self.rate_constants = rate_constants
-#        self.Peq = Peq
-#        self.B = set(iter(B))
-#        
-#        self.run()
-#    
-#    def minimum_spaning_edges(self, edges):
-#        # assume the edges are already sorted appropriately
-#        subtrees = self.union_find
-#        for u,v in edges:
-#            uroot, vroot = subtrees[u], subtrees[v]
-#            if uroot != vroot:
-#                yield u, v, uroot, vroot
-#                subtrees.union(u,v)
-#
-#    
-#    def run(self):
-#        # add B to the union find and make sure they're all connected
-#        b = iter(self.B).next()
-#        for x in self.B:
-#            if x != b:
-#                self.union_find.union(x, b)
-#        
-#        #sort edges by rate with biggest rate to the left
-#        edges = [((u,v), k*self.Peq[u]) for (u,v), k in 
-#                 self.rate_constants.iteritems() if u<v]
-#        edges.sort(key=lambda uvk: -uvk[1])
-#        assert edges[0][1] > edges[1][1]
-#        edges = [uv for uv, k in edges]
-#        
-#        rate_estimates = dict()
-#        graph = nx.Graph()
-#        for u, v, uroot, vroot in self.minimum_spaning_edges(edges):
-#            broot = self.union_find[b]
-#            
-#            if uroot == broot or vroot == broot:
-#                if uroot == broot:
-#                    new_node = v
-#                if vroot == broot:
-#                    new_node = u
-#                
-#                # all nodes connected to new_node are newly connected to the B nodes
-#                tsrate = self.rate_constants[(u,v)] * self.Peq[u]
-#                if new_node not in graph:
-#                    graph.add_node(new_node)
-#                nodes = nx.node_connected_component(graph, new_node)
-##                print len(nodes), "nodes connecting to B"
-#                P = max([self.Peq[x] for x in nodes])
-#                for x in nodes:
-#                    assert x not in rate_estimates
-#                    rate_estimates[x] = tsrate / P
-##                    rate_estimates[x] = tsrate / self.Peq[x]
-#                
-#                graph.remove_nodes_from(nodes)
-#            else:
-#                graph.add_edge(u,v)
-#                    
-#
-#        self.rate_estimates = rate_estimates
+def _find_root(parent, u):
+    while parent[u] != u:
+        parent[u] = parent[parent[u]]
+        u = parent[u]
+    return u
+
+
+def mst_rate_estimates(rows, cols, rates, log_Peq, in_B):
+    """estimate the rate from each node to B from the maximum flux spanning tree
+
+    The edges are added to a spanning tree in order of decreasing equilibrium
+    flux, Peq[u] * k_uv (Kruskal's algorithm).  When a group of nodes first
+    becomes connected to B, the rate from each node in the group is estimated
+    as the flux of the connecting edge divided by the total equilibrium
+    occupation probability of the group.
+
+    Parameters
+    ----------
+    rows, cols, rates : arrays
+        the rate constants k[rows[i], cols[i]] = rates[i] between node indices
+    log_Peq : array
+        the log of the (unnormalized) equilibrium occupation probabilities
+    in_B : array of bool
+        the nodes in group B
+
+    Returns
+    -------
+    rate_estimates : array
+        the estimated rate to B for each node.  The value is zero for nodes in
+        B and nodes not connected to B
+    """
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    n = in_B.size
+    log_Peq = np.asarray(log_Peq, dtype=float)
+    with np.errstate(divide="ignore"):
+        log_flux = np.log(rates) + log_Peq[rows]
+    # each edge appears in both directions, only keep one of them
+    upper = rows < cols
+    rows, cols, log_flux = rows[upper], cols[upper], log_flux[upper]
+    order = np.argsort(-log_flux, kind="mergesort")
+
+    parent = np.arange(n)
+    log_P = log_Peq.copy()
+    members = dict((u, [u]) for u in xrange(n))
+    iB = np.where(in_B)[0]
+    b = iB[0]
+    for x in iB[1:]:
+        parent[x] = b
+        members[b].extend(members.pop(x))
+
+    rate_estimates = np.zeros(n)
+    for i in order:
+        u, v = _find_root(parent, rows[i]), _find_root(parent, cols[i])
+        if u == v:
+            continue
+        broot = _find_root(parent, b)
+        if u == broot or v == broot:
+            # all nodes of the other group are newly connected to B
+            new = v if u == broot else u
+            rate_estimates[members[new]] = np.exp(log_flux[i] - log_P[new])
+        if len(members[u]) < len(members[v]):
+            u, v = v, u
+        parent[v] = u
+        members[u].extend(members.pop(v))
+        log_P[u] = np.logaddexp(log_P[u], log_P[v])
+    return rate_estimates
+
+
+class EstimateRates(object):
+    """make a rough estimate of the rates from each node to B
+
+    This is aimed to be used as an initial guess for the iterative solvers,
+    see mst_rate_estimates.
+
+    Parameters
+    ----------
+    rate_constants : dict
+        the rate constants with keys (u, v)
+    Peq : dict, optional
+        the equilibrium occupation probabilities of the nodes.  If not
+        given they are all assumed equal
+    B : iterable
+        the product nodes
+    """
+    def __init__(self, rate_constants, Peq, B):
+        self.rate_constants = rate_constants
+        self.Peq = Peq
+        self.B = set(B)
+        self.run()
+
+    def run(self):
+        node_list = set()
+        for u, v in self.rate_constants.iterkeys():
+            node_list.add(u)
+            node_list.add(v)
+        node_list = list(node_list)
+        node2i = dict((u, i) for i, u in enumerate(node_list))
+        rows = np.array([node2i[u] for u, v in self.rate_constants.iterkeys()], dtype=int)
+        cols = np.array([node2i[v] for u, v in self.rate_constants.iterkeys()], dtype=int)
+        rates = np.array(self.rate_constants.values())
+        if self.Peq is None:
+            log_Peq = np.zeros(len(node_list))
+        else:
+            log_Peq = np.log([self.Peq[u] for u in node_list])
+        in_B = np.array([u in self.B for u in node_list])
+        estimates = mst_rate_estimates(rows, cols, rates, log_Peq, in_B)
+        self.rate_estimates = dict((u, k) for u, k in izip(node_list, estimates)
+                                   if u not in self.B and k > 0)
+        self.mfpt_estimates = dict((u, 1. / k) for u, k in self.rate_estimates.iteritems())
+        for u in self.B:
+            self.mfpt_estimates[u] = 0.
+
+
+class IterativeSolver(object):
+    """solve sparse linear equations with a preconditioned Krylov subspace method
+
+    This is an alternative to the direct solvers (UMFPACK / SuperLU), which
+    can run out of memory for large, stiff rate matrices.
+
+    Parameters
+    ----------
+    preconditioner : "ilu", "amg", or None
+        "ilu" uses an incomplete LU factorization (scipy.sparse.linalg.spilu).
+        "amg" uses algebraic multigrid from pyamg, which must be installed.
+    method : "gmres", "lgmres", or "bicgstab"
+        the Krylov method from scipy.sparse.linalg
+    tol : float
+        the tolerance of the relative residual
+    maxiter : int
+        the maximum number of iterations
+    drop_tol, fill_factor : float
+        passed to spilu
+    restart : int
+        the number of iterations between restarts of gmres
+    reuse : bool
+        if True the preconditioner built for the first matrix is reused for
+        all later matrices of the same size.  With solve_constrained the
+        matrices for different sets of fixed nodes differ only in those rows,
+        so the preconditioner stays effective.  Call reset() if the
+        rate constants change.
+
+    Examples
+    --------
+    Share the preconditioner between rate calculations with different B::
+
+        >>> solver = IterativeSolver(preconditioner="ilu")
+        >>> for B in groups:
+        ...     tsr = TwoStateRatesCSR(rate_matrix, A, B)
+        ...     tsr.compute_rates(solver=solver)
+    """
+    def __init__(self, preconditioner="ilu", method="gmres", tol=1e-10, maxiter=1000,
+                 drop_tol=1e-4, fill_factor=10., restart=50, reuse=True):
+        if preconditioner not in ("ilu", "amg", None):
+            raise ValueError("preconditioner must be 'ilu', 'amg' or None")
+        self.preconditioner = preconditioner
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+        self.drop_tol = drop_tol
+        self.fill_factor = fill_factor
+        self.restart = restart
+        self.reuse = reuse
+        self.niter = 0
+        self.time_preconditioner = 0.
+        self.reset()
+
+    def reset(self):
+        """discard the stored preconditioner"""
+        self._M = None
+        self._size = None
+
+    def _make_preconditioner(self, matrix):
+        if self.preconditioner is None:
+            return None
+        t0 = time.clock()
+        if self.preconditioner == "ilu":
+            ilu = scipy.sparse.linalg.spilu(matrix.tocsc(), drop_tol=self.drop_tol,
+                                            fill_factor=self.fill_factor)
+            M = scipy.sparse.linalg.LinearOperator(matrix.shape, ilu.solve)
+        else:
+            try:
+                import pyamg
+            except ImportError:
+                raise ImportError("the amg preconditioner requires the package pyamg")
+            ml = pyamg.smoothed_aggregation_solver(matrix.tocsr())
+            M = ml.aspreconditioner()
+        self.time_preconditioner += time.clock() - t0
+        return M
+
+    def get_preconditioner(self, matrix):
+        """return the preconditioner for matrix, building it if necessary"""
+        if self._M is None or not self.reuse or self._size != matrix.shape[0]:
+            self._M = self._make_preconditioner(matrix)
+            self._size = matrix.shape[0]
+        return self._M
+
+    def solve(self, matrix, right_side, x0=None):
+        """solve matrix * x = right_side"""
+        M = self.get_preconditioner(matrix)
+        solver = getattr(scipy.sparse.linalg, self.method)
+        self.niter = 0
+        def callback(*args):
+            self.niter += 1
+        kwargs = dict()
+        if self.method == "gmres":
+            kwargs["restart"] = self.restart
+        x, info = solver(matrix, right_side, x0=x0, tol=self.tol, maxiter=self.maxiter,
+                         M=M, callback=callback, **kwargs)
+        if info != 0:
+            raise LinalgError("%s did not converge (info=%s)" % (self.method, info))
+        return x
+
+    def solve_constrained(self, matrix, fixed, fixed_values, right_side, x0=None):
+        """solve matrix * x = right_side for the free variables with x[fixed] = fixed_values
+
+        The rows of the fixed variables are replaced by rows of the identity
+        so the system always has the size of the full matrix.  This is what
+        allows the preconditioner to be reused for different fixed sets.  Each
+        row is scaled by its diagonal element, which for a rate matrix turns the
+        free rows into (1 - P) with P the transition probabilities.
+        """
+        fixed = np.asarray(fixed, dtype=bool)
+        free = np.logical_not(fixed).astype(float)
+        matrix = scipy.sparse.csr_matrix(matrix)
+        system = scipy.sparse.diags(free, 0).dot(matrix) + scipy.sparse.diags(fixed.astype(float), 0)
+        rhs = np.where(fixed, fixed_values, right_side)
+        scale = 1. / system.diagonal()
+        system = scipy.sparse.diags(scale, 0).dot(system).tocsr()
+        rhs = rhs * scale
+        if x0 is not None:
+            x0 = np.where(fixed, fixed_values, x0)
+        return self.solve(system, rhs, x0=x0)
+
+
+def _generator_matrix(rates, node_list, sum_out_rates):
+    """return the rate matrix with -sum_out_rates on the diagonal over the nodes in node_list"""
+    node2i = dict((u, i) for i, u in enumerate(node_list))
+    rows = []
+    cols = []
+    data = []
+    for (u, v), k in rates.iteritems():
+        if u in node2i and v in node2i:
+            rows.append(node2i[u])
+            cols.append(node2i[v])
+            data.append(k)
+    n = len(node_list)
+    matrix = scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+    diag = np.array([sum_out_rates[u] for u in node_list])
+    return matrix - scipy.sparse.diags(diag, 0)
+
                 
 class CommittorLinalg(object):
     """compute committor probabilites using sparse linear algebra"""
@@ -169,7 +352,17 @@ class CommittorLinalg(object):
         self.matrix =  matrix.tocsr()
         self.right_side = right_side
         
-    def compute_committors(self):
+    def compute_committors(self, solver=None):
+        """compute the committors
+        
+        Parameters
+        ----------
+        solver : IterativeSolver, optional
+            if given, solve iteratively over all the nodes with the nodes in A
+            and B held fixed, rather than with a direct solver
+        """
+        if solver is not None:
+            return self._compute_committors_iterative(solver)
         self.make_matrix()
         if self.right_side.size == 1:
             # some versions of scipy can't handle matrices of size 1
@@ -187,6 +380,19 @@ class CommittorLinalg(object):
 #        self.committors = committors
 #        print "committors", committors
         return self.committor_dict
+
+    def _compute_committors_iterative(self, solver):
+        node_list = sorted(self.nodes)
+        sum_out_rates = compute_sum_out_rates(self.rates)
+        matrix = _generator_matrix(self.rates, node_list, sum_out_rates)
+        fixed = np.array([u in self.A or u in self.B for u in node_list])
+        values = np.array([1. if u in self.B else 0. for u in node_list])
+        t0 = time.clock()
+        committors = solver.solve_constrained(matrix, fixed, values, np.zeros(len(node_list)))
+        self.time_solve += time.clock() - t0
+        self.committor_dict = dict((u, c) for u, c, f in izip(node_list, committors, fixed)
+                                   if not f)
+        return self.committor_dict
     
 
 class MfptLinalgSparse(object):
@@ -248,7 +454,24 @@ class MfptLinalgSparse(object):
         self.node2i = node2i
         self.matrix =  matrix.tocsr()
     
-    def compute_mfpt(self, use_umfpack=True, cg=False, mfpt_estimate=None):
+    def compute_mfpt(self, use_umfpack=True, cg=False, mfpt_estimate=None, solver=None):
+        """compute the mean first passage times to B
+        
+        Parameters
+        ----------
+        use_umfpack : bool
+            passed to scipy.sparse.linalg.spsolve
+        cg : bool
+            solve with the unpreconditioned conjugate gradient squared method
+        mfpt_estimate : dict, optional
+            the initial guess for the iterative solvers, e.g. from EstimateRates
+        solver : IterativeSolver, optional
+            if given, solve iteratively over all the nodes with the nodes in B
+            held fixed.  Because the size of the system does not depend on B,
+            the solver can reuse its preconditioner for other B sets.
+        """
+        if solver is not None:
+            return self._compute_mfpt_iterative(solver, mfpt_estimate)
         if not hasattr(self, "matrix"):
             self.make_matrix(self.nodes - self.B)
         t0 = time.clock()
@@ -266,6 +489,22 @@ class MfptLinalgSparse(object):
             raise LinalgError("error the mean first passage times are not all greater than zero")
         return self.mfpt_dict
     
+    def _compute_mfpt_iterative(self, solver, mfpt_estimate=None):
+        node_list = sorted(self.nodes)
+        matrix = _generator_matrix(self.rates, node_list, self.sum_out_rates)
+        fixed = np.array([u in self.B for u in node_list])
+        x0 = None
+        if mfpt_estimate is not None:
+            x0 = np.array([mfpt_estimate.get(u, 0.) for u in node_list])
+        n = len(node_list)
+        t0 = time.clock()
+        times = solver.solve_constrained(matrix, fixed, np.zeros(n), -np.ones(n), x0=x0)
+        self.time_solve += time.clock() - t0
+        if np.any(times[~fixed] < 0):
+            raise LinalgError("error the mean first passage times are not all greater than zero")
+        self.mfpt_dict = dict((u, t) for u, t, f in izip(node_list, times, fixed) if not f)
+        return self.mfpt_dict
+    
 #    def compute_mfpt_symmetric(self, Peq):
 #        """make the matrix symmetric by multiplying both sides of the equation by Peq
 #        
@@ -432,9 +671,20 @@ class TwoStateRates(object):
             return self.committor_dict[x]
     
     def compute_rates(self, use_umfpack=True, subgroups=False, symmetric=False, Peq=None,
-                      cg=False, mfpt_estimates=None):
-        """compute the mean first passage times."""
-        if mfpt_estimates is not None and not cg:
+                      cg=False, mfpt_estimates=None, solver=None, warm_start=True):
+        """compute the mean first passage times.
+        
+        If an IterativeSolver is passed as `solver` the times are computed
+        iteratively.  With warm_start the initial guess is the minimum
+        spanning tree estimate from EstimateRates, using Peq as the
+        equilibrium occupation probabilities if given.
+        """
+        if solver is not None:
+            if mfpt_estimates is None and warm_start:
+                mfpt_estimates = EstimateRates(self.rate_constants, Peq, self.B).mfpt_estimates
+            self.mfptimes = self.mfpt_computer.compute_mfpt(mfpt_estimate=mfpt_estimates,
+                                                            solver=solver)
+        elif mfpt_estimates is not None and not cg:
             self.mfptimes = self.mfpt_computer.compute_mfpt_from_estimate(mfpt_estimates)
         elif symmetric:
             assert Peq is not None
@@ -446,9 +696,159 @@ class TwoStateRates(object):
             self.mfptimes = self.mfpt_computer.compute_mfpt(use_umfpack=use_umfpack, cg=cg,
                                                             mfpt_estimate=mfpt_estimates)
     
-    def compute_committors(self):
+    def compute_committors(self, solver=None):
         """compute the committors""" 
         self.committor_computer = CommittorLinalg(self.rate_constants, self.A, self.B)
-        self.committor_dict = self.committor_computer.compute_committors()
+        self.committor_dict = self.committor_computer.compute_committors(solver=solver)
         return self.committor_dict
         
+
+class TwoStateRatesCSR(object):
+    """compute committors and rates between two groups from a sparse rate matrix
+
+    This has the same interface as TwoStateRates but the matrices for the
+    linear solvers are sliced directly from the rate matrix rather than being
+    built element by element from a dictionary.
+
+    Parameters
+    ----------
+    rate_matrix : RateMatrix
+        the rate constants.  Nodes not connected to B should already have
+        been removed, see RateMatrix.reduce
+    A, B : iterables
+        the groups of minima (or minimum ids)
+    weights : array, optional
+        the weights of the nodes for averaging over A.  The default is to
+        use rate_matrix.weights()
+    """
+    def __init__(self, rate_matrix, A, B, weights=None):
+        self.rate_matrix = rate_matrix
+        self.rates = rate_matrix.rates.tocsr()
+        self.node_ids = rate_matrix.node_ids
+        n = self.rates.shape[0]
+        self.iA = rate_matrix.indices(A)
+        self.iB = rate_matrix.indices(B)
+        self.in_A = np.zeros(n, dtype=bool)
+        self.in_A[self.iA] = True
+        self.in_B = np.zeros(n, dtype=bool)
+        self.in_B[self.iB] = True
+        self._default_weights = weights is None
+        if weights is None:
+            weights = rate_matrix.weights()
+        if weights is None:
+            weights = np.ones(n)
+        self.weights = np.asarray(weights)
+        self.sum_out_rates = rate_matrix.sum_out_rates()
+        self.time_solve = 0.
+
+    def _solve(self, matrix, right_side):
+        t0 = time.clock()
+        if right_side.size == 1:
+            # some versions of scipy can't handle matrices of size 1
+            x = np.array([right_side[0] / matrix[0, 0]])
+        else:
+            x = scipy.sparse.linalg.spsolve(matrix.tocsc(), right_side)
+        self.time_solve += time.clock() - t0
+        return x
+
+    def _generator(self):
+        """return the rate matrix with -sum_out_rates on the diagonal"""
+        return self.rates - scipy.sparse.diags(self.sum_out_rates, 0)
+
+    def _sub_matrix(self, keep):
+        """return the rate matrix restricted to keep with -sum_out_rates on the diagonal"""
+        matrix = self.rates[keep][:, keep]
+        return matrix - scipy.sparse.diags(self.sum_out_rates[keep], 0)
+
+    def mst_mfpt_estimates(self):
+        """return the minimum spanning tree estimate of the mean first passage times
+        
+        see mst_rate_estimates
+        """
+        coo = self.rates.tocoo()
+        if self.rate_matrix.log_weights is not None and self._default_weights:
+            log_Peq = self.rate_matrix.log_weights
+        else:
+            log_Peq = np.log(self.weights)
+        k = mst_rate_estimates(coo.row, coo.col, coo.data, log_Peq, self.in_B)
+        with np.errstate(divide="ignore"):
+            return np.where(k > 0, 1. / k, 0.)
+
+    def compute_rates(self, solver=None, warm_start=True):
+        """compute the mean first passage times to B
+        
+        Parameters
+        ----------
+        solver : IterativeSolver, optional
+            if given, solve iteratively over all the nodes with the nodes in B
+            held fixed.  The solver can reuse its preconditioner when
+            computing the rates to other B sets.
+        warm_start : bool
+            use mst_mfpt_estimates as the initial guess for the iterative solver
+        """
+        intermediates = np.logical_not(self.in_B)
+        if solver is not None:
+            x0 = self.mst_mfpt_estimates() if warm_start else None
+            n = self.rates.shape[0]
+            t0 = time.clock()
+            times = solver.solve_constrained(self._generator(), self.in_B, np.zeros(n),
+                                             -np.ones(n), x0=x0)
+            self.time_solve += time.clock() - t0
+            times = times[intermediates]
+        else:
+            times = self._solve(self._sub_matrix(intermediates), -np.ones(np.count_nonzero(intermediates)))
+        if np.any(times < 0):
+            raise LinalgError("error the mean first passage times are not all greater than zero")
+        self.mfpt = np.zeros(self.rates.shape[0])
+        self.mfpt[intermediates] = times
+        self.mfptimes = dict(izip(self.node_ids[intermediates].tolist(), times.tolist()))
+        return self.mfptimes
+
+    def compute_committors(self, solver=None):
+        """compute the probability for each node to reach B before A
+        
+        solver is an optional IterativeSolver, see compute_rates
+        """
+        intermediates = np.logical_not(self.in_A | self.in_B)
+        if solver is not None:
+            n = self.rates.shape[0]
+            t0 = time.clock()
+            committors = solver.solve_constrained(self._generator(), self.in_A | self.in_B,
+                                                  self.in_B.astype(float), np.zeros(n))
+            self.time_solve += time.clock() - t0
+            committors = committors[intermediates]
+        else:
+            right_side = -np.asarray(self.rates[intermediates][:, self.in_B].sum(axis=1)).ravel()
+            committors = self._solve(self._sub_matrix(intermediates), right_side)
+        eps = 1e-10
+        if np.any(committors < -eps) or np.any(committors > 1 + eps):
+            qmax = committors.max()
+            qmin = committors.min()
+            raise LinalgError("The committors are not all between 0 and 1.  max=%.18g, min=%.18g" % (qmax, qmin))
+        self.committors = self.in_B.astype(float)
+        self.committors[intermediates] = committors
+        self.committor_dict = dict(izip(self.node_ids[intermediates].tolist(), committors.tolist()))
+        return self.committor_dict
+
+    def get_rate_AB(self):
+        """return the rate from A to B
+
+        the rate is the inverse mean first passage time averaged over the nodes in A
+        """
+        w = self.weights[self.iA]
+        return np.sum(w / self.mfpt[self.iA]) / np.sum(w)
+
+    def get_rate_AB_SS(self):
+        """
+        return the steady state rate from A to B
+        """
+        # the flux out of each node in A into nodes not in A, weighted by the committor
+        rows = self.rates[self.iA]
+        q = np.where(self.in_A, 0., self.committors)
+        flux = rows.dot(q)
+        w = self.weights[self.iA]
+        return np.sum(w * flux) / np.sum(w)
+
+    def get_committor(self, x):
+        """return the probability that a trajectory starting from x reaches B before A"""
+        return self.committors[self.rate_matrix.indices([x])[0]]
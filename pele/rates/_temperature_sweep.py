@@ -0,0 +1,135 @@
+"""compute rates at many temperatures from a single build of the rate network
+"""
+import multiprocessing as mp
+
+import numpy as np
+
+from pele.rates._rate_arrays import rate_network_from_database
+from pele.rates._rates_linalg import TwoStateRatesCSR
+from pele.rates._ngt_cpp import NGT
+
+__all__ = ["TemperatureSweep"]
+
+
+def _as_ids(nodes):
+    return [m if not hasattr(m, "id") else m.id() for m in nodes]
+
+
+class TemperatureSweep(object):
+    """compute the rates between two groups of minima over a range of temperatures
+
+    The topology of the network, the activation energies and the log
+    prefactors are computed once (see RateNetwork).  For each temperature
+    only the values of the rate constants are recomputed before the rates are
+    solved for.  The temperatures can be done in parallel.
+
+    Parameters
+    ----------
+    network : RateNetwork
+        the temperature independent rate network
+    A, B : iterables
+        the groups of minima (or minimum ids)
+    method : "ngt" or "linalg"
+        solve for the rates with the graph transformation (NGT) or with
+        sparse linear algebra (TwoStateRatesCSR).
+    ngt_backend : str
+        passed to NGT as `backend`
+    nproc : int
+        the number of processes to use
+
+    Examples
+    --------
+    An Arrhenius plot from the database::
+
+        >>> sweep = TemperatureSweep.from_database(db, [m1], [m2], nproc=4)
+        >>> T = np.linspace(0.1, 1., 50)
+        >>> kAB, kBA = sweep.run(T)
+        >>> plt.plot(1. / T, np.log(kAB))
+
+    See Also
+    --------
+    RateCalculation, RatesLinalg : rates at a single temperature
+    """
+    def __init__(self, network, A, B, method="ngt", ngt_backend="compact", nproc=1):
+        if method not in ("ngt", "linalg"):
+            raise ValueError("method must be 'ngt' or 'linalg'")
+        self.network = network
+        self.A = _as_ids(A)
+        self.B = _as_ids(B)
+        self.method = method
+        self.ngt_backend = ngt_backend
+        self.nproc = nproc
+
+        # the nodes that are not connected to B don't depend on the temperature
+        keep = network.rate_matrix(1.).connected_to(self.B, A=self.A)
+        if np.all(keep):
+            self._keep = None
+        else:
+            print "removing", np.count_nonzero(~keep), "nodes that are not connected to B"
+            self._keep = keep
+
+    @classmethod
+    def from_database(cls, database, A, B, use_fvib=True, **kwargs):
+        """build the rate network from the columns of the database
+
+        kwargs are passed to the constructor
+        """
+        network = rate_network_from_database(database, use_fvib=use_fvib)
+        return cls(network, A, B, **kwargs)
+
+    def rate_matrix(self, T):
+        """return the RateMatrix at temperature T with the unconnected nodes removed"""
+        rate_matrix = self.network.rate_matrix(T)
+        if self._keep is not None:
+            rate_matrix = rate_matrix.subnetwork(self._keep)
+        return rate_matrix
+
+    def compute_rates(self, T):
+        """return the rates (kAB, kBA) at temperature T"""
+        rate_matrix = self.rate_matrix(T)
+        if self.method == "ngt":
+            ngt = NGT(rate_matrix.rates, self.A, self.B, weights=rate_matrix.weights_dict(),
+                      node_list=rate_matrix.node_ids.tolist(), backend=self.ngt_backend)
+            ngt.compute_rates()
+            kAB, kBA = ngt.get_rate_AB(), ngt.get_rate_BA()
+        else:
+            AB = TwoStateRatesCSR(rate_matrix, self.A, self.B)
+            AB.compute_rates()
+            BA = TwoStateRatesCSR(rate_matrix, self.B, self.A)
+            BA.compute_rates()
+            kAB, kBA = AB.get_rate_AB(), BA.get_rate_AB()
+        return kAB / rate_matrix.rate_norm, kBA / rate_matrix.rate_norm
+
+    def run(self, temperatures):
+        """compute the rates at each temperature
+
+        Returns
+        -------
+        kAB, kBA : arrays
+            the rates from A to B and from B to A at each temperature
+        """
+        temperatures = list(temperatures)
+        if self.nproc > 1 and len(temperatures) > 1:
+            pool = mp.Pool(self.nproc, initializer=_init_worker, initargs=(self,))
+            try:
+                rates = pool.map(_worker_compute_rates, temperatures)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rates = [self.compute_rates(T) for T in temperatures]
+        rates = np.array(rates, dtype=float).reshape(-1, 2)
+        return rates[:, 0], rates[:, 1]
+
+
+# each worker process receives the sweep object only once
+_worker_sweep = None
+
+
+def _init_worker(sweep):  # pragma: no cover (this runs in a separate process)
+    global _worker_sweep
+    _worker_sweep = sweep
+
+
+def _worker_compute_rates(T):  # pragma: no cover (this runs in a separate process)
+    return _worker_sweep.compute_rates(T)
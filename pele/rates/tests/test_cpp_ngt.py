@@ -89,10 +89,40 @@ class TestNgtCppRandom(unittest.TestCase):
             self.assertAlmostEqual(qla, committors[n], 7)
         
     
+    def compare_compact(self, A, B):
+        import scipy.sparse
+        maker = _MakeRandomGraph(nnodes=20, nedges=20, node_set=A+B)
+        maker.run()
+        
+        reducer = NGT(maker.rates, A, B)
+        reducer.compute_rates_and_committors()
+        committors = reducer.get_committors()
+        
+        compact = NGT(maker.rates, A, B, backend="compact")
+        compact.compute_rates_and_committors()
+        self.assertAlmostEqual(reducer.get_rate_AB(), compact.get_rate_AB(), 7)
+        self.assertAlmostEqual(reducer.get_rate_BA(), compact.get_rate_BA(), 7)
+        self.assertAlmostEqual(reducer.get_rate_AB_SS(), compact.get_rate_AB_SS(), 7)
+        # nodes with no path to A or B have nan committors in both backends
+        for n, q in compact.get_committors().iteritems():
+            np.testing.assert_allclose(q, committors[n], rtol=0, atol=1e-7)
+        
+        # pass the rates as a sparse matrix
+        nodes = sorted(set(u for uv in maker.rates for u in uv))
+        node2i = dict((u, i) for i, u in enumerate(nodes))
+        uv = np.array([(node2i[u], node2i[v]) for u, v in maker.rates.iterkeys()])
+        matrix = scipy.sparse.csr_matrix((maker.rates.values(), (uv[:,0], uv[:,1])),
+                                         shape=(len(nodes), len(nodes)))
+        for backend in ["graph", "compact"]:
+            sparse = NGT(matrix, A, B, node_list=nodes, backend=backend)
+            sparse.compute_rates()
+            self.assertAlmostEqual(reducer.get_rate_AB(), sparse.get_rate_AB(), 7)
+    
     def test(self):
         A, B = [0], [1]
         self.do_check(A, B)
         self.compare_linalg(A, B)
+        self.compare_compact(A, B)
  
     def test_setA(self):
         A, B = [0, 1, 2], [3]
@@ -103,6 +133,7 @@ class TestNgtCppRandom(unittest.TestCase):
         A, B = [0, 1, 2], [3, 4, 5, 6]
         self.do_check(A, B)
         self.compare_linalg(A, B)
+        self.compare_compact(A, B)
 
 
 if __name__ == "__main__":
@@ -8,7 +8,7 @@ from pele.landscape import ConnectManager
 from pele.thermodynamics import get_thermodynamic_information
 from pele.utils.disconnectivity_graph import database2graph
 
-from pele.rates import RateCalculation, RatesLinalg
+from pele.rates import RateCalculation, RatesLinalg, TemperatureSweep
 from pele.rates._rate_calculations import GraphReduction, kmcgraph_from_rates
 
 from test_graph_transformation import _MakeRandomGraph
@@ -84,6 +84,29 @@ class TestGraphRatesLJ(unittest.TestCase):
         self.do_check_rates(A, B)
         self.do_check_committors(A, B)
 
+    def do_check_from_database(self, A, B):
+        rcalc = RateCalculation(self.db.transition_states(), A, B)
+        rcalc.compute_rates_and_committors()
+        committors = rcalc.get_committors()
+        
+        rcalc_db = RateCalculation.from_database(self.db, A, B)
+        rcalc_db.compute_rates_and_committors()
+        self.assertAlmostEqual(rcalc.get_rate_AB(), rcalc_db.get_rate_AB(), 7)
+        self.assertAlmostEqual(rcalc.get_rate_BA(), rcalc_db.get_rate_BA(), 7)
+        committors_db = rcalc_db.get_committors()
+        for m, q in committors.iteritems():
+            self.assertAlmostEqual(q, committors_db[m.id()], 7)
+        
+        rla = RatesLinalg.from_database(self.db, A, B)
+        self.assertAlmostEqual(rcalc.get_rate_AB(), rla.compute_rates(), 7)
+        cla = rla.compute_committors()
+        for m, q in cla.iteritems():
+            self.assertAlmostEqual(committors[m], q, 7)
+
+    def test_from_database(self):
+        self.do_check_from_database(self.db.minima()[:1], self.db.minima()[-1:])
+        self.do_check_from_database(self.db.minima()[:2], self.db.minima()[2:4])
+
 class TestOptimCollagen(unittest.TestCase):
     """test a known value for a large database"""
     def setUp(self):
@@ -119,6 +142,36 @@ class TestOptimCollagen(unittest.TestCase):
         rla = RatesLinalg(self.db.transition_states(), [m1, m3], [m2, m4], T=0.592)
         rAB = rla.compute_rates()
         self.assertAlmostEqual(rAB, 8638736600., delta=1e4)
+
+    def test_from_database(self):
+        rcalc = RateCalculation.from_database(self.db, [1, 3], [2, 4], T=0.592)
+        rcalc.compute_rates()
+        self.assertAlmostEqual(rcalc.get_rate_AB(), 8638736600., delta=1e4)
+        self.assertAlmostEqual(rcalc.get_rate_BA(), 3499625167., delta=1e4)
+        
+        rla = RatesLinalg.from_database(self.db, [1, 3], [2, 4], T=0.592)
+        self.assertAlmostEqual(rla.compute_rates(), 8638736600., delta=1e4)
+
+    def test_temperature_sweep(self):
+        temperatures = [0.4, 0.592, 1.]
+        for method in ["ngt", "linalg"]:
+            sweep = TemperatureSweep.from_database(self.db, [1, 3], [2, 4], method=method)
+            kAB, kBA = sweep.run(temperatures)
+            for T, k in zip(temperatures, kAB):
+                rcalc = RateCalculation.from_database(self.db, [1, 3], [2, 4], T=T)
+                rcalc.compute_rates()
+                self.assertAlmostEqual(k / rcalc.get_rate_AB(), 1., 7)
+            self.assertAlmostEqual(kAB[1], 8638736600., delta=1e4)
+            self.assertAlmostEqual(kBA[1], 3499625167., delta=1e4)
+
+    def test_temperature_sweep_parallel(self):
+        temperatures = [0.4, 0.592, 1.]
+        sweep = TemperatureSweep.from_database(self.db, [1, 3], [2, 4])
+        kAB, kBA = sweep.run(temperatures)
+        sweep.nproc = 2
+        kAB2, kBA2 = sweep.run(temperatures)
+        np.testing.assert_allclose(kAB, kAB2)
+        np.testing.assert_allclose(kBA, kBA2)
         
 
 
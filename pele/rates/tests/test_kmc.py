@@ -1,7 +1,8 @@
 import unittest
 import numpy as np
+import scipy.sparse
 
-from pele.rates._kmc import KineticMonteCarlo
+from pele.rates._kmc import KineticMonteCarlo, KineticMonteCarloCSR
 from pele.rates._rate_calculations import GraphReduction
 from pele.rates._rates_linalg import TwoStateRates
 
@@ -118,6 +119,52 @@ class TestKMC_GraphReduction(unittest.TestCase):
             self.assertAlmostEqual(PxB[x], PxB_kmc, delta=.1)
   
 
+class TestKMCCSR(unittest.TestCase):
+    def setUp(self):
+        self.A = [0, 1]
+        self.B = [8, 9]
+        self.x = 5
+        maker = _MakeRandomGraph(nnodes=20, nedges=40, node_set=self.A + self.B + [self.x])
+        maker.run()
+        self.rates = maker.rates
+        self.kmc = KineticMonteCarloCSR(self.rates)
+
+    def test_rates(self):
+        lin = TwoStateRates(self.rates, self.A, self.B)
+        lin.compute_rates()
+        est = self.kmc.mean_rate(self.A, self.B, ntraj=5000)
+        self.assertAlmostEqual(est.value / lin.get_rate_AB(), 1., delta=.05)
+        self.assertLess(est.low, est.value)
+        self.assertGreater(est.high, est.value)
+
+    def test_mfpt(self):
+        reducer = GraphReduction(self.rates, [0], self.B)
+        reducer.compute_rates()
+        est = self.kmc.mean_first_passage_time(0, self.B, ntraj=5000)
+        self.assertAlmostEqual(est.value * reducer.get_rate_AB(), 1., delta=.05)
+        self.assertEqual(est.nsamples, 5000)
+
+    def test_committors(self):
+        reducer = GraphReduction(self.rates, self.A, self.B)
+        PxB = reducer.compute_committor_probability(self.x)
+        est = self.kmc.committor_probability(self.x, self.A, self.B, ntraj=5000)
+        self.assertAlmostEqual(est.value, PxB, delta=.05)
+        self.assertLessEqual(est.low, est.value)
+        self.assertGreaterEqual(est.high, est.value)
+
+    def test_start_in_B(self):
+        times = self.kmc.first_passage_times(self.B[0], self.B, ntraj=10)
+        self.assertEqual(list(times), [0.] * 10)
+
+    def test_sparse_input(self):
+        node_list = self.kmc.node_list
+        rates = scipy.sparse.dok_matrix((len(node_list), len(node_list)))
+        for (u, v), k in self.rates.iteritems():
+            rates[node_list.index(u), node_list.index(v)] = k
+        kmc = KineticMonteCarloCSR(rates, node_list=node_list)
+        np.testing.assert_allclose(kmc.cumulative, self.kmc.cumulative)
+        np.testing.assert_allclose(kmc.tau, self.kmc.tau)
+
 
 if __name__ == "__main__":
     unittest.main()
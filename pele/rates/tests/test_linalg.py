@@ -1,7 +1,9 @@
 import unittest
+import scipy.sparse
 from test_graph_transformation import _three_state_rates, _MakeRandomGraph
 
-from pele.rates._rates_linalg import CommittorLinalg, MfptLinalgSparse, TwoStateRates
+from pele.rates._rates_linalg import (CommittorLinalg, MfptLinalgSparse, TwoStateRates,
+                                     IterativeSolver, EstimateRates)
 
 class TestLinalg3(unittest.TestCase):
     def setUp(self):
@@ -100,6 +102,50 @@ class TestLinalgRandom(unittest.TestCase):
             times = calc.compute_mfpt()
             self.assertGreater(min(times.itervalues()), 0)
 
+class TestIterativeSolver(unittest.TestCase):
+    def setUp(self):
+        maker = _MakeRandomGraph(nnodes=30, nedges=60, node_set=range(6))
+        self.rates = maker.make_rates()
+
+    def compare(self, A, B, solver):
+        direct = TwoStateRates(self.rates, A, B)
+        direct.compute_rates()
+        direct.compute_committors()
+        iterative = TwoStateRates(self.rates, A, B)
+        iterative.compute_rates(solver=solver)
+        iterative.compute_committors(solver=solver)
+        self.assertAlmostEqual(iterative.get_rate_AB() / direct.get_rate_AB(), 1., 7)
+        self.assertEqual(set(iterative.mfptimes.keys()), set(direct.mfptimes.keys()))
+        for u, t in direct.mfptimes.iteritems():
+            self.assertAlmostEqual(iterative.mfptimes[u] / t, 1., 7)
+        for u, q in direct.committor_dict.iteritems():
+            self.assertAlmostEqual(iterative.committor_dict[u], q, 7)
+
+    def test_ilu(self):
+        self.compare([0, 1], [2, 3], IterativeSolver())
+
+    def test_bicgstab(self):
+        self.compare([0], [5], IterativeSolver(method="bicgstab"))
+
+    def test_reuse(self):
+        solver = IterativeSolver()
+        self.compare([0, 1], [2, 3], solver)
+        identity = scipy.sparse.eye(solver._size)
+        M = solver.get_preconditioner(identity)
+        self.compare([4], [5], solver)
+        self.assertIs(solver.get_preconditioner(identity), M)
+        solver.reset()
+        self.assertIsNot(solver.get_preconditioner(identity), M)
+
+    def test_estimate(self):
+        B = [3]
+        estimate = EstimateRates(self.rates, None, B)
+        direct = TwoStateRates(self.rates, [0], B)
+        direct.compute_rates()
+        self.assertEqual(estimate.mfpt_estimates[3], 0.)
+        for u, t in direct.mfptimes.iteritems():
+            self.assertGreater(estimate.mfpt_estimates[u], 0.)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -67,6 +67,10 @@ Minima can be access from the database in a number of ways, but most often by
     database as a unique Minimum.  If compares exact to an existing Minimum then that minimum
     is returned by `database.add_minimum()`. 
 
+    If the database has a `fingerprint` object (e.g. :class:`.ClusterFingerprint`)
+    cheap structural fingerprints of the minima are stored in an indexed table and
+    `database.compareMinima()` is only called for minima whose fingerprints match.
+
 TransitionState
 ---------------
 .. autosummary::
@@ -122,9 +126,26 @@ database with that name if it doesn't.
         >>> minima_adder = database.minimum_adder()
         >>> bh = BasinHopping(coords, potential, takestep, storage=minima_adder)
 
+Structural neighbors
+--------------------
+
+.. autosummary::
+   :toctree: generated/
+
+    StructureIndex
+
+A StructureIndex finds the minima which are structurally closest to a given
+structure without computing the distance to every minimum in the database.
+It is kept up to date as minima are added to the database::
+
+    >>> index = database.structure_index(mindist=system.get_mindist())
+    >>> for dist, m in index.knn(coords, k=5):
+    >>>     print m.id(), dist
+
 """
 
 
 
 
-from database import *
\ No newline at end of file
+from database import *
+from _structure_index import StructureIndex
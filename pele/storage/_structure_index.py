@@ -0,0 +1,360 @@
+"""
+nearest neighbor queries for the structures of the minima in a database
+"""
+import heapq
+
+import numpy as np
+
+__all__ = ["VPTree", "StructureIndex"]
+
+
+class VPTree(object):
+    """a vantage point tree for nearest neighbor queries with the euclidean metric
+
+    Each node of the tree holds a vantage point and the median distance mu
+    of its points to the vantage point.  Points closer than mu go in the
+    inside subtree, the others in the outside subtree.  A query only
+    descends into a subtree if it can contain a point closer than the
+    current k-th nearest neighbor, so on average a query visits O(log n)
+    nodes.
+
+    Parameters
+    ----------
+    points : array, shape (n, d)
+    leaf_size : int
+        nodes with fewer points than this are not split further
+    """
+    def __init__(self, points, leaf_size=16, seed=0):
+        self.points = np.asarray(points, dtype=float)
+        if self.points.ndim != 2:
+            raise ValueError("points must be a 2 dimensional array")
+        self.leaf_size = max(1, leaf_size)
+        self._rng = np.random.RandomState(seed)
+        # a node is either ("leaf", indices) or ("node", vp, mu, inside, outside)
+        self.root = self._build(np.arange(len(self.points)))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, indices):
+        if len(indices) <= self.leaf_size:
+            return ("leaf", indices)
+        k = self._rng.randint(len(indices))
+        vp = indices[k]
+        rest = np.delete(indices, k)
+        d = np.sqrt(((self.points[rest] - self.points[vp])**2).sum(1))
+        mu = np.median(d)
+        inside = d < mu
+        if inside.all() or not inside.any():
+            # the points can't be separated (e.g. many identical points)
+            return ("leaf", indices)
+        return ("node", vp, mu, self._build(rest[inside]), self._build(rest[~inside]))
+
+    def _distances(self, x, indices):
+        return np.sqrt(((self.points[indices] - x)**2).sum(1))
+
+    def query(self, x, k=1, accept=None):
+        """return the k nearest neighbors of x as a list of (distance, index), closest first
+
+        If accept is given only the points for which accept(index) is True
+        are considered.
+        """
+        x = np.asarray(x, dtype=float)
+        heap = []  # (-distance, index) of the k best so far
+
+        def consider(d, i):
+            if accept is not None and not accept(i):
+                return
+            if len(heap) < k:
+                heapq.heappush(heap, (-d, i))
+            elif d < -heap[0][0]:
+                heapq.heapreplace(heap, (-d, i))
+
+        def tau():
+            return -heap[0][0] if len(heap) == k else np.inf
+
+        def search(node):
+            if node[0] == "leaf":
+                indices = node[1]
+                if len(indices) > 0:
+                    for d, i in zip(self._distances(x, indices), indices):
+                        consider(d, i)
+                return
+            _, vp, mu, inside, outside = node
+            d = np.sqrt(((self.points[vp] - x)**2).sum())
+            consider(d, vp)
+            if d < mu:
+                search(inside)
+                if d + tau() >= mu:
+                    search(outside)
+            else:
+                search(outside)
+                if d - tau() <= mu:
+                    search(inside)
+
+        if k > 0 and len(self.points) > 0:
+            search(self.root)
+        return sorted((-d, i) for d, i in heap)
+
+    def query_radius(self, x, r, accept=None):
+        """return all points closer than r to x as a list of (distance, index), closest first"""
+        x = np.asarray(x, dtype=float)
+        found = []
+
+        def search(node):
+            if node[0] == "leaf":
+                indices = node[1]
+                if len(indices) > 0:
+                    d = self._distances(x, indices)
+                    for di, i in zip(d[d <= r], indices[d <= r]):
+                        if accept is None or accept(i):
+                            found.append((di, i))
+                return
+            _, vp, mu, inside, outside = node
+            d = np.sqrt(((self.points[vp] - x)**2).sum())
+            if d <= r and (accept is None or accept(vp)):
+                found.append((d, vp))
+            if d - r < mu:
+                search(inside)
+            if d + r >= mu:
+                search(outside)
+
+        if len(self.points) > 0:
+            search(self.root)
+        return sorted(found)
+
+
+class StructureIndex(object):
+    """an index of the minima in a database for structural nearest neighbor queries
+
+    Every minimum is represented by a descriptor vector which is invariant
+    to the symmetries of the system, by default the database fingerprint
+    (see pele.mindist.ClusterFingerprint).  The descriptors are stored in a
+    vantage point tree, so the approximate nearest neighbors of a structure
+    are found in logarithmic time.  If mindist is given, the candidates from
+    the tree (oversample times as many as requested) are then ranked by the
+    exact mindist distance.
+
+    The index connects to the database signals, so minima which are added
+    to or removed from the database are added to or removed from the index.
+    New minima are kept in a small buffer which is searched by brute force
+    until it is merged into the tree.  The signals only keep a weak
+    reference, so the index must be kept alive by the caller.
+
+    Parameters
+    ----------
+    database : Database
+    descriptor : callable, optional
+        descriptor(coords) returns the descriptor vector.  Defaults to
+        database.fingerprint
+    mindist : callable, optional
+        the routine to compute the distance between two structures, e.g.
+        system.get_mindist().  If None the distances between the descriptors
+        are returned
+    oversample : int
+        the number of candidates from the tree per requested neighbor which
+        are refined with mindist
+    rebuild_fraction : float
+        the tree is rebuilt when the buffer of new minima (or the number of
+        removed minima) is larger than this fraction of the tree
+    leaf_size : int
+        see VPTree
+
+    Examples
+    --------
+    >>> index = db.structure_index(mindist=system.get_mindist())
+    >>> for dist, m in index.knn(coords, 5):
+    >>>     print m.id(), dist
+
+    See Also
+    --------
+    Database.structure_index
+    """
+    def __init__(self, database, descriptor=None, mindist=None, oversample=4,
+                 rebuild_fraction=0.25, leaf_size=16):
+        self.database = database
+        if descriptor is None:
+            descriptor = database.fingerprint
+        if descriptor is None:
+            raise ValueError("a descriptor must be given if the database has no fingerprint")
+        self.descriptor = descriptor
+        self.mindist = mindist
+        self.oversample = max(1, oversample)
+        self.rebuild_fraction = rebuild_fraction
+        self.leaf_size = leaf_size
+
+        self._tree_ids = np.zeros(0, dtype=np.int64)
+        self._tree = None
+        # removed minima are masked by their slot in the tree, not by id,
+        # because the database can reuse the id of a deleted minimum
+        self._tree_slot = dict()
+        self._tree_removed = np.zeros(0, dtype=bool)
+        self._nremoved = 0
+        self._pending_ids = []
+        self._pending = []
+
+        self._build_from_database()
+        database.on_minimum_added.connect(self.add)
+        database.on_minimum_removed.connect(self.remove)
+
+    def __len__(self):
+        return len(self._tree_ids) + len(self._pending_ids) - self._nremoved
+
+    def _build_from_database(self):
+        ids = []
+        descriptors = []
+        for batch in self.database.minima_batches(coords=True):
+            for mid, coords in zip(batch["id"], batch["coords"]):
+                ids.append(mid)
+                descriptors.append(self.descriptor(coords))
+        self._rebuild(ids, descriptors)
+
+    def _rebuild(self, ids, descriptors):
+        self._tree_ids = np.array(ids, dtype=np.int64)
+        if len(descriptors) > 0:
+            self._tree = VPTree(np.array(descriptors), leaf_size=self.leaf_size)
+        else:
+            self._tree = None
+        self._tree_slot = dict((mid, i) for i, mid in enumerate(ids))
+        self._tree_removed = np.zeros(len(ids), dtype=bool)
+        self._nremoved = 0
+        self._pending_ids = []
+        self._pending = []
+
+    def _merge(self):
+        """rebuild the tree including the buffer and without the removed minima"""
+        keep = np.flatnonzero(~self._tree_removed)
+        ids = list(self._tree_ids[keep]) + self._pending_ids
+        if self._tree is not None:
+            descriptors = list(self._tree.points[keep]) + self._pending
+        else:
+            descriptors = list(self._pending)
+        self._rebuild(ids, descriptors)
+
+    def _needs_merge(self):
+        limit = max(4 * self.leaf_size, self.rebuild_fraction * len(self._tree_ids))
+        return len(self._pending_ids) > limit or self._nremoved > limit
+
+    def add(self, minimum):
+        """add a minimum to the index"""
+        if minimum._id is None:
+            self.database.session.flush()
+        if self.descriptor is self.database.fingerprint:
+            descriptor = self.database.get_fingerprint(minimum)
+        else:
+            descriptor = self.descriptor(minimum.coords)
+        self._pending_ids.append(minimum._id)
+        self._pending.append(np.asarray(descriptor, dtype=float))
+        if self._needs_merge():
+            self._merge()
+
+    def remove(self, minimum):
+        """remove a minimum from the index"""
+        mid = minimum._id
+        slot = self._tree_slot.pop(mid, None)
+        if slot is not None:
+            self._tree_removed[slot] = True
+            self._nremoved += 1
+        elif mid in self._pending_ids:
+            i = self._pending_ids.index(mid)
+            del self._pending_ids[i]
+            del self._pending[i]
+        if self._needs_merge():
+            self._merge()
+
+    def _candidates(self, descriptor, n, accept=None):
+        """return the n nearest (distance, id) in descriptor space"""
+        ok = lambda mid: accept is None or accept(mid)
+        ok_slot = lambda i: not self._tree_removed[i] and ok(self._tree_ids[i])
+        found = []
+        if self._tree is not None:
+            found = [(d, self._tree_ids[i]) for d, i in
+                     self._tree.query(descriptor, n, accept=ok_slot)]
+        for mid, p in zip(self._pending_ids, self._pending):
+            if ok(mid):
+                found.append((np.sqrt(((p - descriptor)**2).sum()), mid))
+        found.sort()
+        return found[:n]
+
+    def _candidates_radius(self, descriptor, r, accept=None):
+        ok = lambda mid: accept is None or accept(mid)
+        ok_slot = lambda i: not self._tree_removed[i] and ok(self._tree_ids[i])
+        found = []
+        if self._tree is not None:
+            found = [(d, self._tree_ids[i]) for d, i in
+                     self._tree.query_radius(descriptor, r, accept=ok_slot)]
+        for mid, p in zip(self._pending_ids, self._pending):
+            d = np.sqrt(((p - descriptor)**2).sum())
+            if d <= r and ok(mid):
+                found.append((d, mid))
+        found.sort()
+        return found
+
+    def _load_minima(self, ids):
+        """load the minima with the given ids from the database in one query"""
+        from pele.storage.database import Minimum
+        from sqlalchemy.orm import undefer
+        ids = [int(i) for i in ids]
+        if len(ids) == 0:
+            return []
+        minima = self.database.session.query(Minimum).options(undefer("coords")).\
+            filter(Minimum._id.in_(ids)).all()
+        id_to_minimum = dict((m._id, m) for m in minima)
+        return [id_to_minimum[i] for i in ids]
+
+    def _refine(self, coords, candidates):
+        """return the candidates as (distance, minimum) sorted by the mindist distance"""
+        minima = self._load_minima([mid for d, mid in candidates])
+        if self.mindist is None:
+            return [(d, m) for (d, mid), m in zip(candidates, minima)]
+        refined = [(self.mindist(coords, m.coords)[0], m) for m in minima]
+        refined.sort(key=lambda v: v[0])
+        return refined
+
+    def knn(self, coords, k=1, accept=None):
+        """return the k minima which are structurally closest to coords
+
+        Parameters
+        ----------
+        coords : array
+        k : int
+        accept : callable, optional
+            if given, only minima with accept(minimum_id) True are returned
+
+        Returns
+        -------
+        a list of (distance, minimum) pairs, closest first.  The distance is
+        the mindist distance if mindist was given, else the distance between
+        the descriptors.
+        """
+        descriptor = np.asarray(self.descriptor(coords), dtype=float)
+        nc = k if self.mindist is None else k * self.oversample
+        candidates = self._candidates(descriptor, nc, accept=accept)
+        return self._refine(coords, candidates)[:k]
+
+    def radius(self, coords, r, descriptor_radius=None, accept=None):
+        """return the minima closer than r to coords
+
+        The minima are selected by the distance between the descriptors,
+        descriptor_radius (default r), and then filtered by the mindist
+        distance if mindist was given.  The result is approximate because
+        the descriptor distance is not a bound on the mindist distance.
+
+        Returns
+        -------
+        a list of (distance, minimum) pairs, closest first
+        """
+        if descriptor_radius is None:
+            descriptor_radius = r
+        descriptor = np.asarray(self.descriptor(coords), dtype=float)
+        candidates = self._candidates_radius(descriptor, descriptor_radius, accept=accept)
+        return [(d, m) for d, m in self._refine(coords, candidates) if d <= r]
+
+    def neighbors(self, minimum, k=1, accept=None):
+        """return the k minima closest to a minimum in the database, excluding itself"""
+        mid = minimum._id
+        if accept is None:
+            accept_other = lambda i: i != mid
+        else:
+            accept_other = lambda i: i != mid and accept(i)
+        return self.knn(minimum.coords, k, accept=accept_other)
@@ -5,15 +5,16 @@ import os
 
 import numpy as np
 
-from sqlalchemy import create_engine, and_, or_
+from sqlalchemy import create_engine, and_, or_, bindparam
 from sqlalchemy.orm import sessionmaker, undefer
 from sqlalchemy import Column, Integer, Float, PickleType, String
 from sqlalchemy import ForeignKey
-from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.orm import relationship, deferred, backref
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Index
 
 from pele.utils.events import Signal
+from pele.storage._structure_index import StructureIndex
 
 __all__ = ["Minimum", "TransitionState", "Database"]
 
@@ -226,6 +227,31 @@ class TransitionState(Base):
 
 
 
+class MinimumFingerprint(Base):
+    """the structural fingerprint of a minimum
+    
+    The fingerprints are computed by the `fingerprint` object passed to 
+    Database.  They are stored in a separate table so that databases created
+    before fingerprints existed can still be read.  
+    """
+    __tablename__ = "tbl_minimum_fingerprints"
+    _id = Column(Integer, primary_key=True)
+
+    _minimum_id = Column(Integer, ForeignKey('tbl_minima._id'), index=True)
+    minimum = relationship("Minimum", 
+                           backref=backref("fingerprint", uselist=False, 
+                                           cascade="all, delete-orphan"))
+    key = Column(Integer, index=True)
+    """integer summary of the fingerprint used to find candidates quickly"""
+    values = Column(PickleType)
+    """the fingerprint"""
+    
+    def __init__(self, minimum, key, values):
+        self.minimum = minimum
+        self.key = key
+        self.values = np.copy(values)
+
+
 class SystemProperty(Base):
     """table to hold system properties like potential parameters and number of atoms
     
@@ -316,6 +342,29 @@ class MinimumAdder(object):
         if self.commit_interval != 1:
             self.db.session.commit()
 
+_record_fields = [("id", np.int64), ("energy", float), ("fvib", float), ("pgorder", float)]
+
+
+def _to_records(rows, fields, with_coords):
+    """convert rows of a query to a numpy structured array
+    
+    the columns of the rows are the fields followed by coords if with_coords is True
+    """
+    dtype = list(fields)
+    if with_coords:
+        coords = [c if c is not None else [] for c in (row[-1] for row in rows)]
+        ndof = len(coords[0])
+        if any(len(c) != ndof for c in coords):
+            raise ValueError("the coordinates don't all have the same length")
+        dtype.append(("coords", float, (ndof,)))
+    records = np.empty(len(rows), dtype=dtype)
+    for i, (name, t) in enumerate(fields):
+        records[name] = np.array([row[i] for row in rows], dtype=t)
+    if with_coords:
+        records["coords"] = np.array(coords, dtype=float).reshape(len(rows), ndof)
+    return records
+
+
 class Database(object):
     """Database storage class
 
@@ -340,6 +389,12 @@ class Database(object):
     compareMinima : callable, `bool = compareMinima(min1, min2)`, optional
         called to determine if two minima are identical.  Only called
         if the energies are within `accuracy` of each other.
+    fingerprint : object, optional
+        computes structural fingerprints of the minima, e.g. 
+        `pele.mindist.ClusterFingerprint`.  If given, compareMinima is only called
+        if the fingerprints of the minima match.  It must have the methods
+        `fp = fingerprint(coords)`, `fingerprint.match(fp1, fp2)`, `fingerprint.key(fp)`
+        and `kmin, kmax = fingerprint.key_window(fp)`.
     createdb : boolean, optional
         create database if not exists, default is true
 
@@ -350,7 +405,8 @@ class Database(object):
 
     accuracy : float
     on_minimum_removed : signal
-        called when a minimum is removed from the database
+        called when a minimum is removed from the database, also when it is
+        merged into another minimum
     on_minimum_added : signal
         called when a new, unique, minimum is added to the database
     on_ts_removed : signal
@@ -381,11 +437,13 @@ class Database(object):
     connection = None
     accuracy = 1e-3
     compareMinima=None
+    fingerprint=None
         
     def __init__(self, db=":memory:", accuracy=1e-3, connect_string='sqlite:///%s',
-                 compareMinima=None, createdb=True):
+                 compareMinima=None, createdb=True, fingerprint=None):
         self.accuracy=accuracy
         self.compareMinima = compareMinima
+        self.fingerprint = fingerprint
 
         if not os.path.isfile(db) or db == ":memory:":
             newfile = True
@@ -464,19 +522,44 @@ class Database(object):
             limit(1).all()
         return candidates[0]
     
-    def findMinimum(self, E, coords):
-        candidates = self.session.query(Minimum).\
+    def _candidate_minima(self, E, fp=None):
+        """return a list of the minima which might be the same as a minimum with energy E and fingerprint fp"""
+        # undefer coords because it is likely to be used by compareMinima and
+        # it is slow to load them individually by accessing the database repetitively.
+        query = self.session.query(Minimum).\
             options(undefer("coords")).\
-            filter(Minimum.energy > E-self.accuracy).\
-            filter(Minimum.energy < E+self.accuracy)
-        
+            filter(Minimum.energy.between(E-self.accuracy, E+self.accuracy))
+        if fp is not None:
+            # minima without a fingerprint are also candidates
+            kmin, kmax = self.fingerprint.key_window(fp)
+            query = query.outerjoin(MinimumFingerprint).\
+                filter(or_(MinimumFingerprint.key == None,
+                           MinimumFingerprint.key.between(kmin, kmax)))
+        return query.all()
+
+    def get_fingerprint(self, m):
+        """return the fingerprint of a minimum, computing it if necessary"""
+        if m.fingerprint is None:
+            values = self.fingerprint(m.coords)
+            m.fingerprint = MinimumFingerprint(m, self.fingerprint.key(values), values)
+        return m.fingerprint.values
+
+    def _is_same_minimum(self, new, m, fp=None):
+        """return True if the new minimum is the same as the minimum m in the database"""
+        if fp is not None:
+            if not self.fingerprint.match(fp, self.get_fingerprint(m)):
+                return False
+        if self.compareMinima:
+            return self.compareMinima(new, m)
+        return True
+
+    def findMinimum(self, E, coords):
+        fp = self.fingerprint(coords) if self.fingerprint is not None else None
         new = Minimum(E, coords)
         
-        for m in candidates:
-            if self.compareMinima:
-                if not self.compareMinima(new, m):
-                    continue
-            return m
+        for m in self._candidate_minima(E, fp):
+            if self._is_same_minimum(new, m, fp):
+                return m
         return None
         
     def addMinimum(self, E, coords, commit=True, max_n_minima=-1, pgorder=None, fvib=None):
@@ -502,20 +585,13 @@ class Database(object):
             
         """
         self.lock.acquire()
-        # undefer coords because it is likely to be used by compareMinima and
-        # it is slow to load them individually by accessing the database repetitively.
-        candidates = self.session.query(Minimum).\
-            options(undefer("coords")).\
-            filter(Minimum.energy.between(E-self.accuracy, E+self.accuracy))
-        
+        fp = self.fingerprint(coords) if self.fingerprint is not None else None
         new = Minimum(E, coords)
         
-        for m in candidates:
-            if self.compareMinima:
-                if not self.compareMinima(new, m):
-                    continue
-            self.lock.release() 
-            return m
+        for m in self._candidate_minima(E, fp):
+            if self._is_same_minimum(new, m, fp):
+                self.lock.release() 
+                return m
 
         if max_n_minima is not None and max_n_minima > 0:
             if self.number_of_minima() >= max_n_minima:
@@ -532,6 +608,8 @@ class Database(object):
             new.fvib = fvib
         if pgorder is not None:
             new.pgorder = pgorder
+        if fp is not None:
+            new.fingerprint = MinimumFingerprint(new, self.fingerprint.key(fp), fp)
         self.session.add(new)
         if commit:
             self.session.commit()
@@ -648,6 +726,9 @@ class Database(object):
         coords for multiple minima it is *much* faster to `undefer` before
         executing the query by, e.g.
         `session.query(Minimum).options(undefer("coords"))`
+        
+        For databases too large to load all at once see iter_minima() and
+        minima_batches()
         """
         if order_energy:
             return self.session.query(Minimum).order_by(Minimum.energy).all()
@@ -662,6 +743,186 @@ class Database(object):
         else:
             return self.session.query(TransitionState).all()
     
+    def _window(self, query, cls, Emin=None, Emax=None, id_min=None, id_max=None):
+        """restrict a query to an energy window and a range of ids"""
+        if Emin is not None:
+            query = query.filter(cls.energy >= Emin)
+        if Emax is not None:
+            query = query.filter(cls.energy < Emax)
+        if id_min is not None:
+            query = query.filter(cls._id >= id_min)
+        if id_max is not None:
+            query = query.filter(cls._id < id_max)
+        return query
+
+    def _paged(self, query, id_column, chunk_size, get_id):
+        """iterate over the results of query in chunks of chunk_size, ordered by id
+        
+        Each chunk is a separate query which starts after the last id of the
+        previous chunk, so no cursor is kept open between the chunks and only
+        one chunk is in memory at a time.
+        """
+        last = None
+        while True:
+            q = query
+            if last is not None:
+                q = q.filter(id_column > last)
+            rows = q.order_by(id_column).limit(chunk_size).all()
+            if len(rows) == 0:
+                return
+            yield rows
+            last = get_id(rows[-1])
+
+    def iter_minima(self, Emin=None, Emax=None, id_min=None, id_max=None, 
+                    load_coords=False, chunk_size=1000):
+        """iterate over the minima in the database without loading them all at once
+        
+        The minima are loaded from the database chunk_size at a time, in order of id.
+        
+        Parameters
+        ----------
+        Emin, Emax : float, optional
+            include only minima with Emin <= energy < Emax
+        id_min, id_max : int, optional
+            include only minima with id_min <= id < id_max
+        load_coords : bool
+            if True the coordinates are loaded together with the minima,
+            rather than with a separate query when they are accessed
+        chunk_size : int
+            the number of minima to load at a time
+        
+        See Also
+        --------
+        minima : return a list of all the minima
+        minima_batches : iterate over numpy arrays rather than Minimum objects
+        """
+        query = self.session.query(Minimum)
+        if load_coords:
+            query = query.options(undefer("coords"))
+        query = self._window(query, Minimum, Emin, Emax, id_min, id_max)
+        for chunk in self._paged(query, Minimum._id, chunk_size, lambda m: m._id):
+            for m in chunk:
+                yield m
+
+    def iter_transition_states(self, Emin=None, Emax=None, id_min=None, id_max=None, 
+                               load_coords=False, chunk_size=1000):
+        """iterate over the transition states in the database without loading them all at once
+        
+        The parameters are the same as for iter_minima()
+        """
+        query = self.session.query(TransitionState)
+        if load_coords:
+            query = query.options(undefer("coords"))
+        query = self._window(query, TransitionState, Emin, Emax, id_min, id_max)
+        for chunk in self._paged(query, TransitionState._id, chunk_size, lambda ts: ts._id):
+            for ts in chunk:
+                yield ts
+
+    def minima_batches(self, Emin=None, Emax=None, id_min=None, id_max=None, 
+                       coords=True, batch_size=10000):
+        """iterate over the minima as batches of numpy records
+        
+        No Minimum objects are created.  Each batch is a numpy structured
+        array with the fields id, energy, fvib, pgorder and, if coords is True,
+        coords.  batch["coords"] is an array of shape (len(batch), ndof).
+        Missing values of fvib and pgorder are nan.
+        
+        Parameters
+        ----------
+        Emin, Emax, id_min, id_max :
+            see iter_minima()
+        coords : bool
+            if True include the coordinates
+        batch_size : int
+            the maximum number of minima in a batch
+        
+        Examples
+        --------
+        >>> for batch in db.minima_batches(Emax=-40.):
+        >>>     print batch["id"], batch["energy"], batch["coords"].shape
+        """
+        columns = [Minimum._id, Minimum.energy, Minimum.fvib, Minimum.pgorder]
+        if coords:
+            columns.append(Minimum.coords)
+        query = self._window(self.session.query(*columns), Minimum, Emin, Emax, id_min, id_max)
+        for rows in self._paged(query, Minimum._id, batch_size, lambda row: row[0]):
+            yield _to_records(rows, _record_fields, coords)
+
+    def transition_state_batches(self, Emin=None, Emax=None, id_min=None, id_max=None, 
+                                 coords=True, batch_size=10000):
+        """iterate over the transition states as batches of numpy records
+        
+        The batches have the same fields as in minima_batches() and also 
+        minimum1_id and minimum2_id.
+        """
+        columns = [TransitionState._id, TransitionState.energy, TransitionState.fvib,
+                   TransitionState.pgorder, TransitionState._minimum1_id,
+                   TransitionState._minimum2_id]
+        if coords:
+            columns.append(TransitionState.coords)
+        query = self._window(self.session.query(*columns), TransitionState, Emin, Emax, id_min, id_max)
+        fields = _record_fields + [("minimum1_id", np.int64), ("minimum2_id", np.int64)]
+        for rows in self._paged(query, TransitionState._id, batch_size, lambda row: row[0]):
+            yield _to_records(rows, fields, coords)
+
+    def _bulk_update(self, cls, name, values):
+        """set the column `name` for many rows with a single executemany statement"""
+        values = [{"b_id": int(i), "b_value": v} for i, v in values]
+        if len(values) == 0:
+            return
+        self.session.flush()
+        table = cls.__table__
+        stmt = table.update().where(table.c._id == bindparam("b_id")).\
+            values({name: bindparam("b_value")})
+        self.session.execute(stmt, values)
+        # objects already loaded in the session don't know about the change
+        ids = set(v["b_id"] for v in values)
+        for obj in list(self.session.identity_map.values()):
+            if isinstance(obj, cls) and obj._id in ids:
+                self.session.expire(obj, [name])
+
+    def set_pgorders(self, minima=(), transition_states=(), commit=True):
+        """set the point group orders of many minima and transition states at once
+        
+        This is much faster than setting m.pgorder one object at a time,
+        because no Minimum or TransitionState objects need to be loaded.
+        
+        Parameters
+        ----------
+        minima, transition_states : iterables of (id, pgorder) pairs
+        commit : bool
+            commit the changes to the database
+        
+        See Also
+        --------
+        pele.thermodynamics.get_pgorder_information
+        """
+        self._bulk_update(Minimum, "pgorder", ((i, int(p)) for i, p in minima))
+        self._bulk_update(TransitionState, "pgorder", ((i, int(p)) for i, p in transition_states))
+        if commit:
+            self.session.commit()
+
+    def structure_index(self, descriptor=None, mindist=None, **kwargs):
+        """return an index of the minima for structural nearest neighbor queries
+        
+        The index is kept up to date as minima are added and removed.
+        
+        Parameters
+        ----------
+        descriptor : callable, optional
+            computes a symmetry invariant descriptor vector from the coordinates.
+            Defaults to the database fingerprint
+        mindist : callable, optional
+            used to refine the nearest neighbors, e.g. system.get_mindist()
+        kwargs :
+            passed to StructureIndex
+        
+        See Also
+        --------
+        pele.storage.StructureIndex
+        """
+        return StructureIndex(self, descriptor=descriptor, mindist=mindist, **kwargs)
+
     def minimum_adder(self, Ecut=None, max_n_minima=None, commit_interval=1):
         """wrapper class to add minima
 
@@ -734,6 +995,7 @@ class Database(object):
             if ts.minimum1.id() > ts.minimum2.id():
                 ts.minimum1, ts.minimum2 = ts.minimum2, ts.minimum1
         
+        self.on_minimum_removed(min2)
         self.session.delete(min2)
         self.session.commit()
 
@@ -1,6 +1,8 @@
 import unittest
 import os
 
+import numpy as np
+
 from pele.storage import Database
 
 class TestDB(unittest.TestCase):
@@ -123,6 +125,16 @@ class TestDB(unittest.TestCase):
         self.assertEqual(len(self.db.minima()), self.nminima-1)
         # transition states shouldn't be deleted
         self.assertEqual(len(self.db.transition_states()), self.nts)
+
+    def test_merge_minima_signal(self):
+        m1 = self.db.minima()[0]
+        m2 = self.db.minima()[1]
+        removed = []
+        def on_removed(m):
+            removed.append(m)
+        self.db.on_minimum_removed.connect(on_removed)
+        self.db.mergeMinima(m1, m2)
+        self.assertEqual(removed, [m2])
     
     def test_number_of_minima(self):
         self.assertEqual(self.nminima, self.db.number_of_minima())
@@ -156,6 +168,46 @@ class TestDB(unittest.TestCase):
         self.assertEqual(self.nminima, self.db.number_of_minima())
         self.assertIn(m, self.db.minima())
 
+    def test_iter_minima(self):
+        minima = list(self.db.iter_minima(chunk_size=3))
+        self.assertEqual(minima, sorted(self.db.minima(), key=lambda m: m.id()))
+        
+        minima = list(self.db.iter_minima(Emin=2., Emax=5., chunk_size=2))
+        self.assertEqual([m.energy for m in minima], [2., 3., 4.])
+        
+        ids = [m.id() for m in self.db.minima()]
+        minima = list(self.db.iter_minima(id_min=ids[3], id_max=ids[6], load_coords=True))
+        self.assertEqual([m.id() for m in minima], ids[3:6])
+        self.assertEqual([m.coords for m in minima], [[3.], [4.], [5.]])
+
+    def test_iter_transition_states(self):
+        tslist = list(self.db.iter_transition_states(chunk_size=2))
+        self.assertEqual(len(tslist), self.nts)
+        self.assertEqual(len(list(self.db.iter_transition_states(Emin=1.))), 0)
+
+    def test_minima_batches(self):
+        self.db.minima()[0].fvib = 2.
+        batches = list(self.db.minima_batches(Emax=7., batch_size=3))
+        self.assertEqual([len(b) for b in batches], [3, 3, 1])
+        records = np.concatenate(batches)
+        self.assertEqual(records["coords"].shape, (7, 1))
+        np.testing.assert_array_equal(records["energy"], np.arange(7.))
+        np.testing.assert_array_equal(records["coords"][:, 0], records["energy"])
+        self.assertEqual(records["fvib"][0], 2.)
+        self.assertTrue(np.all(np.isnan(records["fvib"][1:])))
+        self.assertEqual(list(records["id"]), [m.id() for m in self.db.minima()[:7]])
+        
+        records = np.concatenate(list(self.db.minima_batches(coords=False)))
+        self.assertNotIn("coords", records.dtype.names)
+        self.assertEqual(len(records), self.nminima)
+
+    def test_transition_state_batches(self):
+        records = np.concatenate(list(self.db.transition_state_batches(batch_size=2)))
+        self.assertEqual(len(records), self.nts)
+        m1 = [ts.minimum1.id() for ts in self.db.transition_states()]
+        m2 = [ts.minimum2.id() for ts in self.db.transition_states()]
+        self.assertEqual(sorted(zip(records["minimum1_id"], records["minimum2_id"])), sorted(zip(m1, m2)))
+
     def test_getTSfromID(self):
         ts = self.db.transition_states()[0]
         ts1 = self.db.getTransitionStateFromID(ts._id)
@@ -298,6 +350,49 @@ def benchmark_number_of_minima():
     print len(db.minima())
     print "time", t1 - time.clock(); t1 = time.clock()
 
+class TestDBFingerprint(unittest.TestCase):
+    def setUp(self):
+        from pele.mindist import ClusterFingerprint
+        self.ncompare = 0
+        def compare(m1, m2):
+            self.ncompare += 1
+            return np.allclose(m1.coords, m2.coords)
+        self.db = Database(compareMinima=compare, fingerprint=ClusterFingerprint(), accuracy=1.)
+        self.x = np.random.uniform(-1, 1, 30) * 1.5
+    
+    def test_add_minimum(self):
+        m1 = self.db.addMinimum(0., self.x)
+        self.assertIsNotNone(m1.fingerprint)
+        
+        # a different structure is added without calling compareMinima
+        x2 = self.x.copy()
+        x2[:3] += 0.5
+        m2 = self.db.addMinimum(0.1, x2)
+        self.assertNotEqual(m1, m2)
+        self.assertEqual(self.ncompare, 0)
+        
+        # the same structure is compared exactly
+        m3 = self.db.addMinimum(0., self.x)
+        self.assertEqual(m1, m3)
+        self.assertEqual(self.ncompare, 1)
+        self.assertEqual(self.db.findMinimum(0.1, x2), m2)
+        
+    def test_missing_fingerprint(self):
+        # minima added without fingerprints get one when they are compared
+        m1 = self.db.addMinimum(0., self.x)
+        self.db.session.delete(m1.fingerprint)
+        self.db.session.commit()
+        self.assertIsNone(m1.fingerprint)
+        self.assertEqual(self.db.addMinimum(0., self.x), m1)
+        self.assertIsNotNone(m1.fingerprint)
+    
+    def test_remove_minimum(self):
+        from pele.storage.database import MinimumFingerprint
+        m1 = self.db.addMinimum(0., self.x)
+        self.db.removeMinimum(m1)
+        self.assertEqual(self.db.session.query(MinimumFingerprint).count(), 0)
+    
+
 if __name__ == "__main__":
 #    benchmark_number_of_minima()
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+
+from pele.storage import Database, StructureIndex
+from pele.storage._structure_index import VPTree
+
+
+class TestVPTree(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.points = np.random.rand(500, 5)
+        # some duplicate points
+        self.points[:20] = self.points[0]
+        self.tree = VPTree(self.points, leaf_size=4)
+
+    def test_query(self):
+        for i in xrange(20):
+            x = np.random.rand(5)
+            d = np.sqrt(((self.points - x)**2).sum(1))
+            result = self.tree.query(x, 5)
+            self.assertEqual(len(result), 5)
+            for (dist, j), dref in zip(result, np.sort(d)[:5]):
+                self.assertAlmostEqual(dist, dref)
+                self.assertAlmostEqual(d[j], dref)
+
+    def test_accept(self):
+        x = np.random.rand(5)
+        d = np.sqrt(((self.points - x)**2).sum(1))
+        result = self.tree.query(x, 3, accept=lambda j: j % 2 == 1)
+        self.assertTrue(all(j % 2 == 1 for dist, j in result))
+        self.assertAlmostEqual(result[0][0], d[1::2].min())
+
+    def test_radius(self):
+        x = np.random.rand(5)
+        d = np.sqrt(((self.points - x)**2).sum(1))
+        r = np.sort(d)[30]
+        result = self.tree.query_radius(x, r)
+        self.assertEqual(sorted(j for dist, j in result), sorted(np.where(d <= r)[0]))
+
+
+class TestStructureIndex(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.db = Database()
+        for i in xrange(50):
+            self.db.addMinimum(float(i), np.random.rand(3))
+        self.descriptor = lambda coords: np.asarray(coords)
+        self.index = self.db.structure_index(descriptor=self.descriptor, leaf_size=2)
+
+    def brute_force(self, coords, k, exclude=()):
+        minima = [m for m in self.db.minima() if m not in exclude]
+        minima.sort(key=lambda m: np.linalg.norm(m.coords - coords))
+        return minima[:k]
+
+    def test_knn(self):
+        x = np.random.rand(3)
+        result = self.index.knn(x, 4)
+        self.assertEqual([m for d, m in result], self.brute_force(x, 4))
+        self.assertAlmostEqual(result[0][0], np.linalg.norm(result[0][1].coords - x))
+
+    def test_neighbors(self):
+        m = self.db.minima()[10]
+        result = self.index.neighbors(m, 3)
+        self.assertEqual([m2 for d, m2 in result], self.brute_force(m.coords, 3, exclude=[m]))
+
+    def test_radius(self):
+        x = np.random.rand(3)
+        result = self.index.radius(x, .3)
+        d = [np.linalg.norm(m.coords - x) for m in self.db.minima()]
+        self.assertEqual(len(result), np.count_nonzero(np.array(d) <= .3))
+
+    def test_incremental(self):
+        x = np.random.rand(3)
+        for i in xrange(30):
+            self.db.addMinimum(100. + i, np.random.rand(3))
+        self.db.removeMinimum(self.db.minima()[0])
+        self.assertEqual(len(self.index), self.db.number_of_minima())
+        result = self.index.knn(x, 5)
+        self.assertEqual([m for d, m in result], self.brute_force(x, 5))
+
+    def test_reused_id(self):
+        # the database reuses the id of a removed minimum with the largest id
+        m = max(self.db.minima(), key=lambda m: m.id())
+        mid, x = m.id(), m.coords.copy()
+        self.db.removeMinimum(m)
+        m2 = self.db.addMinimum(200., np.random.rand(3))
+        self.assertEqual(len(self.index), self.db.number_of_minima())
+        result = self.index.knn(x, 5)
+        self.assertEqual([m3 for d, m3 in result], self.brute_force(x, 5))
+        self.assertEqual(len(set(m3.id() for d, m3 in result)), 5)
+        d, m3 = self.index.knn(m2.coords, 1)[0]
+        self.assertEqual(m3, m2)
+        self.assertAlmostEqual(d, 0.)
+
+    def test_mindist(self):
+        # the candidates are ranked by the mindist distance
+        mindist = lambda x1, x2: (np.abs(x1 - x2).sum(), x1, x2)
+        index = StructureIndex(self.db, descriptor=self.descriptor, mindist=mindist, oversample=50)
+        x = np.random.rand(3)
+        result = index.knn(x, 3)
+        minima = sorted(self.db.minima(), key=lambda m: np.abs(m.coords - x).sum())
+        self.assertEqual([m for d, m in result], minima[:3])
+
+    def test_fingerprint(self):
+        from pele.mindist import ClusterFingerprint
+        db = Database(fingerprint=ClusterFingerprint())
+        for i in xrange(5):
+            db.addMinimum(float(i), np.random.rand(12))
+        index = db.structure_index()
+        m = db.minima()[0]
+        d, m2 = index.knn(m.coords, 1)[0]
+        self.assertEqual(m2, m)
+        self.assertAlmostEqual(d, 0.)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ from pele import basinhopping
 from pele.storage import Database
 from pele.takestep import RandomDisplacement, AdaptiveStepsizeTemperature
 from pele.utils.xyz import write_xyz
-from pele.optimize import lbfgs_cpp
+from pele.optimize import LBFGSQuencher
 from pele.transition_states._nebdriver import NEBDriver
 from pele.transition_states import FindTransitionState
 from pele.thermodynamics import logproduct_freq2, normalmodes
@@ -158,7 +158,9 @@ class BaseSystem(object):
         
         Notes
         The function should be one of the optimizers in `pele.optimize`, or
-        have similar structure.
+        have similar structure.  The default is an LBFGSQuencher, which
+        reuses the c++ optimizer between quenches, so the returned function
+        should not be shared between threads.
         
         See Also
         --------
@@ -166,7 +168,7 @@ class BaseSystem(object):
         """
         pot = self.get_potential()
         kwargs = dict_copy_update(self.params["structural_quench_params"], kwargs)
-        return lambda coords: lbfgs_cpp(coords, pot, **kwargs)
+        return LBFGSQuencher(pot, **kwargs)
 
     def get_compare_exact(self):
         """object that returns True if two structures are identical.
@@ -187,6 +189,19 @@ class BaseSystem(object):
             return None
         return lambda m1, m2: compare(m1.coords, m2.coords)
 
+    def get_fingerprint(self):
+        """object which computes structural fingerprints of minima
+        
+        The database only compares two minima with compareMinima if their 
+        fingerprints match.
+        
+        See Also
+        --------
+        pele.mindist.ClusterFingerprint
+        pele.storage.Database
+        """
+        raise NotImplementedError
+
     def get_system_properties(self):
         """return a dictionary of system specific properties.
         
@@ -231,6 +246,13 @@ class BaseSystem(object):
             # compareMinima is optional
             pass
 
+        if "fingerprint" not in kwargs:
+            try:
+                kwargs["fingerprint"] = self.get_fingerprint()
+            except NotImplementedError:
+                # fingerprints are optional
+                pass
+
         db = Database(**kwargs)
 
         db.add_properties(self.get_system_properties(), overwrite=overwrite_properties)
@@ -4,7 +4,7 @@ from pele.systems import BaseSystem
 from pele.potentials import LJ
 from pele.transition_states import orthogopt
 from pele.mindist import MinPermDistAtomicCluster, ExactMatchAtomicCluster, \
-    PointGroupOrderCluster
+    PointGroupOrderCluster, MinPermDistAtomicClusterCpp, ClusterFingerprint
 from pele.landscape import smoothPath
 from pele.transition_states import NEBDriver
 
@@ -38,13 +38,24 @@ class AtomicCluster(BaseSystem):
         permlist = self.get_permlist()
         return ExactMatchAtomicCluster(permlist=permlist, **kwargs)
 
-    def get_mindist(self, **kwargs):
+    def get_fingerprint(self, **kwargs):
+        """return an object which computes structural fingerprints of the minima
+        
+        The fingerprints are invariant to translation, rotation, inversion and
+        the permutations in permlist.
+        """
+        return ClusterFingerprint(permlist=self.get_permlist(), **kwargs)
+
+    def get_mindist(self, use_cpp=False, **kwargs):
         """return a function which puts two structures in best alignment.
         
         take into account global rotational symmetry, global translational
-        symmetry and permutational symmetry
+        symmetry and permutational symmetry.  If use_cpp is True the c++
+        implementation MinPermDistAtomicClusterCpp is used.
         """
         permlist = self.get_permlist()
+        if use_cpp:
+            return MinPermDistAtomicClusterCpp(permlist=permlist, **kwargs)
         return MinPermDistAtomicCluster(permlist=permlist, **kwargs)
 
     def get_orthogonalize_to_zero_eigenvectors(self):
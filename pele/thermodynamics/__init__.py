@@ -37,6 +37,7 @@ These are functions which you may find useful.
    :toctree: generated/
 
     get_thermodynamic_information
+    get_pgorder_information
 
     
 
@@ -3,8 +3,26 @@ routines for computing thermodynamic information
 """
 import multiprocessing as mp
 import sys
+import itertools
+
+import numpy as np
 
 from pele.thermodynamics._normalmodes import NormalModeError
+from pele.mindist import PointGroupOrderCache
+
+
+def _make_pgorder_calculator(system, use_cache=False):
+    """return system.get_pgorder, memoized by fingerprint if use_cache and the system supports it"""
+    if not use_cache:
+        return system.get_pgorder
+    try:
+        fingerprint = system.get_fingerprint()
+        exact_match = system.get_compare_exact()
+    except NotImplementedError:
+        return system.get_pgorder
+    if fingerprint is None or exact_match is None:
+        return system.get_pgorder
+    return PointGroupOrderCache(system.get_pgorder, fingerprint, exact_match)
 
 
 class _ThermoWorker(mp.Process):
@@ -17,14 +35,19 @@ class _ThermoWorker(mp.Process):
     output_queue : mp.Queue object
         the worker will return results on this queue
     system : pele system object
+    pgorder_cache : bool
+        if True memoize the point group orders with PointGroupOrderCache
     """
 
-    def __init__(self, input_queue, output_queue, system, verbose=False, **kwargs):
+    def __init__(self, input_queue, output_queue, system, verbose=False, pgorder_cache=False,
+                 **kwargs):
         mp.Process.__init__(self, **kwargs)
         self.input_queue = input_queue
         self.output_queue = output_queue
         self.system = system
         self.verbose = verbose
+        self.pgorder_cache = pgorder_cache
+        self.get_pgorder = None
 
     def process_input(self):  # pragma: no cover (coverage can't see it because it's in a separate process)
         """get input from queue and process it
@@ -38,7 +61,7 @@ class _ThermoWorker(mp.Process):
             return True
 
         # get the next minima / ts to evaluate
-        mts, mid, coords = self.input_queue.get()
+        mts, mid, coords, pgorder = self.input_queue.get()
         if mts == "ts":
             nnegative = 1
         # print "computing thermodynamics for ts", mid
@@ -49,7 +72,10 @@ class _ThermoWorker(mp.Process):
 
         # do the computation
         invalid = False
-        pgorder = self.system.get_pgorder(coords)
+        if pgorder is None:
+            if self.get_pgorder is None:
+                self.get_pgorder = _make_pgorder_calculator(self.system, self.pgorder_cache)
+            pgorder = self.get_pgorder(coords)
         try:
             fvib = self.system.get_log_product_normalmode_freq(coords, nnegative=nnegative)
         except NormalModeError, e:
@@ -96,10 +122,13 @@ class GetThermodynamicInfoParallel(object):
         specify verbosity
     only_minima : bool
         if True the transition state free energy will not be computed
+    pgorder_cache : bool
+        if True each worker memoizes the point group orders with
+        PointGroupOrderCache
     """
 
     def __init__(self, system, database, npar=4, verbose=False, only_minima=False,
-                 recalculate=False):
+                 recalculate=False, pgorder_cache=False):
         self.system = system
         self.database = database
         self.verbose = verbose
@@ -110,7 +139,8 @@ class GetThermodynamicInfoParallel(object):
         self.send_queue = mp.Queue()
         self.done_queue = mp.Queue()
         for i in range(npar):
-            worker = _ThermoWorker(self.send_queue, self.done_queue, system, verbose=self.verbose)
+            worker = _ThermoWorker(self.send_queue, self.done_queue, system, verbose=self.verbose,
+                                   pgorder_cache=pgorder_cache)
             worker.daemon = True
             self.workers.append(worker)
 
@@ -118,15 +148,15 @@ class GetThermodynamicInfoParallel(object):
         """load the jobs into the queue
         """
         self.njobs = 0
-        for m in self.database.minima():
+        for m in self.database.iter_minima(load_coords=True):
             if self.recalculate or (m.pgorder is None or m.fvib is None):
                 self.njobs += 1
-                self.send_queue.put(("m", m.id(), m.coords))
+                self.send_queue.put(("m", m.id(), m.coords, None if self.recalculate else m.pgorder))
 
-        for ts in self.database.transition_states():
+        for ts in self.database.iter_transition_states(load_coords=True):
             if self.recalculate or (ts.pgorder is None or ts.fvib is None):
                 self.njobs += 1
-                self.send_queue.put(("ts", ts.id(), ts.coords))
+                self.send_queue.put(("ts", ts.id(), ts.coords, None if self.recalculate else ts.pgorder))
 
     def _process_return_value(self, ret):
         # if the a worker throws an unexpected exception, kill the workers and raise it
@@ -202,6 +232,83 @@ class GetThermodynamicInfoParallel(object):
         self.finish()
 
 
+# the point group calculator of a pool worker process
+_pgorder_calculator = None
+
+
+def _init_pgorder_worker(system, use_cache):
+    global _pgorder_calculator
+    _pgorder_calculator = _make_pgorder_calculator(system, use_cache)
+
+
+def _compute_pgorder(coords):  # pragma: no cover (runs in a separate process)
+    return _pgorder_calculator(coords)
+
+
+def get_pgorder_information(system, database, nproc=4, recalculate=False, batch_size=1000,
+                            verbose=False, use_cache=False):
+    """compute the point group order of all minima and transition states in one pass
+    
+    The structures are read from the database in batches as numpy arrays,
+    distributed over a pool of nproc processes, and the point group orders
+    of each batch are written back with a single bulk update.  If use_cache
+    is True and the system defines get_fingerprint() each process memoizes
+    the point group orders with PointGroupOrderCache, so symmetry equivalent
+    structures are only computed once per process.  This only pays off if
+    the database contains duplicate structures.
+    
+    Parameters
+    ----------
+    system : pele System class
+    database : a Database object
+    nproc : int or None
+        the number of processes to use.  If None or 1 everything is done
+        in this process
+    recalculate : bool
+        if False only the structures without a point group order are computed
+    batch_size : int
+        the number of structures read from and written to the database at a time
+    use_cache : bool
+        memoize the point group orders with PointGroupOrderCache
+    
+    See Also
+    --------
+    pele.mindist.PointGroupOrderCache
+    pele.storage.Database.set_pgorders
+    """
+    if nproc is None or nproc <= 1:
+        pool = None
+        calculator = _make_pgorder_calculator(system, use_cache)
+        mapper = lambda coords_list: itertools.imap(calculator, coords_list)
+    else:
+        pool = mp.Pool(nproc, initializer=_init_pgorder_worker, initargs=(system, use_cache))
+        chunksize = max(1, batch_size // (4 * nproc))
+        mapper = lambda coords_list: pool.imap(_compute_pgorder, coords_list, chunksize)
+
+    try:
+        ncomputed = 0
+        for mts, batches in [("m", database.minima_batches(batch_size=batch_size)),
+                             ("ts", database.transition_state_batches(batch_size=batch_size))]:
+            for batch in batches:
+                if not recalculate:
+                    batch = batch[np.isnan(batch["pgorder"])]
+                if len(batch) == 0:
+                    continue
+                pgorders = list(mapper(list(batch["coords"])))
+                values = zip(batch["id"], pgorders)
+                if mts == "m":
+                    database.set_pgorders(minima=values)
+                else:
+                    database.set_pgorders(transition_states=values)
+                ncomputed += len(batch)
+                if verbose:
+                    print "computed the point group order of", ncomputed, "structures"
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
 def get_thermodynamic_information_minimum(system, database, minimum, commit=True):
     m = minimum
     changed = False
@@ -217,7 +324,8 @@ def get_thermodynamic_information_minimum(system, database, minimum, commit=True
     return changed
 
 
-def get_thermodynamic_information(system, database, nproc=4, recalculate=False, verbose=False):
+def get_thermodynamic_information(system, database, nproc=4, recalculate=False, verbose=False,
+                                  pgorder_cache=False):
     """
     compute thermodynamic information for all minima and transition states in a database
     
@@ -226,15 +334,23 @@ def get_thermodynamic_information(system, database, nproc=4, recalculate=False,
     system : pele System class
     database : a Database object
     nproc : number of processors to use
+    pgorder_cache : bool
+        if True the point group orders are memoized with PointGroupOrderCache.
+        Only used if nproc is not None
     
     Notes
     -----
     The information that is computed is the point group order (m.pgorder) and the
     log product of the squared normal mode frequencies (m.fvib).
+    
+    See Also
+    --------
+    get_pgorder_information : compute only the point group orders, in bulk
     """
     if nproc is not None:
         worker = GetThermodynamicInfoParallel(system, database, npar=nproc,
-                                              recalculate=recalculate, verbose=verbose)
+                                              recalculate=recalculate, verbose=verbose,
+                                              pgorder_cache=pgorder_cache)
         worker.start()
         return
 
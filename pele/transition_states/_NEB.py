@@ -6,7 +6,7 @@ import logging
 from pele.optimize import Result
 from pele.optimize import mylbfgs
 
-__all__ = ["NEB", ]
+__all__ = ["NEB", "NEB_CPP"]
 
 logger = logging.getLogger("pele.connect.neb")
 
@@ -463,6 +463,110 @@ class NEB(object):
         return neb
 
 
+class NEB_CPP(NEB):
+    """Doubly nudged elastic band optimized entirely in c++
+
+    This has the same interface as NEB, but the band is represented by the
+    c++ class pele::NEB and optimized by the c++ LBFGS.  If the potential is
+    a c++ potential no python is called during the optimization.
+
+    Parameters
+    ----------
+    same as for NEB, with the following restrictions
+
+    distance :
+        only the cartesian distance `distance_cart` is supported
+    quenchRoutine :
+        ignored.  The band is always optimized with LBFGS_CPP.  The relevant
+        parameters in quenchParams (tol, nsteps, maxstep, maxErise, M, H0,
+        iprint) are passed to it.
+    adjustk_freq :
+        k is adjusted every adjustk_freq gradient evaluations rather than 
+        every 5 optimizer steps
+    events :
+        the events are called once at the end of the optimization, not after
+        every step.  Calling python functions at every step would defeat the 
+        purpose of this class.
+    copy_potential, save_energies, use_minimizer_callback :
+        ignored
+
+    See Also
+    --------
+    NEB
+    NEBDriver : use the option `use_cpp=True` to use this class
+    """
+    _lbfgs_params = ["tol", "nsteps", "maxstep", "maxErise", "M", "H0", "iprint"]
+
+    def __init__(self, path, potential, distance=distance_cart, k=100.0, adjustk_freq=0, adjustk_tol=0.1,
+                 adjustk_factor=1.05, with_springenergy=False, dneb=True, **kwargs):
+        from pele.potentials import _pele
+        from pele.potentials._pythonpotential import CppPotentialWrapper
+        from pele.transition_states._neb_cpp import NEBPotential
+
+        if distance is not distance_cart:
+            raise ValueError("NEB_CPP only supports the cartesian distance function distance_cart")
+        if not isinstance(potential, _pele.BasePotential):
+            logger.warning("NEB_CPP: the potential is not a c++ potential, python will be called for every image")
+            potential = CppPotentialWrapper(potential)
+
+        super(NEB_CPP, self).__init__(path, potential, distance=distance, k=k,
+                                      adjustk_freq=adjustk_freq, adjustk_tol=adjustk_tol,
+                                      adjustk_factor=adjustk_factor, with_springenergy=with_springenergy,
+                                      dneb=dneb, **kwargs)
+
+        self.band = NEBPotential(self.coords, potential, k=k, dneb=dneb)
+        self.band.set_adjust_k(adjustk_freq, adjustk_tol, adjustk_factor)
+        self.band.set_with_spring_energy(with_springenergy)
+
+    def _update_band(self):
+        """copy the python state of the band to the c++ band"""
+        self.band.set_k(self.k)
+        self.band.set_active_coords(self.active.reshape(-1))
+        for i in xrange(1, self.nimages - 1):
+            self.band.set_climbing(i, self.isclimbing[i])
+
+    def _update_from_band(self):
+        """copy the state of the c++ band to python"""
+        self.coords[:, :] = self.band.get_coords()
+        self.energies[:] = self.band.get_energies()
+        self.distances[:] = self.band.get_distances()
+        self.k = self.band.get_k()
+
+    def getEnergyGradient(self, coords1d):
+        self._update_band()
+        e, grad = self.band.getEnergyGradient(np.asarray(coords1d, dtype=float).ravel())
+        self._update_from_band()
+        return e, grad
+
+    def optimize(self, quenchRoutine=None, **kwargs):
+        """optimize the band with the c++ LBFGS"""
+        from pele.optimize import LBFGS_CPP
+
+        quenchParams = dict([("nsteps", 300)] +
+                            self.quenchParams.items() +
+                            kwargs.items())
+        params = dict([(key, value) for key, value in quenchParams.iteritems()
+                       if key in self._lbfgs_params])
+
+        self._update_band()
+        opt = LBFGS_CPP(self.active.reshape(-1), self.band, **params)
+        qres = opt.run()
+        self.band.set_active_coords(qres.coords)
+        self._update_from_band()
+
+        res = Result()
+        res.path = self.coords
+        res.nsteps = qres.nsteps
+        res.energy = self.energies
+        res.rms = qres.rms
+        res.success = bool(qres.rms < quenchParams["tol"])
+
+        for event in self.events:
+            event(path=self.coords, energies=self.energies,
+                  distances=self.distances, stepnum=qres.nfev, rms=qres.rms)
+        return res
+
+
 #
 # only testing stuff below here
 #
@@ -0,0 +1,106 @@
+"""
+# distutils: language = C++
+"""
+import numpy as np
+
+cimport numpy as np
+from libcpp cimport bool as cbool
+
+from pele.potentials cimport _pele
+from pele.potentials._pele cimport shared_ptr
+from pele.potentials._pele cimport BasePotential
+from pele.potentials._pele cimport array_wrap_np, pele_array_to_np
+
+
+cdef extern from "pele/neb.h" namespace "pele":
+    cdef cppclass cNEB "pele::NEB":
+        cNEB(shared_ptr[_pele.cBasePotential], _pele.Array[double], size_t, double, cbool) except +
+        size_t get_nimages() except +
+        size_t get_nactive_dof() except +
+        double get_k() except +
+        void set_k(double) except +
+        void set_dneb(cbool) except +
+        void set_with_spring_energy(cbool) except +
+        void set_adjust_k(int, double, double) except +
+        _pele.Array[double] get_coords() except +
+        _pele.Array[double] get_energies() except +
+        _pele.Array[double] get_distances() except +
+        void set_climbing(size_t, cbool) except +
+        cbool is_climbing(size_t) except +
+        void make_all_maxima_climbing() except +
+        void set_active_coords(_pele.Array[double]) except +
+
+
+cdef class NEBPotential(BasePotential):
+    """python interface to the c++ doubly nudged elastic band
+
+    The coordinates of this potential are those of the movable images
+    (all except the two end points) of the band, one after the other.  The
+    gradient is the NEB force and the energy is the sum of the true energies
+    of the images.  The band can be optimized directly by the c++ LBFGS
+    without calling python.
+
+    Parameters
+    ----------
+    path : array, shape (nimages, ndof)
+        the initial coordinates of all the images, including the end points
+    potential : BasePotential
+        the c++ potential of a single image
+    k : float
+        the spring constant
+    dneb : bool
+        use double nudging
+    """
+    cdef cNEB *nebptr
+    cdef BasePotential potential
+    cdef size_t ndof
+
+    def __cinit__(self, path, BasePotential potential not None, double k=100., dneb=True):
+        cdef np.ndarray[double, ndim=2] cpath = np.array(path, dtype=float)
+        cdef np.ndarray[double, ndim=1] cpath1d = cpath.reshape(-1)
+        self.potential = potential
+        self.ndof = cpath.shape[1]
+        self.thisptr = shared_ptr[_pele.cBasePotential](<_pele.cBasePotential*> new cNEB(
+                                        potential.thisptr, array_wrap_np(cpath1d),
+                                        cpath.shape[0], k, dneb))
+        self.nebptr = <cNEB*> self.thisptr.get()
+
+    def get_nimages(self):
+        return self.nebptr.get_nimages()
+
+    def get_k(self):
+        return self.nebptr.get_k()
+
+    def set_k(self, double k):
+        self.nebptr.set_k(k)
+
+    def set_with_spring_energy(self, with_spring_energy):
+        self.nebptr.set_with_spring_energy(bool(with_spring_energy))
+
+    def set_adjust_k(self, int adjustk_freq, double adjustk_tol=0.1, double adjustk_factor=1.05):
+        """adjust k every adjustk_freq gradient evaluations.  Set adjustk_freq=0 to disable"""
+        self.nebptr.set_adjust_k(adjustk_freq, adjustk_tol, adjustk_factor)
+
+    def get_coords(self):
+        """return the coordinates of all images as an array of shape (nimages, ndof)"""
+        return pele_array_to_np(self.nebptr.get_coords()).reshape(-1, self.ndof)
+
+    def get_energies(self):
+        return pele_array_to_np(self.nebptr.get_energies())
+
+    def get_distances(self):
+        return pele_array_to_np(self.nebptr.get_distances())
+
+    def set_active_coords(self, x):
+        """set the coordinates of the movable images and compute their energies"""
+        cdef np.ndarray[double, ndim=1] cx = np.array(x, dtype=float).reshape(-1)
+        self.nebptr.set_active_coords(array_wrap_np(cx))
+
+    def set_climbing(self, size_t i, climbing=True):
+        self.nebptr.set_climbing(i, bool(climbing))
+
+    def is_climbing(self, size_t i):
+        return bool(self.nebptr.is_climbing(i))
+
+    def make_all_maxima_climbing(self):
+        self.nebptr.make_all_maxima_climbing()
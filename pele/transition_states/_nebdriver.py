@@ -1,7 +1,7 @@
 import logging
 import numpy as np
 
-from pele.transition_states import NEB
+from pele.transition_states import NEB, NEB_CPP
 from pele.transition_states._NEB import distance_cart
 from _interpolate import InterpolatedPath, interpolate_linear
 from pele.utils.events import Signal
@@ -57,13 +57,23 @@ class NEBDriver(object):
         the function used to do the path interpolation for the NEB
     NEBquenchParams : dict
         parameters passed to the minimizer
+    use_cpp : bool
+        if True the band is represented and optimized in c++ (see NEB_CPP).
+        This requires the cartesian distance function `distance_cart`.
+    progress : callable, optional
+        e.g. a ProgressChannel.  It is called with the same keyword arguments
+        as `update_event`.  Use this rather than `update_event` for monitoring,
+        since `update_event` is called with the whole band on every gradient
+        evaluation.
     kwargs : keyword options
         additional options are passed to the NEB class
 
     See Also
     ---------
     NEB
+    NEB_CPP
     InterpolatedPath
+    pele.utils.progress.ProgressChannel
 
     """
 
@@ -73,7 +83,8 @@ class NEBDriver(object):
                  adjustk_tol=0.1, adjustk_factor=1.05, dneb=True,
                  reinterpolate_tol=0.1,
                  reinterpolate=0, adaptive_nimages=False, adaptive_niter=False,
-                 interpolator=interpolate_linear, distance=distance_cart, **kwargs):
+                 interpolator=interpolate_linear, distance=distance_cart, use_cpp=False, progress=None,
+                 **kwargs):
 
         self.potential = potential
         self.interpolator = interpolator
@@ -86,11 +97,16 @@ class NEBDriver(object):
         self.image_density = image_density
         self.iter_density = iter_density
         self.update_event = Signal()
+        self.progress = progress
         self.coords1 = coords1
         self.coords2 = coords2
         self.reinterpolate = reinterpolate
         self.reinterpolate_tol = reinterpolate_tol
-        self._nebclass = NEB
+        self.use_cpp = use_cpp
+        if use_cpp:
+            self._nebclass = NEB_CPP
+        else:
+            self._nebclass = NEB
         self._kwargs = kwargs.copy()
         self.k = k
         self.adaptive_images = adaptive_nimages
@@ -129,6 +145,7 @@ class NEBDriver(object):
         # factor is not here, todo, move this out of constuctor
         params["interpolator"] = obj.interpolator
         params["distance"] = obj.distance
+        params["use_cpp"] = obj.use_cpp
 
         return params
 
@@ -151,9 +168,9 @@ class NEBDriver(object):
         for i in xrange(len(self.path) - 1):
             distances.append(np.sqrt(self.distance(self.path[i], self.path[i + 1])[0]))
 
-        self.update_event(path=np.array(self.path), energies=np.array(energies),
-                          distances=np.array(distances), stepnum=self.steps_total,
-                          rms=1.0, k=self.last_k, event="initial")
+        self._send_event(path=np.array(self.path), energies=np.array(energies),
+                         distances=np.array(distances), stepnum=self.steps_total,
+                         rms=1.0, k=self.last_k, event="initial")
 
     def run(self):
         # determine the number of iterations                
@@ -275,17 +292,22 @@ class NEBDriver(object):
         newpath.append(path[-1].copy())
         return newpath
 
+    def _send_event(self, **kwargs):
+        self.update_event(**kwargs)
+        if self.progress is not None:
+            self.progress(**kwargs)
+
     def _process_event(self, path=None, energies=None, distances=None, stepnum=None, rms=None):
-        self.update_event(path=path, energies=energies,
-                          distances=distances, stepnum=stepnum + self.steps_total,
-                          rms=rms, k=self.neb.k, event="update")
+        self._send_event(path=path, energies=energies,
+                         distances=distances, stepnum=stepnum + self.steps_total,
+                         rms=rms, k=self.neb.k, event="update")
 
     def _send_finish_event(self, res):
         distances = []
         for i in xrange(len(res.path) - 1):
             distances.append(np.sqrt(self.distance(res.path[i], res.path[i + 1])[0]))
 
-        self.update_event(path=res.path, energies=res.energy,
-                          distances=np.array(distances), stepnum=res.nsteps,
-                          rms=res.rms, k=self.neb.k, event="final")
+        self._send_event(path=res.path, energies=res.energy,
+                         distances=np.array(distances), stepnum=res.nsteps,
+                         rms=res.rms, k=self.neb.k, event="final")
         
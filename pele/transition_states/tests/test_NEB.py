@@ -34,5 +34,34 @@ class TestNEB(unittest.TestCase):
         neb.run()
 
 
+class TestNEBCPP(unittest.TestCase):
+    def setUp(self):
+        from pele.transition_states import NEB, NEB_CPP, InterpolatedPath
+        self.pot = LJ()
+        path = [x for x in InterpolatedPath(_x1, _x2, 10)]
+        self.neb = NEB(path, self.pot, k=50.)
+        self.neb_cpp = NEB_CPP(path, self.pot, k=50.)
+
+    def test_gradient_same_as_python(self):
+        x = self.neb.active.reshape(-1).copy()
+        e, grad = self.neb.getEnergyGradient(x)
+        ecpp, gradcpp = self.neb_cpp.getEnergyGradient(x)
+        self.assertAlmostEqual(e, ecpp, 5)
+        self.assertLess(np.max(np.abs(grad - gradcpp)), 1e-5)
+        self.assertTrue(np.allclose(self.neb.energies, self.neb_cpp.energies))
+
+    def test_optimize(self):
+        res = self.neb_cpp.optimize(nsteps=100, tol=1e-2, maxErise=100.)
+        self.assertEqual(res.path.shape, self.neb.coords.shape)
+        self.assertLess(np.max(res.energy), np.max(self.neb.energies))
+
+    def test_driver(self):
+        np.random.seed(0)
+        neb = NEBDriver(self.pot, _x1, _x2, use_cpp=True)
+        neb = neb.run()
+        neb.MakeAllMaximaClimbing()
+        self.assertGreater(sum(neb.isclimbing), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -42,6 +42,13 @@ Histogram
 =========
 .. automodule:: pele.utils.histogram
 
+Progress monitoring
+===================
+.. autosummary::
+    :toctree: generated/
+
+    pele.utils.progress.ProgressChannel
+
 .xyz files
 ===========
 .. automodule:: pele.utils.xyz
@@ -5,9 +5,9 @@ from collections import deque
 import numpy as np
 import networkx as nx
 
-from pele.landscape import database2graph
+from pele.landscape import database2graph, ArrayUnionFind, spanning_forest_edges
 
-__all__ = ["DisconnectivityGraph"]
+__all__ = ["DisconnectivityGraph", "BarrierTree"]
 
 
 class TreeLeastCommonAncestor(object):
@@ -100,53 +100,46 @@ class Tree(object):
 
     def number_of_leaves(self):
         """return the number of leaves that are descendants of this Tree"""
-        if len(self.subtrees) == 0:
-            nleaves = 1
-        else:
-            nleaves = 0
-            for tree in self.subtrees:
-                nleaves += tree.number_of_leaves()
+        nleaves = 0
+        for _ in self.leaf_iterator():
+            nleaves += 1
         return nleaves
 
     def get_leaves(self):
         """return a list of the leaves that are descendants of this Tree"""
-        if self.is_leaf():
-            leaves = [self]
-        else:
-            leaves = []
-            for tree in self.subtrees:
-                leaves += tree.get_leaves()
-        return leaves
+        return list(self.leaf_iterator())
 
     def leaf_iterator(self):
         """iterate through the leaves that are descendants of this Tree"""
-        if self.is_leaf():
-            yield self
-        else:
-            for tree in self.subtrees:
-                for leaf in tree.leaf_iterator():
-                    yield leaf
+        for tree in self.get_all_trees():
+            if tree.is_leaf():
+                yield tree
 
     def get_all_trees(self):
-        """iterator over all subtrees, including self"""
-        yield self
-        for branch in self.get_branches():
-            for subtree in branch.get_all_trees():
-                yield subtree
+        """iterator over all subtrees, including self
+        
+        The trees are returned in pre-order.  The tree is walked with an explicit
+        stack so deep trees don't hit the recursion limit.
+        """
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            yield tree
+            stack.extend(reversed(tree.subtrees))
 
     def number_of_subtrees(self):
         """return the number total number of subtrees, including this one"""
-        ntot = 1
-        for branch in self.get_branches():
-            ntot += branch.number_of_subtrees()
+        ntot = 0
+        for _ in self.get_all_trees():
+            ntot += 1
         return ntot
 
     def get_ancestors(self):
         """iterate over ancestors excluding self"""
-        if self.parent is not None:
-            yield self.parent
-            for ancestor in self.parent.get_ancestors():
-                yield ancestor
+        tree = self.parent
+        while tree is not None:
+            yield tree
+            tree = tree.parent
 
 
 class DGTree(Tree):
@@ -169,7 +162,10 @@ class DGTree(Tree):
         elif key in self.data:
             return self.data[key]
         else:
-            m = self.get_branches()[0].get_one_minimum()
+            tree = self.get_branches()[0]
+            while not tree.is_leaf() and key not in tree.data:
+                tree = tree.get_branches()[0]
+            m = tree.get_one_minimum()
             self.data[key] = m
             return m
 
@@ -183,6 +179,154 @@ class DGTree(Tree):
         return True
 
 
+class FlatTree(object):
+    """an array encoding of a Tree
+    
+    The nodes of the tree are numbered in pre-order (the root is node 0) and the
+    structure is stored in index arrays, so quantities like the number of leaves
+    below each node or the x position of each node are computed with a few
+    vectorized numpy operations per level of the tree rather than with
+    recursive calls on the Tree objects.
+    
+    Parameters
+    ----------
+    tree : Tree
+        the root of the tree
+    
+    Attributes
+    ----------
+    trees : list
+        the Tree object for each node
+    parent : array of ints
+        the index of the parent of each node.  -1 for the root
+    depth : array of ints
+        the number of ancestors of each node
+    is_leaf : array of bools
+    nleaves : array of ints
+        the number of leaves below each node, computed in post-order
+    x : array
+        the x position of each node.  This is set by layout()
+    """
+    def __init__(self, tree):
+        trees = []
+        parent = []
+        depth = []
+        stack = [(tree, -1, 0)]
+        while stack:
+            t, p, d = stack.pop()
+            i = len(trees)
+            trees.append(t)
+            parent.append(p)
+            depth.append(d)
+            stack.extend((sub, i, d + 1) for sub in reversed(t.subtrees))
+
+        self.trees = trees
+        self.parent = np.array(parent, dtype=int)
+        self.depth = np.array(depth, dtype=int)
+        nchildren = np.bincount(self.parent[1:], minlength=len(trees))
+        self.is_leaf = nchildren == 0
+
+        # group the nodes by depth.  The nodes at one depth are processed together
+        order = np.argsort(self.depth, kind="mergesort")
+        counts = np.bincount(self.depth)
+        self._levels = np.split(order, np.cumsum(counts)[:-1])
+
+        self.nleaves = self.accumulate(self.is_leaf.astype(int), np.add)
+        self.x = None
+
+    def number_of_nodes(self):
+        return len(self.trees)
+
+    def leaves(self):
+        """return the indices of the leaves"""
+        return np.where(self.is_leaf)[0]
+
+    def children(self, i):
+        """return the indices of the children of node i"""
+        return np.where(self.parent == i)[0]
+
+    def accumulate(self, values, ufunc):
+        """reduce values over each subtree
+        
+        Parameters
+        ----------
+        values : array
+            the value of each node.  This is modified in place
+        ufunc : numpy ufunc
+            e.g. np.add or np.minimum.  The value of each node is combined
+            with the values of its children using ufunc.at
+        
+        Returns
+        -------
+        values : array
+            the reduced value over the subtree of each node
+        """
+        # deepest level first, so the children are finished before their parents
+        for nodes in reversed(self._levels[1:]):
+            ufunc.at(values, self.parent[nodes], values[nodes])
+        return values
+
+    def sibling_positions(self, key, alternate=True):
+        """return the position of each node amongst its siblings
+        
+        Parameters
+        ----------
+        key : array
+            the siblings are sorted by key.  Ties keep the order of the Tree
+        alternate : bool
+            if False the siblings are placed in sorted order from left to right.
+            If True the lowest is placed in the center and the rest are placed
+            alternately to its left and right
+        """
+        n = self.number_of_nodes()
+        order = np.lexsort((np.arange(n), key, self.parent))
+        parent = self.parent[order]
+        # the first entry of each group of siblings
+        is_first = np.ones(n, dtype=bool)
+        is_first[1:] = parent[1:] != parent[:-1]
+        first = np.where(is_first)[0]
+        group = np.cumsum(is_first) - 1
+        rank = np.arange(n) - first[group]
+        if alternate:
+            nsiblings = np.diff(np.append(first, n))[group]
+            half = nsiblings // 2
+            # the even ranks go right of center, the odd ranks left of center
+            rank = np.where(rank % 2 == 0, half + rank // 2, half - 1 - rank // 2)
+        pos = np.empty(n, dtype=int)
+        pos[order] = rank
+        return pos
+
+    def layout(self, positions, xmin=0., dx_per_leaf=1.):
+        """compute the x position of each node
+        
+        Each leaf takes up a space of width dx_per_leaf.  A node is placed in the
+        middle of the leaves below it.
+        
+        Parameters
+        ----------
+        positions : array of ints
+            the position of each node amongst its siblings, see sibling_positions()
+        """
+        n = self.number_of_nodes()
+        # the number of leaves to the left of each node amongst its siblings
+        order = np.lexsort((positions, self.parent))
+        nleaves = self.nleaves[order]
+        cumulative = np.cumsum(nleaves) - nleaves
+        parent = self.parent[order]
+        is_first = np.ones(n, dtype=bool)
+        is_first[1:] = parent[1:] != parent[:-1]
+        group = np.cumsum(is_first) - 1
+        before = np.empty(n, dtype=int)
+        before[order] = cumulative - cumulative[is_first][group]
+
+        # add up the leaves to the left of each ancestor, top down
+        start = before
+        for nodes in self._levels[1:]:
+            start[nodes] += start[self.parent[nodes]]
+        self.x = xmin + dx_per_leaf * (start + self.nleaves / 2.)
+        return self.x
+
+
 class UnionFind(nx.utils.UnionFind):
     def groups_iter(self):
         return (c for c, c1 in self.parents.iteritems() if c == c1)
@@ -335,6 +479,315 @@ class _MakeTree(object):
         return newtrees
 
 
+class BarrierTree(object):
+    """a merge tree of the minima which can be updated as transition states are added
+
+    Each leaf of the tree is a minimum and each internal node is a
+    transition state which joins two groups of minima which are not connected
+    by lower transition states.  The internal nodes are therefore the edges of
+    the minimum spanning forest of the transition state graph (with the
+    transition state energies as edge weights), and the energy of the lowest
+    common ancestor of two minima is the lowest barrier between them.
+
+    When a transition state is added the two chains of ancestors of its
+    minima are merged in order of energy (a zipper merge), and the
+    highest transition state on the newly formed cycle is removed from the
+    tree.  This costs time proportional to the depth of the tree, so the tree
+    does not need to be rebuilt when the database grows.  Large batches of
+    transition states are added with Kruskal's algorithm instead.
+
+    Parameters
+    ----------
+    get_energy : callable, optional
+        a function which returns the energy of a transition state, see
+        _MakeTree
+
+    Examples
+    --------
+    Keep the disconnectivity graph of a growing database up to date::
+
+        >>> btree = BarrierTree.from_database(database)
+        >>> # ... more transition states are found
+        >>> btree.update_from_database(database)
+        >>> dg = DisconnectivityGraph(btree.to_graph())
+        >>> dg.calculate()
+
+    Notes
+    -----
+    The graph returned by to_graph contains only the transition states of the
+    spanning forest.  The connectivity at every energy is the same as for the
+    full transition state graph, so the disconnectivity graph is the same,
+    except that by default the energy levels end at the highest transition state
+    in the spanning forest.
+
+    If minima or transition states are removed from the database (e.g. when
+    minima are merged) the tree should be rebuilt.
+    """
+    def __init__(self, get_energy=None):
+        self._get_energy = get_energy
+        self.minima = []
+        self.minimum_to_index = dict()
+        # lists describing the nodes of the tree.  The nodes of the
+        # transition states store the transition state, the leaves store None
+        self._parent = []
+        self._energy = []
+        self._nchildren = []
+        self._ts = []
+        self._free = []
+        self._last_ts_id = -1
+        self._last_minimum_id = -1
+
+    @classmethod
+    def from_transition_states(cls, minima, transition_states, get_energy=None):
+        """build the tree from lists of minima and transition states"""
+        btree = cls(get_energy=get_energy)
+        btree._reset(minima)
+        btree._kruskal(transition_states)
+        return btree
+
+    @classmethod
+    def from_database(cls, database, get_energy=None):
+        """build the tree from all the minima and transition states in the database"""
+        btree = cls(get_energy=get_energy)
+        btree.update_from_database(database)
+        return btree
+
+    def get_energy(self, ts):
+        """return the energy of the transition state"""
+        if self._get_energy is None:
+            return ts.energy
+        else:
+            return self._get_energy(ts)
+
+    def number_of_minima(self):
+        return len(self.minima)
+
+    def number_of_transition_states(self):
+        """return the number of transition states in the tree (the spanning forest)"""
+        return len(self._parent) - len(self.minima) - len(self._free)
+
+    def add_minimum(self, m):
+        """add a minimum to the tree, return the index of its node"""
+        try:
+            return self.minimum_to_index[m]
+        except KeyError:
+            pass
+        i = self._new_node(None, None)
+        self.minima.append(m)
+        self.minimum_to_index[m] = i
+        return i
+
+    def _reset(self, minima):
+        self.minima = []
+        self.minimum_to_index = dict()
+        self._parent = []
+        self._energy = []
+        self._nchildren = []
+        self._ts = []
+        self._free = []
+        for m in minima:
+            self.add_minimum(m)
+
+    def _new_node(self, ts, energy):
+        if self._free:
+            k = self._free.pop()
+            self._parent[k] = -1
+            self._energy[k] = energy
+            self._nchildren[k] = 0
+            self._ts[k] = ts
+        else:
+            k = len(self._parent)
+            self._parent.append(-1)
+            self._energy.append(energy)
+            self._nchildren.append(0)
+            self._ts.append(ts)
+        return k
+
+    def _set_parent(self, child, parent):
+        old = self._parent[child]
+        if old >= 0:
+            self._nchildren[old] -= 1
+        self._parent[child] = parent
+        if parent >= 0:
+            self._nchildren[parent] += 1
+
+    def _component_below(self, node, energy):
+        """return the highest ancestor of node with energy lower than energy"""
+        parent = self._parent
+        E = self._energy
+        p = parent[node]
+        while p >= 0 and E[p] < energy:
+            node = p
+            p = parent[node]
+        return node
+
+    def _insert(self, ts, energy):
+        """add a transition state to the tree with a zipper merge"""
+        x = self._component_below(self.add_minimum(ts.minimum1), energy)
+        y = self._component_below(self.add_minimum(ts.minimum2), energy)
+        if x == y:
+            # the minima are already connected by lower transition states
+            return
+        # the ancestors of x and y up to (not including) the lowest common
+        # ancestor, which is -1 if they are not connected at all
+        xpath = self._root_path(x)[1:]
+        xset = set(xpath)
+        ypath = []
+        common = self._parent[y]
+        while common >= 0 and common not in xset:
+            ypath.append(common)
+            common = self._parent[common]
+        if common >= 0:
+            xpath = xpath[:xpath.index(common)]
+        # merge the two chains of ancestors in order of energy
+        E = self._energy
+        chain = sorted(xpath + ypath, key=lambda k: E[k])
+        z = self._new_node(ts, energy)
+        self._set_parent(x, z)
+        self._set_parent(y, z)
+        current = z
+        for k in chain:
+            self._set_parent(current, k)
+            current = k
+        self._set_parent(current, common)
+        if common >= 0 and self._nchildren[common] == 1:
+            # the lowest common ancestor is the highest transition state on
+            # the cycle formed by the new transition state.  Remove it
+            self._set_parent(current, self._parent[common])
+            self._set_parent(common, -1)
+            self._ts[common] = None
+            self._free.append(common)
+
+    def _kruskal(self, tslist):
+        """add the transition states to an empty tree with Kruskal's algorithm
+
+        The edges of the minimum spanning forest are found with
+        spanning_forest_edges and then joined in order of energy.
+        """
+        tslist = [ts for ts in tslist if ts.minimum1 != ts.minimum2]
+        if not tslist:
+            return
+        for ts in tslist:
+            self.add_minimum(ts.minimum1)
+            self.add_minimum(ts.minimum2)
+        energies = np.array([self.get_energy(ts) for ts in tslist])
+        u = np.array([self.minimum_to_index[ts.minimum1] for ts in tslist])
+        v = np.array([self.minimum_to_index[ts.minimum2] for ts in tslist])
+        forest = spanning_forest_edges(u, v, energies, len(self._parent))
+        forest = forest[np.argsort(energies[forest], kind="mergesort")]
+        # a union find over the node indices with the top node of each group
+        uf = ArrayUnionFind(len(self._parent))
+        top = dict()
+        for k in forest:
+            i, j = int(u[k]), int(v[k])
+            ri, rj = int(uf.find(i)), int(uf.find(j))
+            z = self._new_node(tslist[k], float(energies[k]))
+            self._set_parent(top.pop(ri, i), z)
+            self._set_parent(top.pop(rj, j), z)
+            uf.union(ri, rj)
+            top[int(uf.find(ri))] = z
+
+    def add_transition_states(self, transition_states):
+        """add transition states to the tree
+
+        If the number of transition states is large compared to the size of the
+        tree the tree is rebuilt, otherwise they are inserted one at a time.
+        """
+        transition_states = list(transition_states)
+        if len(transition_states) > max(100, len(self.minima) // 10):
+            tslist = self.transition_states() + transition_states
+            minima = list(self.minima)
+            self._reset(minima)
+            self._kruskal(tslist)
+        else:
+            for ts in transition_states:
+                self.add_transition_state(ts)
+
+    def add_transition_state(self, ts):
+        """add a single transition state to the tree"""
+        if ts.minimum1 == ts.minimum2:
+            return
+        self._insert(ts, self.get_energy(ts))
+
+    def update_from_database(self, database):
+        """add the minima and transition states that were added to database since the last update
+
+        Returns
+        -------
+        nminima, nts : the number of new minima and transition states
+        """
+        from pele.storage.database import Minimum, TransitionState
+        minima = database.session.query(Minimum).filter(Minimum._id > self._last_minimum_id)\
+                                 .order_by(Minimum._id).all()
+        tslist = database.session.query(TransitionState)\
+                             .filter(TransitionState._id > self._last_ts_id)\
+                             .order_by(TransitionState._id).all()
+        for m in minima:
+            self.add_minimum(m)
+        if minima:
+            self._last_minimum_id = minima[-1]._id
+        self.add_transition_states(tslist)
+        if tslist:
+            self._last_ts_id = tslist[-1]._id
+        return len(minima), len(tslist)
+
+    def transition_states(self):
+        """return the transition states in the tree, i.e. the edges of the minimum spanning forest"""
+        return [ts for ts in self._ts if ts is not None]
+
+    def _root_path(self, node):
+        path = [node]
+        while self._parent[node] >= 0:
+            node = self._parent[node]
+            path.append(node)
+        return path
+
+    def barrier(self, m1, m2):
+        """return the energy of the lowest transition state which connects m1 and m2
+
+        This is the energy of the highest transition state on the minimum
+        energy path between m1 and m2.  Returns None if they are not connected
+        """
+        if m1 == m2:
+            return None
+        ancestors = set(self._root_path(self.minimum_to_index[m1]))
+        for node in self._root_path(self.minimum_to_index[m2]):
+            if node in ancestors:
+                return self._energy[node]
+        return None
+
+    def connected(self, m1, m2, energy):
+        """return True if m1 and m2 are connected by transition states with energy below energy"""
+        i, j = self.minimum_to_index[m1], self.minimum_to_index[m2]
+        return self._component_below(i, energy) == self._component_below(j, energy)
+
+    def to_graph(self, Emax=None):
+        """return the graph of the minima and the spanning forest transition states
+
+        The graph can be passed to DisconnectivityGraph.  As for
+        database2graph, Emax is the maximum energy of the minima and transition
+        states to include.
+        """
+        graph = nx.Graph()
+        if Emax is None:
+            graph.add_nodes_from(self.minima)
+        else:
+            graph.add_nodes_from(m for m in self.minima if m.energy <= Emax)
+        for ts in self.transition_states():
+            if Emax is None or self.get_energy(ts) <= Emax:
+                graph.add_edge(ts.minimum1, ts.minimum2, ts=ts)
+        return graph
+
+    def make_tree(self, energy_levels):
+        """return the disconnectivity tree (a DGTree) at the given energy levels
+
+        See _MakeTree.
+        """
+        maketree = _MakeTree(self.minima, self.transition_states(), energy_levels,
+                             get_energy=self._get_energy)
+        return maketree.make_tree()
+
+
 class ColorDGraphByGroups(object):
     """color the graph based on specified grouping of minima
 
@@ -446,7 +899,8 @@ class ColorDGraphByGroups(object):
 
     def run(self):
         """main loop for the algorithm"""
-        for tree in self.tree_graph.get_all_trees():
+        # go from the leaves up so the colors of the subtrees are already known
+        for tree in reversed(list(self.tree_graph.get_all_trees())):
             colors = self.tree_get_colors(tree)
             if colors is not None:
                 tree.data["colour"] = self.colors_to_color(colors)
@@ -529,7 +983,8 @@ class ColorDGraphByValue(object):
 
     def run(self):
         """main loop for the algorithm"""
-        for tree in self.tree_graph.get_all_trees():
+        # go from the leaves up so the values of the subtrees are already known
+        for tree in reversed(list(self.tree_graph.get_all_trees())):
             value = self.tree_get_value(tree)
             if value is not None:
                 tree.data["colour"] = self.value_to_color(value)
@@ -550,6 +1005,13 @@ class DisconnectivityGraph(object):
         >>> from pele.utils.disconnectivity_graph import database2graph
         >>> graph = database2graph(database)
         >>> dg = DisconnectivityGraph(graph)
+        
+        For databases which are too large for database2graph, 
+        CompactTSGraph(database).to_graph() returns the graph of the minimum
+        spanning tree.  At each energy level it gives the same barriers and
+        the same sub-basins, but the default levels differ because the
+        higher energy transition states are not in the graph.  Pass the
+        energy of the highest transition state as Emax to get the same levels.
          
     nlevels : int
         how many levels at which to bin the transition states
@@ -695,17 +1157,13 @@ class DisconnectivityGraph(object):
     # These functions determine how to layout the tree on the x axis
     # ################################################################
 
-    def _recursive_layout_x_axis(self, tree, xmin, dx_per_min):
-        #        nbranches = tree.number_of_branches()
-        nminima = tree.number_of_leaves()
-        subtrees = tree.get_branches()
-        subtrees = self._order_trees(subtrees)
-        tree.data["x"] = xmin + dx_per_min * nminima / 2.
-        x = xmin
-        for subtree in subtrees:
-            self._recursive_layout_x_axis(subtree, x, dx_per_min)
-            nminima_sub = subtree.number_of_leaves()
-            x += dx_per_min * nminima_sub
+    def _get_flat_tree(self, tree):
+        """return the array encoding of tree"""
+        flat = getattr(self, "flat_tree", None)
+        if flat is None or flat.trees[0] is not tree:
+            flat = FlatTree(tree)
+            self.flat_tree = flat
+        return flat
 
     def _layout_x_axis(self, tree):
         """determining the x position of the branches and leaves
@@ -714,195 +1172,172 @@ class DisconnectivityGraph(object):
         """
         xmin = 4.0
         dx_per_min = 1.
-        self._recursive_layout_x_axis(tree, xmin, dx_per_min)
-
-    def _tree_get_minimum_energy(self, tree, emin=1e100):
+        flat = self._get_flat_tree(tree)
+        positions = self._order_trees(flat)
+        xpos = flat.layout(positions, xmin, dx_per_min)
+        for t, x in izip(flat.trees, xpos.tolist()):
+            t.data["x"] = x
+            t.data.pop("_x_updated", None)
+
+    def _leaf_values(self, flat, get_value):
+        """return an array with get_value(minimum) for the leaves and inf for the other nodes"""
+        values = np.empty(flat.number_of_nodes())
+        values.fill(np.inf)
+        leaves = flat.leaves()
+        values[leaves] = [get_value(flat.trees[i].data["minimum"]) for i in leaves]
+        return values
+
+    def _order_trees(self, flat):
         """
-        return the minimum energy of all the leaves in the tree
-        """
-        return min([leaf.data["minimum"].energy for leaf in tree.get_leaves()])
-
-    def _order_trees(self, trees):
-        """
-        order a list of trees for printing
+        order the subtrees of every node for printing
         
         This is the highest level function for ordering trees.  This, 
         and functions called by this, will account for all the user options 
         like center_gmin and order by energy
+        
+        Returns
+        -------
+        positions : array
+            the position of each node amongst its siblings
         """
         if self.get_value is not None:
-            return self._order_trees_by_value(trees)
+            return self._order_trees_by_value(flat)
         elif self.order_by_energy:
-            return self._order_trees_by_minimum_energy(trees)
+            return self._order_trees_by_minimum_energy(flat)
         else:
-            return self._order_trees_by_most_leaves(trees)
+            return self._order_trees_by_most_leaves(flat)
 
-    def _order_trees_by_value(self, trees):
+    def _order_trees_by_value(self, flat):
         """order the trees by a value. smaller numbers to the left
         
         Each tree will take the smallest value of all its associated minima.
         """
+        values = flat.accumulate(self._leaf_values(flat, self.get_value), np.minimum)
+        return flat.sibling_positions(values, alternate=False)
 
-        def get_min_val(tree):
-            return min([self.get_value(leaf.data["minimum"])
-                        for leaf in tree.leaf_iterator()])
-
-        trees.sort(key=get_min_val)
-        return trees
-
-    def _order_trees_final(self, tree_value_list):
+    def _ensure_gmin_is_center(self, flat, values):
+        """ensure that the tree containing the global minimum has the lowest value
+        amongst its siblings
         """
-        Parameters
-        ----------
-        tree_value_list :
-            a list of (value, tree) pairs where value is the object
-            by which to sort the trees
+        if self.gmin0 is None:
+            return values
+        contains_gmin = np.zeros(flat.number_of_nodes(), dtype=bool)
+        leaves = flat.leaves()
+        contains_gmin[leaves] = [flat.trees[i].data["minimum"] == self.gmin0 for i in leaves]
+        contains_gmin = flat.accumulate(contains_gmin, np.logical_or)
+        # the root has no siblings
+        contains_gmin[0] = False
+        sibling_min = np.empty(flat.number_of_nodes())
+        sibling_min.fill(np.inf)
+        np.minimum.at(sibling_min, flat.parent[1:], values[1:])
+        # replace the value with a lower one for the trees containing min0
+        values[contains_gmin] = sibling_min[flat.parent[contains_gmin]] - 1
+        return values
+
+    def _order_trees_by_most_leaves(self, flat):
+        """order the trees by the number of leaves
         
-        Returns
-        -------
-        treelist :
-            a list of trees ordered with the lowest in the center
-            and the others placed successively on the left and right
-        """
-        mylist = sorted(tree_value_list)
-        neworder = deque()
-        for i in range(len(mylist)):
-            if i % 2 == 0:
-                neworder.append(mylist[i][1])
-            else:
-                neworder.appendleft(mylist[i][1])
-        return list(neworder)
-
-    def _ensure_gmin_is_center(self, tree_value_list):
-        """ensure that the tree containing the global minimum has the lowest value
+        The trees with the fewest leaves go in the center, with the remaining
+        being placed alternating on the left and on the right.
         """
-        if self.gmin0 is None: return
-        min0index = None
-        for i in range(len(tree_value_list)):
-            v, tree = tree_value_list[i]
-            if self.gmin0 in [leaf.data["minimum"] for leaf in tree.get_leaves()]:
-                min0index = i
-                break
-        if min0index is not None:
-            minvalue = min([v for v, tree in tree_value_list])
-            # replace the value with a lower one
-            # for the tree containing min0
-            newvalue = minvalue - 1  # this won't work for non number values
-            tree_value_list[i] = (newvalue, tree_value_list[i][1])
-        return tree_value_list
-
-
-    def _order_trees_by_most_leaves(self, trees):
-        """order list of trees by the number of leaves"""
-        #        if self.center_gmin:
-        #            return self._order_trees_by_most_leaves_and_global_min(trees)
-        mylist = [(tree.number_of_leaves(), tree) for tree in trees]
+        values = flat.nleaves.astype(float)
         if self.center_gmin:
-            mylist = self._ensure_gmin_is_center(mylist)
-        return self._order_trees_final(mylist)
+            values = self._ensure_gmin_is_center(flat, values)
+        return flat.sibling_positions(values, alternate=True)
 
-
-    def _order_trees_by_minimum_energy(self, trees):
+    def _order_trees_by_minimum_energy(self, flat):
         """
         order trees with by the lowest energy minimum.  the global minimum
         goes in the center, with the remaining being placed alternating on the
         left and on the right.
         """
-        mylist = [(self._tree_get_minimum_energy(tree), tree) for tree in trees]
-        return self._order_trees_final(mylist)
+        energies = flat.accumulate(self._leaf_values(flat, lambda m: m.energy), np.minimum)
+        return flat.sibling_positions(energies, alternate=True)
 
 
     #######################################################################
     # functions which return the line segments that make up the visual graph
     #######################################################################
 
-    def _get_line_segment_single(self, line_segments, line_colours, tree, eoffset):
-        color_default = (0., 0., 0.)
-        if tree.parent is None:
-            # this is a top level tree.  Add a short decorative vertical line
-            if "children_not_connected" in tree.data:
-                # this tree is simply a container, add the line to the subtrees
-                treelist = tree.subtrees
-            else:
-                treelist = [tree]
-
-            dy = self.energy_levels[-1] - self.energy_levels[-2]
-            for t in treelist:
-                x = t.data["x"]
-                y = t.data["ethresh"]
-                line_segments.append(([x, x], [y, y + dy]))
-                line_colours.append(color_default)
-        else:
-            # add two line segments.  A vertical one to yhigh
-            #  ([x, x], [y, yhigh])
-            # and an angled one connecting yhigh with the parent
-            #  ([x, xparent], [yhigh, yparent])
-            xparent = tree.parent.data['x']
-            xself = tree.data['x']
-            yparent = tree.parent.data["ethresh"]
-
-            if tree.is_leaf():
-                yself = self._getEnergy(tree.data["minimum"])
-            else:
-                yself = tree.data["ethresh"]
-
-            # determine yhigh from eoffset
-            yhigh = yparent - eoffset
-            if yhigh <= yself:
-                draw_vertical = False
-                yhigh = yself
-            else:
-                draw_vertical = True
-
-            # determine the line color
-            try:
-                color = tree.data['colour']
-            except KeyError:
-                color = color_default
-
-            # draw vertical line
-            if tree.is_leaf() and not draw_vertical:
-                # stop diagonal line earlier to avoid artifacts
-                # change the x position so that the angle of the line
-                # doesn't change
-                if not "_x_updated" in tree.data:
-                    dxdy = (xself - xparent) / eoffset
-                    xself = dxdy * (yparent - yself) + xparent
-                    tree.data['x'] = xself
-                    tree.data["_x_updated"] = True
-            else:
-                # add vertical line segment
-                line_segments.append(([xself, xself], [yself, yhigh]))
-                line_colours.append(color)
-            #                print "coloring vertical line", tree
-
-            # draw the diagonal line
-            if not tree.parent.data.has_key("children_not_connected"):
-                line_segments.append(([xself, xparent], [yhigh, yparent]))
-                line_colours.append(color)
-
-    def _get_line_segment_recursive(self, line_segments, line_colours, tree, eoffset):
-        """
-        add the line segment connecting this tree to its parent
-        """
-        self._get_line_segment_single(line_segments, line_colours, tree, eoffset)
-        for subtree in tree.get_branches():
-            self._get_line_segment_recursive(line_segments, line_colours, subtree, eoffset)
-
-
     def _get_line_segments(self, tree, eoffset=-1.):
         """
         get all the line segments for drawing the connection between 
         each minimum to it's parent node.
         
+        Each node except the root gets two line segments.  A vertical one to yhigh
+        ((x, y), (x, yhigh)) and an angled one connecting yhigh with the parent
+        ((x, yhigh), (xparent, yparent)).  The segments for all nodes are
+        computed at once from the arrays of the FlatTree.
+        
         Returns
         -------
-        line_segments : list
-            list of line segments.  each line segment has the form ((x1, x2), (y1, y2))
+        line_segments : array, shape (nsegments, 2, 2)
+            array of line segments.  each line segment has the form ((x1, y1), (x2, y2)),
+            which can be passed directly to matplotlib's LineCollection
+        line_colours : list
+            the colour of each line segment
         """
-        line_segments = []
-        line_colours = []
-        self._get_line_segment_recursive(line_segments, line_colours, tree, eoffset)
+        color_default = (0., 0., 0.)
+        flat = self._get_flat_tree(tree)
+        trees = flat.trees
+        xpos = np.array([t.data["x"] for t in trees])
+        ypos = np.array([self._getEnergy(t.data["minimum"]) if leaf else t.data["ethresh"]
+                         for t, leaf in izip(trees, flat.is_leaf)])
+        colours = [t.data.get("colour", color_default) for t in trees]
+        children_not_connected = np.array(["children_not_connected" in t.data for t in trees])
+        x_updated = np.array(["_x_updated" in t.data for t in trees])
+
+        # this is a top level tree.  Add a short decorative vertical line
+        if children_not_connected[0]:
+            # this tree is simply a container, add the line to the subtrees
+            top = flat.children(0)
+        else:
+            top = np.array([0])
+        dy = self.energy_levels[-1] - self.energy_levels[-2]
+        top_segments = np.empty([len(top), 2, 2])
+        top_segments[:, :, 0] = xpos[top, np.newaxis]
+        top_segments[:, 0, 1] = ypos[top]
+        top_segments[:, 1, 1] = ypos[top] + dy
+
+        nodes = np.arange(1, flat.number_of_nodes())
+        parents = flat.parent[nodes]
+        xself = xpos[nodes]
+        yself = ypos[nodes]
+        xparent = xpos[parents]
+        yparent = ypos[parents]
+
+        # determine yhigh from eoffset
+        yhigh = yparent - eoffset
+        draw_vertical = yhigh > yself
+        yhigh = np.where(draw_vertical, yhigh, yself)
+
+        # for leaves without a vertical line stop the diagonal line earlier to
+        # avoid artifacts.  Change the x position so that the angle of the line
+        # doesn't change
+        no_vertical = flat.is_leaf[nodes] & ~draw_vertical
+        update = no_vertical & ~x_updated[nodes]
+        dxdy = (xself[update] - xparent[update]) / eoffset
+        xself[update] = dxdy * (yparent[update] - yself[update]) + xparent[update]
+        for i, x in izip(nodes[update], xself[update].tolist()):
+            trees[i].data["x"] = x
+            trees[i].data["_x_updated"] = True
+
+        vertical = np.empty([len(nodes), 2, 2])
+        vertical[:, :, 0] = xself[:, np.newaxis]
+        vertical[:, 0, 1] = yself
+        vertical[:, 1, 1] = yhigh
+        diagonal = np.empty([len(nodes), 2, 2])
+        diagonal[:, 0, 0] = xself
+        diagonal[:, 0, 1] = yhigh
+        diagonal[:, 1, 0] = xparent
+        diagonal[:, 1, 1] = yparent
+
+        has_vertical = ~no_vertical
+        has_diagonal = ~children_not_connected[parents]
+        line_segments = np.concatenate([top_segments, vertical[has_vertical], diagonal[has_diagonal]])
+        line_colours = ([color_default] * len(top)
+                        + [colours[i] for i in nodes[has_vertical]]
+                        + [colours[i] for i in nodes[has_diagonal]])
         assert len(line_segments) == len(line_colours)
         return line_segments, line_colours
 
@@ -1187,7 +1622,7 @@ class DisconnectivityGraph(object):
 
         # draw the line segments 
         # use LineCollection because it's much faster than drawing the lines individually 
-        linecollection = LineCollection([[(x[0], y[0]), (x[1], y[1])] for x, y in self.line_segments])
+        linecollection = LineCollection(self.line_segments)
         linecollection.set_linewidth(linewidth)
         linecollection.set_color(self.line_colours)
         ax.add_collection(linecollection)
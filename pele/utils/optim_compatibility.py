@@ -2,7 +2,12 @@
 tools for reading and writing OPTIM input and output files
 """
 
+import os
+from itertools import islice, izip
+
 import numpy as np
+import sqlalchemy
+
 from pele.storage import Minimum, TransitionState
 
 _id_count = 0
@@ -36,7 +41,7 @@ _id_count = 0
 #        assert self.id() is not None
 #        return self.id()
 
-def read_points_min_ts(fname, ndof=None, endianness="="):
+def read_points_min_ts(fname, ndof=None, endianness="=", mmap=False):
     """
     read coords from a points.min or a points.ts file
     
@@ -70,10 +75,24 @@ def read_points_min_ts(fname, ndof=None, endianness="="):
         for testing to make sure the number of floats read is a multiple of ndof
     endianness : str
         define the endianness of the data. can be "=", "<", ">" 
+    mmap : bool
+        if True the file is memory mapped rather than read into memory.  The
+        coordinates are then only read from disk when they are accessed.
      
     """
-    with open(fname, "rb") as fin:
-        coords = np.fromfile(fin, dtype=np.dtype(endianness + "d"))
+    dtype = np.dtype(endianness + "d")
+    if mmap:
+        # open the file first so that a missing file raises IOError
+        with open(fname, "rb") as fin:
+            size = os.fstat(fin.fileno()).st_size
+        if size == 0:
+            # an empty file cannot be memory mapped
+            coords = np.zeros(0, dtype=dtype)
+        else:
+            coords = np.memmap(fname, dtype=dtype, mode="r")
+    else:
+        with open(fname, "rb") as fin:
+            coords = np.fromfile(fin, dtype=dtype)
     if ndof is not None:
         if len(coords) % ndof != 0:
             raise Exception("number of double precision variables read from %s (%s) is not divisible by ndof (%d)" %
@@ -82,6 +101,40 @@ def read_points_min_ts(fname, ndof=None, endianness="="):
     return coords.reshape(-1)
 
 
+def read_data_file(fname, ncol, chunk_size=100000):
+    """iterate over the first ncol columns of a min.data or ts.data file
+    
+    The file is read chunk_size lines at a time and each chunk is parsed with
+    a single call to numpy.
+    
+    Parameters
+    ----------
+    fname : str
+        the file to read
+    ncol : int
+        the number of columns to return
+    chunk_size : int
+        the number of lines to read at a time
+    
+    Returns
+    -------
+    an iterator of float arrays of shape (nlines, ncol)
+    """
+    with open(fname, "r") as fin:
+        while True:
+            lines = [line for line in islice(fin, chunk_size) if line.strip()]
+            if len(lines) == 0:
+                break
+            data = np.fromstring(" ".join(lines), sep=" ")
+            nwords = len(lines[0].split())
+            if data.size == nwords * len(lines) and nwords >= ncol:
+                data = data.reshape(len(lines), nwords)[:, :ncol]
+            else:
+                # the lines have different lengths or contain things numpy can't parse
+                data = np.array([line.split()[:ncol] for line in lines], dtype=float)
+            yield data
+
+
 class OptimDBConverter(object):
     """
     Converts old OPTIM to pele database
@@ -105,9 +158,19 @@ class OptimDBConverter(object):
     assert_coords : bool
         If this is True the conversion will abort if the coordinate conversion doesn't work.
         Set this to false if you only care about the minima and ts metadata.
+    trusted : bool
+        If True the minima and transition states are inserted directly into the
+        database in large transactions, without checking for duplicates.  If
+        False they are added with Database.addMinimum and
+        Database.addTransitionState, which is much slower.
+    chunk_size : int
+        the number of lines of min.data and ts.data to read and insert at a time
 
     Notes
     -----
+    The text files are parsed chunk_size lines at a time and the binary files
+    are memory mapped, so the whole database is never held in memory.
+
     the files were written with fortran code that looks something like this::
 
         NOPT = 3 * NATOMS
@@ -133,7 +196,7 @@ class OptimDBConverter(object):
 
     def __init__(self, database, ndof=None, mindata="min.data",
                  tsdata="ts.data", pointsmin="points.min", pointsts="points.ts",
-                 endianness="=", assert_coords=True):
+                 endianness="=", assert_coords=True, trusted=True, chunk_size=100000):
         self.db = database
         self.ndof = ndof
         self.mindata = mindata
@@ -142,10 +205,76 @@ class OptimDBConverter(object):
         self.pointsts = pointsts
         self.endianness = endianness
         self.no_coords_ok = not assert_coords
+        self.trusted = trusted
+        self.chunk_size = chunk_size
+        # the database id of the minimum on each line of min.data
+        self.minimum_ids = None
 
     def setAccuracy(self, accuracy=0.000001):
         self.db.accuracy = accuracy
 
+    def _next_id(self, cls):
+        """return the id that the next object added to the table will get"""
+        maxid = self.db.session.query(sqlalchemy.func.max(cls._id)).scalar()
+        return 1 if maxid is None else maxid + 1
+
+    def _get_coords(self, data, indx):
+        """return a copy of the coordinates of object indx"""
+        if data is None:
+            return np.zeros(1)
+        return np.array(data[indx, :])
+
+    def _bulk_insert(self, table, chunks):
+        """insert the rows from each chunk into table in a single transaction"""
+        self.db.session.commit()
+        connection = self.db.engine.connect()
+        transaction = connection.begin()
+        try:
+            for rows in chunks:
+                connection.execute(table.insert(), rows)
+            transaction.commit()
+        except:
+            transaction.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _minimum_chunks(self, first_id):
+        """iterate over chunks of rows to insert into the minima table"""
+        indx = 0
+        for data in read_data_file(self.mindata, 3, self.chunk_size):
+            # must add minima like this.  If you use db.addMinimum()
+            # some minima with similar energy might be assumed to be duplicates
+            rows = [dict(_id=first_id + indx + k, energy=e, invalid=False,
+                         coords=self._get_coords(self.pointsmin_data, indx + k),
+                         fvib=fvib, pgorder=int(pg))
+                    for k, (e, fvib, pg) in enumerate(data.tolist())]
+            indx += len(rows)
+            yield rows
+
+    def _transition_state_chunks(self):
+        """iterate over chunks of rows to insert into the transition state table"""
+        indx = 0
+        for data in read_data_file(self.tsdata, 5, self.chunk_size):
+            min1, min2 = self._minimum_ids_from_index(data[:, 3:5].astype(np.int64))
+            rows = [dict(energy=e, invalid=False,
+                         coords=self._get_coords(self.pointsts_data, indx + k),
+                         fvib=fvib, pgorder=int(pg),
+                         _minimum1_id=m1, _minimum2_id=m2)
+                    for k, (e, fvib, pg, m1, m2) in enumerate(izip(data[:, 0].tolist(), data[:, 1].tolist(),
+                                                                   data[:, 2].tolist(), min1, min2))]
+            indx += len(rows)
+            yield rows
+
+    def _minimum_ids_from_index(self, indices):
+        """convert the (fortran) indices of min.data to database ids"""
+        if self.minimum_ids is None:
+            # the minima were not read by this converter
+            ids = indices
+        else:
+            ids = self.minimum_ids[indices - 1]  # minus 1 for fortran indexing
+        return ids[:, 0].tolist(), ids[:, 1].tolist()
+
     def ReadMinDataFast(self):
         """read min.data file
         
@@ -154,41 +283,32 @@ class OptimDBConverter(object):
         minimum.invalid must be set to false manually here.
         """
         print "reading from", self.mindata
-        indx = 0
-        #        f_len = file_len(self.mindata)
-        minima_dicts = []
-        for line in open(self.mindata, 'r'):
-            sline = line.split()
-
-            # get the coordinates corresponding to this minimum
-            if self.pointsmin_data is None:
-                coords = np.zeros(1)
-            else:
-                coords = self.pointsmin_data[indx, :]
-
+        if not self.trusted:
+            return self._add_minima_checked()
 
-            # read data from the min.data line            
-            e, fvib = map(float, sline[:2])  # energy and vibrational free energy
-            pg = int(sline[2])  # point group order
+        first_id = self._next_id(Minimum)
+        self._bulk_insert(Minimum.__table__, self._minimum_chunks(first_id))
+        nminima = self._next_id(Minimum) - first_id
+        self.minimum_ids = np.arange(first_id, first_id + nminima)
 
-            # create the minimum object and attach the data
-            # must add minima like this.  If you use db.addMinimum()
-            # some minima with similar energy might be assumed to be duplicates
-            min_dict = dict(energy=e, coords=coords, invalid=False,
-                            fvib=fvib, pgorder=pg
-            )
-            minima_dicts.append(min_dict)
+        print "--->finished loading %s minima" % nminima
 
-            indx += 1
-        #            if indx % 50 == 0:
-        #                self.db.session.commit()
-
-        self.db.engine.execute(Minimum.__table__.insert(), minima_dicts)
-        self.db.session.commit()
+    def _add_minima_checked(self):
+        """read min.data and add the minima with Database.addMinimum"""
+        ids = []
+        indx = 0
+        for data in read_data_file(self.mindata, 3, self.chunk_size):
+            minima = [self.db.addMinimum(e, self._get_coords(self.pointsmin_data, indx + k),
+                                         commit=False, fvib=fvib, pgorder=int(pg))
+                      for k, (e, fvib, pg) in enumerate(data.tolist())]
+            indx += len(minima)
+            self.db.session.flush()
+            ids += [m.id() for m in minima]
+            self.db.session.commit()
+        self.minimum_ids = np.array(ids, dtype=np.int64)
 
         print "--->finished loading %s minima" % indx
 
-
     def ReadMindata(self):  # pragma: no cover
         print "reading from", self.mindata
         indx = 0
@@ -233,45 +353,28 @@ class OptimDBConverter(object):
 
         """
         print "reading from", self.tsdata
+        if not self.trusted:
+            return self._add_transition_states_checked()
 
-        indx = 0
-        ts_dicts = []
-        for line in open(self.tsdata, 'r'):
-            sline = line.split()
-
-            # get the coordinates corresponding to this minimum
-            if self.pointsts_data is None:
-                coords = np.zeros(1)
-            else:
-                coords = self.pointsts_data[indx, :]
-
-            # read data from the min.ts line            
-            e, fvib = map(float, sline[:2])  # get energy and fvib
-            pg = int(sline[2])  # point group order
-            m1indx, m2indx = map(int, sline[3:5])
-            #            m1indx -= 1
-            #            m2indx -= 1
-            #            min1 = self.index2min[m1indx - 1] # minus 1 for fortran indexing
-            #            min2 = self.index2min[m2indx - 1] # minus 1 for fortran indexing
+        first_id = self._next_id(TransitionState)
+        self._bulk_insert(TransitionState.__table__, self._transition_state_chunks())
 
-            # must add transition states like this.  If you use db.addtransitionState()
-            # some transition states might be assumed to be duplicates
-            tsdict = dict(energy=e, coords=coords, invalid=False,
-                          fvib=fvib, pgorder=pg,
-                          _minimum1_id=m1indx,
-                          _minimum2_id=m2indx
-            )
-            ts_dicts.append(tsdict)
+        print "--->finished loading %s transition states" % (self._next_id(TransitionState) - first_id)
 
-            indx += 1
-        #            if indx % 50 == 0:
-        #                self.db.session.commit()
-        self.db.engine.execute(TransitionState.__table__.insert(), ts_dicts)
-        self.db.session.commit()
+    def _add_transition_states_checked(self):
+        """read ts.data and add the transition states with Database.addTransitionState"""
+        indx = 0
+        for data in read_data_file(self.tsdata, 5, self.chunk_size):
+            min1, min2 = self._minimum_ids_from_index(data[:, 3:5].astype(np.int64))
+            for k, (e, fvib, pg) in enumerate(data[:, :3].tolist()):
+                self.db.addTransitionState(e, self._get_coords(self.pointsts_data, indx + k),
+                                           self.db.getMinimum(min1[k]), self.db.getMinimum(min2[k]),
+                                           commit=False, fvib=fvib, pgorder=int(pg))
+            indx += len(data)
+            self.db.session.commit()
 
         print "--->finished loading %s transition states" % indx
 
-
     def ReadTSdata(self):  # pragma: no cover
         print "reading from", self.tsdata
 
@@ -309,7 +412,7 @@ class OptimDBConverter(object):
 
     def read_points_min(self):
         print "reading from", self.pointsmin
-        coords = read_points_min_ts(self.pointsmin, self.ndof, endianness=self.endianness)
+        coords = read_points_min_ts(self.pointsmin, self.ndof, endianness=self.endianness, mmap=True)
         if coords.size == 0:
             raise Exception(self.pointsmin + " is empty")
         if self.ndof is None:
@@ -325,7 +428,7 @@ class OptimDBConverter(object):
 
     def read_points_ts(self):
         print "reading from", self.pointsts
-        coords = read_points_min_ts(self.pointsts, self.ndof, endianness=self.endianness)
+        coords = read_points_min_ts(self.pointsts, self.ndof, endianness=self.endianness, mmap=True)
         self.pointsts_data = coords.reshape([-1, self.ndof])
 
     def load_minima(self):
@@ -361,3 +464,125 @@ class OptimDBConverter(object):
         self.ReadMinDataFast()
         self.ReadTSdataFast()
 
+
+
+class OptimDBExporter(object):
+    """
+    Writes a pele database in the OPTIM / PATHSAMPLE format
+
+    Parameters
+    ----------
+    database : pele Database
+        the minima and transition states to write
+    mindata, tsdata, pointsmin, pointsts : str
+        the files to write to.  See OptimDBConverter for a description of the files.
+    endianness : str
+        define the endianness of the binary data. can be "=", "<", ">"
+    write_coords : bool
+        if False only min.data and ts.data are written
+    chunk_size : int
+        the number of minima or transition states to read from the database
+        and write at a time
+
+    Notes
+    -----
+    The minima are written in order of their database id, so the index of a
+    minimum in min.data will not be its database id if minima have been removed.
+    The moments of inertia are not stored in the database and are written as
+    zero.  Missing values of fvib and pgorder are written as 0 and 1.
+
+    See Also
+    --------
+    OptimDBConverter : read the files back into a database
+    """
+
+    min_fmt = "%.10f %.10f %d 0.0 0.0 0.0"
+    ts_fmt = "%.10f %.10f %d %d %d 0.0 0.0 0.0"
+
+    def __init__(self, database, mindata="min.data", tsdata="ts.data",
+                 pointsmin="points.min", pointsts="points.ts", endianness="=",
+                 write_coords=True, chunk_size=100000):
+        self.db = database
+        self.mindata = mindata
+        self.tsdata = tsdata
+        self.pointsmin = pointsmin
+        self.pointsts = pointsts
+        self.endianness = endianness
+        self.write_coords = write_coords
+        self.chunk_size = chunk_size
+
+    def _stream(self, query):
+        """iterate over the rows of query in chunks"""
+        rows = []
+        for row in query.yield_per(self.chunk_size):
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                yield rows
+                rows = []
+        if len(rows) > 0:
+            yield rows
+
+    def _fill_missing(self, rows, kind):
+        """return the rows as an array, replacing missing fvib and pgorder values"""
+        data = np.array([r[1:4] for r in rows], dtype=float)
+        missing = np.isnan(data[:, 1:3])
+        if missing.any():
+            print "warning: %d %s have no fvib or pgorder information" % (np.count_nonzero(missing.any(axis=1)), kind)
+            data[:, 1] = np.where(missing[:, 0], 0., data[:, 1])
+            data[:, 2] = np.where(missing[:, 1], 1., data[:, 2])
+        return data
+
+    def _write_coords(self, fname, query):
+        """write the coordinates from the query to a binary file"""
+        dtype = np.dtype(self.endianness + "d")
+        with open(fname, "wb") as fout:
+            for rows in self._stream(query):
+                for (coords,) in rows:
+                    np.asarray(coords, dtype=dtype).tofile(fout)
+
+    def write_minima(self):
+        """write min.data and points.min"""
+        print "writing", self.mindata
+        query = self.db.session.query(Minimum._id, Minimum.energy, Minimum.fvib,
+                                      Minimum.pgorder).order_by(Minimum._id)
+        ids = []
+        with open(self.mindata, "w") as fout:
+            for rows in self._stream(query):
+                np.savetxt(fout, self._fill_missing(rows, "minima"), fmt=self.min_fmt)
+                ids.append(np.array([r[0] for r in rows], dtype=np.int64))
+        self.minimum_ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+
+        if self.write_coords:
+            print "writing", self.pointsmin
+            self._write_coords(self.pointsmin,
+                               self.db.session.query(Minimum.coords).order_by(Minimum._id))
+        print "--->finished writing %s minima" % len(self.minimum_ids)
+
+    def write_transition_states(self):
+        """write ts.data and points.ts
+        
+        write_minima() must be called first
+        """
+        print "writing", self.tsdata
+        query = self.db.session.query(TransitionState._id, TransitionState.energy, TransitionState.fvib,
+                                      TransitionState.pgorder, TransitionState._minimum1_id,
+                                      TransitionState._minimum2_id).order_by(TransitionState._id)
+        nts = 0
+        with open(self.tsdata, "w") as fout:
+            for rows in self._stream(query):
+                data = self._fill_missing(rows, "transition states")
+                # the (fortran) index of the minima in min.data
+                min_ids = np.array([r[4:6] for r in rows], dtype=np.int64)
+                indices = np.searchsorted(self.minimum_ids, min_ids) + 1
+                np.savetxt(fout, np.hstack([data, indices]), fmt=self.ts_fmt)
+                nts += len(rows)
+
+        if self.write_coords:
+            print "writing", self.pointsts
+            self._write_coords(self.pointsts,
+                               self.db.session.query(TransitionState.coords).order_by(TransitionState._id))
+        print "--->finished writing %s transition states" % nts
+
+    def write(self):
+        self.write_minima()
+        self.write_transition_states()
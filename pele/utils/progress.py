@@ -0,0 +1,140 @@
+"""
+a decimating, bounded progress channel for monitoring long running calculations
+
+NEB and DoubleEndedConnect can report their progress on every step, which is
+far more often than anybody wants to look at it.  A :class:`ProgressChannel`
+sits between the calculation and the consumers.  It drops all but every n'th
+update, stores only what is asked for in a ring buffer of fixed length and can
+forward the records to another process through a queue without ever blocking
+the calculation.
+
+Example
+-------
+Monitor a connect run from the GUI process::
+
+    >>> from multiprocessing import Queue
+    >>> queue = Queue(maxsize=100)
+    >>> progress = ProgressChannel(every=20, queue=queue)
+    >>> connect = DoubleEndedConnect(min1, min2, pot, mindist, db, progress=progress)
+    >>> # in the other process
+    >>> record = queue.get()
+    >>> print record["event"], record["stepnum"], record["energies"]
+
+"""
+import time
+from collections import deque
+try:
+    from Queue import Full
+except ImportError:
+    from queue import Full
+
+import numpy as np
+
+from pele.utils.events import Signal
+
+__all__ = ["ProgressChannel"]
+
+
+class ProgressChannel(object):
+    """a decimating, ring buffered channel for progress events
+
+    The channel is called with keyword arguments, e.g. as
+    `progress(event="update", stepnum=10, energies=energies, path=path)`.
+    Events named in `decimate` are only recorded every `every` calls, all
+    other events (e.g. "initial" and "final") are always recorded.  A recorded
+    event is converted to a dictionary of copies of the arguments and
+
+    1. appended to a ring buffer holding the last `maxlen` records
+    2. passed to the functions connected to `on_progress`
+    3. put on `queue` if one was passed.  If the queue is full the record is
+       dropped rather than waiting for the consumer.
+
+    Parameters
+    ----------
+    every : int
+        record only every `every`'th event of the decimated types
+    snapshots : bool
+        if False the coordinates ("path" and "coords") are not recorded, only
+        the energy profile and the scalar data.  Copying the whole band on
+        every recorded event is expensive and is rarely needed.
+    maxlen : int
+        the number of records kept in the ring buffer
+    queue : Queue, optional
+        e.g. a multiprocessing.Queue.  Records are put with `put_nowait`.
+    decimate : sequence of str
+        the names of the events to decimate
+
+    Attributes
+    ----------
+    on_progress : Signal
+        called with the record as `on_progress(record)`
+    ncalls : int
+        the number of events received
+    nrecorded : int
+        the number of events recorded
+    ndropped : int
+        the number of records which could not be put on the queue
+    """
+    snapshot_keys = ("path", "coords")
+
+    def __init__(self, every=10, snapshots=False, maxlen=100, queue=None,
+                 decimate=("update",)):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.every = int(every)
+        self.snapshots = snapshots
+        self.queue = queue
+        self.decimate = set(decimate)
+        self.on_progress = Signal()
+
+        self._buffer = deque(maxlen=maxlen)
+        self._counts = dict()
+        self.ncalls = 0
+        self.nrecorded = 0
+        self.ndropped = 0
+
+    def __call__(self, event="update", **kwargs):
+        self.ncalls += 1
+        if event in self.decimate:
+            count = self._counts.get(event, 0)
+            self._counts[event] = count + 1
+            if count % self.every != 0:
+                return
+        self._record(event, kwargs)
+
+    def _record(self, event, kwargs):
+        record = dict(event=event, time=time.time())
+        for key, value in kwargs.iteritems():
+            if not self.snapshots and key in self.snapshot_keys:
+                continue
+            if isinstance(value, (np.ndarray, list, tuple)):
+                # the caller may modify its arrays in place
+                value = np.array(value)
+            record[key] = value
+
+        self.nrecorded += 1
+        self._buffer.append(record)
+        self.on_progress(record)
+        if self.queue is not None:
+            try:
+                self.queue.put_nowait(record)
+            except Full:
+                self.ndropped += 1
+
+    def records(self):
+        """return a list of the records in the ring buffer, oldest first"""
+        return list(self._buffer)
+
+    def latest(self):
+        """return the most recent record or None"""
+        if len(self._buffer) == 0:
+            return None
+        return self._buffer[-1]
+
+    def clear(self):
+        """empty the ring buffer and reset the decimation counters"""
+        self._buffer.clear()
+        self._counts.clear()
+
+    def __len__(self):
+        return len(self._buffer)
@@ -1,9 +1,11 @@
 import unittest
 import numpy as np
+import networkx as nx
 
 from pele.storage import Database
 from pele.landscape import ConnectManager
-from pele.utils.disconnectivity_graph import DisconnectivityGraph, database2graph, TreeLeastCommonAncestor, Tree
+from pele.utils.disconnectivity_graph import DisconnectivityGraph, database2graph, TreeLeastCommonAncestor, Tree, \
+    BarrierTree, _MakeTree, FlatTree
 
 _show = False
 
@@ -45,6 +47,20 @@ class TestDisconnectivityGraph(unittest.TestCase):
         
         dgraph.draw_minima(self.db.minima()[:2])
 
+    def test_layout(self):
+        dgraph = DisconnectivityGraph(self.tsgraph)
+        dgraph.calculate()
+        # the leaves are spaced evenly and each node is centered over its leaves
+        xpos, minima = dgraph.get_minima_layout()
+        self.assertTrue(np.allclose(sorted(xpos), 4.5 + np.arange(len(xpos))))
+        for tree in dgraph.tree_graph.get_all_trees():
+            xleaves = [leaf.data["x"] for leaf in tree.get_leaves()]
+            self.assertAlmostEqual(tree.data["x"], (min(xleaves) + max(xleaves)) / 2.)
+        
+        segments, colours = dgraph._get_line_segments(dgraph.tree_graph, eoffset=dgraph.eoffset)
+        self.assertEqual(segments.shape[1:], (2, 2))
+        self.assertEqual(len(segments), len(colours))
+
     def test_show_minima(self):
         dgraph = DisconnectivityGraph(self.tsgraph)
         dgraph.calculate()
@@ -108,6 +124,120 @@ class TestDisconnectivityGraph(unittest.TestCase):
         dgraph.plot()
 
 
+def _tree_groups(tree):
+    """return the set of groups of minima at each level of a disconnectivity tree"""
+    groups = set()
+    for subtree in tree.get_all_trees():
+        groups.add((subtree.data.get("ethresh"), frozenset(m.id() for m in subtree.get_minima())))
+    return groups
+
+
+class TestBarrierTree(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.db = create_random_database(20, 60)
+
+    def check_same_tree(self, btree):
+        graph = database2graph(self.db)
+        energies = [ts.energy for ts in self.db.transition_states()]
+        levels = np.linspace(min(energies), max(energies), 10)
+        tree = _MakeTree(graph.nodes(), self.db.transition_states(), levels).make_tree()
+        self.assertEqual(_tree_groups(btree.make_tree(levels)), _tree_groups(tree))
+
+    def test_spanning_tree(self):
+        btree = BarrierTree.from_database(self.db)
+        self.assertEqual(btree.number_of_transition_states(), self.db.number_of_minima() - 1)
+        self.check_same_tree(btree)
+        
+        # a large batch is added with Kruskal's algorithm
+        bulk = BarrierTree()
+        bulk.add_transition_states(self.db.transition_states() * 2)
+        self.assertItemsEqual(bulk.transition_states(), btree.transition_states())
+
+    def test_incremental(self):
+        btree = BarrierTree()
+        for ts in self.db.transition_states():
+            btree.add_transition_state(ts)
+        self.check_same_tree(btree)
+        
+        # add transition states to the database and update the tree
+        minima = self.db.minima()
+        for i in xrange(10):
+            m1, m2 = minima[i], minima[-i-1]
+            energy = max(m1.energy, m2.energy) + np.random.uniform(0, 3)
+            self.db.addTransitionState(energy, [energy], m1, m2)
+        new_tree = BarrierTree.from_database(self.db)
+        btree.update_from_database(self.db)
+        self.check_same_tree(btree)
+        for m in minima[1:]:
+            self.assertAlmostEqual(btree.barrier(minima[0], m), new_tree.barrier(minima[0], m))
+
+    def test_barrier(self):
+        btree = BarrierTree.from_database(self.db)
+        graph = database2graph(self.db)
+        m1, m2 = self.db.minima()[0], self.db.minima()[-1]
+        barrier = btree.barrier(m1, m2)
+        self.assertTrue(btree.connected(m1, m2, barrier + 1e-6))
+        self.assertFalse(btree.connected(m1, m2, barrier - 1e-6))
+        # removing the edges at or above the barrier disconnects m1 and m2
+        graph.remove_edges_from([(u, v) for u, v, data in graph.edges(data=True)
+                                 if data["ts"].energy >= barrier])
+        self.assertFalse(nx.has_path(graph, m1, m2))
+
+    def test_dgraph(self):
+        btree = BarrierTree.from_database(self.db)
+        dgraph = DisconnectivityGraph(btree.to_graph())
+        dgraph.calculate()
+        dgraph.plot()
+
+
+class TestFlatTree(unittest.TestCase):
+    def setUp(self):
+        #        root
+        #       /    \
+        #      a      l3
+        #    / | \
+        #  l0  l1  l2
+        self.root = Tree()
+        self.a = self.root.make_branch()
+        self.leaves = [self.a.make_branch() for _ in xrange(3)]
+        self.leaves.append(self.root.make_branch())
+
+    def test_arrays(self):
+        flat = FlatTree(self.root)
+        self.assertIs(flat.trees[0], self.root)
+        self.assertEqual(flat.trees, list(self.root.get_all_trees()))
+        self.assertEqual(flat.parent.tolist(), [-1, 0, 1, 1, 1, 0])
+        self.assertEqual(flat.depth.tolist(), [0, 1, 2, 2, 2, 1])
+        self.assertEqual(flat.nleaves.tolist(), [4, 3, 1, 1, 1, 1])
+        self.assertEqual(flat.leaves().tolist(), [2, 3, 4, 5])
+
+    def test_layout(self):
+        flat = FlatTree(self.root)
+        # the lowest key goes in the center, the others alternate left and right
+        positions = flat.sibling_positions(np.array([0., 1., 2., 0., 1., 0.]))
+        self.assertEqual(positions.tolist(), [0, 0, 2, 1, 0, 1])
+        x = flat.layout(positions)
+        self.assertEqual(x.tolist(), [2., 1.5, 2.5, 1.5, 0.5, 3.5])
+
+        positions = flat.sibling_positions(np.array([0., 1., 2., 0., 1., 0.]), alternate=False)
+        self.assertEqual(positions.tolist(), [0, 1, 2, 0, 1, 0])
+
+    def test_deep_tree(self):
+        # deeper than the recursion limit
+        depth = 5000
+        root = tree = Tree()
+        for _ in xrange(depth):
+            tree.make_branch()
+            tree = tree.make_branch()
+        flat = FlatTree(root)
+        self.assertEqual(flat.number_of_nodes(), 2 * depth + 1)
+        self.assertEqual(root.number_of_leaves(), depth + 1)
+        self.assertEqual(flat.nleaves[0], depth + 1)
+        x = flat.layout(flat.sibling_positions(np.zeros(flat.number_of_nodes())))
+        self.assertItemsEqual(x[flat.leaves()], 0.5 + np.arange(depth + 1))
+
+
 class TestTreeLeastCommonAncestor(unittest.TestCase):
     def test(self):
         t1 = Tree()
@@ -1,9 +1,11 @@
 import unittest
 import os
+import shutil
+import tempfile
 
 import numpy as np
 
-from pele.utils.optim_compatibility import OptimDBConverter
+from pele.utils.optim_compatibility import OptimDBConverter, OptimDBExporter
 from pele.storage import Database
 
 class TestOptimCompatibility(unittest.TestCase):
@@ -58,5 +60,63 @@ class TestOptimCompatibility(unittest.TestCase):
         with self.assertRaises(IOError):
             converter.convert()
 
+class TestOptimExport(unittest.TestCase):
+    def setUp(self):
+        current_dir = os.path.dirname(__file__)
+        self.files = dict(mindata=os.path.join(current_dir, "min.data"),
+                          tsdata=os.path.join(current_dir, "ts.data"),
+                          pointsmin=os.path.join(current_dir, "points.min"),
+                          pointsts=os.path.join(current_dir, "points.ts"))
+        self.db = Database()
+        OptimDBConverter(self.db, endianness="<", **self.files).convert()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_same(self, db1, db2):
+        self.assertEqual(db1.number_of_minima(), db2.number_of_minima())
+        self.assertEqual(db1.number_of_transition_states(), db2.number_of_transition_states())
+        for m1, m2 in zip(db1.minima(), db2.minima()):
+            self.assertAlmostEqual(m1.energy, m2.energy, 8)
+            self.assertAlmostEqual(m1.fvib, m2.fvib, 8)
+            self.assertEqual(m1.pgorder, m2.pgorder)
+            self.assertTrue(np.all(m1.coords == m2.coords))
+        for ts1, ts2 in zip(db1.transition_states(), db2.transition_states()):
+            self.assertAlmostEqual(ts1.energy, ts2.energy, 8)
+            self.assertAlmostEqual(ts1.minimum1.energy, ts2.minimum1.energy, 8)
+            self.assertAlmostEqual(ts1.minimum2.energy, ts2.minimum2.energy, 8)
+            self.assertTrue(np.all(ts1.coords == ts2.coords))
+
+    def test_roundtrip(self):
+        files = dict((key, os.path.join(self.tmpdir, os.path.basename(fname)))
+                     for key, fname in self.files.iteritems())
+        OptimDBExporter(self.db, endianness="<", **files).write()
+        db = Database()
+        OptimDBConverter(db, endianness="<", chunk_size=1, **files).convert()
+        self.check_same(self.db, db)
+
+    def test_untrusted(self):
+        db = Database()
+        converter = OptimDBConverter(db, endianness="<", trusted=False, **self.files)
+        converter.convert()
+        self.check_same(self.db, db)
+        
+        # converting again doesn't add duplicates
+        converter = OptimDBConverter(db, endianness="<", trusted=False, **self.files)
+        converter.convert()
+        self.check_same(self.db, db)
+
+    def test_existing_minima(self):
+        # the transition states are attached to the new minima
+        db = Database()
+        db.addMinimum(0., [0.])
+        OptimDBConverter(db, endianness="<", **self.files).convert()
+        self.assertEqual(db.number_of_minima(), 3)
+        ts = db.transition_states()[0]
+        self.assertItemsEqual([ts.minimum1.energy, ts.minimum2.energy],
+                              [m.energy for m in self.db.minima()])
+
+
 if __name__ == "__main__":
     unittest.main()
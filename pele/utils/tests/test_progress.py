@@ -0,0 +1,64 @@
+import unittest
+from Queue import Queue
+
+import numpy as np
+
+from pele.utils.progress import ProgressChannel
+
+
+class TestProgressChannel(unittest.TestCase):
+    def send(self, progress, n):
+        energies = np.zeros(5)
+        for i in xrange(n):
+            energies[:] = i
+            progress(event="update", stepnum=i, energies=energies, path=np.zeros([5, 3]))
+
+    def test_decimate(self):
+        progress = ProgressChannel(every=10)
+        self.send(progress, 100)
+        records = progress.records()
+        self.assertEqual(len(records), 10)
+        self.assertEqual([r["stepnum"] for r in records], range(0, 100, 10))
+        # the energies must be copies
+        self.assertEqual(records[1]["energies"][0], 10)
+        self.assertNotIn("path", records[0])
+
+    def test_snapshots(self):
+        progress = ProgressChannel(every=1, snapshots=True)
+        self.send(progress, 2)
+        self.assertEqual(progress.latest()["path"].shape, (5, 3))
+
+    def test_ring_buffer(self):
+        progress = ProgressChannel(every=1, maxlen=3)
+        self.send(progress, 10)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(progress.latest()["stepnum"], 9)
+        self.assertEqual(progress.nrecorded, 10)
+
+    def test_other_events_not_decimated(self):
+        progress = ProgressChannel(every=100)
+        progress(event="initial", stepnum=0)
+        self.send(progress, 10)
+        progress(event="final", stepnum=10)
+        self.assertEqual([r["event"] for r in progress.records()], ["initial", "update", "final"])
+
+    def test_queue_does_not_block(self):
+        queue = Queue(maxsize=2)
+        progress = ProgressChannel(every=1, queue=queue)
+        self.send(progress, 5)
+        self.assertEqual(queue.qsize(), 2)
+        self.assertEqual(progress.ndropped, 3)
+        self.assertEqual(queue.get()["stepnum"], 0)
+
+    def test_signal(self):
+        received = []
+        def callback(record):
+            received.append(record["stepnum"])
+        progress = ProgressChannel(every=5)
+        progress.on_progress.connect(callback)
+        self.send(progress, 10)
+        self.assertEqual(received, [0, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ import networkx as nx
 
 from pele.storage.database import Database
 from pele.utils.disconnectivity_graph import database2graph
+from pele.utils.optim_compatibility import OptimDBExporter
 
 def print_system_properties(db, supress_long=True):
     if len(db.properties()) == 0: return
@@ -110,23 +111,8 @@ def main():
         
 
 def writeDPS(db):
-    minindex={}
-    out = open("min.data", "w")
-    i=1
-    for m in db.minima():
-        minindex[m]=i
-        i+=1
-        if m.fvib is None:
-            print "no frequency information available for minimum", m._id
-        if m.pgorder is None:
-            print "no pgorder information available for minimum", m._id
-        out.write("%f %f %d 0.0 0.0 0.0\n"%(m.energy, m.fvib, m.pgorder))
-    out = open("ts.data", "w")
-    ti=0
-    for ts in db.transition_states():
-        ti+=1
-        out.write("%f %f %d %d %d 0.0 0.0 0.0\n"%(ts.energy, ts.fvib, ts.pgorder, minindex[ts.minimum1], minindex[ts.minimum2]))
-    print "Written %d minima and %d transition states"%(i, ti)
+    exporter = OptimDBExporter(db, write_coords=False)
+    exporter.write()
 
 if __name__ == "__main__":
     main()    
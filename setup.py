@@ -268,7 +268,8 @@ cxx_modules = [
     Extension("pele.optimize._lbfgs_cpp", 
               ["pele/optimize/_lbfgs_cpp.cxx", "source/lbfgs.cpp"] + include_sources,
               include_dirs=include_dirs,
-              extra_compile_args=extra_compile_args,
+              extra_compile_args=extra_compile_args + ["-pthread"],
+              extra_link_args=["-pthread"],
               language="c++", depends=depends,
               ),
     Extension("pele.optimize._modified_fire_cpp", 
@@ -295,12 +296,25 @@ cxx_modules = [
               extra_compile_args=extra_compile_args,
               language="c++", depends=depends,
               ),
+    Extension("pele.transition_states._neb_cpp", 
+              ["pele/transition_states/_neb_cpp.cxx"] + include_sources,
+              include_dirs=include_dirs,
+              extra_compile_args=extra_compile_args,
+              language="c++", depends=depends,
+              ),
+    Extension("pele.mindist._minpermdist_cpp", 
+              ["pele/mindist/_minpermdist_cpp.cxx"] + include_sources,
+              include_dirs=include_dirs,
+              extra_compile_args=extra_compile_args + ["-pthread"],
+              extra_link_args=["-pthread"],
+              language="c++", depends=depends,
+              ),
                ]
 
 
 cxx_modules.append(
     Extension("pele.rates._ngt_cpp", 
-              ["pele/rates/_ngt_cpp.cxx"] + ["sources/pele/graph.hpp", "sources/pele/ngt.hpp"],
+              ["pele/rates/_ngt_cpp.cxx"] + ["sources/pele/graph.hpp", "sources/pele/ngt.hpp", "sources/pele/ngt_compact.hpp"],
               include_dirs=include_dirs,
               extra_compile_args=extra_compile_args,
               language="c++", 
@@ -254,6 +254,8 @@ cxx_files = ["pele/potentials/_lj_cpp.cxx",
              "pele/potentials/_pythonpotential.cxx",
              "pele/angleaxis/_cpp_aa.cxx",
              "pele/utils/_cpp_utils.cxx",
+             "pele/transition_states/_neb_cpp.cxx",
+             "pele/mindist/_minpermdist_cpp.cxx",
              "pele/rates/_ngt_cpp.cxx",
              ]
 
@@ -0,0 +1,160 @@
+#ifndef _PELE_BATCH_LBFGS_H__
+#define _PELE_BATCH_LBFGS_H__
+
+#include <algorithm>
+#include <atomic>
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <thread>
+#include <vector>
+
+#include "array.h"
+#include "base_potential.h"
+#include "lbfgs.h"
+
+namespace pele {
+
+/**
+ * Minimize many independent starting configurations with LBFGS.
+ *
+ * Each thread owns one LBFGS optimizer which is reset for every starting
+ * configuration, so the optimizer state is allocated once per thread rather
+ * than once per minimization.  The result of each minimization is the same
+ * as that of a new LBFGS optimizer with the same parameters.
+ *
+ * The configurations are handed out to the nthreads threads one at a time.
+ * The potential is shared by all threads, so nthreads > 1 requires that
+ * get_energy_gradient() is thread safe.  This is the case for potentials
+ * without internal state, e.g. the simple pairwise potentials, but not for
+ * the cell list potentials or potentials implemented in python.
+ */
+class BatchLBFGS {
+    std::shared_ptr<BasePotential> potential_;
+    double tol_;
+    int M_;
+    double maxstep_;
+    double max_f_rise_;
+    double H0_;
+    int maxiter_;
+    bool use_relative_f_;
+    size_t nthreads_;
+
+public:
+    BatchLBFGS(std::shared_ptr<BasePotential> potential, double tol=1e-4, int M=4,
+            size_t nthreads=1)
+        : potential_(potential),
+          tol_(tol),
+          M_(M),
+          maxstep_(0.1),
+          max_f_rise_(1e-4),
+          H0_(0.1),
+          maxiter_(1000),
+          use_relative_f_(false),
+          nthreads_(std::max<size_t>(nthreads, 1))
+    {}
+
+    inline void set_tol(double tol) { tol_ = tol; }
+    inline void set_maxstep(double maxstep) { maxstep_ = maxstep; }
+    inline void set_max_f_rise(double max_f_rise) { max_f_rise_ = max_f_rise; }
+    inline void set_H0(double H0) { H0_ = H0; }
+    inline void set_max_iter(int max_iter) { maxiter_ = max_iter; }
+    inline void set_use_relative_f(int use_relative_f) { use_relative_f_ = (bool) use_relative_f; }
+    inline void set_nthreads(size_t nthreads) { nthreads_ = std::max<size_t>(nthreads, 1); }
+
+    /**
+     * minimize the n = x0.size() / ndof configurations stored consecutively in x0
+     *
+     * The minimized coordinates are stored in x (same size as x0) and the
+     * energy, rms gradient, number of function evaluations, number of
+     * iterations and whether the minimization converged are stored in the
+     * arrays f, rms, nfev, niter and success of size n.
+     */
+    void run(Array<double> x0, size_t ndof, Array<double> x, Array<double> f,
+            Array<double> rms, Array<long> nfev, Array<long> niter, Array<long> success)
+    {
+        if (ndof == 0 || x0.size() % ndof != 0) {
+            throw std::invalid_argument("BatchLBFGS: x0.size() must be a multiple of ndof");
+        }
+        size_t const n = x0.size() / ndof;
+        if (x.size() != x0.size()) {
+            throw std::invalid_argument("BatchLBFGS: x must have the same size as x0");
+        }
+        if (f.size() != n || rms.size() != n || nfev.size() != n
+                || niter.size() != n || success.size() != n) {
+            throw std::invalid_argument("BatchLBFGS: the result arrays must have one element per configuration");
+        }
+        if (n == 0) {
+            return;
+        }
+
+        size_t const nthreads = std::min(nthreads_, n);
+        // the optimizers are set up before the threads start
+        std::vector<std::shared_ptr<LBFGS> > optimizers;
+        for (size_t i = 0; i < nthreads; ++i) {
+            optimizers.push_back(make_optimizer(Array<double>(ndof, 0.)));
+        }
+
+        std::atomic<size_t> next(0);
+        std::atomic<bool> failed(false);
+        std::exception_ptr error;
+        std::mutex error_mutex;
+
+        auto worker = [&](size_t ithread) {
+            LBFGS & lbfgs = *optimizers[ithread];
+            try {
+                size_t i;
+                while (!failed && (i = next++) < n) {
+                    Array<double> xi(x0.data() + i * ndof, ndof);
+                    lbfgs.reset(xi);
+                    lbfgs.set_H0(H0_);
+                    lbfgs.run();
+                    Array<double> xnew = lbfgs.get_x();
+                    std::copy(xnew.begin(), xnew.end(), x.data() + i * ndof);
+                    f[i] = lbfgs.get_f();
+                    rms[i] = lbfgs.get_rms();
+                    nfev[i] = lbfgs.get_nfev();
+                    niter[i] = lbfgs.get_niter();
+                    success[i] = lbfgs.success();
+                }
+            } catch (...) {
+                std::lock_guard<std::mutex> lock(error_mutex);
+                if (!failed) {
+                    error = std::current_exception();
+                    failed = true;
+                }
+            }
+        };
+
+        if (nthreads == 1) {
+            worker(0);
+        } else {
+            std::vector<std::thread> threads;
+            for (size_t i = 0; i < nthreads; ++i) {
+                threads.push_back(std::thread(worker, i));
+            }
+            for (size_t i = 0; i < nthreads; ++i) {
+                threads[i].join();
+            }
+        }
+        if (error) {
+            std::rethrow_exception(error);
+        }
+    }
+
+protected:
+    std::shared_ptr<LBFGS> make_optimizer(Array<double> x0)
+    {
+        auto lbfgs = std::make_shared<LBFGS>(potential_, x0, tol_, M_);
+        lbfgs->set_maxstep(maxstep_);
+        lbfgs->set_max_f_rise(max_f_rise_);
+        lbfgs->set_max_iter(maxiter_);
+        lbfgs->set_use_relative_f(use_relative_f_);
+        return lbfgs;
+    }
+};
+
+} // namespace pele
+
+#endif
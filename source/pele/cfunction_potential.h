@@ -0,0 +1,79 @@
+#ifndef _PELE_CFUNCTION_POTENTIAL_H
+#define _PELE_CFUNCTION_POTENTIAL_H
+
+#include <cstddef>
+#include <stdexcept>
+
+#include "array.h"
+#include "base_potential.h"
+
+namespace pele {
+
+/**
+ * A potential defined by plain c functions.
+ *
+ * This wraps compiled functions with the signatures
+ *
+ *     double energy(double const * x, size_t ndof, void * userdata)
+ *     double energy_gradient(double const * x, double * grad, size_t ndof, void * userdata)
+ *
+ * as a BasePotential.  The functions can come from anywhere that produces a
+ * c function pointer, e.g. a Numba cfunc or a Cython cdef function, so a
+ * potential written in a script can be used by the c++ optimizers without
+ * going through python for every call.  energy_gradient must set every
+ * element of grad.
+ *
+ * Either function may be NULL.  Without energy_gradient the gradient is
+ * computed numerically, without energy the energy is computed with
+ * energy_gradient.  userdata is passed unchanged to the functions and is
+ * not owned by the potential.
+ */
+class CFunctionPotential : public BasePotential {
+public:
+    typedef double EnergyFunction(double const * x, size_t ndof, void * userdata);
+    typedef double EnergyGradientFunction(double const * x, double * grad, size_t ndof,
+            void * userdata);
+
+protected:
+    EnergyFunction * m_energy;
+    EnergyGradientFunction * m_energy_gradient;
+    void * m_userdata;
+
+public:
+    CFunctionPotential(EnergyFunction * energy, EnergyGradientFunction * energy_gradient,
+            void * userdata=NULL)
+        : m_energy(energy),
+          m_energy_gradient(energy_gradient),
+          m_userdata(userdata)
+    {
+        if (energy == NULL && energy_gradient == NULL) {
+            throw std::invalid_argument("CFunctionPotential: at least one of energy and energy_gradient must be given");
+        }
+    }
+
+    virtual ~CFunctionPotential() {}
+
+    virtual double get_energy(Array<double> x)
+    {
+        if (m_energy != NULL) {
+            return (*m_energy)(x.data(), x.size(), m_userdata);
+        }
+        Array<double> grad(x.size());
+        return (*m_energy_gradient)(x.data(), grad.data(), x.size(), m_userdata);
+    }
+
+    virtual double get_energy_gradient(Array<double> x, Array<double> grad)
+    {
+        if (grad.size() != x.size()) {
+            throw std::invalid_argument("the gradient has the wrong size");
+        }
+        if (m_energy_gradient == NULL) {
+            return BasePotential::get_energy_gradient(x, grad);
+        }
+        return (*m_energy_gradient)(x.data(), grad.data(), x.size(), m_userdata);
+    }
+};
+
+} // namespace pele
+
+#endif
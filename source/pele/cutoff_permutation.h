@@ -0,0 +1,273 @@
+#ifndef _PELE_CUTOFF_PERMUTATION_H
+#define _PELE_CUTOFF_PERMUTATION_H
+
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <stdexcept>
+#include <vector>
+
+#include "lap.h"
+
+namespace pele {
+
+/**
+ * Find the permutation of identical atoms which minimizes the distance
+ * between two structures, considering only pairs of atoms which are closer
+ * than a cutoff.
+ *
+ * The candidate pairs are found with a cell list, so building the sparse
+ * cost matrix is O(natoms) rather than O(natoms^2), and the assignment
+ * problem is solved with SparseLinearAssignment.  If there is no perfect
+ * matching within the cutoff, the cutoff is multiplied by widen_factor and
+ * the search is repeated.  Once the cutoff exceeds the largest possible
+ * distance between two atoms all pairs are included and a solution always
+ * exists.
+ *
+ * For periodic systems the box is rectangular with side lengths box, the
+ * minimum image convention is used for the distances.  An empty box means
+ * no periodic boundary conditions.
+ */
+class CutoffPermutation {
+    std::vector<double> m_box;
+    bool m_periodic;
+    double m_widen_factor;
+    double m_final_cutoff;
+    SparseLinearAssignment m_lap;
+    // the sparse cost matrix
+    std::vector<size_t> m_row_ptr;
+    std::vector<size_t> m_cols;
+    std::vector<double> m_costs;
+    // the cell list of the second structure
+    std::vector<long> m_hoc;
+    std::vector<long> m_ll;
+
+public:
+    CutoffPermutation(std::vector<double> const & box=std::vector<double>(),
+            double widen_factor=1.5)
+        : m_box(box),
+          m_periodic(!box.empty()),
+          m_widen_factor(widen_factor),
+          m_final_cutoff(0)
+    {
+        if (m_periodic && m_box.size() != 3) {
+            throw std::invalid_argument("CutoffPermutation: the box must have 3 side lengths");
+        }
+        if (widen_factor <= 1) {
+            throw std::invalid_argument("CutoffPermutation: widen_factor must be larger than 1");
+        }
+    }
+
+    /**
+     * return the cutoff which was used in the last call to find_permutation()
+     */
+    double get_final_cutoff() const { return m_final_cutoff; }
+
+    /**
+     * return the number of candidate pairs in the last sparse cost matrix
+     */
+    size_t get_npairs() const { return m_cols.size(); }
+
+    /**
+     * find the best permutation
+     *
+     * @param x1, x2 the coordinates of the natoms atoms in the two structures
+     * @param cutoff the initial cutoff
+     * @param max_cutoff the cutoff is not widened beyond this.  If it is not
+     *        positive the cutoff is widened until a solution is found.
+     * @param perm on return x2[perm[i]] is the atom matched to x1[i]
+     * @param dist2 on return the sum of the squared distances of the matched atoms
+     * @return false if no perfect matching was found within max_cutoff
+     */
+    bool find_permutation(double const * x1, double const * x2, size_t natoms,
+            double cutoff, double max_cutoff, std::vector<size_t> & perm,
+            double & dist2)
+    {
+        if (cutoff <= 0) {
+            throw std::invalid_argument("CutoffPermutation: the cutoff must be positive");
+        }
+        double const rmax = largest_distance(x1, x2, natoms);
+        while (true) {
+            bool const all_pairs = cutoff > rmax;
+            m_final_cutoff = cutoff;
+            build_cost_matrix(x1, x2, natoms, cutoff);
+            if (m_lap.solve(&m_row_ptr[0], m_cols.empty() ? NULL : &m_cols[0],
+                        m_costs.empty() ? NULL : &m_costs[0], natoms, perm, dist2)) {
+                return true;
+            }
+            if (all_pairs) {
+                throw std::runtime_error("CutoffPermutation: no perfect matching including all pairs");
+            }
+            if (max_cutoff > 0 && cutoff >= max_cutoff) {
+                return false;
+            }
+            cutoff *= m_widen_factor;
+            if (max_cutoff > 0) {
+                cutoff = std::min(cutoff, max_cutoff);
+            }
+        }
+    }
+
+protected:
+    /**
+     * return the largest distance two atoms can have, pairs further apart
+     * than this need not be considered
+     */
+    double largest_distance(double const * x1, double const * x2, size_t natoms) const
+    {
+        double r2 = 0;
+        for (size_t d = 0; d < 3; ++d) {
+            double extent;
+            if (m_periodic) {
+                extent = 0.5 * m_box[d];
+            } else {
+                double lo, hi;
+                bounds(x1, x2, natoms, d, lo, hi);
+                extent = hi - lo;
+            }
+            r2 += extent * extent;
+        }
+        return std::sqrt(r2);
+    }
+
+    void bounds(double const * x1, double const * x2, size_t natoms, size_t d,
+            double & lo, double & hi) const
+    {
+        lo = hi = natoms > 0 ? x1[d] : 0;
+        for (size_t i = 0; i < natoms; ++i) {
+            lo = std::min(lo, std::min(x1[3 * i + d], x2[3 * i + d]));
+            hi = std::max(hi, std::max(x1[3 * i + d], x2[3 * i + d]));
+        }
+    }
+
+    double distance2(double const * r1, double const * r2) const
+    {
+        double d2 = 0;
+        for (size_t d = 0; d < 3; ++d) {
+            double dx = r1[d] - r2[d];
+            if (m_periodic) {
+                dx -= m_box[d] * std::floor(dx / m_box[d] + 0.5);
+            }
+            d2 += dx * dx;
+        }
+        return d2;
+    }
+
+    /**
+     * build the sparse matrix of squared distances between all pairs closer than cutoff
+     */
+    void build_cost_matrix(double const * x1, double const * x2, size_t natoms,
+            double cutoff)
+    {
+        // set up the cell grid.  The cells are at least as large as the
+        // cutoff so only neighboring cells need to be searched, and there are
+        // not many more cells than atoms.
+        double origin[3], side[3];
+        size_t ncells[3];
+        double volume = 1;
+        for (size_t d = 0; d < 3; ++d) {
+            if (m_periodic) {
+                origin[d] = 0;
+                side[d] = m_box[d];
+            } else {
+                double hi;
+                bounds(x1, x2, natoms, d, origin[d], hi);
+                side[d] = hi - origin[d];
+            }
+            volume *= std::max(side[d], cutoff);
+        }
+        double const min_cell = std::max(cutoff, std::pow(volume / std::max<size_t>(natoms, 1), 1. / 3));
+        size_t ncells_tot = 1;
+        for (size_t d = 0; d < 3; ++d) {
+            ncells[d] = std::max<size_t>(1, static_cast<size_t>(side[d] / min_cell));
+            ncells_tot *= ncells[d];
+        }
+
+        m_hoc.assign(ncells_tot, -1);
+        m_ll.assign(natoms, -1);
+        for (size_t j = 0; j < natoms; ++j) {
+            size_t const icell = cell_index(x2 + 3 * j, origin, side, ncells);
+            m_ll[j] = m_hoc[icell];
+            m_hoc[icell] = j;
+        }
+
+        double const cutoff2 = cutoff * cutoff;
+        m_row_ptr.assign(1, 0);
+        m_cols.clear();
+        m_costs.clear();
+        std::vector<size_t> neighbors[3];
+        for (size_t i = 0; i < natoms; ++i) {
+            double const * r1 = x1 + 3 * i;
+            for (size_t d = 0; d < 3; ++d) {
+                neighbor_cells(r1[d], origin[d], side[d], ncells[d], neighbors[d]);
+            }
+            for (size_t a = 0; a < neighbors[0].size(); ++a) {
+                for (size_t b = 0; b < neighbors[1].size(); ++b) {
+                    for (size_t c = 0; c < neighbors[2].size(); ++c) {
+                        size_t const icell = neighbors[0][a]
+                                + ncells[0] * (neighbors[1][b] + ncells[1] * neighbors[2][c]);
+                        for (long j = m_hoc[icell]; j >= 0; j = m_ll[j]) {
+                            double const d2 = distance2(r1, x2 + 3 * j);
+                            if (d2 <= cutoff2) {
+                                m_cols.push_back(j);
+                                m_costs.push_back(d2);
+                            }
+                        }
+                    }
+                }
+            }
+            m_row_ptr.push_back(m_cols.size());
+        }
+    }
+
+    /**
+     * return the index of the cell in one dimension
+     */
+    long cell_coordinate(double x, double origin, double side, size_t ncells) const
+    {
+        if (side <= 0) {
+            return 0;
+        }
+        double s = (x - origin) / side;
+        if (m_periodic) {
+            s -= std::floor(s);
+        }
+        long const ic = static_cast<long>(s * ncells);
+        return std::max<long>(0, std::min<long>(ncells - 1, ic));
+    }
+
+    size_t cell_index(double const * r, double const * origin, double const * side,
+            size_t const * ncells) const
+    {
+        size_t icell = 0;
+        for (long d = 2; d >= 0; --d) {
+            icell = icell * ncells[d] + cell_coordinate(r[d], origin[d], side[d], ncells[d]);
+        }
+        return icell;
+    }
+
+    /**
+     * the cells in one dimension which can hold atoms within the cutoff
+     */
+    void neighbor_cells(double x, double origin, double side, size_t ncells,
+            std::vector<size_t> & cells) const
+    {
+        cells.clear();
+        long const ic = cell_coordinate(x, origin, side, ncells);
+        for (long k = ic - 1; k <= ic + 1; ++k) {
+            long kk = k;
+            if (m_periodic) {
+                kk = ((k % (long)ncells) + ncells) % ncells;
+            } else if (k < 0 || k >= (long)ncells) {
+                continue;
+            }
+            if (std::find(cells.begin(), cells.end(), (size_t)kk) == cells.end()) {
+                cells.push_back(kk);
+            }
+        }
+    }
+};
+
+} // namespace pele
+
+#endif
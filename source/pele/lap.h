@@ -0,0 +1,430 @@
+#ifndef _PELE_LAP_H
+#define _PELE_LAP_H
+
+#include <cstddef>
+#include <functional>
+#include <limits>
+#include <queue>
+#include <stdexcept>
+#include <utility>
+#include <vector>
+
+namespace pele {
+
+/**
+ * Solve the dense linear assignment problem.
+ *
+ * Find the assignment of rows to columns which minimizes the sum of
+ * cost[i * n + assignment[i]].  This is the shortest augmenting path method
+ * of Jonker and Volgenant: the dual variables are initialized by column
+ * reduction, then each unassigned row is added by a Dijkstra-like search
+ * for the shortest augmenting path in the reduced costs.  The cost is
+ * O(n^3) in the worst case but usually much less.
+ *
+ * R. Jonker and A. Volgenant, "A shortest augmenting path algorithm for
+ * dense and sparse linear assignment problems", Computing 38, 325 (1987)
+ *
+ * @param cost the n x n cost matrix in row major order
+ * @param n the number of rows and columns
+ * @param assignment on return assignment[i] is the column assigned to row i
+ * @return the total cost of the assignment
+ */
+class LinearAssignment {
+    size_t n_;
+    std::vector<double> u_; /**< the row dual variables */
+    std::vector<double> v_; /**< the column dual variables */
+    std::vector<long> row_of_col_;
+    std::vector<long> col_of_row_;
+    // work arrays for the augmenting path search
+    std::vector<double> dist_;
+    std::vector<long> pred_;
+    std::vector<bool> done_;
+    std::vector<size_t> scanned_;
+
+public:
+    LinearAssignment(size_t n=0)
+    {
+        resize(n);
+    }
+
+    void resize(size_t n)
+    {
+        n_ = n;
+        u_.assign(n, 0);
+        v_.assign(n, 0);
+        row_of_col_.assign(n, -1);
+        col_of_row_.assign(n, -1);
+        dist_.assign(n, 0);
+        pred_.assign(n, -1);
+        done_.assign(n, false);
+        scanned_.clear();
+        scanned_.reserve(n);
+    }
+
+    double solve(double const * cost, size_t n, std::vector<size_t> & assignment)
+    {
+        if (n != n_) {
+            resize(n);
+        }
+        assignment.assign(n, 0);
+        if (n == 0) {
+            return 0;
+        }
+        std::fill(row_of_col_.begin(), row_of_col_.end(), -1);
+        std::fill(col_of_row_.begin(), col_of_row_.end(), -1);
+        std::fill(u_.begin(), u_.end(), 0.);
+
+        // column reduction: assign each column to the row with the smallest
+        // cost if that row is still free
+        for (size_t j = 0; j < n; ++j) {
+            size_t imin = 0;
+            double cmin = cost[j];
+            for (size_t i = 1; i < n; ++i) {
+                if (cost[i * n + j] < cmin) {
+                    cmin = cost[i * n + j];
+                    imin = i;
+                }
+            }
+            v_[j] = cmin;
+            if (col_of_row_[imin] < 0) {
+                col_of_row_[imin] = j;
+                row_of_col_[j] = imin;
+            }
+        }
+        for (size_t i = 0; i < n; ++i) {
+            if (col_of_row_[i] >= 0) {
+                u_[i] = cost[i * n + col_of_row_[i]] - v_[col_of_row_[i]];
+            }
+        }
+
+        // augment the free rows one at a time
+        for (size_t i = 0; i < n; ++i) {
+            if (col_of_row_[i] < 0) {
+                augment(cost, i);
+            }
+        }
+
+        double total = 0;
+        for (size_t i = 0; i < n; ++i) {
+            assignment[i] = col_of_row_[i];
+            total += cost[i * n + col_of_row_[i]];
+        }
+        return total;
+    }
+
+protected:
+    /**
+     * find the shortest augmenting path starting from the free row `free_row`
+     * and assign it
+     */
+    void augment(double const * cost, size_t free_row)
+    {
+        size_t const n = n_;
+        double const inf = std::numeric_limits<double>::infinity();
+        std::fill(done_.begin(), done_.end(), false);
+        scanned_.clear();
+        for (size_t j = 0; j < n; ++j) {
+            dist_[j] = cost[free_row * n + j] - u_[free_row] - v_[j];
+            pred_[j] = free_row;
+        }
+
+        size_t jend = 0;
+        double dmin = 0;
+        while (true) {
+            // find the closest column which has not yet been scanned
+            dmin = inf;
+            for (size_t j = 0; j < n; ++j) {
+                if (!done_[j] && dist_[j] < dmin) {
+                    dmin = dist_[j];
+                    jend = j;
+                }
+            }
+            if (dmin == inf) {
+                throw std::runtime_error("LinearAssignment: no augmenting path found");
+            }
+            done_[jend] = true;
+            scanned_.push_back(jend);
+            long i = row_of_col_[jend];
+            if (i < 0) {
+                // the column is free: we found the augmenting path
+                break;
+            }
+            // extend the search through the row assigned to this column
+            double const h = dmin - (cost[i * n + jend] - u_[i] - v_[jend]);
+            for (size_t j = 0; j < n; ++j) {
+                if (!done_[j]) {
+                    double const d = h + cost[i * n + j] - u_[i] - v_[j];
+                    if (d < dist_[j]) {
+                        dist_[j] = d;
+                        pred_[j] = i;
+                    }
+                }
+            }
+        }
+
+        // update the dual variables of the scanned columns
+        for (size_t k = 0; k < scanned_.size(); ++k) {
+            size_t const j = scanned_[k];
+            v_[j] += dist_[j] - dmin;
+        }
+
+        // flip the assignments along the path
+        size_t j = jend;
+        while (true) {
+            long const i = pred_[j];
+            row_of_col_[j] = i;
+            long const jprev = col_of_row_[i];
+            col_of_row_[i] = j;
+            if (static_cast<size_t>(i) == free_row) {
+                break;
+            }
+            j = jprev;
+        }
+
+        // restore complementary slackness for the rows on the path
+        for (size_t k = 0; k < scanned_.size(); ++k) {
+            size_t const jj = scanned_[k];
+            long const i = row_of_col_[jj];
+            if (i >= 0) {
+                u_[i] = cost[i * n + jj] - v_[jj];
+            }
+        }
+    }
+};
+
+/**
+ * convenience function to solve a single linear assignment problem
+ *
+ * see LinearAssignment for details
+ */
+inline double linear_assignment(double const * cost, size_t n, std::vector<size_t> & assignment)
+{
+    LinearAssignment lap(n);
+    return lap.solve(cost, n, assignment);
+}
+
+/**
+ * Solve the sparse linear assignment problem.
+ *
+ * This is the same shortest augmenting path method as LinearAssignment, but
+ * only the entries of the cost matrix which are given explicitly are allowed.
+ * The matrix is passed in compressed sparse row format: the entries of row
+ * i are cols[k], costs[k] for row_ptr[i] <= k < row_ptr[i+1].  The shortest
+ * path search uses a binary heap, so if each row has m entries the cost of
+ * one augmentation is O(n m log n) in the worst case, but usually only a
+ * small neighborhood of the free row is visited.
+ *
+ * A perfect matching need not exist in the sparse graph.  In that case
+ * solve() returns false and the assignment is undefined.
+ */
+class SparseLinearAssignment {
+    typedef std::pair<double, size_t> heap_item;
+    typedef std::priority_queue<heap_item, std::vector<heap_item>,
+            std::greater<heap_item> > heap_type;
+
+    size_t n_;
+    std::vector<double> u_; /**< the row dual variables */
+    std::vector<double> v_; /**< the column dual variables */
+    std::vector<long> row_of_col_;
+    std::vector<long> col_of_row_;
+    std::vector<double> cost_of_row_; /**< the cost of the edge assigned to each row */
+    // work arrays for the augmenting path search
+    std::vector<double> dist_;
+    std::vector<long> pred_;
+    std::vector<double> pred_cost_;
+    std::vector<bool> done_;
+    std::vector<size_t> scanned_;
+    std::vector<size_t> touched_;
+
+public:
+    SparseLinearAssignment(size_t n=0)
+    {
+        resize(n);
+    }
+
+    void resize(size_t n)
+    {
+        n_ = n;
+        u_.assign(n, 0);
+        v_.assign(n, 0);
+        row_of_col_.assign(n, -1);
+        col_of_row_.assign(n, -1);
+        cost_of_row_.assign(n, 0);
+        dist_.assign(n, std::numeric_limits<double>::infinity());
+        pred_.assign(n, -1);
+        pred_cost_.assign(n, 0);
+        done_.assign(n, false);
+        scanned_.clear();
+        touched_.clear();
+    }
+
+    /**
+     * @param row_ptr the n+1 row offsets into cols and costs
+     * @param cols the column of each entry
+     * @param costs the cost of each entry
+     * @param n the number of rows and columns
+     * @param assignment on return assignment[i] is the column assigned to row i
+     * @param total on return the total cost of the assignment
+     * @return false if there is no perfect matching
+     */
+    bool solve(size_t const * row_ptr, size_t const * cols, double const * costs,
+            size_t n, std::vector<size_t> & assignment, double & total)
+    {
+        resize(n);
+        assignment.assign(n, 0);
+        total = 0;
+        if (n == 0) {
+            return true;
+        }
+
+        // column reduction.  The row duals are all zero after this step
+        double const inf = std::numeric_limits<double>::infinity();
+        std::vector<long> argmin(n, -1);
+        std::vector<double> argmin_cost(n, 0);
+        v_.assign(n, inf);
+        for (size_t i = 0; i < n; ++i) {
+            if (row_ptr[i] == row_ptr[i + 1]) {
+                return false;
+            }
+            for (size_t k = row_ptr[i]; k < row_ptr[i + 1]; ++k) {
+                size_t const j = cols[k];
+                if (costs[k] < v_[j]) {
+                    v_[j] = costs[k];
+                    argmin[j] = i;
+                }
+            }
+        }
+        for (size_t j = 0; j < n; ++j) {
+            if (argmin[j] < 0) {
+                return false;
+            }
+            long const i = argmin[j];
+            if (col_of_row_[i] < 0) {
+                col_of_row_[i] = j;
+                row_of_col_[j] = i;
+                cost_of_row_[i] = v_[j];
+            }
+        }
+
+        for (size_t i = 0; i < n; ++i) {
+            if (col_of_row_[i] < 0) {
+                if (!augment(row_ptr, cols, costs, i)) {
+                    return false;
+                }
+            }
+        }
+
+        for (size_t i = 0; i < n; ++i) {
+            assignment[i] = col_of_row_[i];
+            total += cost_of_row_[i];
+        }
+        return true;
+    }
+
+protected:
+    void relax(size_t const * row_ptr, size_t const * cols, double const * costs,
+            size_t i, double h, heap_type & heap)
+    {
+        for (size_t k = row_ptr[i]; k < row_ptr[i + 1]; ++k) {
+            size_t const j = cols[k];
+            if (done_[j]) {
+                continue;
+            }
+            double const d = h + costs[k] - u_[i] - v_[j];
+            if (d < dist_[j]) {
+                if (dist_[j] == std::numeric_limits<double>::infinity()) {
+                    touched_.push_back(j);
+                }
+                dist_[j] = d;
+                pred_[j] = i;
+                pred_cost_[j] = costs[k];
+                heap.push(heap_item(d, j));
+            }
+        }
+    }
+
+    void reset_work_arrays()
+    {
+        for (size_t k = 0; k < touched_.size(); ++k) {
+            dist_[touched_[k]] = std::numeric_limits<double>::infinity();
+            done_[touched_[k]] = false;
+        }
+        touched_.clear();
+        scanned_.clear();
+    }
+
+    /**
+     * find the shortest augmenting path starting from the free row `free_row`
+     * and assign it.  Return false if there is none
+     */
+    bool augment(size_t const * row_ptr, size_t const * cols, double const * costs,
+            size_t free_row)
+    {
+        heap_type heap;
+        relax(row_ptr, cols, costs, free_row, 0., heap);
+
+        size_t jend = 0;
+        double dmin = 0;
+        while (true) {
+            // find the closest column which has not yet been scanned
+            if (heap.empty()) {
+                reset_work_arrays();
+                return false;
+            }
+            heap_item const top = heap.top();
+            heap.pop();
+            size_t const j = top.second;
+            if (done_[j] || top.first > dist_[j]) {
+                // an outdated entry
+                continue;
+            }
+            dmin = top.first;
+            done_[j] = true;
+            scanned_.push_back(j);
+            long const i = row_of_col_[j];
+            if (i < 0) {
+                // the column is free: we found the augmenting path
+                jend = j;
+                break;
+            }
+            // extend the search through the row assigned to this column
+            double const h = dmin - (cost_of_row_[i] - u_[i] - v_[j]);
+            relax(row_ptr, cols, costs, i, h, heap);
+        }
+
+        // update the dual variables of the scanned columns
+        for (size_t k = 0; k < scanned_.size(); ++k) {
+            size_t const j = scanned_[k];
+            v_[j] += dist_[j] - dmin;
+        }
+
+        // flip the assignments along the path
+        size_t j = jend;
+        while (true) {
+            long const i = pred_[j];
+            row_of_col_[j] = i;
+            long const jprev = col_of_row_[i];
+            col_of_row_[i] = j;
+            cost_of_row_[i] = pred_cost_[j];
+            if (static_cast<size_t>(i) == free_row) {
+                break;
+            }
+            j = jprev;
+        }
+
+        // restore complementary slackness for the rows on the path
+        for (size_t k = 0; k < scanned_.size(); ++k) {
+            size_t const jj = scanned_[k];
+            long const i = row_of_col_[jj];
+            if (i >= 0) {
+                u_[i] = cost_of_row_[i] - v_[jj];
+            }
+        }
+        reset_work_arrays();
+        return true;
+    }
+};
+
+} // namespace pele
+
+#endif
@@ -0,0 +1,582 @@
+#ifndef _PELE_MINPERMDIST_H
+#define _PELE_MINPERMDIST_H
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <limits>
+#include <mutex>
+#include <random>
+#include <stdexcept>
+#include <thread>
+#include <vector>
+
+#include "array.h"
+#include "lap.h"
+
+namespace pele {
+
+/**
+ * the rigid transformation and permutation which maps a cluster onto another
+ *
+ * The transformed coordinates of atom i are
+ *
+ *     x2new[i] = rotation * (sign * (x2[permutation[i]] - com2)) + com1
+ *
+ * where sign is -1 if invert is true and 1 otherwise.
+ */
+struct ClusterTransformation {
+    double rotation[9]; /**< row major rotation matrix */
+    bool invert;
+    std::vector<size_t> permutation;
+    double com1[3];
+    double com2[3];
+
+    ClusterTransformation()
+        : invert(false)
+    {
+        set_identity_rotation();
+        std::fill(com1, com1 + 3, 0.);
+        std::fill(com2, com2 + 3, 0.);
+    }
+
+    void set_identity_rotation()
+    {
+        std::fill(rotation, rotation + 9, 0.);
+        rotation[0] = rotation[4] = rotation[8] = 1.;
+    }
+
+    /**
+     * apply the transformation to x2, putting the result in x2new
+     */
+    void apply(double const * x2, double * x2new, size_t natoms) const
+    {
+        double const sign = invert ? -1. : 1.;
+        for (size_t i = 0; i < natoms; ++i) {
+            size_t const j = permutation.empty() ? i : permutation[i];
+            double r[3];
+            for (size_t k = 0; k < 3; ++k) {
+                r[k] = sign * (x2[3 * j + k] - com2[k]);
+            }
+            for (size_t k = 0; k < 3; ++k) {
+                x2new[3 * i + k] = com1[k] + rotation[3 * k] * r[0]
+                    + rotation[3 * k + 1] * r[1] + rotation[3 * k + 2] * r[2];
+            }
+        }
+    }
+};
+
+namespace minpermdist_detail {
+
+/**
+ * return the eigenvector of the largest eigenvalue of the symmetric 4x4
+ * matrix A using cyclic Jacobi rotations.  A is destroyed.
+ */
+inline void largest_eigenvector_4(double A[4][4], double evec[4])
+{
+    double V[4][4];
+    for (size_t i = 0; i < 4; ++i) {
+        for (size_t j = 0; j < 4; ++j) {
+            V[i][j] = (i == j) ? 1. : 0.;
+        }
+    }
+    for (size_t sweep = 0; sweep < 50; ++sweep) {
+        double off = 0, diag = 0;
+        for (size_t p = 0; p < 4; ++p) {
+            diag += A[p][p] * A[p][p];
+            for (size_t q = p + 1; q < 4; ++q) {
+                off += A[p][q] * A[p][q];
+            }
+        }
+        if (off <= 1e-30 * diag || off == 0) {
+            break;
+        }
+        for (size_t p = 0; p < 3; ++p) {
+            for (size_t q = p + 1; q < 4; ++q) {
+                if (A[p][q] == 0) {
+                    continue;
+                }
+                double const theta = (A[q][q] - A[p][p]) / (2 * A[p][q]);
+                double t = 1. / (std::fabs(theta) + std::sqrt(theta * theta + 1));
+                if (theta < 0) {
+                    t = -t;
+                }
+                double const c = 1. / std::sqrt(t * t + 1);
+                double const s = t * c;
+                for (size_t k = 0; k < 4; ++k) {
+                    double const akp = A[k][p];
+                    double const akq = A[k][q];
+                    A[k][p] = c * akp - s * akq;
+                    A[k][q] = s * akp + c * akq;
+                }
+                for (size_t k = 0; k < 4; ++k) {
+                    double const apk = A[p][k];
+                    double const aqk = A[q][k];
+                    A[p][k] = c * apk - s * aqk;
+                    A[q][k] = s * apk + c * aqk;
+                }
+                for (size_t k = 0; k < 4; ++k) {
+                    double const vkp = V[k][p];
+                    double const vkq = V[k][q];
+                    V[k][p] = c * vkp - s * vkq;
+                    V[k][q] = s * vkp + c * vkq;
+                }
+            }
+        }
+    }
+    size_t imax = 0;
+    for (size_t i = 1; i < 4; ++i) {
+        if (A[i][i] > A[imax][imax]) {
+            imax = i;
+        }
+    }
+    for (size_t i = 0; i < 4; ++i) {
+        evec[i] = V[i][imax];
+    }
+}
+
+/** the rotation matrix of the unit quaternion (q0, qx, qy, qz) */
+inline void quaternion_to_rotation(double q0, double qx, double qy, double qz, double * rot)
+{
+    rot[0] = q0 * q0 + qx * qx - qy * qy - qz * qz;
+    rot[1] = 2 * (qx * qy - q0 * qz);
+    rot[2] = 2 * (qx * qz + q0 * qy);
+    rot[3] = 2 * (qy * qx + q0 * qz);
+    rot[4] = q0 * q0 - qx * qx + qy * qy - qz * qz;
+    rot[5] = 2 * (qy * qz - q0 * qx);
+    rot[6] = 2 * (qz * qx - q0 * qy);
+    rot[7] = 2 * (qz * qy + q0 * qx);
+    rot[8] = q0 * q0 - qx * qx - qy * qy + qz * qz;
+}
+
+/**
+ * return the rotation matrix which best aligns x2 with x1
+ *
+ * minimize |x1 - R x2| over rotations R.  Rotations are about the origin.
+ * This uses the quaternion method of Horn (J. Opt. Soc. Am. A 4, 629, 1987),
+ * which is equivalent to the method of Kearsley used in findrotation.
+ */
+inline void find_rotation(double const * x1, double const * x2, size_t natoms, double * rot)
+{
+    double S[3][3] = {{0, 0, 0}, {0, 0, 0}, {0, 0, 0}};
+    for (size_t i = 0; i < natoms; ++i) {
+        for (size_t a = 0; a < 3; ++a) {
+            for (size_t b = 0; b < 3; ++b) {
+                S[a][b] += x2[3 * i + a] * x1[3 * i + b];
+            }
+        }
+    }
+    double N[4][4];
+    N[0][0] = S[0][0] + S[1][1] + S[2][2];
+    N[0][1] = N[1][0] = S[1][2] - S[2][1];
+    N[0][2] = N[2][0] = S[2][0] - S[0][2];
+    N[0][3] = N[3][0] = S[0][1] - S[1][0];
+    N[1][1] = S[0][0] - S[1][1] - S[2][2];
+    N[1][2] = N[2][1] = S[0][1] + S[1][0];
+    N[1][3] = N[3][1] = S[2][0] + S[0][2];
+    N[2][2] = -S[0][0] + S[1][1] - S[2][2];
+    N[2][3] = N[3][2] = S[1][2] + S[2][1];
+    N[3][3] = -S[0][0] - S[1][1] + S[2][2];
+    double q[4];
+    largest_eigenvector_4(N, q);
+    quaternion_to_rotation(q[0], q[1], q[2], q[3], rot);
+}
+
+/** x <- R x for each atom */
+inline void rotate(double const * rot, double * x, size_t natoms)
+{
+    for (size_t i = 0; i < natoms; ++i) {
+        double * r = x + 3 * i;
+        double const r0 = r[0], r1 = r[1], r2 = r[2];
+        r[0] = rot[0] * r0 + rot[1] * r1 + rot[2] * r2;
+        r[1] = rot[3] * r0 + rot[4] * r1 + rot[5] * r2;
+        r[2] = rot[6] * r0 + rot[7] * r1 + rot[8] * r2;
+    }
+}
+
+/** C = A B for 3x3 matrices */
+inline void matmul3(double const * A, double const * B, double * C)
+{
+    for (size_t i = 0; i < 3; ++i) {
+        for (size_t j = 0; j < 3; ++j) {
+            C[3 * i + j] = A[3 * i] * B[j] + A[3 * i + 1] * B[3 + j] + A[3 * i + 2] * B[6 + j];
+        }
+    }
+}
+
+inline double distance(double const * x1, double const * x2, size_t n)
+{
+    double d = 0;
+    for (size_t i = 0; i < n; ++i) {
+        double const dx = x1[i] - x2[i];
+        d += dx * dx;
+    }
+    return std::sqrt(d);
+}
+
+/**
+ * a uniformly distributed random rotation matrix from a random unit quaternion
+ * (Shoemake, Graphics Gems III, 1992)
+ */
+inline void random_rotation(std::mt19937 & rng, double * rot)
+{
+    std::uniform_real_distribution<double> uniform(0., 1.);
+    double const u1 = uniform(rng), u2 = uniform(rng), u3 = uniform(rng);
+    double const a = std::sqrt(1 - u1), b = std::sqrt(u1);
+    double const twopi = 2 * M_PI;
+    double const q0 = a * std::sin(twopi * u2);
+    double const qx = a * std::cos(twopi * u2);
+    double const qy = b * std::sin(twopi * u3);
+    double const qz = b * std::cos(twopi * u3);
+    quaternion_to_rotation(q0, qx, qy, qz, rot);
+}
+
+} // namespace minpermdist_detail
+
+/**
+ * Minimize the distance between two atomic clusters with respect to
+ * translation, rotation, inversion and permutations of identical atoms.
+ *
+ * This is a c++ implementation of the python class
+ * pele.mindist.MinPermDistCluster for atomic clusters (cartesian coordinates,
+ * all masses equal).  The algorithm is the same: first the standard
+ * alignments of StandardClusterAlignment are tried, then niter random
+ * rotations.  Each trial rotation is followed by an optimal permutation
+ * (solved with LinearAssignment for each group of permutable atoms) and an
+ * optimal rotation.  The search stops as soon as a distance less than tol is
+ * found.
+ *
+ * The trials are independent, so they are distributed over nthreads threads.
+ * The random rotation of trial i depends only on seed and i, so the result
+ * does not depend on the number of threads unless the search stops early.
+ */
+class MinPermDistCluster {
+    std::vector<std::vector<size_t> > permlist_;
+    bool can_invert_;
+    size_t niter_;
+    double tol_;
+    double accuracy_;
+    size_t nthreads_;
+    unsigned long seed_;
+    ClusterTransformation transform_; /**< the transformation from the last alignment */
+
+    /** the state of one trial alignment */
+    struct Trial {
+        std::vector<double> x2;
+        std::vector<double> cost;
+        std::vector<size_t> perm;
+        std::vector<size_t> group_perm;
+        std::vector<double> x2_permuted;
+        LinearAssignment lap;
+    };
+
+    /** the best alignment found so far, shared between the threads */
+    struct Best {
+        std::mutex mutex;
+        std::atomic<bool> done;
+        double dist;
+        double rotation[9];
+        bool invert;
+        std::vector<size_t> perm;
+    };
+
+public:
+    MinPermDistCluster(std::vector<std::vector<size_t> > const & permlist,
+            bool can_invert=true, size_t niter=10, double tol=0.01,
+            double accuracy=0.01, size_t nthreads=1, unsigned long seed=0)
+        : permlist_(permlist),
+          can_invert_(can_invert),
+          niter_(niter),
+          tol_(tol),
+          accuracy_(accuracy),
+          nthreads_(std::max<size_t>(nthreads, 1)),
+          seed_(seed)
+    {}
+
+    void set_seed(unsigned long seed) { seed_ = seed; }
+    void set_nthreads(size_t nthreads) { nthreads_ = std::max<size_t>(nthreads, 1); }
+
+    /**
+     * return the transformation which was applied to x2 in the last call to align
+     */
+    ClusterTransformation const & get_transformation() const { return transform_; }
+
+    /**
+     * put x2 in best alignment with x1
+     *
+     * @param x1 the reference structure.  It is not modified.
+     * @param x2 the structure to align
+     * @param x2new on return x2 in best alignment with x1
+     * @return the distance between x1 and x2new
+     */
+    double align(Array<double> x1, Array<double> x2, Array<double> x2new)
+    {
+        if (x1.size() != x2.size() || x1.size() != x2new.size() || x1.size() % 3 != 0) {
+            throw std::invalid_argument("the coordinates must have the same size, a multiple of 3");
+        }
+        size_t const natoms = x1.size() / 3;
+        size_t const ndof = 3 * natoms;
+        check_permlist(natoms);
+
+        // move the centers of mass to the origin
+        std::vector<double> y1(x1.data(), x1.data() + ndof);
+        std::vector<double> y2(x2.data(), x2.data() + ndof);
+        ClusterTransformation transform;
+        center(y1, transform.com1);
+        center(y2, transform.com2);
+
+        Best best;
+        best.done = false;
+        best.dist = minpermdist_detail::distance(y1.data(), y2.data(), ndof);
+        std::fill(best.rotation, best.rotation + 9, 0.);
+        best.rotation[0] = best.rotation[4] = best.rotation[8] = 1.;
+        best.invert = false;
+        best.perm.resize(natoms);
+        for (size_t i = 0; i < natoms; ++i) {
+            best.perm[i] = i;
+        }
+
+        if (best.dist >= tol_) {
+            std::vector<double> standard_rotations;
+            std::vector<bool> standard_inversions;
+            standard_alignments(y1, y2, standard_rotations, standard_inversions);
+            size_t const nstandard = standard_inversions.size();
+            size_t const ntrials = nstandard + niter_;
+            std::atomic<size_t> next_trial(0);
+
+            auto worker = [&]() {
+                Trial trial;
+                double rot[9];
+                while (!best.done) {
+                    size_t const itrial = next_trial++;
+                    if (itrial >= ntrials) {
+                        break;
+                    }
+                    if (itrial < nstandard) {
+                        check_match(y1, y2, &standard_rotations[9 * itrial],
+                                standard_inversions[itrial], trial, best);
+                    } else {
+                        std::mt19937 rng(seed_ + itrial - nstandard);
+                        minpermdist_detail::random_rotation(rng, rot);
+                        check_match(y1, y2, rot, false, trial, best);
+                        if (can_invert_ && !best.done) {
+                            check_match(y1, y2, rot, true, trial, best);
+                        }
+                    }
+                }
+            };
+
+            size_t const nthreads = std::min(nthreads_, ntrials);
+            if (nthreads <= 1) {
+                worker();
+            } else {
+                std::vector<std::thread> threads;
+                for (size_t i = 0; i < nthreads; ++i) {
+                    threads.push_back(std::thread(worker));
+                }
+                for (size_t i = 0; i < nthreads; ++i) {
+                    threads[i].join();
+                }
+            }
+        }
+
+        std::copy(best.rotation, best.rotation + 9, transform.rotation);
+        transform.invert = best.invert;
+        transform.permutation = best.perm;
+        transform.apply(x2.data(), x2new.data(), natoms);
+        transform_ = transform;
+        return minpermdist_detail::distance(x1.data(), x2new.data(), ndof);
+    }
+
+protected:
+    void check_permlist(size_t natoms) const
+    {
+        for (size_t k = 0; k < permlist_.size(); ++k) {
+            for (size_t i = 0; i < permlist_[k].size(); ++i) {
+                if (permlist_[k][i] >= natoms) {
+                    throw std::invalid_argument("permlist contains an atom index out of range");
+                }
+            }
+        }
+    }
+
+    static void center(std::vector<double> & x, double * com)
+    {
+        size_t const natoms = x.size() / 3;
+        std::fill(com, com + 3, 0.);
+        for (size_t i = 0; i < natoms; ++i) {
+            for (size_t k = 0; k < 3; ++k) {
+                com[k] += x[3 * i + k];
+            }
+        }
+        for (size_t k = 0; k < 3; ++k) {
+            com[k] /= natoms;
+        }
+        for (size_t i = 0; i < natoms; ++i) {
+            for (size_t k = 0; k < 3; ++k) {
+                x[3 * i + k] -= com[k];
+            }
+        }
+    }
+
+    /**
+     * compute the candidate rotations of StandardClusterAlignment
+     *
+     * Two reference atoms far from the center and not in a line are chosen in
+     * x1.  For every pair of atoms in x2 at the same distances from the
+     * center (within accuracy) and with approximately the same angle between
+     * them, the rotation which maps the pair onto the reference atoms is a
+     * candidate.
+     */
+    void standard_alignments(std::vector<double> const & x1, std::vector<double> const & x2,
+            std::vector<double> & rotations, std::vector<bool> & inversions) const
+    {
+        size_t const natoms = x1.size() / 3;
+        if (natoms < 2) {
+            return;
+        }
+        std::vector<double> R1(natoms), R2(natoms);
+        for (size_t i = 0; i < natoms; ++i) {
+            R1[i] = norm(&x1[3 * i]);
+            R2[i] = norm(&x2[3 * i]);
+        }
+        std::vector<size_t> idx(natoms);
+        for (size_t i = 0; i < natoms; ++i) {
+            idx[i] = i;
+        }
+        std::sort(idx.begin(), idx.end(), [&](size_t a, size_t b) { return R1[a] < R1[b]; });
+        size_t const ref1 = idx[natoms - 1];
+        size_t ref2 = idx[natoms - 2];
+        double cos_best = 99.;
+        for (size_t k = natoms - 1; k-- > 0;) {
+            double const c = cos_angle(&x1[3 * ref1], &x1[3 * idx[k]]);
+            if (std::fabs(c) < std::fabs(cos_best)) {
+                cos_best = c;
+                ref2 = idx[k];
+            }
+            if (std::fabs(c) < 0.9) {
+                break;
+            }
+        }
+
+        double const R2max = *std::max_element(R2.begin(), R2.end());
+        if (std::fabs(R1[ref1] - R2max) > accuracy_) {
+            return;
+        }
+        std::vector<size_t> candidates1, candidates2;
+        for (size_t i = 0; i < natoms; ++i) {
+            if (R2[i] > R1[ref1] - accuracy_ && R2[i] < R1[ref1] + accuracy_) {
+                candidates1.push_back(i);
+            }
+            if (R2[i] > R1[ref2] - accuracy_ && R2[i] < R1[ref2] + accuracy_) {
+                candidates2.push_back(i);
+            }
+        }
+
+        double ref[6], pair[6], rot[9];
+        std::copy(&x1[3 * ref1], &x1[3 * ref1] + 3, ref);
+        std::copy(&x1[3 * ref2], &x1[3 * ref2] + 3, ref + 3);
+        for (size_t a = 0; a < candidates1.size(); ++a) {
+            for (size_t b = 0; b < candidates2.size(); ++b) {
+                size_t const i = candidates1[a];
+                size_t const j = candidates2[b];
+                if (i == j) {
+                    continue;
+                }
+                if (std::fabs(cos_angle(&x2[3 * i], &x2[3 * j]) - cos_best) > 0.5) {
+                    continue;
+                }
+                for (int inv = 0; inv < (can_invert_ ? 2 : 1); ++inv) {
+                    double const sign = inv ? -1. : 1.;
+                    for (size_t k = 0; k < 3; ++k) {
+                        pair[k] = sign * x2[3 * i + k];
+                        pair[3 + k] = sign * x2[3 * j + k];
+                    }
+                    minpermdist_detail::find_rotation(ref, pair, 2, rot);
+                    rotations.insert(rotations.end(), rot, rot + 9);
+                    inversions.push_back(inv == 1);
+                }
+            }
+        }
+    }
+
+    /**
+     * rotate (and invert) x2, optimize the permutation and the rotation and
+     * update best if it is an improvement
+     */
+    void check_match(std::vector<double> const & x1, std::vector<double> const & x2,
+            double const * rot, bool invert, Trial & trial, Best & best) const
+    {
+        size_t const natoms = x1.size() / 3;
+        size_t const ndof = x1.size();
+        trial.x2 = x2;
+        if (invert) {
+            for (size_t i = 0; i < ndof; ++i) {
+                trial.x2[i] = -trial.x2[i];
+            }
+        }
+        minpermdist_detail::rotate(rot, trial.x2.data(), natoms);
+
+        // find the best permutation of each group of permutable atoms
+        trial.perm.resize(natoms);
+        for (size_t i = 0; i < natoms; ++i) {
+            trial.perm[i] = i;
+        }
+        for (size_t k = 0; k < permlist_.size(); ++k) {
+            std::vector<size_t> const & atoms = permlist_[k];
+            size_t const n = atoms.size();
+            trial.cost.resize(n * n);
+            for (size_t a = 0; a < n; ++a) {
+                double const * r1 = &x1[3 * atoms[a]];
+                for (size_t b = 0; b < n; ++b) {
+                    double const * r2 = &trial.x2[3 * atoms[b]];
+                    double const dx = r1[0] - r2[0];
+                    double const dy = r1[1] - r2[1];
+                    double const dz = r1[2] - r2[2];
+                    trial.cost[a * n + b] = dx * dx + dy * dy + dz * dz;
+                }
+            }
+            trial.lap.solve(trial.cost.data(), n, trial.group_perm);
+            for (size_t a = 0; a < n; ++a) {
+                trial.perm[atoms[a]] = atoms[trial.group_perm[a]];
+            }
+        }
+        trial.x2_permuted.resize(ndof);
+        for (size_t i = 0; i < natoms; ++i) {
+            std::copy(&trial.x2[3 * trial.perm[i]], &trial.x2[3 * trial.perm[i]] + 3,
+                    &trial.x2_permuted[3 * i]);
+        }
+
+        // now find the best rotational alignment
+        double rot2[9], rottot[9];
+        minpermdist_detail::find_rotation(x1.data(), trial.x2_permuted.data(), natoms, rot2);
+        minpermdist_detail::rotate(rot2, trial.x2_permuted.data(), natoms);
+        double const dist = minpermdist_detail::distance(x1.data(), trial.x2_permuted.data(), ndof);
+
+        minpermdist_detail::matmul3(rot2, rot, rottot);
+        std::lock_guard<std::mutex> lock(best.mutex);
+        if (dist < best.dist) {
+            best.dist = dist;
+            std::copy(rottot, rottot + 9, best.rotation);
+            best.invert = invert;
+            best.perm = trial.perm;
+            if (dist < tol_) {
+                best.done = true;
+            }
+        }
+    }
+
+    static double norm(double const * r)
+    {
+        return std::sqrt(r[0] * r[0] + r[1] * r[1] + r[2] * r[2]);
+    }
+
+    static double cos_angle(double const * r1, double const * r2)
+    {
+        return (r1[0] * r2[0] + r1[1] * r2[1] + r1[2] * r2[2]) / (norm(r1) * norm(r2));
+    }
+};
+
+} // namespace pele
+
+#endif
@@ -0,0 +1,355 @@
+#ifndef _PELE_NEB_H
+#define _PELE_NEB_H
+
+#include <cmath>
+#include <memory>
+#include <stdexcept>
+#include <vector>
+
+#include "array.h"
+#include "base_potential.h"
+
+namespace pele {
+
+/**
+ * The doubly nudged elastic band as a potential.
+ *
+ * The coordinates are those of the movable images of the band (all images
+ * except the two fixed end points) stored one after the other.  The
+ * gradient returned is the NEB "force": the component of the true gradient
+ * perpendicular to the path plus the spring force along the path, and
+ * optionally the doubly nudged part of the spring force.  The returned energy
+ * is the sum of the true energies of all the images.  Since the NEB force is
+ * not the gradient of any energy, this should be optimized with an optimizer
+ * which relies mostly on the gradient, e.g. LBFGS with a large max_f_rise.
+ *
+ * This is a c++ implementation of the python class pele.transition_states.NEB
+ * and uses the same conventions.  See that class for references.
+ */
+class NEB : public BasePotential {
+protected:
+    std::shared_ptr<BasePotential> potential_;
+    size_t nimages_; /**< the total number of images including the end points */
+    size_t ndof_; /**< the number of degrees of freedom of each image */
+    double k_; /**< the spring constant */
+    bool dneb_; /**< if true do double nudging */
+    bool with_spring_energy_; /**< if true add the spring energy to the energy */
+    int adjustk_freq_;
+    double adjustk_tol_;
+    double adjustk_factor_;
+    size_t neval_; /**< the number of times the gradient has been computed */
+
+    Array<double> coords_; /**< the coordinates of all images including the end points */
+    Array<double> true_gradient_; /**< the true gradient of the images */
+    Array<double> energies_; /**< the true energies of the images */
+    Array<double> distances_; /**< the distances between neighboring images */
+    std::vector<bool> climbing_; /**< which images are climbing images */
+
+    // work arrays
+    Array<double> t_;
+    Array<double> g_left_;
+    Array<double> g_right_;
+    Array<double> g_perp_;
+    Array<double> g_spring_;
+
+public:
+    /**
+     * constructor
+     *
+     * @param potential the potential of a single image
+     * @param path the initial coordinates of all the images, including the
+     *        end points, one after the other
+     * @param nimages the number of images including the end points
+     */
+    NEB(std::shared_ptr<BasePotential> potential, Array<double> path,
+            size_t nimages, double k=100., bool dneb=true)
+        : potential_(potential),
+          nimages_(nimages),
+          ndof_(path.size() / nimages),
+          k_(k),
+          dneb_(dneb),
+          with_spring_energy_(false),
+          adjustk_freq_(0),
+          adjustk_tol_(0.1),
+          adjustk_factor_(1.05),
+          neval_(0),
+          coords_(path.copy()),
+          true_gradient_(path.size(), 0),
+          energies_(nimages, 0),
+          distances_(nimages - 1, 0),
+          climbing_(nimages, false),
+          t_(ndof_),
+          g_left_(ndof_),
+          g_right_(ndof_),
+          g_perp_(ndof_),
+          g_spring_(ndof_)
+    {
+        if (nimages_ < 3) {
+            throw std::invalid_argument("NEB: there must be at least 3 images");
+        }
+        if (ndof_ * nimages_ != path.size()) {
+            throw std::invalid_argument("NEB: path.size() must be a multiple of nimages");
+        }
+        for (size_t i = 0; i < nimages_; ++i) {
+            energies_[i] = potential_->get_energy(get_image(i));
+        }
+        update_distances();
+    }
+
+    virtual ~NEB() {}
+
+    /**
+     * return the number of degrees of freedom of the band (excluding the end points)
+     */
+    inline size_t get_nactive_dof() const { return (nimages_ - 2) * ndof_; }
+    inline size_t get_nimages() const { return nimages_; }
+    inline double get_k() const { return k_; }
+    inline void set_k(double k) { k_ = k; }
+    inline void set_dneb(bool dneb) { dneb_ = dneb; }
+    inline void set_with_spring_energy(bool with_spring_energy)
+    {
+        with_spring_energy_ = with_spring_energy;
+    }
+
+    /**
+     * adjust k every adjustk_freq gradient evaluations.
+     *
+     * If the average relative deviation of the image spacing is larger than
+     * adjustk_tol then k is multiplied by adjustk_factor, else it is divided
+     * by adjustk_factor.  Set adjustk_freq to zero to disable.
+     */
+    inline void set_adjust_k(int adjustk_freq, double adjustk_tol, double adjustk_factor)
+    {
+        adjustk_freq_ = adjustk_freq;
+        adjustk_tol_ = adjustk_tol;
+        adjustk_factor_ = adjustk_factor;
+    }
+
+    /**
+     * return the coordinates of all the images, including the end points
+     */
+    inline Array<double> get_coords() const { return coords_.copy(); }
+    inline Array<double> get_energies() const { return energies_.copy(); }
+    inline Array<double> get_distances() const { return distances_.copy(); }
+
+    inline void set_climbing(size_t i, bool climbing)
+    {
+        if (i == 0 || i >= nimages_ - 1) {
+            throw std::invalid_argument("NEB: the end points can not be climbing images");
+        }
+        climbing_[i] = climbing;
+    }
+    inline bool is_climbing(size_t i) const { return climbing_.at(i); }
+
+    /**
+     * make all maxima along the band climbing images
+     */
+    void make_all_maxima_climbing()
+    {
+        for (size_t i = 1; i < nimages_ - 1; ++i) {
+            if (energies_[i] > energies_[i - 1] && energies_[i] > energies_[i + 1]) {
+                climbing_[i] = true;
+            }
+        }
+    }
+
+    /**
+     * set the coordinates of the movable images and compute their true energies
+     */
+    void set_active_coords(Array<double> x)
+    {
+        copy_active(x);
+        for (size_t i = 1; i < nimages_ - 1; ++i) {
+            energies_[i] = potential_->get_energy(get_image(i));
+        }
+        update_distances();
+    }
+
+    virtual double get_energy(Array<double> x)
+    {
+        Array<double> grad(x.size());
+        return get_energy_gradient(x, grad);
+    }
+
+    virtual double get_energy_gradient(Array<double> x, Array<double> grad)
+    {
+        if (grad.size() != x.size()) {
+            throw std::invalid_argument("NEB: grad.size() must be the same as x.size()");
+        }
+        copy_active(x);
+
+        double energy = energies_[0] + energies_[nimages_ - 1];
+        for (size_t i = 1; i < nimages_ - 1; ++i) {
+            energies_[i] = potential_->get_energy_gradient(get_image(i),
+                    true_gradient_.view(i * ndof_, (i + 1) * ndof_));
+            energy += energies_[i];
+        }
+
+        double spring_energy = 0;
+        for (size_t i = 1; i < nimages_ - 1; ++i) {
+            spring_energy += compute_image_force(i,
+                    grad.view((i - 1) * ndof_, i * ndof_));
+        }
+
+        ++neval_;
+        if (adjustk_freq_ > 0 && neval_ % adjustk_freq_ == 0) {
+            adjust_k();
+        }
+
+        if (with_spring_energy_) {
+            energy += spring_energy;
+        }
+        return energy;
+    }
+
+protected:
+    inline Array<double> get_image(size_t i)
+    {
+        return coords_.view(i * ndof_, (i + 1) * ndof_);
+    }
+
+    void copy_active(Array<double> x)
+    {
+        if (x.size() != get_nactive_dof()) {
+            throw std::invalid_argument("NEB: x has the wrong size");
+        }
+        coords_.view(ndof_, (nimages_ - 1) * ndof_).assign(x);
+    }
+
+    void update_distances()
+    {
+        for (size_t i = 0; i < nimages_ - 1; ++i) {
+            Array<double> x1 = get_image(i);
+            Array<double> x2 = get_image(i + 1);
+            double d2 = 0;
+            for (size_t j = 0; j < ndof_; ++j) {
+                double const dx = x1[j] - x2[j];
+                d2 += dx * dx;
+            }
+            distances_[i] = std::sqrt(d2);
+        }
+    }
+
+    /**
+     * compute the upwind tangent at image i
+     *
+     * Henkelman and Jonsson, J. Chem. Phys 113 (22), 9978 (2000)
+     */
+    void compute_tangent(size_t i)
+    {
+        double const central = energies_[i];
+        double const left = energies_[i - 1];
+        double const right = energies_[i + 1];
+        double const vmax = std::max(std::abs(central - left), std::abs(central - right));
+        double const vmin = std::min(std::abs(central - left), std::abs(central - right));
+        double a_left, a_right;
+        if ((central >= left && central >= right) || (central <= left && central <= right)) {
+            // special interpolation treatment for maxima/minima
+            if (left > right) {
+                a_left = vmax;
+                a_right = vmin;
+            } else {
+                a_left = vmin;
+                a_right = vmax;
+            }
+        } else if (left > right) {
+            a_left = 1;
+            a_right = 0;
+        } else {
+            a_left = 0;
+            a_right = 1;
+        }
+        for (size_t j = 0; j < ndof_; ++j) {
+            t_[j] = a_left * g_left_[j] - a_right * g_right_[j];
+        }
+        double const tnorm = norm(t_);
+        if (tnorm > 0) {
+            t_ /= tnorm;
+        }
+    }
+
+    /**
+     * compute the NEB force on image i and return the spring energy
+     *
+     * Trygubenko and Wales, J. Chem. Phys. 120, 2082 (2004)
+     */
+    double compute_image_force(size_t i, Array<double> g_tot)
+    {
+        Array<double> x = get_image(i);
+        Array<double> xleft = get_image(i - 1);
+        Array<double> xright = get_image(i + 1);
+        Array<double> greal = true_gradient_.view(i * ndof_, (i + 1) * ndof_);
+
+        double d_left = 0;
+        double d_right = 0;
+        for (size_t j = 0; j < ndof_; ++j) {
+            g_left_[j] = x[j] - xleft[j];
+            g_right_[j] = x[j] - xright[j];
+            d_left += g_left_[j] * g_left_[j];
+            d_right += g_right_[j] * g_right_[j];
+        }
+        distances_[i - 1] = std::sqrt(d_left);
+        distances_[i] = std::sqrt(d_right);
+
+        compute_tangent(i);
+
+        double const greal_t = dot(greal, t_);
+        if (climbing_[i]) {
+            for (size_t j = 0; j < ndof_; ++j) {
+                g_tot[j] = greal[j] - 2. * greal_t * t_[j];
+            }
+            return 0;
+        }
+
+        // the perpendicular part of the true gradient plus the parallel part
+        // of the spring force
+        for (size_t j = 0; j < ndof_; ++j) {
+            g_perp_[j] = greal[j] - greal_t * t_[j];
+            g_tot[j] = g_perp_[j] + k_ * (d_left - d_right) * t_[j];
+            g_spring_[j] = k_ * (g_left_[j] + g_right_[j]);
+        }
+
+        if (dneb_) {
+            // double nudging: the perpendicular part of the spring force
+            // projected perpendicular to the true gradient
+            double const gspring_t = dot(g_spring_, t_);
+            double gs_perp_gperp = 0;
+            for (size_t j = 0; j < ndof_; ++j) {
+                gs_perp_gperp += (g_spring_[j] - gspring_t * t_[j]) * g_perp_[j];
+            }
+            double const gperp2 = dot(g_perp_, g_perp_);
+            double const c = (gperp2 > 0) ? gs_perp_gperp / gperp2 : 0.;
+            for (size_t j = 0; j < ndof_; ++j) {
+                g_tot[j] += g_spring_[j] - gspring_t * t_[j] - c * g_perp_[j];
+            }
+        }
+
+        return 0.5 * dot(g_spring_, g_spring_) / k_;
+    }
+
+    void adjust_k()
+    {
+        double average = 0;
+        for (size_t i = 0; i < distances_.size(); ++i) {
+            average += distances_[i];
+        }
+        average /= distances_.size();
+        if (average <= 0) {
+            return;
+        }
+        double deviation = 0;
+        for (size_t i = 0; i < distances_.size(); ++i) {
+            deviation += std::abs((distances_[i] - average) / average);
+        }
+        deviation /= distances_.size();
+        if (deviation > adjustk_tol_) {
+            k_ *= adjustk_factor_;
+        } else {
+            k_ /= adjustk_factor_;
+        }
+    }
+};
+
+} // namespace pele
+
+#endif
@@ -0,0 +1,502 @@
+#ifndef _NGT_COMPACT_HPP_
+#define _NGT_COMPACT_HPP_
+/*
+ * A memory efficient implementation of the New Graph Transformation method
+ * (NGT) described in
+ *
+ * David Wales, J. Chem. Phys., 2009 http://dx.doi.org/10.1063/1.3133782
+ *
+ * This computes the same quantities as pele::NGT in ngt.hpp, but the graph is
+ * stored in flat arrays indexed by the node id rather than as a network of
+ * individually allocated nodes and edges.  The out edges of each node are
+ * stored in a vector of (head, P) pairs sorted by head and the in edges in a
+ * sorted vector of tail ids.  The self transition probabilities are stored
+ * separately.  Removing a node merges sorted vectors, so no memory is
+ * allocated per edge.
+ *
+ * The order in which the intermediate nodes are removed is chosen with the
+ * minimum degree heuristic, which limits the number of new edges created.
+ */
+
+#include <algorithm>
+#include <cstdlib>
+#include <functional>
+#include <iostream>
+#include <list>
+#include <map>
+#include <queue>
+#include <set>
+#include <vector>
+#include <utility>
+#include <assert.h>
+#include <stdexcept>
+
+#include "graph.hpp"
+
+namespace pele
+{
+
+/**
+ * a directed graph with nodes 0..n-1 stored in flat arrays
+ */
+class CompactGraph {
+public:
+    typedef std::pair<node_id, double> out_edge_t;
+    typedef std::vector<out_edge_t> out_list_t;
+    typedef std::vector<node_id> in_list_t;
+
+    std::vector<double> tau; /**< the waiting time of each node */
+    std::vector<double> Pself; /**< the self transition probability P_uu */
+    std::vector<out_list_t> out; /**< the out edges (v, P_uv), sorted by v, not including u */
+    std::vector<in_list_t> in; /**< the tails of the in edges, sorted, not including u */
+    std::vector<char> alive; /**< false if the node has been removed */
+    size_t nalive;
+
+    CompactGraph(size_t n=0)
+        : tau(n, 0.),
+          Pself(n, 0.),
+          out(n),
+          in(n),
+          alive(n, 1),
+          nalive(n)
+    {}
+
+    size_t number_of_nodes() const { return nalive; }
+    size_t size() const { return tau.size(); }
+    size_t degree(node_id u) const { return out[u].size() + in[u].size(); }
+
+    /**
+     * return P_uv, or 0 if there is no edge u->v
+     */
+    double get_P(node_id u, node_id v) const
+    {
+        if (u == v) {
+            return Pself[u];
+        }
+        out_list_t const & ulist = out[u];
+        auto iter = std::lower_bound(ulist.begin(), ulist.end(), out_edge_t(v, -1e300));
+        if (iter != ulist.end() && iter->first == v) {
+            return iter->second;
+        }
+        return 0.;
+    }
+
+    /**
+     * return 1 - P_uu
+     *
+     * If P_uu is close to one, 1 - P_uu is computed by summing P over the out
+     * edges of u.  This is extremely important for numerical precision.
+     */
+    double one_minus_Pself(node_id u) const
+    {
+        if (Pself[u] < 0.99) {
+            return 1. - Pself[u];
+        }
+        double omP = 0.;
+        for (auto const & e : out[u]) {
+            omP += e.second;
+        }
+        return omP;
+    }
+};
+
+class CompactNGT {
+public:
+    typedef std::map<std::pair<node_id, node_id>, double> rate_map_t;
+
+    CompactGraph _graph;
+    std::vector<char> _in_A;
+    std::vector<char> _in_B;
+    std::vector<node_id> _A;
+    std::vector<node_id> _B;
+    bool debug;
+
+    std::vector<double> initial_tau;
+    std::map<node_id, double> final_omPxx;
+    std::map<node_id, double> final_tau;
+    std::map<node_id, double> final_committors;
+    std::vector<double> weights;
+
+private:
+    // work space for merging sorted lists
+    CompactGraph::out_list_t _out_work;
+    CompactGraph::in_list_t _in_work;
+
+public:
+    /**
+     * construct from a rate matrix in compressed sparse row format
+     *
+     * The rate from node u to node indices[j] is data[j] for j in
+     * indptr[u] .. indptr[u+1]-1.  The nodes are numbered 0..n-1.
+     */
+    template<class Acontainer, class Bcontainer>
+    CompactNGT(size_t n, long const * indptr, long const * indices, double const * data,
+            Acontainer const & A, Bcontainer const & B)
+        : _graph(n),
+          debug(false)
+    {
+        std::vector<size_t> in_count(n, 0);
+        for (node_id u = 0; u < n; ++u) {
+            double sum_out = 0;
+            for (long j = indptr[u]; j < indptr[u + 1]; ++j) {
+                sum_out += data[j];
+            }
+            double tau_u = 1. / sum_out;
+            _graph.tau[u] = tau_u;
+            CompactGraph::out_list_t & ulist = _graph.out[u];
+            ulist.reserve(indptr[u + 1] - indptr[u]);
+            for (long j = indptr[u]; j < indptr[u + 1]; ++j) {
+                node_id v = indices[j];
+                if (v >= n) {
+                    throw std::invalid_argument("CompactNGT: node index out of range");
+                }
+                if (v == u) {
+                    _graph.Pself[u] += data[j] * tau_u;
+                } else {
+                    ulist.push_back(CompactGraph::out_edge_t(v, data[j] * tau_u));
+                    ++in_count[v];
+                }
+            }
+            std::sort(ulist.begin(), ulist.end());
+        }
+        initial_tau = _graph.tau;
+
+        for (node_id v = 0; v < n; ++v) {
+            _graph.in[v].reserve(in_count[v]);
+        }
+        for (node_id u = 0; u < n; ++u) {
+            for (auto const & e : _graph.out[u]) {
+                // u is increasing so the in lists are created sorted
+                _graph.in[e.first].push_back(u);
+            }
+        }
+        set_groups(A, B);
+    }
+
+    /**
+     * construct from a map of rate constants
+     *
+     * The node ids must be in the range 0..n-1 where n is the largest node id + 1
+     */
+    template<class Acontainer, class Bcontainer>
+    CompactNGT(rate_map_t & rate_constants, Acontainer const & A, Bcontainer const & B)
+        : debug(false)
+    {
+        size_t n = 0;
+        for (auto const & mapval : rate_constants) {
+            n = std::max(n, std::max(mapval.first.first, mapval.first.second) + 1);
+        }
+        // the map is sorted by (u, v) so this is already in csr format
+        std::vector<long> indptr(n + 1, 0), indices;
+        std::vector<double> data;
+        for (auto const & mapval : rate_constants) {
+            indptr[mapval.first.first + 1]++;
+            indices.push_back(mapval.first.second);
+            data.push_back(mapval.second);
+        }
+        for (size_t u = 0; u < n; ++u) {
+            indptr[u + 1] += indptr[u];
+        }
+        CompactNGT tmp(n, indptr.data(), indices.data(), data.data(), A, B);
+        *this = tmp;
+    }
+
+    void set_debug() { debug = true; }
+    std::map<node_id, double> const & get_committors() { return final_committors; }
+
+    void set_node_occupation_probabilities(std::map<node_id, double> & Peq)
+    {
+        weights.assign(_graph.size(), 1.);
+        for (auto const & mapval : Peq) {
+            if (mapval.first < weights.size()) {
+                weights[mapval.first] = mapval.second;
+            }
+        }
+    }
+
+    /**
+     * remove node x from graph and update its neighbors
+     *
+     * tau_u -> tau_u + P_ux * tau_x / (1 - P_xx)
+     * P_uv -> P_uv + P_ux * P_xv / (1 - P_xx)
+     */
+    void remove_node(CompactGraph & graph, node_id x)
+    {
+        if (debug) {
+            std::cout << "removing node " << x << " degree " << graph.degree(x) << "\n";
+        }
+        double const tau_x = graph.tau[x];
+        double const omPxx = graph.one_minus_Pself(x);
+        CompactGraph::out_list_t const & xout = graph.out[x];
+        CompactGraph::in_list_t const & xin = graph.in[x];
+
+        // update the out edges of the nodes u with an edge u->x
+        for (node_id u : xin) {
+            double const Pux = graph.get_P(u, x);
+            graph.tau[u] += Pux * tau_x / omPxx;
+            double const factor = Pux / omPxx;
+
+            // out[u] = out[u] - {x} + factor * out[x]
+            CompactGraph::out_list_t const & uout = graph.out[u];
+            _out_work.clear();
+            auto iu = uout.begin();
+            auto ix = xout.begin();
+            while (iu != uout.end() || ix != xout.end()) {
+                if (ix == xout.end() || (iu != uout.end() && iu->first < ix->first)) {
+                    if (iu->first != x) {
+                        _out_work.push_back(*iu);
+                    }
+                    ++iu;
+                } else if (ix->first == u) {
+                    graph.Pself[u] += factor * ix->second;
+                    ++ix;
+                } else if (iu == uout.end() || ix->first < iu->first) {
+                    _out_work.push_back(CompactGraph::out_edge_t(ix->first, factor * ix->second));
+                    ++ix;
+                } else {
+                    _out_work.push_back(CompactGraph::out_edge_t(iu->first, iu->second + factor * ix->second));
+                    ++iu;
+                    ++ix;
+                }
+            }
+            graph.out[u].swap(_out_work);
+        }
+
+        // update the in edges of the nodes v with an edge x->v
+        for (auto const & xv : xout) {
+            node_id const v = xv.first;
+            // in[v] = in[v] - {x} + in[x] - {v}
+            CompactGraph::in_list_t const & vin = graph.in[v];
+            _in_work.clear();
+            auto iv = vin.begin();
+            auto ix = xin.begin();
+            while (iv != vin.end() || ix != xin.end()) {
+                node_id w;
+                if (ix == xin.end() || (iv != vin.end() && *iv < *ix)) {
+                    w = *iv++;
+                } else if (iv == vin.end() || *ix < *iv) {
+                    w = *ix++;
+                } else {
+                    w = *iv++;
+                    ++ix;
+                }
+                if (w != x && w != v) {
+                    _in_work.push_back(w);
+                }
+            }
+            graph.in[v].swap(_in_work);
+        }
+
+        CompactGraph::out_list_t().swap(graph.out[x]);
+        CompactGraph::in_list_t().swap(graph.in[x]);
+        graph.alive[x] = 0;
+        --graph.nalive;
+    }
+
+    /**
+     * remove all nodes of graph that are not in keep, smallest degree first
+     */
+    void remove_all_except(CompactGraph & graph, std::vector<char> const & keep)
+    {
+        typedef std::pair<size_t, node_id> degree_node_t;
+        std::priority_queue<degree_node_t, std::vector<degree_node_t>, std::greater<degree_node_t> > queue;
+        for (node_id u = 0; u < graph.size(); ++u) {
+            if (graph.alive[u] && !keep[u]) {
+                queue.push(degree_node_t(graph.degree(u), u));
+            }
+        }
+        std::vector<node_id> neibs;
+        while (!queue.empty()) {
+            degree_node_t top = queue.top();
+            queue.pop();
+            node_id x = top.second;
+            if (!graph.alive[x] || top.first != graph.degree(x)) {
+                // this entry is out of date
+                continue;
+            }
+            neibs.clear();
+            for (auto const & e : graph.out[x]) {
+                neibs.push_back(e.first);
+            }
+            neibs.insert(neibs.end(), graph.in[x].begin(), graph.in[x].end());
+
+            remove_node(graph, x);
+
+            for (node_id u : neibs) {
+                if (graph.alive[u] && !keep[u]) {
+                    queue.push(degree_node_t(graph.degree(u), u));
+                }
+            }
+        }
+    }
+
+    /*
+     * phase one of the rate calculation is to remove all intermediate nodes
+     */
+    void phase_one()
+    {
+        remove_all_except(_graph, _in_AB);
+    }
+
+    void phase_two()
+    {
+        reduce_all_in_group(_A, _in_B);
+        reduce_all_in_group(_B, _in_A);
+    }
+
+    void compute_rates()
+    {
+        phase_one();
+        phase_two();
+    }
+
+    /*
+     * Compute the rate from A->B and committor probabilities for all intermediates
+     *
+     * This is much slower than compute_rates.
+     */
+    void compute_rates_and_committors()
+    {
+        std::vector<char> keep = _in_AB;
+        for (node_id x = 0; x < _graph.size(); ++x) {
+            if (!_graph.alive[x] || _in_AB[x]) {
+                continue;
+            }
+            // remove all remaining intermediates from a copy of the graph except x
+            CompactGraph new_graph(_graph);
+            keep[x] = 1;
+            remove_all_except(new_graph, keep);
+            keep[x] = 0;
+            final_omPxx[x] = new_graph.one_minus_Pself(x);
+            final_tau[x] = new_graph.tau[x];
+            final_committors[x] = get_PxB(new_graph, x, _in_B);
+
+            remove_node(_graph, x);
+        }
+
+        phase_two();
+
+        for (node_id a : _A) {
+            final_committors[a] = 0.;
+        }
+        for (node_id b : _B) {
+            final_committors[b] = 1.;
+        }
+    }
+
+    double get_rate_AB() { return _get_rate_final(_A); }
+    double get_rate_BA() { return _get_rate_final(_B); }
+
+    /*
+     * Return the steady state rate A->B.  This must be called after phase_one
+     */
+    double get_rate_AB_SS() { return _get_rate_SS(_A, _in_B); }
+    double get_rate_BA_SS() { return _get_rate_SS(_B, _in_A); }
+
+protected:
+    std::vector<char> _in_AB;
+
+    template<class Acontainer, class Bcontainer>
+    void set_groups(Acontainer const & A, Bcontainer const & B)
+    {
+        size_t n = _graph.size();
+        _in_A.assign(n, 0);
+        _in_B.assign(n, 0);
+        for (node_id a : A) {
+            if (a >= n) throw std::invalid_argument("CompactNGT: a node in A is not in the graph");
+            if (!_in_A[a]) _A.push_back(a);
+            _in_A[a] = 1;
+        }
+        for (node_id b : B) {
+            if (b >= n) throw std::invalid_argument("CompactNGT: a node in B is not in the graph");
+            if (!_in_B[b]) _B.push_back(b);
+            _in_B[b] = 1;
+        }
+        _in_AB.assign(n, 0);
+        for (size_t u = 0; u < n; ++u) {
+            _in_AB[u] = _in_A[u] || _in_B[u];
+        }
+    }
+
+    /*
+     * compute final_tau and final_omPxx for each node x in group.  For each x
+     * this involves removing all other nodes in group from a copy of the graph.
+     */
+    void reduce_all_in_group(std::vector<node_id> const & group, std::vector<char> const & others)
+    {
+        if (group.size() == 1) {
+            node_id x = group[0];
+            final_omPxx[x] = _graph.one_minus_Pself(x);
+            final_tau[x] = _graph.tau[x];
+            return;
+        }
+        CompactGraph working_graph(_graph);
+        std::vector<char> keep = others;
+        for (size_t i = group.size() - 1; i > 0; --i) {
+            node_id x = group[i];
+            CompactGraph new_graph(working_graph);
+            keep[x] = 1;
+            remove_all_except(new_graph, keep);
+            keep[x] = 0;
+            final_omPxx[x] = new_graph.one_minus_Pself(x);
+            final_tau[x] = new_graph.tau[x];
+
+            remove_node(working_graph, x);
+        }
+        node_id x = group[0];
+        final_omPxx[x] = working_graph.one_minus_Pself(x);
+        final_tau[x] = working_graph.tau[x];
+    }
+
+    double _get_rate_final(std::vector<node_id> const & A)
+    {
+        double rate_sum = 0.;
+        double norm = 0.;
+        for (node_id a : A) {
+            double weight = weights.empty() ? 1. : weights[a];
+            rate_sum += weight * final_omPxx.at(a) / final_tau.at(a);
+            norm += weight;
+        }
+        return rate_sum / norm;
+    }
+
+    double _get_rate_SS(std::vector<node_id> const & A, std::vector<char> const & in_B)
+    {
+        double kAB = 0.;
+        double norm = 0.;
+        for (node_id a : A) {
+            double PaB = 0.;
+            for (auto const & e : _graph.out[a]) {
+                if (in_B[e.first]) {
+                    PaB += e.second;
+                }
+            }
+            double weight = weights.empty() ? 1. : weights[a];
+            kAB += weight * PaB / initial_tau[a];
+            norm += weight;
+        }
+        return kAB / norm;
+    }
+
+    /*
+     * sum the probabilities of the out edges of x that end in B normalized by 1-Pxx
+     */
+    double get_PxB(CompactGraph const & graph, node_id x, std::vector<char> const & in_B)
+    {
+        double PxB = 0.;
+        double omPxx = 0.;
+        for (auto const & e : graph.out[x]) {
+            omPxx += e.second;
+            if (in_B[e.first]) {
+                PxB += e.second;
+            }
+        }
+        if (graph.Pself[x] < 0.9) {
+            omPxx = 1. - graph.Pself[x];
+        }
+        return PxB / omPxx;
+    }
+};
+
+}
+#endif